@@ -0,0 +1,76 @@
+"""
+Speed of the C code of the ops of theano.tensor.extra_ops.
+
+Usage: python bench.py [size] [nb_call]
+
+For bincount, repeat, diff, unique, cumsum and cumprod, compare the
+functions compiled with the C linker and with the Python linker, that uses
+the numpy implementation in perform. Set THEANO_FLAGS=openmp=True to use
+several threads in bincount, cumsum and cumprod.
+
+"""
+from __future__ import absolute_import, print_function, division
+import sys
+import timeit
+
+import numpy
+
+import theano
+import theano.tensor as T
+from theano.tensor import extra_ops
+
+size = 1000000
+nb_call = 20
+if len(sys.argv) > 1:
+    size = int(sys.argv[1])
+if len(sys.argv) > 2:
+    nb_call = int(sys.argv[2])
+
+c_mode = theano.compile.get_mode('FAST_RUN')
+py_mode = theano.compile.Mode(linker='py', optimizer=c_mode.optimizer)
+rng = numpy.random.RandomState(0)
+
+ivec = T.lvector()
+fvec = T.fvector()
+fmat = T.fmatrix()
+ints = rng.randint(0, 1000, size)
+floats = rng.rand(size).astype('float32')
+matrix = rng.rand(size // 1000, 1000).astype('float32')
+small = rng.randint(0, 4, size // 4)
+
+cases = [
+    ('bincount(x)', [ivec], extra_ops.bincount(ivec), [ints]),
+    ('bincount(x, w)', [ivec, fvec], extra_ops.bincount(ivec, fvec),
+     [ints, floats]),
+    ('repeat(x, r)', [fvec, ivec],
+     extra_ops.RepeatOp()(fvec, ivec), [floats[:size // 4], small]),
+    ('repeat(m, r, 0)', [fmat, ivec],
+     extra_ops.RepeatOp(axis=0)(fmat, ivec),
+     [matrix, small[:matrix.shape[0]]]),
+    ('diff(m, 1, 0)', [fmat], extra_ops.diff(fmat, 1, 0), [matrix]),
+    ('diff(m, 3, 1)', [fmat], extra_ops.diff(fmat, 3, 1), [matrix]),
+    ('unique(x)', [ivec], extra_ops.Unique()(ivec), [ints]),
+    ('unique(x, True, True, True)', [fvec],
+     extra_ops.Unique(True, True, True)(fvec), [floats.round(3)]),
+    ('cumsum(x)', [fvec], extra_ops.cumsum(fvec), [floats]),
+    # The product is a new buffer that cumsum can overwrite.
+    ('cumsum(2 * x)', [fvec], extra_ops.cumsum(2 * fvec), [floats]),
+    ('cumsum(m, 0)', [fmat], extra_ops.cumsum(fmat, 0), [matrix]),
+    ('cumsum(m, 1)', [fmat], extra_ops.cumsum(fmat, 1), [matrix]),
+    ('cumprod(m, 0)', [fmat], extra_ops.cumprod(fmat, 0), [matrix + 0.5]),
+]
+
+print('%-28s %10s %10s %8s' % ('op', 'numpy ms', 'C ms', 'speedup'))
+for name, inputs, outputs, values in cases:
+    times = []
+    results = []
+    for mode in [py_mode, c_mode]:
+        f = theano.function(inputs, outputs, mode=mode)
+        results.append(f(*values))
+        times.append(min(timeit.repeat(lambda: f(*values), number=nb_call,
+                                       repeat=3)) / nb_call)
+    for py_out, c_out in zip(*[r if isinstance(r, list) else [r]
+                               for r in results]):
+        assert numpy.allclose(py_out, c_out), name
+    print('%-28s %10.3f %10.3f %8.2f' % (
+        name, times[0] * 1e3, times[1] * 1e3, times[0] / times[1]))
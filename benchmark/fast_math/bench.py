@@ -0,0 +1,63 @@
+"""
+Accuracy and speed of the fast_math approximations.
+
+Usage: python bench.py [size] [nb_call]
+
+For exp, log, log1p, tanh, sigmoid, softplus and a Composite using several
+of them, compare the functions compiled with and without the fast_math
+optimization: the maximal relative error of the approximation against the
+exact function computed in float64, and the time of one call, for float32
+and float64 vectors.
+
+"""
+from __future__ import absolute_import, print_function, division
+import sys
+import timeit
+
+import numpy
+
+import theano
+import theano.tensor as T
+
+size = 1000000
+nb_call = 20
+if len(sys.argv) > 1:
+    size = int(sys.argv[1])
+if len(sys.argv) > 2:
+    nb_call = int(sys.argv[2])
+
+exact_mode = theano.compile.get_mode('FAST_RUN').excluding('fast_math')
+fast_mode = theano.compile.get_mode('FAST_RUN').including('fast_math')
+rng = numpy.random.RandomState(0)
+
+cases = [
+    ('exp', T.exp, numpy.exp, (-80, 80)),
+    ('log', T.log, numpy.log, (1e-30, 1e30)),
+    ('log1p', T.log1p, numpy.log1p, (-0.999, 1e5)),
+    ('tanh', T.tanh, numpy.tanh, (-10, 10)),
+    ('sigmoid', T.nnet.sigmoid, lambda v: 1 / (1 + numpy.exp(-v)),
+     (-40, 40)),
+    ('softplus', T.nnet.softplus, lambda v: numpy.log1p(numpy.exp(v)),
+     (-40, 40)),
+    ('tanh(x) * exp(-x * x)', lambda x: T.tanh(x) * T.exp(-x * x),
+     lambda v: numpy.tanh(v) * numpy.exp(-v * v), (-5, 5)),
+]
+
+print('%-24s %-8s %10s %10s %10s %8s' % ('function', 'dtype', 'rel err',
+                                         'exact ms', 'fast ms', 'speedup'))
+for dtype in ['float32', 'float64']:
+    x = T.vector(dtype=dtype)
+    for name, fn, ref, (low, high) in cases:
+        v = rng.uniform(low, high, size).astype(dtype)
+        expected = ref(v.astype('float64'))
+        times = []
+        for mode in [exact_mode, fast_mode]:
+            f = theano.function([x], fn(x), mode=mode)
+            out = f(v)
+            times.append(min(timeit.repeat(lambda: f(v), number=nb_call,
+                                           repeat=3)) / nb_call)
+        ok = expected != 0
+        err = (abs(out[ok] - expected[ok]) / abs(expected[ok])).max()
+        print('%-24s %-8s %10.2e %10.3f %10.3f %8.2f' % (
+            name, dtype, err, times[0] * 1e3, times[1] * 1e3,
+            times[0] / times[1]))
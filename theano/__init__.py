@@ -68,7 +68,7 @@ from theano.compile import (
     SymbolicOutput, Out,
     Mode,
     predefined_modes, predefined_linkers, predefined_optimizers,
-    FunctionMaker, function, function_dump, OpFromGraph,
+    FunctionMaker, function, function_dump, function_batch, OpFromGraph,
     ProfileStats,
     Param, shared, as_op)
 
@@ -77,7 +77,7 @@ from theano.misc.safe_asarray import _asarray
 from theano.printing import pprint, pp
 
 from theano.scan_module import (scan, map, reduce, foldl, foldr, clone,
-                                scan_checkpoints)
+                                scan_checkpoints, scan_stream)
 
 from theano.updates import OrderedUpdates
 
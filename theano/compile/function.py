@@ -5,14 +5,19 @@ Define the `function` function.
 from __future__ import absolute_import, print_function, division
 
 import logging
+import multiprocessing
 
 import traceback as tb
 import re
 
-from six import string_types
+from six import BytesIO, string_types
+import six.moves.cPickle as pickle
 from theano.compile.io import In
 from theano.compile.function_module import orig_function
 from theano.compile.pfunc import pfunc
+from theano.compile.sharedvalue import SharedVariable
+from theano.configparser import change_flags
+from theano.gof import Container
 from numpy import any
 import warnings
 from theano import compat
@@ -328,3 +333,157 @@ def function(inputs, outputs=None, mode=None, updates=None, givens=None,
     # borrowed used defined inputs
     fn._check_for_aliased_inputs = check_for_aliased_inputs
     return fn
+
+
+class _PersistentContainerID(object):
+    """
+    Persist the `Container` instances of a pickled object by index.
+
+    Used by `function_batch` so that the values of the shared variables are
+    not sent to the worker processes and back.
+
+    Parameters
+    ----------
+    index : dict or None
+        If None, all the containers seen are persisted along with what is
+        needed to build an empty container of the same type in the worker.
+        Otherwise, a dict from id(container) to its index: only those
+        containers are persisted, by their index only.
+
+    """
+    def __init__(self, index=None):
+        self.describe = index is None
+        if index is None:
+            index = {}
+        self.index = index
+        self.containers = []
+        # id(container) -> SharedVariable
+        self.shared = {}
+
+    def __call__(self, obj):
+        if isinstance(obj, SharedVariable):
+            self.shared.setdefault(id(obj.container), obj)
+        elif isinstance(obj, Container):
+            if not self.describe:
+                return self.index.get(id(obj))
+            if id(obj) not in self.index:
+                self.index[id(obj)] = len(self.containers)
+                self.containers.append(obj)
+            return (self.index[id(obj)], obj.type, obj.readonly, obj.strict,
+                    obj.allow_downcast, obj.name)
+
+
+class _PersistentContainerLoad(object):
+    """
+    Build empty containers for the ids given by `_PersistentContainerID`.
+
+    """
+    def __init__(self):
+        # index -> Container
+        self.containers = {}
+
+    def __call__(self, pid):
+        idx, typ, readonly, strict, allow_downcast, name = pid
+        if idx not in self.containers:
+            self.containers[idx] = Container(
+                typ, [None], readonly=readonly, strict=strict,
+                allow_downcast=allow_downcast, name=name)
+        return self.containers[idx]
+
+
+def _function_batch_worker(pickled_spec):
+    """
+    Compile one `function_batch` spec in a worker process.
+
+    """
+    unpickler = pickle.Unpickler(BytesIO(pickled_spec))
+    persistent_load = _PersistentContainerLoad()
+    unpickler.persistent_load = persistent_load
+    spec = unpickler.load()
+
+    fn = function(**spec)
+
+    f = BytesIO()
+    pickler = pickle.Pickler(f, protocol=-1)
+    pickler.persistent_id = _PersistentContainerID(
+        dict((id(c), idx) for idx, c in
+             persistent_load.containers.items()))
+    pickler.dump((fn.maker, fn._check_for_aliased_inputs))
+    return f.getvalue()
+
+
+def function_batch(specs, n_jobs=None):
+    """
+    Compile many Theano functions in parallel worker processes.
+
+    Graph optimization is done in pure Python, so compiling many functions
+    in threads does not help. This compiles each function in a separate
+    process, then transfers the optimized graph back using the pickling of
+    `FunctionMaker`. The C code compiled by the workers is shared through
+    the compilation cache, so only the loading of the compiled modules is
+    done again in the current process.
+
+    The values of the shared variables are not transferred to the workers:
+    the returned functions use the containers of the original shared
+    variables, as if they had been compiled with `theano.function`.
+
+    Parameters
+    ----------
+    specs : list of dict
+        Each dict contains the keyword arguments of one call to
+        `theano.function` (`inputs`, `outputs`, `updates`, ...). They must be
+        picklable.
+    n_jobs : int or None
+        The number of worker processes to use. Defaults to the number of
+        CPUs. If only one is needed, the functions are compiled in the
+        current process.
+
+    Returns
+    -------
+    list of :class:`theano.compile.function_module.Function`
+        The compiled functions, in the same order as `specs`.
+
+    """
+    specs = list(specs)
+    if n_jobs is None:
+        n_jobs = multiprocessing.cpu_count()
+    n_jobs = min(n_jobs, len(specs))
+    if n_jobs <= 1:
+        return [function(**spec) for spec in specs]
+
+    persistent_id = _PersistentContainerID()
+    pickled_specs = []
+    for spec in specs:
+        f = BytesIO()
+        pickler = pickle.Pickler(f, protocol=-1)
+        pickler.persistent_id = persistent_id
+        pickler.dump(spec)
+        pickled_specs.append(f.getvalue())
+
+    pool = multiprocessing.Pool(n_jobs)
+    try:
+        results = pool.map(_function_batch_worker, pickled_specs)
+    finally:
+        pool.close()
+        pool.join()
+
+    fns = []
+    # The graphs are already optimized, do not optimize them again.
+    with change_flags(unpickle_function=True,
+                      reoptimize_unpickled_function=False):
+        for spec, result in zip(specs, results):
+            unpickler = pickle.Unpickler(BytesIO(result))
+            unpickler.persistent_load = persistent_id.containers.__getitem__
+            maker, check_for_aliased_inputs = unpickler.load()
+            # Rebind the inputs to the original shared variables.
+            for i in maker.inputs:
+                if isinstance(i.value, Container):
+                    i.variable = persistent_id.shared.get(id(i.value),
+                                                          i.variable)
+            fn = maker.create([getattr(i, 'value', None)
+                               for i in maker.inputs])
+            fn.name = spec.get('name', None)
+            fn.maker.fgraph.name = fn.name
+            fn._check_for_aliased_inputs = check_for_aliased_inputs
+            fns.append(fn)
+    return fns
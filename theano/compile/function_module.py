@@ -1456,6 +1456,9 @@ class FunctionMaker(object):
                     theano.config.compute_test_value_opt
                 theano.config.traceback.limit = theano.config.traceback.compile_limit
                 start_optimizer = time.time()
+                time_budget = getattr(mode, 'optimizer_time_budget', None)
+                if time_budget is not None:
+                    fgraph.optimizer_deadline = start_optimizer + time_budget
 
                 # now optimize the graph
                 if theano.config.cache_optimizations:
@@ -1482,6 +1485,8 @@ class FunctionMaker(object):
             finally:
                 theano.config.compute_test_value = compute_test_value_orig
                 theano.config.traceback.limit = limit_orig
+                if hasattr(fgraph, 'optimizer_deadline'):
+                    del fgraph.optimizer_deadline
 
         # initialize the linker
         if not hasattr(linker, 'accept'):
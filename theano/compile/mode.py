@@ -10,7 +10,7 @@ from theano import gof
 import theano.gof.vm
 from theano.configparser import config
 from theano.compile.ops import _output_guard
-from six import string_types
+from six import iteritems, string_types
 
 
 _logger = logging.getLogger('theano.compile.mode')
@@ -227,6 +227,12 @@ class Mode(object):
     linker : a structure of type Linker
         A Linker decides which implementations to use (C or Python, for example)
         and how to string them together to perform the computation.
+    optimizer_time_budget : float or None
+        Number of seconds the optimizer may spend on a graph. Once it is
+        spent, only the optimizations tagged with one of
+        `theano.gof.optdb.time_budget_required_tags` (the ones needed for
+        a correct and reasonably efficient graph) are still applied.
+        None, the default, means no limit.
 
     See Also
     --------
@@ -236,12 +242,13 @@ class Mode(object):
 
     """
 
-    def __init__(self, linker=None, optimizer='default'):
+    def __init__(self, linker=None, optimizer='default',
+                 optimizer_time_budget=None):
         if linker is None:
             linker = config.linker
         if optimizer is 'default':
             optimizer = config.optimizer
-        Mode.__setstate__(self, (linker, optimizer))
+        Mode.__setstate__(self, (linker, optimizer, optimizer_time_budget))
 
         # self.provided_optimizer - typically the `optimizer` arg.
         # But if the `optimizer` arg is keyword corresponding to a predefined
@@ -253,10 +260,14 @@ class Mode(object):
         # self.optimizer - property that returns __get_optimizer()
 
     def __getstate__(self):
-        return (self.provided_linker, self.provided_optimizer)
+        return (self.provided_linker, self.provided_optimizer,
+                self.optimizer_time_budget)
 
     def __setstate__(self, state):
-        linker, optimizer = state
+        if len(state) == 2:
+            # Mode pickled before the optimization time budget
+            state = tuple(state) + (None,)
+        linker, optimizer, optimizer_time_budget = state
         self.provided_linker = linker
         self.provided_optimizer = optimizer
         if isinstance(linker, string_types) or linker is None:
@@ -267,6 +278,7 @@ class Mode(object):
         if isinstance(optimizer, gof.Query):
             self.provided_optimizer = optimizer
         self._optimizer = optimizer
+        self.optimizer_time_budget = optimizer_time_budget
         self.call_time = 0
         self.fn_time = 0
         linker.mode = self  # TODO: WHY IS THIS HERE?
@@ -350,9 +362,109 @@ class Mode(object):
             optimizer = self.provided_optimizer
         new_mode = type(self)(linker=new_linker,
                               optimizer=optimizer)
+        new_mode.optimizer_time_budget = getattr(
+            self, 'optimizer_time_budget', None)
         return new_mode
 
 
+def optimizer_applied_counts(profiles):
+    """
+    Count how many times each optimization changed the graph while the
+    functions profiled in `profiles` were compiled.
+
+    Parameters
+    ----------
+    profiles : list of ProfileStats
+        Profiles of compiled functions (e.g. `f.profile`). They contain the
+        needed information only if the Theano flag profile_optimizer was
+        True when the functions were compiled.
+
+    Returns
+    -------
+    dict
+        A dict from a path (the tuple of the names of the DBs that contain
+        an optimization, the outermost first) to a dict from optimization
+        name to the number of times it was applied, summed over `profiles`.
+        See `Optimizer.count_applied`.
+
+    """
+    counts = {}
+    for prof in profiles:
+        if getattr(prof, 'optimizer_profile', None):
+            optimizer, optimizer_profile = prof.optimizer_profile
+            optimizer.count_applied(optimizer_profile, counts)
+    return counts
+
+
+def profile_guided_query(profiles, query=OPT_FAST_RUN):
+    """
+    Return a copy of `query` that excludes all the optimizations that never
+    changed the graph while the functions profiled in `profiles` were
+    compiled.
+
+    The exclusions are done by name in the DB where each optimization was
+    found, using the `subquery` of the `Query`. The optimizations that do not
+    record whether they changed the graph (e.g. the MergeOptimizer) are
+    always kept.
+
+    Compiling the same graphs with the returned query gives the same
+    optimized graphs in a fraction of the time. When the graphs change, it
+    should be regenerated from new profiles, as optimizations that were not
+    needed before could be needed now.
+
+    Parameters
+    ----------
+    profiles : list of ProfileStats
+        See `optimizer_applied_counts`.
+    query : Query
+        The query used to compile the profiled functions.
+
+    """
+    counts = optimizer_applied_counts(profiles)
+    paths = set()
+    for path in counts:
+        for i in range(len(path) + 1):
+            paths.add(path[:i])
+
+    def build(base, path):
+        unused = sorted(name for name, count in
+                        iteritems(counts.get(path, {})) if count == 0)
+        subquery = dict(base.subquery)
+        for sub_path in paths:
+            if len(sub_path) == len(path) + 1 and sub_path[:-1] == path:
+                name = sub_path[-1]
+                subquery[name] = build(base.subquery.get(name, base),
+                                       sub_path)
+        q = base.excluding(*unused)
+        q.subquery = subquery
+        return q
+    return build(query, ())
+
+
+def get_profile_guided_mode(profiles, mode=None):
+    """
+    Return a copy of `mode` that excludes all the optimizations that never
+    changed the graph while the functions profiled in `profiles` were
+    compiled. See `profile_guided_query`.
+
+    Parameters
+    ----------
+    profiles : list of ProfileStats
+        See `optimizer_applied_counts`.
+    mode : Mode or string
+        The mode used to compile the profiled functions. Its optimizer must
+        be a `Query`. Defaults to the default mode.
+
+    """
+    mode = get_mode(mode)
+    link, opt = mode.get_linker_optimizer(mode.provided_linker,
+                                          mode.provided_optimizer)
+    if not isinstance(opt, gof.Query):
+        raise TypeError("get_profile_guided_mode needs a mode whose "
+                        "optimizer is a Query", mode)
+    return mode.clone(optimizer=profile_guided_query(profiles, opt))
+
+
 # If a string is passed as the mode argument in function or
 # FunctionMaker, the Mode will be taken from this dictionary using the
 # string as the key
@@ -54,14 +54,17 @@ class MonitorMode(Mode):
         super(MonitorMode, self).__init__(wrap_linker, optimizer=optimizer)
 
     def __getstate__(self):
-        lnk, opt = super(MonitorMode, self).__getstate__()
-        return (lnk, opt, self.pre_func, self.post_func)
+        lnk, opt, budget = super(MonitorMode, self).__getstate__()
+        return (lnk, opt, self.pre_func, self.post_func, budget)
 
     def __setstate__(self, state):
-        lnk, opt, pre_func, post_func = state
+        if len(state) == 4:
+            # MonitorMode pickled before the optimization time budget
+            state = tuple(state) + (None,)
+        lnk, opt, pre_func, post_func, budget = state
         self.pre_func = pre_func
         self.post_func = post_func
-        super(MonitorMode, self).__setstate__((lnk, opt))
+        super(MonitorMode, self).__setstate__((lnk, opt, budget))
 
     def eval(self, i, node, fn):
         """
@@ -820,6 +820,7 @@ class SpecifyShape(gof.Op):
     # the output variable is %(oname)s.
     c_code_and_version = {}
     __props__ = ()
+    _f16_ok = True
 
     def make_node(self, x, shape):
         if not isinstance(x, gof.Variable):
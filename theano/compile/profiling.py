@@ -10,6 +10,7 @@ ProfileStats object for runtime and memory profiling.
 from __future__ import absolute_import, print_function, division
 
 import logging
+import math
 
 __authors__ = "James Bergstra"
 __reviewer__ = "Razvan Pascanu"
@@ -640,6 +641,11 @@ class ProfileStats(object):
                                 nd_id,
                                 flops, flops_s,
                                 str(a)[:maxlen]), file=file)
+            # The inner nodes of a profiled scan
+            inner_profile = getattr(getattr(getattr(a.op, 'fn', None),
+                                            'maker', None), 'profile', None)
+            if isinstance(inner_profile, ScanProfileStats):
+                inner_profile.summary_inner(file, N)
             if not config.profile_memory:
                 continue
             for idx, var in enumerate(a.inputs):
@@ -1431,9 +1437,135 @@ class ScanProfileStats(ProfileStats):
     nbsteps = 0.0
     call_time = 0.0
 
+    step_time_bins_per_decade = 20
+    step_time_range = (1e-9, 1e3)
+    # The time spent in the inner function at each step is counted in a
+    # histogram of log-spaced bins over step_time_range, so that its size
+    # doesn't grow with the number of steps. Its percentiles are within
+    # half a bin, about 6%, of the exact ones.
+
+    step_time_hist = None
+    # numpy array of the number of steps in each bin
+    #
+
+    nb_timed_steps = 0
+    # number of steps timed
+    #
+
+    step_time_min = None
+    step_time_max = None
+    # exact min and max of the step times
+    #
+
+    output_copies = 0
+    # number of inner outputs that were copied in the outputs of the
+    # scan, instead of being computed directly in them
+    #
+
+    output_copied_bytes = 0
+    # total size of those copies
+    #
+
     def __init__(self, atexit_print=True, name=None, **kwargs):
         super(ScanProfileStats, self).__init__(atexit_print, **kwargs)
         self.name = name
+        self._reset_step_times()
+
+    def reset(self):
+        super(ScanProfileStats, self).reset()
+        self._reset_step_times()
+        self.output_copies = 0
+        self.output_copied_bytes = 0
+
+    def _reset_step_times(self):
+        low, high = self.step_time_range
+        nb_bins = int(round(numpy.log10(high / low) *
+                            self.step_time_bins_per_decade))
+        self.step_time_hist = numpy.zeros(nb_bins, dtype='int64')
+        self.nb_timed_steps = 0
+        self.step_time_min = None
+        self.step_time_max = None
+
+    def add_step_time(self, t):
+        """
+        Count the time `t` of one step of the inner function.
+
+        """
+        if self.nb_timed_steps == 0:
+            self.step_time_min = self.step_time_max = t
+        else:
+            self.step_time_min = min(self.step_time_min, t)
+            self.step_time_max = max(self.step_time_max, t)
+        self.nb_timed_steps += 1
+        low = self.step_time_range[0]
+        b = 0
+        if t > low:
+            b = int(math.log10(t / low) * self.step_time_bins_per_decade)
+        self.step_time_hist[min(b, len(self.step_time_hist) - 1)] += 1
+
+    def step_time_stats(self):
+        """
+        Return the min, median, 99th percentile and max of the time of the
+        steps, or None if no step was timed.
+
+        The min and the max are exact. The percentiles are the geometric
+        middle of the bin of the histogram they fall in.
+
+        """
+        if not self.nb_timed_steps:
+            return None
+        cumsum = numpy.cumsum(self.step_time_hist)
+        stats = [self.step_time_min]
+        for q in [0.5, 0.99]:
+            b = numpy.searchsorted(cumsum, q * self.nb_timed_steps)
+            t = self.step_time_range[0] * 10 ** (
+                (b + 0.5) / self.step_time_bins_per_decade)
+            stats.append(min(max(t, self.step_time_min),
+                             self.step_time_max))
+        stats.append(self.step_time_max)
+        return stats
+
+    def summary_inner(self, file=sys.stderr, N=None, indent='    | '):
+        """
+        Print the steps and the Apply nodes of the inner function, below
+        the Apply node of the scan in the summary of the function that
+        contains it.
+
+        """
+        stats = self.step_time_stats()
+        if stats is not None:
+            print(indent + '%d steps, time per step: min %.2es, '
+                  'p50 %.2es, p99 %.2es, max %.2es' %
+                  ((self.nb_timed_steps,) + tuple(stats)), file=file)
+        if self.output_copies:
+            print(indent + '%d inner outputs copied in the outputs of the '
+                  'scan (%d bytes)' % (self.output_copies,
+                                       self.output_copied_bytes), file=file)
+        local_time = sum(self.apply_time.values())
+        if local_time == 0:
+            return
+        print(indent + ('<% inner time> <apply time> <time per call> '
+                        '<#call> <out bytes> <Inner apply name>'), file=file)
+        atimes = sorted(iteritems(self.apply_time), reverse=True,
+                        key=lambda a_t: a_t[1])
+        for a, t in atimes[:N]:
+            nb_call = self.apply_callcount[a]
+            if nb_call == 0:
+                continue
+            out_bytes = ''
+            if all(var in self.variable_shape and
+                   hasattr(var.type, 'dtype') for var in a.outputs):
+                out_bytes = sum(
+                    int(numpy.prod(self.variable_shape[var])) *
+                    numpy.dtype(var.type.dtype).itemsize
+                    for var in a.outputs
+                    if self.variable_shape[var] is not None)
+            print(indent + '     %5.1f%%      %7.3fs       %8.2es  '
+                  '%6d  %11s  %s' % (t * 100 / local_time, t, t / nb_call,
+                                     nb_call, out_bytes, a), file=file)
+        if N is not None and len(atimes) > N:
+            print(indent + '   ... (remaining %i inner Apply instances)' %
+                  (len(atimes) - N), file=file)
 
     def summary_globals(self, file):
         # Do nothing, we don't want to print extra global summary
@@ -1462,6 +1594,13 @@ class ScanProfileStats(ProfileStats):
         print(('  Time in %i calls of the op (for a total of %i '
                'steps) %es' %
                (self.callcount, self.nbsteps, self.call_time)), file=file)
+        stats = self.step_time_stats()
+        if stats is not None:
+            print('  Time per step in the VM: min %es, p50 %es, p99 %es, '
+                  'max %es' % tuple(stats), file=file)
+        print('  Inner outputs copied in the outputs of the scan: %d (%d '
+              'bytes)' % (self.output_copies, self.output_copied_bytes),
+              file=file)
         print('', file=file)
         val = 0
         if self.call_time > 0:
@@ -30,6 +30,23 @@ def test_function_dump():
     assert numpy.allclose(fct1(x), fct2(x))
 
 
+def test_function_batch():
+    v = theano.tensor.vector()
+    w = theano.shared(numpy.ones(3), name='w')
+    specs = [dict(inputs=[v], outputs=v * w + 1, name='f'),
+             dict(inputs=[v], outputs=[], updates=[(w, w + v)])]
+    f, upd = theano.function_batch(specs, n_jobs=2)
+    assert f.name == 'f'
+    assert upd.maker.inputs[1].variable is w
+
+    x = numpy.asarray([1, 2, 3], dtype=v.dtype)
+    assert numpy.allclose(f(x), x + 1)
+    # The functions use the storage of the original shared variable.
+    upd(x)
+    assert numpy.allclose(w.get_value(), x + 1)
+    assert numpy.allclose(f(x), x * (x + 1) + 1)
+
+
 class TestFunctionIn(unittest.TestCase):
 
     def test_in_strict(self):
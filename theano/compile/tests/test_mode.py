@@ -1,11 +1,17 @@
 from __future__ import absolute_import, print_function, division
+import pickle
 
 from nose.plugins.skip import SkipTest
+import numpy
 
 import theano
-from theano.compile.mode import Mode, AddFeatureOptimizer
+from theano.compile.mode import (Mode, AddFeatureOptimizer,
+                                 get_profile_guided_mode,
+                                 optimizer_applied_counts)
+from theano.configparser import change_flags
 from theano.gof.toolbox import NoOutputFromInplace
 import theano.tensor as T
+from theano.tests import unittest_tools as utt
 
 
 def test_no_output_from_implace():
@@ -36,3 +42,64 @@ def test_no_output_from_implace():
 def test_including():
     mode = theano.Mode(optimizer='merge')
     mode.including('fast_compile')
+
+
+def test_profile_guided_mode():
+    x = T.matrix()
+    y = T.matrix()
+    out = T.nnet.sigmoid(T.dot(x, y) + 0) * 1 + T.exp(x).sum()
+
+    with change_flags(profile_optimizer=True):
+        profile = theano.compile.ProfileStats(atexit_print=False)
+        f = theano.function([x, y], out, mode="FAST_RUN", profile=profile)
+    counts = optimizer_applied_counts([f.profile])
+    assert any(c > 0 for c in counts[('canonicalize',)].values())
+    assert any(c == 0 for c in counts[('canonicalize',)].values())
+
+    mode = get_profile_guided_mode([f.profile], "FAST_RUN")
+    f2 = theano.function([x, y], out, mode=mode)
+    assert (theano.printing.debugprint(f, file='str') ==
+            theano.printing.debugprint(f2, file='str'))
+
+    # The optimizations that were never applied are not run.
+    opt = mode.optimizer
+    canonicalize = [o for o in opt if o.name == 'canonicalize'][0]
+    names = set(o.name for o in canonicalize.get_local_optimizers())
+    for name, c in counts[('canonicalize',)].items():
+        assert (name in names) == (c > 0)
+
+
+def test_optimizer_time_budget():
+    x = T.matrix()
+    y = T.matrix()
+    out = T.tanh(T.dot(x, y) + 0) * 1 + T.exp(x).sum()
+
+    mode = Mode(optimizer='fast_run', optimizer_time_budget=0)
+    assert mode.clone().optimizer_time_budget == 0
+    assert pickle.loads(pickle.dumps(mode)).optimizer_time_budget == 0
+    # Modes pickled before the budget
+    old_mode = Mode.__new__(Mode)
+    old_mode.__setstate__(('py', 'fast_run'))
+    assert old_mode.optimizer_time_budget is None
+    with change_flags(profile_optimizer=True):
+        profile = theano.compile.ProfileStats(atexit_print=False)
+        f = theano.function([x, y], out, mode=mode, profile=profile)
+        profile_ref = theano.compile.ProfileStats(atexit_print=False)
+        f_ref = theano.function([x, y], out, mode='FAST_RUN',
+                                profile=profile_ref)
+    assert not hasattr(f.maker.fgraph, 'optimizer_deadline')
+    counts = optimizer_applied_counts([f.profile])
+    counts_ref = optimizer_applied_counts([f_ref.profile])
+    # Only the fast_compile optimizations of canonicalize are applied.
+    assert counts[('canonicalize',)]['local_mul_canonizer'] == 0
+    assert counts_ref[('canonicalize',)]['local_mul_canonizer'] > 0
+    assert (len(f.maker.fgraph.apply_nodes) >
+            len(f_ref.maker.fgraph.apply_nodes))
+
+    # The inplace optimizations are still applied.
+    op = f.maker.fgraph.outputs[0].owner.op
+    assert (hasattr(op, 'destroy_map') and 0 in op.destroy_map)
+
+    xv = numpy.random.rand(3, 3).astype(theano.config.floatX)
+    yv = numpy.random.rand(3, 3).astype(theano.config.floatX)
+    utt.assert_allclose(f(xv, yv), f_ref(xv, yv))
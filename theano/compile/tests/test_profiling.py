@@ -108,6 +108,55 @@ class Test_profiling(unittest.TestCase):
             theano.config.profile = config1
             theano.config.profile_memory = config2
 
+    def test_scan(self):
+        config1 = theano.config.profile_memory
+        try:
+            theano.config.profile_memory = True
+            x = T.matrix('x')
+            h0 = T.vector('h0')
+            W = T.matrix('W')
+            out, _ = theano.scan(
+                lambda x_t, h, W: T.tanh(T.dot(h, W) + x_t),
+                sequences=x, outputs_info=h0, non_sequences=W,
+                name='rnn', profile=True)
+
+            if theano.config.mode in ["DebugMode", "DEBUG_MODE",
+                                      "FAST_COMPILE"]:
+                m = "FAST_RUN"
+            else:
+                m = None
+            p = theano.ProfileStats(False)
+            f = theano.function([x, h0, W], out[-1], profile=p, mode=m)
+            floatX = theano.config.floatX
+            f(numpy.ones((5, 3), dtype=floatX), numpy.ones(3, dtype=floatX),
+              numpy.eye(3, dtype=floatX))
+            f(numpy.ones((5, 3), dtype=floatX), numpy.ones(3, dtype=floatX),
+              numpy.eye(3, dtype=floatX))
+
+            scan_profile = [
+                n.op.fn.maker.profile for n in f.maker.fgraph.toposort()
+                if isinstance(n.op, theano.scan_module.scan_op.Scan)][0]
+            assert scan_profile.nb_timed_steps == 10
+            assert scan_profile.step_time_hist.sum() == 10
+            stats = scan_profile.step_time_stats()
+            assert stats[0] <= stats[1] <= stats[2] <= stats[3]
+
+            # The inner nodes are listed below the scan in the profile
+            # of the function.
+            buf = StringIO()
+            f.profile.summary_nodes(buf, N=20)
+            lines = buf.getvalue().split("\n")
+            scan_line = [i for i, l in enumerate(lines) if "rnn}" in l][0]
+            assert lines[scan_line + 1].startswith(
+                "    | 10 steps, time per step: min "), lines
+            assert "tanh" in buf.getvalue()
+
+            buf = StringIO()
+            scan_profile.summary_function(buf)
+            assert "Time per step in the VM: min " in buf.getvalue()
+        finally:
+            theano.config.profile_memory = config1
+
 
 if __name__ == '__main__':
     unittest.main()
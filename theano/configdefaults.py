@@ -583,6 +583,14 @@ AddConfigVar(
     BoolParam(True),
     in_c_key=False)
 
+AddConfigVar(
+    'tensor.fast_math',
+    ("Enable in fast_run mode the local_fast_math optimization, that "
+     "replaces exp, log, log1p, tanh, sigmoid and softplus by faster "
+     "approximations (see theano.scalar.fast_math)"),
+    BoolParam(False),
+    in_c_key=False)
+
 AddConfigVar(
     'gpu.local_elemwise_fusion',
     ("Enable or not in fast_run mode(fast_run optimization) the gpu "
@@ -899,7 +907,8 @@ AddConfigVar('openmp',
 AddConfigVar('openmp_elemwise_minsize',
              "If OpenMP is enabled, this is the minimum size of vectors "
              "for which the openmp parallelization is enabled "
-             "in element wise ops.",
+             "in element wise ops, reductions and indexing with a vector "
+             "of integers.",
              IntParam(200000),
              in_c_key=False,
              )
@@ -1467,6 +1476,32 @@ AddConfigVar('scan.allow_output_prealloc',
              BoolParam(True),
              in_c_key=False)
 
+AddConfigVar('scan.c_loop',
+             "If True, Scan ops whose inner graph has C code for all its "
+             "nodes run their whole loop in C (default: True)",
+             BoolParam(True),
+             in_c_key=False)
+
+AddConfigVar('scan.unroll_threshold',
+             "Scan ops with a constant number of steps whose unrolled inner "
+             "graph has at most this many nodes are replaced by their "
+             "iterations. 0 disables it (default: 0)",
+             IntParam(0, lambda i: i >= 0),
+             in_c_key=False)
+
+AddConfigVar('scan.unroll_factor',
+             "Scan ops with a constant number of steps that is a multiple "
+             "of this factor, and that aren't fully unrolled, do this many "
+             "iterations per step. 1 disables it (default: 1)",
+             IntParam(1, lambda i: i >= 1),
+             in_c_key=False)
+
+AddConfigVar('scan.n_threads',
+             "Number of threads that run the iterations of Scan ops without "
+             "recurrent outputs. 1 disables it (default: 1)",
+             IntParam(1, lambda i: i >= 1),
+             in_c_key=False)
+
 AddConfigVar('scan.debug',
              "If True, enable extra verbose output related to scan",
              BoolParam(False),
@@ -181,6 +181,21 @@ def _config_print(thing, buf, print_doc=True):
         print("", file=buf)
 
 
+# Number of times a config option was set. What is memoised from the
+# config, like the result of get_config_md5(), is valid only as long as
+# it doesn't change.
+_config_version = [0]
+_config_md5 = [None, None]  # [config version, md5]
+
+
+def get_config_version():
+    """
+    Return a number that changes each time a config option is set.
+
+    """
+    return _config_version[0]
+
+
 def get_config_md5():
     """
     Return a string md5 of the current config options. It should be such that
@@ -189,10 +204,16 @@ def get_config_md5():
 
     We only take into account config options for which `in_c_key` is True.
     """
-    all_opts = sorted([c for c in _config_var_list if c.in_c_key],
-                      key=lambda cv: cv.fullname)
-    return theano.gof.utils.hash_from_code('\n'.join(
-        ['%s = %s' % (cv.fullname, cv.__get__(True, None)) for cv in all_opts]))
+    if _config_md5[0] != _config_version[0]:
+        all_opts = sorted([c for c in _config_var_list if c.in_c_key],
+                          key=lambda cv: cv.fullname)
+        md5 = theano.gof.utils.hash_from_code('\n'.join(
+            ['%s = %s' % (cv.fullname, cv.__get__(True, None))
+             for cv in all_opts]))
+        # Getting an option for the first time sets it, so only read
+        # the version now.
+        _config_md5[:] = [_config_version[0], md5]
+    return _config_md5[1]
 
 
 class TheanoConfigParser(object):
@@ -342,6 +363,7 @@ class ConfigParam(object):
             self.val = self.filter(val)
         else:
             self.val = val
+        _config_version[0] += 1
 
 
 class EnumStr(ConfigParam):
@@ -10,6 +10,7 @@ from copy import copy
 import os
 import sys
 import logging
+import weakref
 
 import numpy
 
@@ -27,6 +28,7 @@ from theano.gof import utils
 from theano.gof import cmodule
 from theano.gof.compilelock import get_lock, release_lock
 from theano.gof.callcache import CallCache
+from theano.gof.type import Type
 
 
 _logger = logging.getLogger("theano.gof.cc")
@@ -59,6 +61,102 @@ def get_persistent_module_cache():
     return _persistent_module_cache
 
 
+# In-process memo of what each Op and Type contributes to the cmodule key
+# and to the compilation parameters, so that warm compilations (and the
+# OpWiseCLinker, that makes one CLinker per node) don't query them again.
+# Ops are memoised by identity, as equal Ops can generate different code
+# (e.g. OpenMPOp.openmp isn't in __props__), Types by equality. The
+# config version is part of each memo key, so setting a flag invalidates
+# it.
+_op_fragments = {}
+_type_fragments = {}
+
+
+def _fragments_of(x):
+    """
+    Return the dict memoising the key fragments of the Op or Type `x`, or
+    None if `x` can't be memoised.
+
+    """
+    if isinstance(x, Type):
+        try:
+            return _type_fragments.setdefault(x, {})
+        except TypeError:
+            # unhashable Type
+            return None
+    entry = _op_fragments.get(id(x))
+    if entry is None or entry[0]() is not x:
+        try:
+            ref = weakref.ref(
+                x, lambda r, k=id(x): _op_fragments.pop(k, None))
+        except TypeError:
+            return None
+        entry = _op_fragments[id(x)] = (ref, {})
+    return entry[1]
+
+
+def _c_fragment(x, name, c_compiler=None):
+    """
+    Return the list returned by the method `name` of the Op or Type `x`,
+    e.g. `c_headers`, memoised in-process.
+
+    If `c_compiler` is not None, it is passed to the method when it
+    accepts it. A method that isn't defined contributes an empty list.
+
+    """
+    key = (name, c_compiler, theano.configparser.get_config_version())
+    memo = _fragments_of(x)
+    if memo is not None and key in memo:
+        return memo[key]
+    method = getattr(x, name)
+    try:
+        if c_compiler is None:
+            ret = method()
+        else:
+            try:
+                ret = method(c_compiler)
+            except TypeError:
+                ret = method()
+    except utils.MethodNotDefined:
+        ret = []
+    if memo is not None:
+        memo[key] = ret
+    return ret
+
+
+def _node_version(node):
+    """
+    Return the versions that `node` contributes to the cmodule key,
+    memoised in-process per (op, input types, output types).
+
+    """
+    memo = _fragments_of(node.op)
+    if memo is not None:
+        key = ('version',
+               tuple(i.type for i in node.inputs),
+               tuple(o.type for o in node.outputs),
+               theano.configparser.get_config_version())
+        try:
+            if key in memo:
+                return memo[key]
+        except TypeError:
+            # unhashable Type
+            memo = None
+    version = []
+    try:
+        # Pure Ops do not have a c_code_cache_version_apply ...
+        version.append(node.op.c_code_cache_version_apply(node))
+    except AttributeError:
+        pass
+    for i in node.inputs:
+        version.append(i.type.c_code_cache_version())
+    for o in node.outputs:
+        version.append(o.type.c_code_cache_version())
+    if memo is not None:
+        memo[key] = version
+    return version
+
+
 class CodeBlock:
     """
     Represents a computation unit composed of declare, behavior, and cleanup.
@@ -937,32 +1035,19 @@ class CLinker(link.Linker):
 
         for x in [y.type for y in self.variables] + [
                 y.op for y in self.node_order]:
-            try:
-                try:
-                    ret += x.c_compile_args(c_compiler)
-                except TypeError:
-                    ret += x.c_compile_args()
-            except utils.MethodNotDefined:
-                pass
+            ret += _c_fragment(x, 'c_compile_args', c_compiler)
 
         ret = utils.uniq(ret)  # to remove duplicate
         # The args set by the compiler include the user flags. We do not want
         # to reorder them
-        ret += c_compiler.compile_args()
+        ret += _c_fragment(c_compiler, 'compile_args')
         for x in [y.type for y in self.variables] + [
                 y.op for y in self.node_order]:
-            try:
+            for i in _c_fragment(x, 'c_no_compile_args', c_compiler):
                 try:
-                    no_comp = x.c_no_compile_args(c_compiler)
-                except TypeError:
-                    no_comp = x.c_no_compile_args()
-                for i in no_comp:
-                    try:
-                        ret.remove(i)
-                    except ValueError:
-                        pass  # in case the value is not there
-            except utils.MethodNotDefined:
-                pass
+                    ret.remove(i)
+                except ValueError:
+                    pass  # in case the value is not there
         return ret
 
     def headers(self):
@@ -977,13 +1062,7 @@ class CLinker(link.Linker):
         c_compiler = self.c_compiler()
         for x in [y.type for y in self.variables] + [
                 y.op for y in self.node_order]:
-            try:
-                try:
-                    ret += x.c_headers(c_compiler)
-                except TypeError:
-                    ret += x.c_headers()
-            except utils.MethodNotDefined:
-                pass
+            ret += _c_fragment(x, 'c_headers', c_compiler)
         return utils.uniq(ret)
 
     def init_code(self):
@@ -997,10 +1076,7 @@ class CLinker(link.Linker):
         ret = []
         for x in [y.type for y in self.variables] + [
                 y.op for y in self.node_order]:
-            try:
-                ret += x.c_init_code()
-            except utils.MethodNotDefined:
-                pass
+            ret += _c_fragment(x, 'c_init_code')
         return utils.uniq(ret)
 
     def c_compiler(self):
@@ -1036,13 +1112,7 @@ class CLinker(link.Linker):
         c_compiler = self.c_compiler()
         for x in [y.type for y in self.variables] + [
                 y.op for y in self.node_order]:
-            try:
-                try:
-                    ret += x.c_header_dirs(c_compiler)
-                except TypeError:
-                    ret += x.c_header_dirs()
-            except utils.MethodNotDefined:
-                pass
+            ret += _c_fragment(x, 'c_header_dirs', c_compiler)
         return utils.uniq(ret)
 
     def libraries(self):
@@ -1057,13 +1127,7 @@ class CLinker(link.Linker):
         c_compiler = self.c_compiler()
         for x in [y.type for y in self.variables] + [
                 y.op for y in self.node_order]:
-            try:
-                try:
-                    ret += x.c_libraries(c_compiler)
-                except TypeError:
-                    ret += x.c_libraries()
-            except utils.MethodNotDefined:
-                pass
+            ret += _c_fragment(x, 'c_libraries', c_compiler)
         return utils.uniq(ret)
 
     def lib_dirs(self):
@@ -1078,13 +1142,7 @@ class CLinker(link.Linker):
         c_compiler = self.c_compiler()
         for x in [y.type for y in self.variables] + [
                 y.op for y in self.node_order]:
-            try:
-                try:
-                    ret += x.c_lib_dirs(c_compiler)
-                except TypeError:
-                    ret += x.c_lib_dirs()
-            except utils.MethodNotDefined:
-                pass
+            ret += _c_fragment(x, 'c_lib_dirs', c_compiler)
         return utils.uniq(ret)
 
     def __compile__(self, input_storage=None, output_storage=None,
@@ -1412,15 +1470,7 @@ class CLinker(link.Linker):
 
         version = []
         for node_pos, node in enumerate(order):
-            try:
-                # Pure Ops do not have a c_code_cache_version_apply ...
-                version.append(node.op.c_code_cache_version_apply(node))
-            except AttributeError:
-                pass
-            for i in node.inputs:
-                version.append(i.type.c_code_cache_version())
-            for o in node.outputs:
-                version.append(o.type.c_code_cache_version())
+            version.extend(_node_version(node))
 
             # add the signature for this node
             sig.append((
@@ -1451,6 +1501,16 @@ class CLinker(link.Linker):
                           if not len(getattr(var, 'clients', []))]:
             sig.append((var.type, in_sig(var, -1, ipos)))
 
+        # Add the position of the outputs in the key. The outputs that
+        # aren't used by another node don't appear in the signature of the
+        # nodes, so graphs that only differ by the order of their outputs
+        # would share a module that puts them in the wrong storage.
+        sig.append(('outputs',
+                    tuple(in_sig(var, -1, opos)
+                          for opos, var in enumerate(fgraph.outputs))))
+        if error_on_play[0]:
+            return None
+
         # crystalize the signature and version
         sig = tuple(sig)
         version = tuple(version)
@@ -1680,25 +1740,35 @@ class _CThunk(object):
     def __call__(self):
         failure = run_cthunk(self.cthunk)
         if failure:
-            task, taskname, id = self.find_task(failure)
-            try:
-                trace = task.trace
-            except AttributeError:
-                trace = ()
-            try:
-                exc_type, _exc_value, exc_trace = self.error_storage
-                if task in self.nodes:
-                    self.position_of_error = self.nodes.index(task)
-                # this can be used to retrieve the location the Op was declared
-                exc_value = exc_type(_exc_value)
-                exc_value.__thunk_trace__ = trace
-            except Exception:
-                print(('ERROR retrieving error_storage.'
-                       'Was the error set in the c code?'),
-                      end=' ', file=sys.stderr)
-                print(self.error_storage, file=sys.stderr)
-                raise
-            reraise(exc_type, exc_value, exc_trace)
+            self.raise_failure(failure)
+
+    def raise_failure(self, failure):
+        """
+        Raise the error stored by the C code for the failure code `failure`.
+
+        This is also used by code that runs `self.cthunk` directly, like
+        the C loop of Scan.
+
+        """
+        task, taskname, id = self.find_task(failure)
+        try:
+            trace = task.trace
+        except AttributeError:
+            trace = ()
+        try:
+            exc_type, _exc_value, exc_trace = self.error_storage
+            if task in self.nodes:
+                self.position_of_error = self.nodes.index(task)
+            # this can be used to retrieve the location the Op was declared
+            exc_value = exc_type(_exc_value)
+            exc_value.__thunk_trace__ = trace
+        except Exception:
+            print(('ERROR retrieving error_storage.'
+                   'Was the error set in the c code?'),
+                  end=' ', file=sys.stderr)
+            print(self.error_storage, file=sys.stderr)
+            raise
+        reraise(exc_type, exc_value, exc_trace)
 
 
 class OpWiseCLinker(link.LocalLinker):
@@ -160,6 +160,10 @@ class FunctionGraph(utils.object2):
         # outputs even if they aren't used in the graph.
         self.variables = set()
 
+        # Cache of the result of toposort(). It is reset each time the
+        # graph or the features change.
+        self._toposort = None
+
         self.inputs = list(inputs)
         self.outputs = outputs
 
@@ -189,6 +193,7 @@ class FunctionGraph(utils.object2):
             self.inputs.append(input)
             self.__setup_r__(input)
             self.variables.add(input)
+            self._toposort = None
 
     # Setup a Variable #
     def __setup_r__(self, r):
@@ -244,6 +249,7 @@ class FunctionGraph(utils.object2):
             del variable.clients
         self.apply_nodes = set()
         self.variables = set()
+        self._toposort = None
         self.inputs = None
         self.outputs = None
         self.profile = None
@@ -327,6 +333,7 @@ class FunctionGraph(utils.object2):
                         apply_node.tag.removed_by = []
                     apply_node.tag.removed_by.append(str(reason))
                     self.apply_nodes.remove(apply_node)
+                    self._toposort = None
                     # del apply_node.fgraph
                     self.variables.difference_update(apply_node.outputs)
                     # for var in apply_node.outputs:
@@ -400,6 +407,7 @@ class FunctionGraph(utils.object2):
             assert node not in self.apply_nodes
             self.__setup_node__(node)
             self.apply_nodes.add(node)
+            self._toposort = None
             if not hasattr(node.tag, 'imported_by'):
                 node.tag.imported_by = []
             node.tag.imported_by.append(str(reason))
@@ -448,6 +456,7 @@ class FunctionGraph(utils.object2):
         if r is new_r:
             return
 
+        self._toposort = None
         self.__import_r__(new_r, reason=reason)
         self.__add_client__(new_r, (node, i))
         self.__remove_client__(r, (node, i), reason=reason)
@@ -550,6 +559,7 @@ class FunctionGraph(utils.object2):
 
         # Add the feature
         self._features.append(feature)
+        self._toposort = None
 
     def remove_feature(self, feature):
         """
@@ -564,6 +574,7 @@ class FunctionGraph(utils.object2):
             self._features.remove(feature)
         except ValueError:
             return
+        self._toposort = None
         detach = getattr(feature, 'on_detach', None)
         if detach is not None:
             detach(self)
@@ -620,6 +631,11 @@ class FunctionGraph(utils.object2):
         this FunctionGraph as sole argument. It should return a dictionary of
         `{node: predecessors}` where predecessors is a list of nodes that
         should be computed before the key node.
+
+        The order is cached until the graph or its features change through
+        the FunctionGraph interface (`on_import`, `on_prune` and
+        `on_change_input`), so calling this repeatedly on an unchanged
+        graph is cheap. A new list is returned each time.
         """
         if len(self.apply_nodes) < 2:
             # optimization
@@ -627,13 +643,14 @@ class FunctionGraph(utils.object2):
             # This special case happens a lot because the OpWiseCLinker
             # produces 1-element graphs.
             return list(self.apply_nodes)
-        fg = self
+        if self._toposort is None:
+            fg = self
 
-        ords = self.orderings()
+            ords = self.orderings()
 
-        order = graph.io_toposort(fg.inputs, fg.outputs, ords)
+            self._toposort = graph.io_toposort(fg.inputs, fg.outputs, ords)
 
-        return order
+        return list(self._toposort)
 
     def orderings(self):
         """
@@ -789,6 +806,8 @@ class FunctionGraph(utils.object2):
 
     def __setstate__(self, dct):
         self.__dict__.update(dct)
+        # FunctionGraph pickled before the toposort cache was added.
+        self.__dict__.setdefault('_toposort', None)
         for feature in self._features:
             if hasattr(feature, "unpickle"):
                 feature.unpickle(self)
@@ -940,6 +940,10 @@ def general_toposort(r_out, deps, debug_print=False,
         clients.update(_clients)
     sources = deque([r for r in reachable if not deps_cache.get(r, None)])
 
+    # Number of distinct dependencies of each client that are not sorted
+    # yet. Counting them instead of filtering the dependency lists keeps
+    # the sort linear in the number of edges for nodes with many inputs.
+    remaining = {}
     rset = set()
     rlist = []
     while sources:
@@ -947,10 +951,17 @@ def general_toposort(r_out, deps, debug_print=False,
         if node not in rset:
             rlist.append(node)
             rset.add(node)
+            # A client that uses node more than once is in the list
+            # once per use, only count it once.
+            done = set()
             for client in _clients.get(node, []):
-                deps_cache[client] = [a for a in deps_cache[client]
-                                      if a is not node]
-                if not deps_cache[client]:
+                if client in done:
+                    continue
+                done.add(client)
+                if client not in remaining:
+                    remaining[client] = len(set(deps_cache[client]))
+                remaining[client] -= 1
+                if not remaining[client]:
                     sources.append(client)
 
     if len(rlist) != len(reachable):
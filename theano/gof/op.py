@@ -1197,6 +1197,10 @@ int main( int argc, const char* argv[] )
     def prepare_node(self, node, storage_map, compute_map, impl):
         if impl == 'c':
             self.update_self_openmp()
+        # Subclasses can also inherit from an Op preparing the node, like
+        # GpuOp.
+        super(OpenMPOp, self).prepare_node(node, storage_map, compute_map,
+                                           impl)
 
 
 def simple_meth(tag):
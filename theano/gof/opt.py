@@ -121,6 +121,21 @@ class Optimizer(object):
                 "The function print_profile must be overrided if the"
                 " optimizer return profiling information.")
 
+    @staticmethod
+    def count_applied(prof, counts, path=()):
+        """
+        Record in `counts` how many times the optimizations in `prof`
+        changed the graph.
+
+        `counts` is a dict from a path (the tuple of the names of the
+        optimizers that contain an optimization, the outermost first) to a
+        dict from optimization name to the number of times it was applied.
+        Optimizers that do not keep track of which of their sub-optimizations
+        changed the graph do not record anything.
+
+        """
+        pass
+
 
 class FromFunctionOptimizer(Optimizer):
     """
@@ -202,12 +217,17 @@ class SeqOptimizer(Optimizer, list):
         failure_callback : callable or None
             Keyword only argument. A callback used when a failure
             happen during optimization.
+        optional : set
+            Keyword only argument. The optimizers that are skipped once
+            the optimization time budget is spent. See
+            `Mode.optimizer_time_budget`.
 
         """
         if len(opts) == 1 and isinstance(opts[0], (list, tuple)):
             opts = opts[0]
         self[:] = opts
         self.failure_callback = kw.pop('failure_callback', None)
+        self.optional = kw.pop('optional', set())
         assert len(kw) == 0
 
     def apply(self, fgraph):
@@ -228,7 +248,19 @@ class SeqOptimizer(Optimizer, list):
         nb_node_before = len(fgraph.apply_nodes)
         sub_profs = []
         nb_nodes = []
+        deadline = getattr(fgraph, 'optimizer_deadline', None)
         for optimizer in self:
+            if (deadline is not None and optimizer in self.optional and
+                    time.time() > deadline):
+                _logger.debug("Optimization time budget spent, skipping %s" %
+                              getattr(optimizer, 'name', optimizer))
+                l.append(0.)
+                sub_profs.append(None)
+                nb_nodes.append((len(fgraph.apply_nodes),
+                                 len(fgraph.apply_nodes)))
+                if fgraph.profile:
+                    sub_validate_time.append(fgraph.profile.validate_time)
+                continue
             try:
                 nb_nodes_before = len(fgraph.apply_nodes)
                 t0 = time.time()
@@ -339,6 +371,13 @@ class SeqOptimizer(Optimizer, list):
                                       level=level + 1)
         print(file=stream)
 
+    @staticmethod
+    def count_applied(prof, counts, path=()):
+        for opt, sub_prof in zip(prof[0], prof[6]):
+            name = getattr(opt, 'name', None)
+            if sub_prof is not None and name is not None:
+                opt.count_applied(sub_prof, counts, path + (name,))
+
     @staticmethod
     def merge_profile(prof1, prof2):
         """
@@ -1378,6 +1417,23 @@ class LocalOptGroup(LocalOptimizer):
     def merge_profile(prof1, prof2):
         raise NotImplementedError
 
+    def count_applied(self, counts, path=()):
+        """
+        Record in `counts` how many times each of the optimizations of this
+        group changed the graph. See `Optimizer.count_applied`.
+
+        Only groups created with profile=True keep track of this.
+
+        """
+        if not self.profile:
+            return
+        path_counts = counts.setdefault(path, {})
+        for o in self.opts:
+            name = getattr(o, 'name', None)
+            if name is not None:
+                path_counts[name] = (path_counts.get(name, 0) +
+                                     self.applied_true[o])
+
     def print_summary(self, stream=sys.stdout, level=0, depth=-1):
         print("%s%s id=%i" % (
             (' ' * level), self.__class__.__name__, id(self)), file=stream)
@@ -2112,6 +2168,17 @@ class TopoOptimizer(NavigatorOptimizer):
                                             lopt.profile),
                                    level=level + 1)
 
+    @staticmethod
+    def count_applied(prof, counts, path=()):
+        if prof is None or not path:
+            return
+        (opt, nb, nb_nodes_start, nb_nodes_end,
+         io_t, loop_t, callback_time, lopt) = prof
+        path_counts = counts.setdefault(path[:-1], {})
+        path_counts[path[-1]] = path_counts.get(path[-1], 0) + nb
+        if isinstance(lopt, LocalOptGroup):
+            lopt.count_applied(counts, path)
+
     def __str__(self):
         return getattr(self, '__name__',
                        '<TopoOptimizer instance>')
@@ -2269,6 +2336,10 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         They must not traverse the graph as they are called very frequently.
         The MergeOptimizer is one example of optimization that respect this.
         They are applied after all global optimizer, then when one local optimizer is applied, then after all final optimizer.
+    optional_optimizers
+        Local, global and final optimizers that are not applied anymore
+        once the optimization time budget is spent. See
+        `Mode.optimizer_time_budget`.
 
     """
 
@@ -2279,7 +2350,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                  tracks_on_change_inputs=False,
                  max_use_ratio=None,
                  final_optimizers=None,
-                 cleanup_optimizers=None):
+                 cleanup_optimizers=None,
+                 optional_optimizers=None):
         super(EquilibriumOptimizer, self).__init__(
             None,
             ignore_newtrees=ignore_newtrees,
@@ -2304,6 +2376,7 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             self.final_optimizers = final_optimizers
         if cleanup_optimizers:
             self.cleanup_optimizers = cleanup_optimizers
+        self.optional_optimizers = set(optional_optimizers or ())
         self.max_use_ratio = max_use_ratio
         assert self.max_use_ratio is not None, (
             'max_use_ratio has to be a number')
@@ -2343,6 +2416,8 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         max_use_abort = False
         opt_name = None
         global_process_count = {}
+        deadline = getattr(fgraph, 'optimizer_deadline', None)
+        skip_optional = False
         start_nb_nodes = len(fgraph.apply_nodes)
         max_nb_nodes = len(fgraph.apply_nodes)
         max_use = max_nb_nodes * self.max_use_ratio
@@ -2390,9 +2465,17 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             for copt in self.cleanup_optimizers:
                 iter_cleanup_sub_profs[copt] = []
 
+            # Once the time budget is spent, only the required
+            # optimizers are applied until equilibrium.
+            if deadline is not None and not skip_optional:
+                skip_optional = time.time() > deadline
+
             # apply global optimizers
             sub_profs = []
             for gopt in self.global_optimizers:
+                if skip_optional and gopt in self.optional_optimizers:
+                    sub_profs.append(None)
+                    continue
                 change_tracker.reset()
                 nb = change_tracker.nb_imported
                 t_opt = time.time()
@@ -2444,9 +2527,13 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                     if node not in fgraph.apply_nodes:
                         continue
                     current_node = node
+                    if deadline is not None and not skip_optional:
+                        skip_optional = time.time() > deadline
                     for lopt in (self.local_optimizers_all +
                                  self.local_optimizers_map.get(type(node.op), []) +
                                  self.local_optimizers_map.get(node.op, [])):
+                        if skip_optional and lopt in self.optional_optimizers:
+                            continue
                         nb = change_tracker.nb_imported
                         t_opt = time.time()
                         lopt_change = self.process_node(fgraph, node, lopt)
@@ -2473,6 +2560,9 @@ class EquilibriumOptimizer(NavigatorOptimizer):
             sub_profs = []
             t_before_final_opt = time.time()
             for gopt in self.final_optimizers:
+                if skip_optional and gopt in self.optional_optimizers:
+                    sub_profs.append(None)
+                    continue
                 change_tracker.reset()
                 nb = change_tracker.nb_imported
                 t_opt = time.time()
@@ -2627,11 +2717,17 @@ class EquilibriumOptimizer(NavigatorOptimizer):
         for i in range(len(loop_timing)):
             print(blanc, "Iter %d" % i, file=stream)
             for o, prof in zip(opt.global_optimizers, global_sub_profs[i]):
+                if prof is None:
+                    # Skipped as the optimization time budget was spent.
+                    continue
                 try:
                     o.print_profile(stream, prof, level + 2)
                 except NotImplementedError:
                     print(blanc, "merge not implemented for ", o)
             for o, prof in zip(opt.final_optimizers, final_sub_profs[i]):
+                if prof is None:
+                    # Skipped as the optimization time budget was spent.
+                    continue
                 try:
                     o.print_profile(stream, prof, level + 2)
                 except NotImplementedError:
@@ -2642,6 +2738,27 @@ class EquilibriumOptimizer(NavigatorOptimizer):
                 except NotImplementedError:
                     print(blanc, "merge not implemented for ", o)
 
+    @staticmethod
+    def count_applied(prof, counts, path=()):
+        opt, loop_process_count = prof[0], prof[2]
+        path_counts = counts.setdefault(path, {})
+        local_optimizers = list(opt.get_local_optimizers())
+        for o in (opt.global_optimizers + local_optimizers +
+                  list(opt.final_optimizers) +
+                  list(opt.cleanup_optimizers)):
+            name = getattr(o, 'name', None)
+            if name is not None:
+                path_counts.setdefault(name, 0)
+        for count in loop_process_count:
+            for o, v in iteritems(count):
+                name = getattr(o, 'name', None)
+                if name is not None:
+                    path_counts[name] = path_counts.get(name, 0) + v
+        for o in local_optimizers:
+            name = getattr(o, 'name', None)
+            if isinstance(o, LocalOptGroup) and name is not None:
+                o.count_applied(counts, path + (name,))
+
     @staticmethod
     def merge_profile(prof1, prof2):
         # (opt, loop_timing, loop_process_count, max_nb_nodes,
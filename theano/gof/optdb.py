@@ -9,6 +9,13 @@ from theano.gof import opt
 from theano import config
 
 
+# Optimizations with one of these tags are still applied once the
+# optimization time budget of a Mode is spent.
+# See `Mode.optimizer_time_budget`.
+time_budget_required_tags = ('fast_compile', 'fast_compile_gpu', 'inplace',
+                             'merge')
+
+
 class DB(object):
     def __hash__(self):
         if not hasattr(self, '_optimizer_idx'):
@@ -137,6 +144,29 @@ multiple time in a DB. Tryed to register "%s" again under the new name "%s".
                                     exclude=exclude,
                                     subquery=kwtags))
 
+    def optional_optimizations(self, opts):
+        """
+        Return the set of the optimizations in `opts`, as returned by a
+        query, that can be skipped once the optimization time budget is
+        spent.
+
+        Those are the ones registered in this DB without any of the tags in
+        `time_budget_required_tags`. Optimizations that aren't registered
+        in this DB, like the extra optimizations of a Query, are never
+        optional.
+
+        """
+        required = OrderedSet()
+        for tag in time_budget_required_tags:
+            if tag in self.__db__:
+                required.update(self.__db__[tag])
+        optional = set()
+        for o in opts:
+            name = getattr(o, 'name', None)
+            if name in self._names and self[name] not in required:
+                optional.add(o)
+        return optional
+
     def __getitem__(self, name):
         variables = self.__db__[name]
         if not variables:
@@ -294,7 +324,8 @@ class EquilibriumDB(DB):
             tracks_on_change_inputs=self.tracks_on_change_inputs,
             failure_callback=opt.NavigatorOptimizer.warn_inplace,
             final_optimizers=final_opts,
-            cleanup_optimizers=cleanup_opts)
+            cleanup_optimizers=cleanup_opts,
+            optional_optimizers=self.optional_optimizations(_opts))
 
 
 class SequenceDB(DB):
@@ -373,6 +404,7 @@ class SequenceDB(DB):
         kwargs = {}
         if self.failure_callback:
             kwargs["failure_callback"] = self.failure_callback
+        kwargs["optional"] = self.optional_optimizations(opts)
         ret = self.seq_opt(opts, **kwargs)
         if hasattr(tags[0], 'name'):
             ret.name = tags[0].name
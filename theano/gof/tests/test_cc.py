@@ -240,6 +240,60 @@ def test_clinker_single_node():
     assert fn(2.0, 7.0) == 9
 
 
+def test_clinker_key_memo():
+    class CountedAdd(Add):
+        nb_calls = 0
+        # Not in __props__, like OpenMPOp.openmp.
+        flag = 1
+
+        def c_compile_args(self):
+            CountedAdd.nb_calls += 1
+            return ['-DCOUNTED_ADD=%d' % self.flag]
+
+    x, y, z = inputs()
+    counted_add = CountedAdd()
+    e = Env([x, y], [counted_add(x, y)])
+    key = CLinker().accept(e).cmodule_key()
+    nb_calls = CountedAdd.nb_calls
+    assert nb_calls > 0
+    assert CLinker().accept(e).cmodule_key() == key
+    assert CountedAdd.nb_calls == nb_calls
+
+    # Ops are memoised by identity, not equality.
+    other_add = CountedAdd()
+    other_add.flag = 2
+    assert other_add == counted_add
+    x, y, z = inputs()
+    e2 = Env([x, y], [other_add(x, y)])
+    assert CLinker().accept(e2).cmodule_key() != key
+
+    # Setting a config flag invalidates the memo.
+    with theano.configparser.change_flags(compute_test_value='off'):
+        CLinker().accept(e).cmodule_key()
+    assert CountedAdd.nb_calls > nb_calls
+
+
+def test_clinker_outputs_order():
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+    # Graphs that only differ by the order of their outputs must not share
+    # a module.
+    x = theano.tensor.vector()
+    y = theano.tensor.vector()
+    e1 = x + y
+    e2 = x * y
+
+    def schedule(fgraph):
+        return sorted(fgraph.apply_nodes, key=lambda node: str(node.op))
+    xv = numpy.asarray([2.0], dtype=x.dtype)
+    yv = numpy.asarray([3.0], dtype=y.dtype)
+    lnk = CLinker(schedule=schedule).accept(Env([x, y], [e1, e2]))
+    assert numpy.allclose(lnk.make_function()(xv, yv), [[5.0], [6.0]])
+    lnk2 = CLinker(schedule=schedule).accept(Env([x, y], [e2, e1]))
+    assert lnk2.cmodule_key() != lnk.cmodule_key()
+    assert numpy.allclose(lnk2.make_function()(xv, yv), [[6.0], [5.0]])
+
+
 def test_clinker_dups():
     if not theano.config.cxx:
         raise SkipTest("G++ not available, so we need to skip this test.")
@@ -30,6 +30,26 @@ class TFunctionGraph(unittest.TestCase):
         s = pickle.dumps(func)
         pickle.loads(s)
 
+    def test_toposort_cache(self):
+        x = tt.vector()
+        y = tt.exp(x)
+        fg = FunctionGraph([x], [tt.log(y) + y], clone=False)
+        topo = fg.toposort()
+        assert len(topo) == 3
+        assert fg.toposort() == topo
+        assert fg.toposort() is not fg.toposort()
+
+        # The cache is reset when the graph changes.
+        fg.replace(y, tt.tanh(x))
+        topo2 = fg.toposort()
+        assert len(topo2) == 3
+        assert topo2 != topo
+        assert topo2[0].op == tt.tanh
+        assert topo2 == theano.gof.graph.io_toposort(fg.inputs, fg.outputs)
+
+        fg.replace(fg.outputs[0], x)
+        assert fg.toposort() == []
+
     def test_node_outputs_not_used(self):
         # In the past, we where removing some not used variable from
         # fgraph.variables event if the apply had other output used in
@@ -230,6 +230,19 @@ class TestToposort:
         all = io_toposort([], o0.outputs)
         assert all == [o0]
 
+    def test_deep_wide(self):
+        """Test a deep chain whose nodes also have many inputs"""
+        r1 = MyVariable(1)
+        nodes = []
+        out = r1
+        for i in range(20000):
+            o = MyOp.make_node(out, r1)
+            nodes.append(o)
+            out = o.outputs[0]
+        wide = MyOp.make_node(*([out] * 1000 + [r1]))
+        all = io_toposort([r1], wide.outputs)
+        assert all == nodes + [wide]
+
 
 #################
 # is_same_graph #
@@ -2644,6 +2644,9 @@ class GpuCAReduceCPY(GpuKernelBase, HideC, CAReduceDtype):
     CAReduce that reuse the python code from gpuarray.
 
     """
+    # Unlike CAReduce, this op has no float16 support.
+    _f16_ok = False
+
     def __init__(self, scalar_op, axis=None, dtype=None, acc_dtype=None):
         if not hasattr(scalar_op, 'identity'):
             raise ValueError("No identity on scalar op")
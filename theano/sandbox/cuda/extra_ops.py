@@ -28,6 +28,8 @@ class GpuCumsum(CumOp, GpuOp):
 
     def __init__(self, axis):
         self.axis = axis
+        self.inplace = False
+        self.openmp = False
         self.max_threads_dim0 = None
         self.max_grid_size1 = None
         self.max_grid_size2 = None
@@ -0,0 +1,357 @@
+"""
+Faster approximations of exp, log, log1p and tanh.
+
+The C code of :class:`FastExp`, :class:`FastLog`, :class:`FastLog1p` and
+:class:`FastTanh` doesn't call the C math library: it computes the
+functions with range reductions and polynomials that only use arithmetic,
+comparisons and bit manipulations, without branches, so the compiler can
+vectorize the loops of Elemwise and of the fused Composites that use them.
+Their Python implementation computes the exact functions.
+
+The approximations are used on float32 and float64 values. Their maximal
+relative errors, measured on values spread over their domain (excluding the
+results that are subnormal numbers), are:
+
+=========  ==========  ==========
+function   float32     float64
+=========  ==========  ==========
+exp        7.1e-8      3.1e-16
+log        1.8e-7      4.4e-16
+log1p      2.6e-7      4.4e-16
+tanh       1.6e-7      1.2e-15
+sigmoid    1.2e-7      4.1e-16
+softplus   2.4e-7      5.2e-16
+=========  ==========  ==========
+
+(the machine epsilon is 1.2e-7 for float32 and 2.2e-16 for float64). The
+special values (infinities, NaN, zeros and subnormal numbers) give the same
+result as the exact functions. The approximations of sigmoid and softplus
+are in :mod:`theano.tensor.nnet.sigm`.
+
+The ``local_fast_math`` optimization, enabled with the ``fast_math`` tag
+(for instance with ``optimizer_including=fast_math``) or by the Theano flag
+``tensor.fast_math``, replaces exp, log, log1p, tanh, sigmoid and softplus
+by these approximations.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import theano
+from theano.scalar.basic import Exp, Log, Log1p, Tanh, upgrade_to_float
+
+fast_math_support_code = """
+#ifndef THEANO_FAST_MATH
+#define THEANO_FAST_MATH
+#include <math.h>
+#include <string.h>
+
+// The special values are handled by selects between constants or values
+// that are computed anyway, or by arithmetic, but never by selecting a
+// value computed only for some inputs: gcc would make it a branch, which
+// prevents the vectorization.
+
+// 2**n for -126 <= n <= 127.
+static inline float theano_fast_pow2f(npy_int32 n)
+{
+    npy_int32 bits = (n + 127) << 23;
+    float r;
+    memcpy(&r, &bits, sizeof(r));
+    return r;
+}
+
+// 2**n for -1022 <= n <= 1023.
+static inline double theano_fast_pow2(npy_int64 n)
+{
+    npy_int64 bits = (n + 1023) << 52;
+    double r;
+    memcpy(&r, &bits, sizeof(r));
+    return r;
+}
+
+// exp(x) = 2**n exp(r) with n the integer nearest to x / log(2), so
+// |r| <= log(2) / 2, and exp(r) computed by its Taylor polynomial. 2**n is
+// the product of two powers of 2 to also give the subnormal results.
+// x is clamped to a range whose ends give 0 and inf. Above it, and for inf
+// and NaN, r is large, inf or NaN and gives inf or NaN.
+static inline float theano_fast_expf(float x)
+{
+    float xl = x < -104.f ? -104.f : x;
+    float xc = xl > 89.f ? 89.f : xl;
+    xc = x != x ? 0.f : xc;
+    npy_int32 n = (npy_int32)(xc * 1.44269504f + (x < 0.f ? -0.5f : 0.5f));
+    float fn = (float)n;
+    float r = (xl - fn * 0.693359375f) + fn * 2.12194440e-4f;
+    float p = 1.f + r * (1.f + r * (1.f / 2 + r * (1.f / 6 + r * (
+        1.f / 24 + r * (1.f / 120 + r * (1.f / 720 + r * (1.f / 5040)))))));
+    npy_int32 n1 = n / 2;
+    return p * theano_fast_pow2f(n1) * theano_fast_pow2f(n - n1);
+}
+
+static inline double theano_fast_exp(double x)
+{
+    double xl = x < -746. ? -746. : x;
+    double xc = xl > 710. ? 710. : xl;
+    xc = x != x ? 0. : xc;
+    npy_int64 n = (npy_int64)(xc * 1.4426950408889634 +
+                              (x < 0. ? -0.5 : 0.5));
+    double fn = (double)n;
+    double r = (xl - fn * 6.93147180369123816490e-01) -
+        fn * 1.90821492927058770002e-10;
+    double p = 1. / 479001600;
+    p = 1. / 39916800 + r * p;
+    p = 1. / 3628800 + r * p;
+    p = 1. / 362880 + r * p;
+    p = 1. / 40320 + r * p;
+    p = 1. / 5040 + r * p;
+    p = 1. / 720 + r * p;
+    p = 1. / 120 + r * p;
+    p = 1. / 24 + r * p;
+    p = 1. / 6 + r * p;
+    p = 1. / 2 + r * p;
+    p = 1. + r * p;
+    p = 1. + r * p;
+    npy_int64 n1 = n / 2;
+    return p * theano_fast_pow2(n1) * theano_fast_pow2(n - n1);
+}
+
+// log(x) = e log(2) + log(m) with x = m 2**e and sqrt(1/2) <= m < sqrt(2),
+// and log(m) = 2 atanh(s) with s = (m - 1) / (m + 1), so |s| <= 0.1716,
+// computed by the beginning of its series. Subnormal numbers are first
+// scaled to normal ones. The result of the special values is added.
+static inline float theano_fast_logf(float x)
+{
+    float xs = x * (x < 1.17549435e-38f ? 33554432.f : 1.f);
+    npy_int32 bits;
+    memcpy(&bits, &xs, sizeof(bits));
+    npy_int32 e = ((bits >> 23) & 0xff) -
+        (x < 1.17549435e-38f ? 152 : 127);
+    bits = (bits & 0x7fffff) | 0x3f800000;
+    // Halve m above sqrt(2).
+    npy_int32 big = bits > 0x3fb504f3;
+    bits -= big << 23;
+    float m;
+    memcpy(&m, &bits, sizeof(m));
+    float fe = (float)(e + big);
+    float s = (m - 1.f) / (m + 1.f);
+    float s2 = s * s;
+    float z = 2.f * s * (1.f + s2 * (1.f / 3 + s2 * (1.f / 5 + s2 * (
+        1.f / 7 + s2 * (1.f / 9)))));
+    z = fe * 0.693359375f + (z - fe * 2.12194440e-4f);
+    float special = x == INFINITY ? INFINITY : 0.f;
+    special = x == 0.f ? -INFINITY : special;
+    special = x >= 0.f ? special : NAN;
+    return z + special;
+}
+
+static inline double theano_fast_log(double x)
+{
+    double xs = x * (x < 2.2250738585072014e-308 ? 18014398509481984. : 1.);
+    npy_int64 bits;
+    memcpy(&bits, &xs, sizeof(bits));
+    npy_int64 e = ((bits >> 52) & 0x7ff) -
+        (x < 2.2250738585072014e-308 ? 1077 : 1023);
+    bits = (bits & 0xfffffffffffffLL) | 0x3ff0000000000000LL;
+    npy_int64 big = bits > 0x3ff6a09e667f3bcdLL;
+    bits -= big << 52;
+    double m;
+    memcpy(&m, &bits, sizeof(m));
+    double fe = (double)(e + big);
+    double s = (m - 1.) / (m + 1.);
+    double s2 = s * s;
+    double p = 1. / 19;
+    p = 1. / 17 + s2 * p;
+    p = 1. / 15 + s2 * p;
+    p = 1. / 13 + s2 * p;
+    p = 1. / 11 + s2 * p;
+    p = 1. / 9 + s2 * p;
+    p = 1. / 7 + s2 * p;
+    p = 1. / 5 + s2 * p;
+    p = 1. / 3 + s2 * p;
+    p = 1. + s2 * p;
+    double z = 2. * s * p;
+    z = fe * 6.93147180369123816490e-01 +
+        (z + fe * 1.90821492927058770002e-10);
+    double special = x == INFINITY ? INFINITY : 0.;
+    special = x == 0. ? -INFINITY : special;
+    special = x >= 0. ? special : NAN;
+    return z + special;
+}
+
+// log1p(x) = log(u) - ((u - 1) - x) / u with u = 1 + x, where the second
+// term corrects the rounding of u. u is finite except for x = inf, whose
+// result is added. The result has the sign of x, for -0 too.
+static inline float theano_fast_log1pf(float x)
+{
+    float xs = x == INFINITY ? 0.f : x;
+    float u = 1.f + xs;
+    float d = u == 0.f ? 1.f : u;
+    float z = theano_fast_logf(u) - ((u - 1.f) - xs) / d;
+    return copysignf(z + (x == INFINITY ? INFINITY : 0.f), x);
+}
+
+static inline double theano_fast_log1p(double x)
+{
+    double xs = x == INFINITY ? 0. : x;
+    double u = 1. + xs;
+    double d = u == 0. ? 1. : u;
+    double z = theano_fast_log(u) - ((u - 1.) - xs) / d;
+    return copysign(z + (x == INFINITY ? INFINITY : 0.), x);
+}
+
+// tanh(x) is its Taylor polynomial near 0, and (1 - e) / (1 + e) with
+// e = exp(-2 |x|) and the sign of x above. The polynomial is
+// computed on 0 above, so that both are finite and can be blended.
+static inline float theano_fast_tanhf(float x)
+{
+    float a = fabsf(x);
+    // xs is x or 0 and w 1 or 0 depending on the branch, by masking the
+    // bits of x.
+    npy_int32 lo = a < 0.4f;
+    npy_int32 bits;
+    memcpy(&bits, &x, sizeof(bits));
+    bits &= -lo;
+    float xs;
+    memcpy(&xs, &bits, sizeof(xs));
+    float w = (float)lo;
+    float x2 = xs * xs;
+    float small = xs + xs * x2 * (-1.f / 3 + x2 * (2.f / 15 + x2 * (
+        -17.f / 315 + x2 * (62.f / 2835 + x2 * (-1382.f / 155925 +
+        x2 * (21844.f / 6081075))))));
+    float e = theano_fast_expf(-2.f * a);
+    float big = copysignf((1.f - e) / (1.f + e), x);
+    // The sign of x, for -0 too.
+    return copysignf(w * small + (1.f - w) * big, x);
+}
+
+static inline double theano_fast_tanh(double x)
+{
+    double a = fabs(x);
+    npy_int64 lo = a < 0.1;
+    npy_int64 bits;
+    memcpy(&bits, &x, sizeof(bits));
+    bits &= -lo;
+    double xs;
+    memcpy(&xs, &bits, sizeof(xs));
+    double w = (double)lo;
+    double x2 = xs * xs;
+    double small = xs + xs * x2 * (-1. / 3 + x2 * (2. / 15 + x2 * (
+        -17. / 315 + x2 * (62. / 2835 + x2 * (-1382. / 155925 +
+        x2 * (21844. / 6081075))))));
+    double e = theano_fast_exp(-2. * a);
+    double big = copysign((1. - e) / (1. + e), x);
+    // The sign of x, for -0 too.
+    return copysign(w * small + (1. - w) * big, x);
+}
+
+// sigmoid(x) = 1 / (1 + exp(-x))
+static inline float theano_fast_sigmoidf(float x)
+{
+    return 1.f / (1.f + theano_fast_expf(-x));
+}
+
+static inline double theano_fast_sigmoid(double x)
+{
+    return 1. / (1. + theano_fast_exp(-x));
+}
+
+// softplus(x) = max(x, 0) + log1p(exp(-|x|))
+static inline float theano_fast_softplusf(float x)
+{
+    return (x > 0.f ? x : 0.f) +
+        theano_fast_log1pf(theano_fast_expf(-fabsf(x)));
+}
+
+static inline double theano_fast_softplus(double x)
+{
+    return (x > 0. ? x : 0.) + theano_fast_log1p(theano_fast_exp(-fabs(x)));
+}
+#endif
+"""
+
+
+class FastMathOp(object):
+    """
+    Mixin for the scalar ops that have a fast_math approximation in C.
+
+    The class it is mixed with computes the exact function, which is used
+    in Python and for the types other than float32 and float64.
+
+    """
+
+    fast_math_function = None
+    """
+    The name of the C function of the approximation, for float64. The
+    float32 function has the suffix ``f``.
+
+    """
+
+    def c_support_code(self):
+        return fast_math_support_code
+
+    def c_code(self, node, name, inputs, outputs, sub):
+        (x,) = inputs
+        (z,) = outputs
+        dtypes = set(v.type.dtype for v in node.inputs + node.outputs)
+        if dtypes == set(['float32']):
+            fct = self.fast_math_function + 'f'
+        elif dtypes == set(['float64']):
+            fct = self.fast_math_function
+        else:
+            return super(FastMathOp, self).c_code(node, name, inputs,
+                                                  outputs, sub)
+        return "%(z)s = %(fct)s(%(x)s);" % locals()
+
+    def c_code_contiguous(self, node, name, inputs, outputs, sub):
+        # The Elemwise loop vectorizes better than the library calls.
+        raise theano.gof.utils.MethodNotDefined()
+
+    def c_code_cache_version(self):
+        v = super(FastMathOp, self).c_code_cache_version()
+        if v:
+            return (2,) + v
+        else:
+            return v
+
+
+class FastExp(FastMathOp, Exp):
+    """
+    exp, with a fast_math approximation in C.
+
+    """
+    fast_math_function = 'theano_fast_exp'
+fast_exp = FastExp(upgrade_to_float, name='fast_exp')
+
+
+class FastLog(FastMathOp, Log):
+    """
+    log, with a fast_math approximation in C.
+
+    """
+    fast_math_function = 'theano_fast_log'
+fast_log = FastLog(upgrade_to_float, name='fast_log')
+
+
+class FastLog1p(FastMathOp, Log1p):
+    """
+    log1p, with a fast_math approximation in C.
+
+    """
+    fast_math_function = 'theano_fast_log1p'
+fast_log1p = FastLog1p(upgrade_to_float, name='fast_log1p')
+
+
+class FastTanh(FastMathOp, Tanh):
+    """
+    tanh, with a fast_math approximation in C.
+
+    """
+    fast_math_function = 'theano_fast_tanh'
+fast_tanh = FastTanh(upgrade_to_float, name='fast_tanh')
+
+fast_math_ops = {Exp: FastExp, Log: FastLog, Log1p: FastLog1p,
+                 Tanh: FastTanh}
+"""
+The scalar op classes that have a fast_math approximation, and the class of
+that approximation, used by the ``local_fast_math`` optimization.
+
+"""
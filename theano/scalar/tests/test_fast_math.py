@@ -0,0 +1,74 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+import numpy
+from nose.plugins.skip import SkipTest
+
+import theano
+from theano.scalar.fast_math import (fast_exp, fast_log, fast_log1p,
+                                     fast_tanh)
+from theano.tensor.elemwise import Elemwise
+from theano.tests import unittest_tools as utt
+
+
+class TestFastMath(unittest.TestCase):
+    def setUp(self):
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+        self.mode = theano.compile.Mode(linker='c', optimizer=None)
+
+    def check(self, op, ref, domain=lambda v: v):
+        for dtype in ['float32', 'float64']:
+            info = numpy.finfo(dtype)
+            x = theano.tensor.vector(dtype=dtype)
+            f = theano.function([x], Elemwise(op)(x), mode=self.mode)
+
+            v = numpy.concatenate([
+                self.rng.uniform(-1, 1, 1000) *
+                10 ** self.rng.uniform(info.minexp / 3.33, 2, 1000),
+                self.rng.uniform(-800, 800, 1000),
+                numpy.linspace(-1, 1, 1001)])
+            v = domain(v).astype(dtype)
+            expected = ref(v.astype('float64'))
+            out = f(v)
+            assert out.dtype == dtype
+            normal = ((abs(expected) >= info.tiny) &
+                      (abs(expected) <= info.max))
+            rel = (abs(out[normal] - expected[normal]) /
+                   abs(expected[normal]))
+            assert rel.max() < 16 * info.eps, (op, dtype, rel.max())
+
+            special = numpy.asarray([0, -0., numpy.inf, -numpy.inf,
+                                     numpy.nan, info.tiny, info.tiny / 4,
+                                     info.max, -info.max, 1, -1],
+                                    dtype=dtype)
+            with numpy.errstate(all='ignore'):
+                expected = ref(special)
+            out = f(special)
+            numpy.testing.assert_allclose(out, expected, rtol=16 * info.eps)
+            # The zeros keep their sign.
+            numpy.testing.assert_array_equal(numpy.signbit(out[:2]),
+                                             numpy.signbit(expected[:2]))
+
+    def test_exp(self):
+        self.check(fast_exp, numpy.exp)
+
+    def test_log(self):
+        self.check(fast_log, numpy.log, abs)
+
+    def test_log1p(self):
+        self.check(fast_log1p, numpy.log1p,
+                   lambda v: numpy.where(v < -1, -1 - v, v))
+
+    def test_tanh(self):
+        self.check(fast_tanh, numpy.tanh)
+
+    def test_python(self):
+        # The Python implementation computes the exact function.
+        x = theano.tensor.dvector()
+        f = theano.function([x], Elemwise(fast_exp)(x),
+                            mode=theano.compile.Mode(linker='py'))
+        v = numpy.linspace(-5, 5, 11)
+        utt.assert_allclose(f(v), numpy.exp(v))
@@ -1,12 +1,64 @@
 from __future__ import absolute_import, print_function, division
 
+import numpy
+
 import theano
 from theano.tensor.basic import Join
 
 
+def checkpoint_interval(n_steps, outputs_info, memory_budget=None):
+    """Return the number of steps between two checkpoints of a scan.
+
+    Storing a checkpoint every ``N`` steps keeps ``ceil(n_steps / N)``
+    checkpoints and, while the gradient of one segment is computed, the
+    ``N`` states of that segment: ``ceil(n_steps / N) + N`` states, which
+    is the smallest for ``N = sqrt(n_steps)``. As every step is computed
+    twice whatever ``N`` is, a bigger ``N`` only reduces the number of
+    segments, so this returns the biggest ``N`` whose states fit in
+    ``memory_budget``, or ``ceil(sqrt(n_steps))`` if none fits.
+
+    Parameters
+    ----------
+    n_steps
+        The number of steps of the scan, an int or Theano scalar.
+    outputs_info
+        The ``outputs_info`` of the scan. The initial states give the
+        size of the states stored at each step.
+    memory_budget
+        The number of bytes available to store the states, or None to
+        use the smallest amount of memory.
+
+    Returns
+    -------
+    Theano int64 scalar
+        The number of steps between two checkpoints.
+
+    """
+    T = theano.tensor
+    n_steps = T.as_tensor_variable(n_steps)
+    interval = T.ceil(T.sqrt(n_steps))
+    if memory_budget is not None:
+        step_bytes = 0
+        for init in outputs_info:
+            if isinstance(init, dict):
+                init = init.get('initial', None)
+            if init is None:
+                continue
+            init = T.as_tensor_variable(init)
+            step_bytes += (T.prod(init.shape) *
+                           numpy.dtype(init.dtype).itemsize)
+        # The biggest N such that n_steps / N + N <= n_states.
+        n_states = memory_budget / T.maximum(step_bytes, 1)
+        discriminant = n_states ** 2 - 4 * n_steps
+        biggest = T.floor((n_states + T.sqrt(abs(discriminant))) / 2)
+        interval = T.switch(T.ge(discriminant, 0),
+                            T.maximum(biggest, interval), interval)
+    return T.cast(T.clip(interval, 1, T.maximum(n_steps, 1)), 'int64')
+
+
 def scan_checkpoints(fn, sequences=[], outputs_info=None, non_sequences=[],
                      name="checkpointscan_fn", n_steps=None, save_every_N=10,
-                     padding=True):
+                     padding=True, memory_budget=None):
     """Scan function that uses less memory, but is more restrictive.
 
     In :func:`~theano.scan`, if you compute the gradient of the output
@@ -62,7 +114,9 @@ def scan_checkpoints(fn, sequences=[], outputs_info=None, non_sequences=[],
     save_every_N
         ``save_every_N`` is the number of steps to go without storing
         the computations of ``scan`` (ie they will have to be recomputed
-        during the gradient computation).
+        during the gradient computation). If it is ``'auto'``, it is
+        chosen when the function runs by :func:`checkpoint_interval`,
+        from the number of steps and ``memory_budget``.
 
     padding
         If the length of the sequences is not a multiple of ``save_every_N``,
@@ -71,6 +125,12 @@ def scan_checkpoints(fn, sequences=[], outputs_info=None, non_sequences=[],
         avoided by setting ``padding`` to False, but you need to make
         sure the length of the sequences is a multple of ``save_every_N``.
 
+    memory_budget
+        Only used when ``save_every_N`` is ``'auto'``. The number of bytes
+        that the states of the recurrent outputs stored for the gradient
+        may use. If None, ``save_every_N`` is the square root of the
+        number of steps, which uses the least memory.
+
     Returns
     -------
     tuple
@@ -102,6 +162,10 @@ def scan_checkpoints(fn, sequences=[], outputs_info=None, non_sequences=[],
     if n_steps is None:
         n_steps = sequences[0].shape[0]
 
+    if save_every_N == 'auto':
+        save_every_N = checkpoint_interval(n_steps, outputs_info,
+                                           memory_budget)
+
     # Compute the number of steps of the outer scan
     o_n_steps = theano.tensor.cast(theano.tensor.ceil(n_steps / save_every_N),
                                    'int64')
@@ -118,12 +182,14 @@ def scan_checkpoints(fn, sequences=[], outputs_info=None, non_sequences=[],
         # Since padding could be an empty tensor, Join returns a view of s.
         join = Join(view=0)
         for i, s in enumerate(sequences):
-            n = s.shape[0] % save_every_N
-            z = theano.tensor.zeros((n, s.shape[1:]), dtype=s.dtype)
-            sequences[i] = join(0, [s, z])
+            n = (save_every_N - s.shape[0] % save_every_N) % save_every_N
+            z = theano.tensor.zeros([n] + [s.shape[i]
+                                           for i in range(1, s.ndim)],
+                                    dtype=s.dtype)
+            sequences[i] = join(0, s, z)
 
     # Establish the input variables of the outer scan
-    o_sequences = [s.reshape([s.shape[0] / save_every_N, save_every_N] +
+    o_sequences = [s.reshape([s.shape[0] // save_every_N, save_every_N] +
                              [s.shape[i] for i in range(1, s.ndim)],
                              s.ndim + 1) for s in sequences]
     o_sequences.append(i_n_steps)
@@ -133,9 +199,10 @@ def scan_checkpoints(fn, sequences=[], outputs_info=None, non_sequences=[],
     def outer_step(*args):
         # Separate the received arguments into their respective (seq, outputs
         # from previous iterations, nonseqs) categories
+        end_outputs = len(args) - len(o_nonsequences)
         i_sequences = list(args[:len(o_sequences)])
-        i_prev_outputs = list(args[len(o_sequences):-len(o_nonsequences)])
-        i_non_sequences = list(args[-len(o_nonsequences):])
+        i_prev_outputs = list(args[len(o_sequences):end_outputs])
+        i_non_sequences = list(args[end_outputs:])
         i_outputs_infos = i_prev_outputs + [None, ] * len(new_nitsots)
 
         # Call the user-provided function with the proper arguments
@@ -0,0 +1,515 @@
+"""
+An Op computing an elementwise recurrence in one loop.
+
+Scans whose steps are elementwise, like an exponential moving average
+``h[t] = a * h[t - 1] + b * x[t]``, compute each position of their outputs
+independently of the others. `ElemwiseScan` computes them with a scalar op
+(usually a `Composite`) in one C loop over the steps and the positions,
+instead of running one small Elemwise per step.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import numpy
+from six.moves import xrange
+
+import theano
+from theano import gof, scalar, tensor
+from theano.gof import Apply, OpenMPOp
+from theano.scalar import get_scalar_type
+
+__docformat__ = 'restructedtext en'
+
+
+def _elem_shape(shapes):
+    # The broadcasted shape of the positions of the operands.
+    shape = [1] * len(shapes[0])
+    for s in shapes:
+        for d, dim in enumerate(s):
+            if dim != 1:
+                if shape[d] != 1 and shape[d] != dim:
+                    raise ValueError(
+                        "ElemwiseScan: the operands have incompatible "
+                        "shapes %s" % str(shapes))
+                shape[d] = dim
+    return tuple(shape)
+
+
+class ElemwiseScan(OpenMPOp):
+    """
+    Compute an elementwise recurrence in one loop.
+
+    At each step and each position, `scalar_op` computes the new value of
+    each state and the value of each other output from the values at that
+    position of the sequences at that step, of the states at the previous
+    step and of the invariant inputs. As the positions are independent,
+    the C code splits them in blocks of `block_size` positions, computed in
+    parallel with OpenMP, and loops over the steps of each block, so that
+    each step of a block reads and writes consecutive positions.
+
+    The inputs are the number of steps, the sequences (with the steps on
+    their first axis), the buffers of the states and the invariant inputs.
+    The buffers hold the initial value of the states in their first row,
+    like the sit_sot inputs of Scan. The outputs are the buffers of the
+    states, with the value after step ``t`` in row ``(t + 1) % len(buffer)``
+    like the sit_sot outputs of Scan, and the other outputs at each step.
+    All operands have the same number of dimensions (not counting the
+    steps) and are broadcasted together.
+
+    Parameters
+    ----------
+    scalar_op
+        The scalar op computing one step at one position. Its inputs are
+        the sequences, the states and the invariant inputs, its outputs
+        the new states and the other outputs.
+    n_seqs
+        The number of sequences.
+    n_states
+        The number of states.
+
+    """
+    __props__ = ('scalar_op', 'n_seqs', 'n_states')
+    block_size = 256
+
+    def __init__(self, scalar_op, n_seqs, n_states, openmp=None):
+        super(ElemwiseScan, self).__init__(openmp=openmp)
+        self.scalar_op = scalar_op
+        self.n_seqs = n_seqs
+        self.n_states = n_states
+
+    def __str__(self):
+        return "%s{%s}" % (self.__class__.__name__, self.scalar_op)
+
+    def make_node(self, n_steps, *inputs):
+        n_steps = tensor.as_tensor_variable(n_steps)
+        if n_steps.ndim != 0 or n_steps.dtype not in tensor.integer_dtypes:
+            raise TypeError("ElemwiseScan: n_steps must be an integer "
+                            "scalar", n_steps.type)
+        inputs = [tensor.as_tensor_variable(x) for x in inputs]
+        if len(inputs) != self.scalar_op.nin:
+            raise TypeError("ElemwiseScan: wrong number of inputs, expected "
+                            "%d" % self.scalar_op.nin, len(inputs))
+        if self.scalar_op.nout < self.n_states:
+            raise TypeError("ElemwiseScan: the scalar op must have an "
+                            "output per state")
+        n_stepped = self.n_seqs + self.n_states
+        elem_bcast = [x.broadcastable[1:] for x in inputs[:n_stepped]]
+        elem_bcast += [x.broadcastable for x in inputs[n_stepped:]]
+        nd = len(elem_bcast[0])
+        if any(len(b) != nd for b in elem_bcast):
+            raise TypeError("ElemwiseScan: all the operands must have the "
+                            "same number of dimensions",
+                            [x.type for x in inputs])
+        bcast = tuple(all(b[d] for b in elem_bcast) for d in xrange(nd))
+        out_dtypes = [o.type.dtype for o in
+                      self.scalar_op.make_node(*[
+                          get_scalar_type(x.dtype).make_variable()
+                          for x in inputs]).outputs]
+        states = inputs[self.n_seqs:n_stepped]
+        for state, dtype in zip(states, out_dtypes):
+            if state.dtype != dtype or state.broadcastable[1:] != bcast:
+                raise TypeError("ElemwiseScan: the new value of a state "
+                                "must have its type", state.type, dtype)
+        outputs = [state.type() for state in states]
+        outputs += [tensor.TensorType(dtype, (False,) + bcast)()
+                    for dtype in out_dtypes[self.n_states:]]
+        return Apply(self, [n_steps] + inputs, outputs)
+
+    def _scalar_node(self, node):
+        return Apply(
+            self.scalar_op,
+            [get_scalar_type(dtype=x.type.dtype).make_variable()
+             for x in node.inputs[1:]],
+            [get_scalar_type(dtype=o.type.dtype).make_variable()
+             for o in node.outputs])
+
+    def prepare_node(self, node, storage_map, compute_map, impl):
+        node.tag.fake_node = self._scalar_node(node)
+        self.scalar_op.prepare_node(node.tag.fake_node, None, None, impl)
+
+    def infer_shape(self, node, shapes):
+        n_stepped = self.n_seqs + self.n_states
+        elem_shapes = [s[1:] for s in shapes[1:1 + n_stepped]]
+        elem_shapes += shapes[1 + n_stepped:]
+        elem_bcast = [x.broadcastable[1:]
+                      for x in node.inputs[1:1 + n_stepped]]
+        elem_bcast += [x.broadcastable for x in node.inputs[1 + n_stepped:]]
+        nd = len(elem_bcast[0])
+        elem_shape = []
+        for d in xrange(nd):
+            for s, b in zip(elem_shapes, elem_bcast):
+                if not b[d]:
+                    elem_shape.append(s[d])
+                    break
+            else:
+                elem_shape.append(1)
+        n_steps = node.inputs[0]
+        out_shapes = list(shapes[1 + self.n_seqs:1 + n_stepped])
+        out_shapes += [[n_steps] + elem_shape] * (len(node.outputs) -
+                                                  self.n_states)
+        return out_shapes
+
+    def perform(self, node, inputs, output_storage):
+        n_steps = int(inputs[0])
+        seqs = inputs[1:1 + self.n_seqs]
+        buffers = [numpy.array(x) for x in
+                   inputs[1 + self.n_seqs:1 + self.n_seqs + self.n_states]]
+        invariants = inputs[1 + self.n_seqs + self.n_states:]
+        if n_steps < 0:
+            raise ValueError("ElemwiseScan: negative number of steps")
+        if any(len(x) < n_steps for x in seqs):
+            raise ValueError("ElemwiseScan: a sequence is shorter than the "
+                             "number of steps")
+        elem_shape = _elem_shape([x.shape[1:] for x in seqs + buffers] +
+                                 [x.shape for x in invariants])
+        out_dtypes = [o.type.dtype for o in node.outputs]
+        others = [numpy.empty((n_steps,) + elem_shape, dtype=dtype)
+                  for dtype in out_dtypes[self.n_states:]]
+        ufunc = numpy.frompyfunc(self.scalar_op.impl, self.scalar_op.nin,
+                                 self.scalar_op.nout)
+        for t in xrange(n_steps):
+            values = ufunc(*([x[t] for x in seqs] +
+                             [b[t % len(b)] for b in buffers] +
+                             list(invariants)))
+            if self.scalar_op.nout == 1:
+                values = [values]
+            for b, value in zip(buffers, values):
+                b[(t + 1) % len(b)] = value
+            for o, value in zip(others, values[self.n_states:]):
+                o[t] = value
+        for storage, value in zip(output_storage, buffers + others):
+            storage[0] = value
+
+    def c_support_code(self):
+        return self.scalar_op.c_support_code() + """
+        static int elemwise_scan_copy_rows(PyArrayObject* dst,
+                                           PyArrayObject* src,
+                                           npy_intp start, npy_intp stop)
+        {
+            int ret = -1;
+            if (start >= stop)
+                return 0;
+            PyObject* dst_rows = PySequence_GetSlice((PyObject*)dst,
+                                                     start, stop);
+            PyObject* src_rows = PySequence_GetSlice((PyObject*)src,
+                                                     start, stop);
+            if (dst_rows && src_rows)
+                ret = PyArray_CopyInto((PyArrayObject*)dst_rows,
+                                       (PyArrayObject*)src_rows);
+            Py_XDECREF(dst_rows);
+            Py_XDECREF(src_rows);
+            return ret;
+        }
+        """
+
+    def c_support_code_apply(self, node, name):
+        return self.scalar_op.c_support_code_apply(self._scalar_node(node),
+                                                   name + '_scalar_')
+
+    def c_code(self, node, name, inames, onames, sub):
+        if (any(x.type.dtype == 'float16' for x in node.inputs) or
+                any(o.type.dtype == 'float16' for o in node.outputs) or
+                getattr(self.scalar_op, 'inner_float16', False)):
+            # Disable C code for float16 vars
+            super(ElemwiseScan, self).c_code(node, name, inames, onames, sub)
+        n_steps = inames[0]
+        n_steps_dtype = node.inputs[0].type.dtype_specs()[1]
+        n_stepped = self.n_seqs + self.n_states
+        seqs = inames[1:1 + self.n_seqs]
+        states = inames[1 + self.n_seqs:1 + n_stepped]
+        invariants = inames[1 + n_stepped:]
+        out_states = onames[:self.n_states]
+        others = onames[self.n_states:]
+        in_types = node.inputs[1:]
+        nd = node.outputs[0].ndim - 1
+        nd1 = max(nd, 1)
+        fail = sub['fail']
+
+        def c_dtype(var):
+            return var.type.dtype_specs()[1]
+
+        # The operands that are read or written at each position, with
+        # their variable and whether their first axis is the steps.
+        operands = []
+        for i, x in enumerate(seqs):
+            operands.append(('seq%d' % i, x, in_types[i], 1))
+        for i, x in enumerate(out_states):
+            operands.append(('state%d' % i, x, node.outputs[i], 1))
+        for i, x in enumerate(invariants):
+            operands.append(('inv%d' % i, x, in_types[n_stepped + i], 0))
+        for i, x in enumerate(others):
+            operands.append(('out%d' % i, x,
+                             node.outputs[self.n_states + i], 1))
+
+        code = ["""
+        npy_intp n_steps = (npy_intp)*(%(n_steps_dtype)s*)PyArray_DATA(%(n_steps)s);
+        npy_intp shape[%(nd1)s];
+        npy_intp n_pos = 1;
+        if (n_steps < 0) {
+            PyErr_SetString(PyExc_ValueError,
+                            "ElemwiseScan: negative number of steps");
+            %(fail)s
+        }
+        for (int d = 0; d < %(nd1)s; ++d)
+            shape[d] = -1;
+        """ % locals()]
+        for x in seqs:
+            code.append("""
+            if (PyArray_DIMS(%(x)s)[0] < n_steps) {
+                PyErr_SetString(PyExc_ValueError,
+                    "ElemwiseScan: a sequence is shorter than the number "
+                    "of steps");
+                %(fail)s
+            }
+            """ % locals())
+        for x in states:
+            code.append("""
+            if (PyArray_DIMS(%(x)s)[0] < 1) {
+                PyErr_SetString(PyExc_ValueError,
+                    "ElemwiseScan: the buffer of a state is empty");
+                %(fail)s
+            }
+            """ % locals())
+        # The shape of the positions, from the dimensions that aren't
+        # broadcastable.
+        for x, var, off in ([(x, in_types[i], 1) for i, x in
+                             enumerate(seqs + states)] +
+                            [(x, in_types[n_stepped + i], 0) for i, x in
+                             enumerate(invariants)]):
+            for d in xrange(nd):
+                if var.broadcastable[d + off]:
+                    continue
+                code.append("""
+                if (shape[%(d)s] == -1)
+                    shape[%(d)s] = PyArray_DIMS(%(x)s)[%(d)s + %(off)s];
+                else if (shape[%(d)s] != PyArray_DIMS(%(x)s)[%(d)s + %(off)s]) {
+                    PyErr_SetString(PyExc_ValueError,
+                        "ElemwiseScan: the operands have incompatible shapes");
+                    %(fail)s
+                }
+                """ % locals())
+        code.append("""
+        for (int d = 0; d < %(nd)s; ++d) {
+            if (shape[d] == -1)
+                shape[d] = 1;
+            n_pos *= shape[d];
+        }
+        """ % locals())
+        # The outputs of the states get the rows of their buffer that the
+        # steps don't overwrite: the initial value, and the rows after the
+        # last step if the buffer is longer than the steps.
+        for x, z, var in zip(states, out_states, node.outputs):
+            typenum = var.type.dtype_specs()[2]
+            code.append("""
+            if (!(%(z)s && PyArray_CompareLists(PyArray_DIMS(%(z)s),
+                                                PyArray_DIMS(%(x)s),
+                                                PyArray_NDIM(%(x)s)))) {
+                Py_XDECREF(%(z)s);
+                %(z)s = (PyArrayObject*)PyArray_EMPTY(PyArray_NDIM(%(x)s),
+                                                      PyArray_DIMS(%(x)s),
+                                                      %(typenum)s, 0);
+                if (!%(z)s) {
+                    PyErr_SetString(PyExc_MemoryError,
+                        "ElemwiseScan: failed to allocate an output");
+                    %(fail)s
+                }
+            }
+            if (elemwise_scan_copy_rows(%(z)s, %(x)s, 0, 1) ||
+                elemwise_scan_copy_rows(%(z)s, %(x)s, n_steps + 1,
+                                        PyArray_DIMS(%(x)s)[0]))
+                %(fail)s
+            """ % locals())
+        for z, var in zip(others, node.outputs[self.n_states:]):
+            typenum = var.type.dtype_specs()[2]
+            code.append("""
+            {
+                npy_intp dims[%(nd)s + 1];
+                dims[0] = n_steps;
+                for (int d = 0; d < %(nd)s; ++d)
+                    dims[d + 1] = shape[d];
+                if (!(%(z)s && PyArray_CompareLists(PyArray_DIMS(%(z)s),
+                                                    dims, %(nd)s + 1))) {
+                    Py_XDECREF(%(z)s);
+                    %(z)s = (PyArrayObject*)PyArray_EMPTY(%(nd)s + 1, dims,
+                                                          %(typenum)s, 0);
+                    if (!%(z)s) {
+                        PyErr_SetString(PyExc_MemoryError,
+                            "ElemwiseScan: failed to allocate an output");
+                        %(fail)s
+                    }
+                }
+            }
+            """ % locals())
+
+        # The strides of the operands over the steps and the positions.
+        for op_name, x, var, off in operands:
+            code.append("""
+            char* base_%(op_name)s = (char*)PyArray_DATA(%(x)s);
+            npy_intp estr_%(op_name)s[%(nd1)s];
+            """ % locals())
+            if off:
+                code.append("""
+                npy_intp tstr_%(op_name)s = PyArray_STRIDES(%(x)s)[0];
+                npy_intp len_%(op_name)s = PyArray_DIMS(%(x)s)[0];
+                """ % locals())
+            for d in xrange(nd):
+                if var.broadcastable[d + off]:
+                    code.append("estr_%(op_name)s[%(d)s] = 0;\n" % locals())
+                else:
+                    code.append("estr_%(op_name)s[%(d)s] = "
+                                "PyArray_STRIDES(%(x)s)[%(d)s + %(off)s];\n"
+                                % locals())
+
+        # The loop over the steps, for blocks of positions. The steps of a
+        # block read and write consecutive positions of the rows of the
+        # operands, and the blocks are independent.
+        block = self.block_size
+        if self.openmp:
+            minsize = theano.config.openmp_elemwise_minsize
+            code.append("""
+            npy_intp n_blocks = (n_pos + %(block)s - 1) / %(block)s;
+            #pragma omp parallel for if(n_blocks > 1 && n_pos * n_steps >= %(minsize)s)
+            """ % locals())
+        else:
+            code.append("""
+            npy_intp n_blocks = (n_pos + %(block)s - 1) / %(block)s;
+            """ % locals())
+        declare = "".join("npy_intp off_%s[%d];\n" % (op[0], block)
+                          for op in operands)
+        unravel = "".join("off_%s[q] += idx * estr_%s[d];\n" % (op[0], op[0])
+                          for op in operands)
+        init = "".join("off_%s[q] = 0;\n" % op[0] for op in operands)
+        # The rows of the operands read and written at a step.
+        rows = ""
+        cursors = ""
+        advance = ""
+        loads = ""
+        for op_name, x, var, off in operands:
+            dtype = c_dtype(var)
+            if op_name.startswith('seq') or op_name.startswith('out'):
+                rows += ("char* row_%(op_name)s = base_%(op_name)s + "
+                         "t * tstr_%(op_name)s;\n" % locals())
+            elif op_name.startswith('state'):
+                # The rows of the buffer wrap around at its end.
+                rows += ("const npy_intp nxt_%(op_name)s = (cur_%(op_name)s"
+                         " + 1 == len_%(op_name)s ? 0 : cur_%(op_name)s + 1);"
+                         "\nchar* row_%(op_name)s = base_%(op_name)s + "
+                         "cur_%(op_name)s * tstr_%(op_name)s;\n"
+                         "char* next_%(op_name)s = base_%(op_name)s + "
+                         "nxt_%(op_name)s * tstr_%(op_name)s;\n" % locals())
+                cursors += "npy_intp cur_%(op_name)s = 0;\n" % locals()
+                advance += ("cur_%(op_name)s = nxt_%(op_name)s;\n"
+                            % locals())
+            else:
+                rows += ("char* row_%(op_name)s = base_%(op_name)s;\n"
+                         % locals())
+            if not op_name.startswith('out'):
+                loads += ("const %(dtype)s %(op_name)s_i = *(%(dtype)s*)"
+                          "(row_%(op_name)s + off_%(op_name)s[q]);\n"
+                          % locals())
+        new_values = "".join("%s new%d_i;\n" % (c_dtype(o), i)
+                             for i, o in enumerate(node.outputs))
+        task_code = self.scalar_op.c_code(
+            node.tag.fake_node if hasattr(node.tag, 'fake_node')
+            else self._scalar_node(node),
+            name + '_scalar_',
+            ["seq%d_i" % i for i in xrange(self.n_seqs)] +
+            ["state%d_i" % i for i in xrange(self.n_states)] +
+            ["inv%d_i" % i for i in xrange(len(invariants))],
+            ["new%d_i" % i for i in xrange(len(node.outputs))],
+            sub)
+        stores = ""
+        for i in xrange(self.n_states):
+            dtype = c_dtype(node.outputs[i])
+            stores += ("*(%(dtype)s*)(next_state%(i)s + off_state%(i)s[q]) = "
+                       "new%(i)s_i;\n" % locals())
+        for i in xrange(len(others)):
+            dtype = c_dtype(node.outputs[self.n_states + i])
+            j = self.n_states + i
+            stores += ("*(%(dtype)s*)(row_out%(i)s + off_out%(i)s[q]) = "
+                       "new%(j)s_i;\n" % locals())
+        code.append("""
+        for (npy_intp b = 0; b < n_blocks; ++b) {
+            const npy_intp start = b * %(block)s;
+            const npy_intp count = (n_pos - start < %(block)s ?
+                                    n_pos - start : %(block)s);
+            %(declare)s
+            for (npy_intp q = 0; q < count; ++q) {
+                npy_intp rem = start + q;
+                %(init)s
+                for (int d = %(nd)s - 1; d >= 0; --d) {
+                    npy_intp idx = rem %% shape[d];
+                    rem /= shape[d];
+                    %(unravel)s
+                }
+            }
+            %(cursors)s
+            for (npy_intp t = 0; t < n_steps; ++t) {
+                %(rows)s
+                for (npy_intp q = 0; q < count; ++q) {
+                    %(loads)s
+                    %(new_values)s
+                    {
+                        %(task_code)s
+                    }
+                    %(stores)s
+                }
+                %(advance)s
+            }
+        }
+        """ % locals())
+        return "{\n%s\n}" % "".join(code)
+
+    def c_code_cache_version_apply(self, node):
+        version = [1]
+        version.append(self.scalar_op.c_code_cache_version_apply(
+            self._scalar_node(node)))
+        for x in node.inputs[1:] + node.outputs:
+            version.append(
+                get_scalar_type(dtype=x.type.dtype).c_code_cache_version())
+        version.append(('openmp', self.openmp))
+        if all(version):
+            return tuple(version)
+        else:
+            return ()
+
+
+def elemwise_scan_op(inputs, outputs, n_seqs, n_states):
+    """
+    Build the ElemwiseScan computing an elementwise step.
+
+    Parameters
+    ----------
+    inputs
+        The variables of the step: the values at one position of the
+        sequences, of the states and of the invariant inputs.
+    outputs
+        The variables computed by the step: the new states and the other
+        outputs. They must be computed from `inputs` by Elemwise ops only.
+
+    Returns
+    -------
+    ElemwiseScan or None
+        None if the step isn't elementwise or if one of its ops doesn't
+        have C code.
+
+    """
+    s_inputs = [get_scalar_type(x.dtype).make_variable() for x in inputs]
+    givens = dict(zip(inputs, s_inputs))
+    for node in gof.graph.io_toposort(inputs, outputs):
+        if not isinstance(node.op, tensor.Elemwise):
+            return None
+        s_args = [givens.get(x) for x in node.inputs]
+        if any(x is None for x in s_args):
+            return None
+        s_node = node.op.scalar_op.make_node(*s_args)
+        try:
+            node.op.scalar_op.c_code(s_node, "test_presence_of_c_code",
+                                     ["x" for x in node.inputs],
+                                     ["z" for z in node.outputs], {})
+        except (gof.utils.MethodNotDefined, NotImplementedError):
+            return None
+        givens.update(zip(node.outputs, s_node.outputs))
+    s_outputs = [givens[o] for o in outputs]
+    return ElemwiseScan(scalar.Composite(s_inputs, s_outputs), n_seqs,
+                        n_states)
@@ -0,0 +1,392 @@
+/*
+ * Loop of the Scan op in C.
+ *
+ * This is used when the inner graph of a scan is compiled by the CLinker
+ * into one C struct. The iterations, the indexing of the taps and the
+ * writes of the outputs are done here, in C, and the C struct of the
+ * inner graph is executed directly, without going back to Python between
+ * iterations.
+ *
+ * Only scans without mit_mot and shared outputs are handled, see
+ * `Scan.make_thunk`.
+ */
+#include <Python.h>
+#include "theano_mod_helper.h"
+#include "numpy/arrayobject.h"
+
+#if PY_VERSION_HEX >= 0x03000000
+#include "numpy/npy_3kcompat.h"
+#define PyCObject_AsVoidPtr  NpyCapsule_AsVoidPtr
+#define PyCObject_GetDesc  NpyCapsule_GetDesc
+#define PyCObject_Check NpyCapsule_Check
+#endif
+
+/*
+ * Return a new view of `arr[idx]`, i.e. of `arr` without its first
+ * dimension.
+ */
+static PyArrayObject* row_view(PyArrayObject* arr, npy_intp idx)
+{
+    PyArray_Descr* descr = PyArray_DESCR(arr);
+    Py_INCREF(descr);
+    PyArrayObject* view = (PyArrayObject*)PyArray_NewFromDescr(
+        &PyArray_Type, descr, PyArray_NDIM(arr) - 1,
+        PyArray_DIMS(arr) + 1, PyArray_STRIDES(arr) + 1,
+        PyArray_BYTES(arr) + idx * PyArray_STRIDES(arr)[0],
+        PyArray_FLAGS(arr) & (NPY_ARRAY_WRITEABLE | NPY_ARRAY_ALIGNED),
+        NULL);
+    if (view == NULL)
+        return NULL;
+    Py_INCREF(arr);
+    // Steals the reference to arr, even on failure.
+    if (PyArray_SetBaseObject(view, (PyObject*)arr) < 0) {
+        Py_DECREF(view);
+        return NULL;
+    }
+    PyArray_UpdateFlags(view, NPY_ARRAY_UPDATE_ALL);
+    return view;
+}
+
+/*
+ * Put `value` in the one element list `storage`. Steals the reference
+ * to `value`.
+ */
+static int set_storage(PyObject* storage, PyObject* value)
+{
+    if (value == NULL)
+        return -1;
+    return PyList_SetItem(storage, 0, value);
+}
+
+/*
+ * Return the array in the one element list `storage` (borrowed), or
+ * NULL with an exception set if it isn't an ndarray.
+ */
+static PyArrayObject* get_array(PyObject* storage, const char* what)
+{
+    PyObject* value = PyList_GET_ITEM(storage, 0);
+    if (!PyArray_Check(value)) {
+        PyErr_Format(PyExc_TypeError,
+                     "Scan C loop: expected an ndarray for %s", what);
+        return NULL;
+    }
+    return (PyArrayObject*)value;
+}
+
+/*
+ * Make sure the buffer of the nit_sot output `out` can store
+ * `store_steps` values shaped like `first`, the value computed at the
+ * first iteration.
+ */
+static int prepare_nit_sot(PyObject* out, PyArrayObject* first,
+                           npy_intp store_steps)
+{
+    PyObject* buf = PyList_GET_ITEM(out, 0);
+    int nd = PyArray_NDIM(first) + 1;
+    if (buf != Py_None && PyArray_Check(buf)) {
+        PyArrayObject* abuf = (PyArrayObject*)buf;
+        int ok = (PyArray_NDIM(abuf) == nd &&
+                  PyArray_DIMS(abuf)[0] >= store_steps &&
+                  PyArray_EquivTypes(PyArray_DESCR(abuf),
+                                     PyArray_DESCR(first)));
+        for (int d = 1; ok && d < nd; d++)
+            ok = PyArray_DIMS(abuf)[d] == PyArray_DIMS(first)[d - 1];
+        if (ok) {
+            if (PyArray_DIMS(abuf)[0] == store_steps)
+                return 0;
+            // Reuse the beginning of the buffer, like buf[:store_steps].
+            PyObject* sub = PySequence_GetSlice(buf, 0, store_steps);
+            return set_storage(out, sub);
+        }
+    }
+    npy_intp* dims = (npy_intp*)malloc(nd * sizeof(npy_intp));
+    if (dims == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    dims[0] = store_steps;
+    for (int d = 1; d < nd; d++)
+        dims[d] = PyArray_DIMS(first)[d - 1];
+    PyArray_Descr* descr = PyArray_DESCR(first);
+    Py_INCREF(descr);
+    PyObject* new_buf = PyArray_Zeros(nd, dims, descr, 0);
+    free(dims);
+    return set_storage(out, new_buf);
+}
+
+#define GET_INT(list, i) PyLong_AsSsize_t(PyList_GET_ITEM(list, i))
+
+/*
+ * perform(n_steps, cthunk, seqs, seq_storage, outs, taps, tap_storage,
+ *         out_storage, store_steps, mintaps, n_nit_sot, prealloc,
+ *         cond_storage)
+ *
+ * n_steps      Number of iterations.
+ * cthunk       The CObject/Capsule of the C struct of the inner graph.
+ * seqs         List of the sequences.
+ * seq_storage  List of the inner storage of the sequences.
+ * outs         List of the outer storage of the outputs: mit_sot and
+ *              sit_sot outputs (already containing the initial states),
+ *              then nit_sot outputs.
+ * taps         List of the list of taps of the mit_sot and sit_sot.
+ * tap_storage  List of the list of the inner storage of those taps.
+ * out_storage  List of the inner storage of the outputs, in the order
+ *              of `outs`.
+ * store_steps  List of the number of steps stored for each output.
+ * mintaps      List of the minimal tap of each output (0 for nit_sot).
+ * n_nit_sot    Number of nit_sot outputs, at the end of `outs`.
+ * prealloc     List of booleans, true if the inner graph may compute the
+ *              output directly in the outer storage.
+ * cond_storage Inner storage of the condition of a scan `until`, or None.
+ *
+ * Return a tuple (number of iterations done, failure code of the inner
+ * struct or 0). When the failure code isn't 0, the caller must raise the
+ * error stored by the inner struct.
+ */
+static PyObject* perform(PyObject* self, PyObject* args)
+{
+    Py_ssize_t n_steps, n_nit_sot;
+    PyObject *cthunk, *seqs, *seq_storage, *outs, *taps, *tap_storage;
+    PyObject *out_storage, *store_steps_l, *mintaps_l, *prealloc_l;
+    PyObject *cond_storage;
+    if (!PyArg_ParseTuple(args, "nOO!O!O!O!O!O!O!O!nO!O",
+                          &n_steps, &cthunk,
+                          &PyList_Type, &seqs, &PyList_Type, &seq_storage,
+                          &PyList_Type, &outs, &PyList_Type, &taps,
+                          &PyList_Type, &tap_storage,
+                          &PyList_Type, &out_storage,
+                          &PyList_Type, &store_steps_l,
+                          &PyList_Type, &mintaps_l, &n_nit_sot,
+                          &PyList_Type, &prealloc_l, &cond_storage))
+        return NULL;
+    if (!PyCObject_Check(cthunk)) {
+        PyErr_SetString(PyExc_TypeError,
+                        "Scan C loop: cthunk must be a CObject/Capsule");
+        return NULL;
+    }
+    int (*executor)(void*) = (int (*)(void*))PyCObject_AsVoidPtr(cthunk);
+    void* cstruct = PyCObject_GetDesc(cthunk);
+
+    Py_ssize_t n_seqs = PyList_GET_SIZE(seqs);
+    Py_ssize_t n_outs_all = PyList_GET_SIZE(outs);
+    Py_ssize_t n_outs = n_outs_all - n_nit_sot;
+    if (PyList_GET_SIZE(seq_storage) != n_seqs ||
+        PyList_GET_SIZE(taps) != n_outs ||
+        PyList_GET_SIZE(tap_storage) != n_outs ||
+        PyList_GET_SIZE(out_storage) != n_outs_all ||
+        PyList_GET_SIZE(store_steps_l) != n_outs_all ||
+        PyList_GET_SIZE(mintaps_l) != n_outs_all ||
+        PyList_GET_SIZE(prealloc_l) != n_outs_all) {
+        PyErr_SetString(PyExc_ValueError,
+                        "Scan C loop: inconsistent number of arguments");
+        return NULL;
+    }
+    for (Py_ssize_t k = 0; k < n_seqs; k++) {
+        if (!PyArray_Check(PyList_GET_ITEM(seqs, k))) {
+            PyErr_SetString(PyExc_TypeError,
+                            "Scan C loop: sequences must be ndarrays");
+            return NULL;
+        }
+    }
+
+    Py_ssize_t i = 0;
+    int failure = 0;
+    int err = 0;
+    npy_intp* store_steps = NULL;
+    npy_intp* pos = NULL;
+    int* prealloc = NULL;
+    PyArrayObject** slots = NULL;
+    if (n_outs_all) {
+        store_steps = (npy_intp*)malloc(n_outs_all * sizeof(npy_intp));
+        pos = (npy_intp*)malloc(n_outs_all * sizeof(npy_intp));
+        prealloc = (int*)malloc(n_outs_all * sizeof(int));
+        slots = (PyArrayObject**)calloc(n_outs_all, sizeof(PyArrayObject*));
+        if (!store_steps || !pos || !prealloc || !slots) {
+            PyErr_NoMemory();
+            err = 1;
+            goto done;
+        }
+    }
+    for (Py_ssize_t j = 0; j < n_outs_all; j++) {
+        store_steps[j] = GET_INT(store_steps_l, j);
+        npy_intp mintap = GET_INT(mintaps_l, j);
+        if (PyErr_Occurred()) {
+            err = 1;
+            goto done;
+        }
+        pos[j] = (-mintap) % store_steps[j];
+        if (pos[j] < 0)
+            pos[j] += store_steps[j];
+        // The inner graph can't compute an output directly in the outer
+        // storage when that storage is also read by one of the taps.
+        prealloc[j] = (PyObject_IsTrue(PyList_GET_ITEM(prealloc_l, j)) &&
+                       store_steps[j] > -mintap);
+    }
+
+    for (i = 0; i < n_steps;) {
+        // Sequences
+        for (Py_ssize_t k = 0; k < n_seqs; k++) {
+            PyArrayObject* seq = (PyArrayObject*)PyList_GET_ITEM(seqs, k);
+            if (set_storage(PyList_GET_ITEM(seq_storage, k),
+                            (PyObject*)row_view(seq, i))) {
+                err = 1;
+                goto done;
+            }
+        }
+        // Taps of mit_sot and sit_sot
+        for (Py_ssize_t j = 0; j < n_outs; j++) {
+            PyArrayObject* buf = get_array(PyList_GET_ITEM(outs, j),
+                                           "a recurrent output");
+            if (buf == NULL) {
+                err = 1;
+                goto done;
+            }
+            PyObject* j_taps = PyList_GET_ITEM(taps, j);
+            PyObject* j_storage = PyList_GET_ITEM(tap_storage, j);
+            for (Py_ssize_t t = 0; t < PyList_GET_SIZE(j_taps); t++) {
+                npy_intp idx = (pos[j] + GET_INT(j_taps, t)) % store_steps[j];
+                if (idx < 0)
+                    idx += store_steps[j];
+                if (set_storage(PyList_GET_ITEM(j_storage, t),
+                                (PyObject*)row_view(buf, idx))) {
+                    err = 1;
+                    goto done;
+                }
+            }
+        }
+        // Outputs, computed directly in the outer storage if possible.
+        // The buffers of the nit_sot outputs only exist after the first
+        // iteration.
+        for (Py_ssize_t j = 0; j < n_outs_all; j++) {
+            PyObject* value = Py_None;
+            if (prealloc[j] && (i > 0 || j < n_outs)) {
+                PyArrayObject* buf = get_array(PyList_GET_ITEM(outs, j),
+                                               "an output");
+                if (buf == NULL) {
+                    err = 1;
+                    goto done;
+                }
+                slots[j] = row_view(buf, pos[j]);
+                if (slots[j] == NULL) {
+                    err = 1;
+                    goto done;
+                }
+                value = (PyObject*)slots[j];
+            }
+            Py_INCREF(value);
+            if (set_storage(PyList_GET_ITEM(out_storage, j), value)) {
+                err = 1;
+                goto done;
+            }
+        }
+        if (cond_storage != Py_None) {
+            Py_INCREF(Py_None);
+            if (set_storage(cond_storage, Py_None)) {
+                err = 1;
+                goto done;
+            }
+        }
+
+        failure = executor(cstruct);
+        if (failure)
+            goto done;
+
+        // Copy the outputs that weren't computed in the outer storage.
+        for (Py_ssize_t j = 0; j < n_outs_all; j++) {
+            PyArrayObject* value = get_array(
+                PyList_GET_ITEM(out_storage, j), "an inner output");
+            if (value == NULL) {
+                err = 1;
+                goto done;
+            }
+            if (i == 0 && j >= n_outs &&
+                    prepare_nit_sot(PyList_GET_ITEM(outs, j), value,
+                                    store_steps[j])) {
+                err = 1;
+                goto done;
+            }
+            if (value != slots[j]) {
+                PyArrayObject* buf = get_array(PyList_GET_ITEM(outs, j),
+                                               "an output");
+                PyArrayObject* dst = NULL;
+                if (buf != NULL)
+                    dst = row_view(buf, pos[j]);
+                if (dst == NULL || PyArray_CopyInto(dst, value)) {
+                    Py_XDECREF(dst);
+                    err = 1;
+                    goto done;
+                }
+                Py_DECREF(dst);
+            }
+            Py_CLEAR(slots[j]);
+            pos[j] = (pos[j] + 1) % store_steps[j];
+        }
+        i++;
+
+        if (cond_storage != Py_None) {
+            int stop = PyObject_IsTrue(PyList_GET_ITEM(cond_storage, 0));
+            if (stop < 0) {
+                err = 1;
+                goto done;
+            }
+            if (stop)
+                break;
+        }
+    }
+
+done:
+    if (slots) {
+        for (Py_ssize_t j = 0; j < n_outs_all; j++)
+            Py_XDECREF(slots[j]);
+    }
+    free(store_steps);
+    free(pos);
+    free(prealloc);
+    free(slots);
+    if (err)
+        return NULL;
+    return Py_BuildValue("ni", i, failure);
+}
+
+static PyObject* get_version(PyObject* dummy, PyObject* args)
+{
+    return PyFloat_FromDouble(0.2);
+}
+
+static PyMethodDef scan_loop_methods[] = {
+    {"perform", perform, METH_VARARGS, "Run the loop of a scan in C."},
+    {"get_version", get_version, METH_VARARGS, "Get extension version."},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+#if defined(NPY_PY3K)
+static struct PyModuleDef moduledef = {
+        PyModuleDef_HEAD_INIT,
+        "scan_loop",
+        NULL,
+        -1,
+        scan_loop_methods,
+        NULL,
+        NULL,
+        NULL,
+        NULL
+};
+#define RETVAL m
+PyMODINIT_FUNC
+PyInit_scan_loop(void) {
+#else
+#define RETVAL
+PyMODINIT_FUNC
+initscan_loop(void)
+{
+#endif
+    PyObject* m;
+    import_array();
+#if defined(NPY_PY3K)
+    m = PyModule_Create(&moduledef);
+#else
+    m = Py_InitModule3("scan_loop", scan_loop_methods,
+                       "Loop of the Scan op in C.");
+#endif
+    return RETVAL;
+}
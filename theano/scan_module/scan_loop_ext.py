@@ -0,0 +1,107 @@
+"""
+Compile and import the C loop of Scan (scan_loop.c).
+
+To update the C code of the loop you must update the version in this file
+and the constant returned by `get_version()` in scan_loop.c.
+
+"""
+
+from __future__ import absolute_import, print_function, division
+import errno
+import logging
+import os
+import sys
+
+import theano
+from theano import config
+from theano.compat import reload
+from theano.gof.compilelock import get_lock, release_lock
+from theano.gof import cmodule
+
+
+_logger = logging.getLogger('theano.scan_module.scan_loop')
+
+
+version = 0.2  # must match constant returned in function get_version()
+
+need_reload = False
+
+
+def try_import():
+    global scan_loop
+    sys.path[0:0] = [config.compiledir]
+    import scan_loop
+    del sys.path[0]
+
+
+def try_reload():
+    sys.path[0:0] = [config.compiledir]
+    reload(scan_loop)
+    del sys.path[0]
+
+try:
+    try_import()
+    need_reload = True
+    if version != getattr(scan_loop, '_version', None):
+        raise ImportError()
+except ImportError:
+    get_lock()
+    try:
+        # Maybe someone else already finished compiling it while we were
+        # waiting for the lock?
+        try:
+            if need_reload:
+                # The module was successfully imported earlier: we need to
+                # reload it to check if the version was updated.
+                try_reload()
+            else:
+                try_import()
+                need_reload = True
+            if version != getattr(scan_loop, '_version', None):
+                raise ImportError()
+        except ImportError:
+            if not theano.config.cxx:
+                raise ImportError("no c compiler, can't compile the C loop "
+                                  "of scan")
+            _logger.info("Compiling the C loop of scan")
+            dirname = 'scan_loop'
+            cfile = os.path.join(theano.__path__[0], 'scan_module',
+                                 'scan_loop.c')
+            if not os.path.exists(cfile):
+                raise ImportError("The file scan_loop.c is not available.")
+
+            with open(cfile) as f:
+                code = f.read()
+            loc = os.path.join(config.compiledir, dirname)
+            if not os.path.exists(loc):
+                try:
+                    os.mkdir(loc)
+                except OSError as e:
+                    assert e.errno == errno.EEXIST
+                    assert os.path.exists(loc)
+
+            args = cmodule.GCC_compiler.compile_args()
+            cmodule.GCC_compiler.compile_str(dirname, code, location=loc,
+                                             preargs=args)
+            # Save version into the __init__.py file.
+            init_py = os.path.join(loc, '__init__.py')
+            with open(init_py, 'w') as f:
+                f.write('_version = %s\n' % version)
+            # If we just compiled the module for the first time, then it was
+            # imported at the same time: we need to make sure we do not
+            # reload the now outdated __init__.pyc below.
+            init_pyc = os.path.join(loc, '__init__.pyc')
+            if os.path.isfile(init_pyc):
+                os.remove(init_pyc)
+            try_import()
+            try_reload()
+            from scan_loop import scan_loop as scan_loop_c
+            assert (scan_loop._version ==
+                    scan_loop_c.get_version())
+            _logger.info("New version %s", scan_loop._version)
+    finally:
+        # Release lock on compilation directory.
+        release_lock()
+
+from scan_loop.scan_loop import *  # noqa
+assert version == get_version()
@@ -52,6 +52,8 @@ import copy
 import itertools
 import logging
 import time
+import weakref
+from multiprocessing.pool import ThreadPool
 from collections import OrderedDict
 
 import numpy
@@ -86,6 +88,29 @@ __contact__ = "Razvan Pascanu <r.pascanu@gmail>"
 # Logging function for sending warning or info
 _logger = logging.getLogger('theano.scan_module.scan_op')
 
+# Compiled inner functions of the Scan ops, by `Scan._inner_fn_key`.
+# Structurally identical scans (stacked layers, the gradients of identical
+# scans, ...) only optimize their inner graph once, and then copy the
+# function to get their own storage. An entry lives as long as a Scan
+# uses the function.
+_inner_fn_cache = weakref.WeakValueDictionary()
+
+
+class _ThreadPoolOwner(object):
+    """
+    Hold a ThreadPool and close it when it is no longer referenced.
+
+    The threads of a ThreadPool keep it alive, so it has to be closed
+    explicitly for them to exit.
+
+    """
+
+    def __init__(self, n_threads):
+        self.pool = ThreadPool(n_threads)
+
+    def __del__(self):
+        self.pool.close()
+
 
 class Scan(PureOp):
     """
@@ -620,7 +645,7 @@ class Scan(PureOp):
                 1 + self.n_seqs: (1 + self.n_seqs + self.n_outs)]]
         self.vector_outs += [
             isinstance(t.type, tensor.TensorType) and t.ndim == 0
-            for t in self.outer_nitsot_outs(self.outputs)]
+            for t in self.inner_nitsot_outs(self.outputs)]
 
         apply_node = Apply(self,
                            new_inputs,
@@ -852,12 +877,21 @@ class Scan(PureOp):
         # make_thunk can be called many times on the same op
         # we do not want to recompile the inner fct every time.
         if not getattr(self, 'fn', None):
-            self.fn = function(wrapped_inputs,
-                               wrapped_outputs,
-                               mode=compilation_mode,
-                               name=self.name,
-                               profile=profile,
-                               on_unused_input='ignore')
+            key = self._inner_fn_key()
+            shared_fn = None
+            if key is not None:
+                shared_fn = _inner_fn_cache.get(key, None)
+            if shared_fn is not None:
+                self.fn = shared_fn.copy(name=self.name, profile=profile)
+            else:
+                self.fn = function(wrapped_inputs,
+                                   wrapped_outputs,
+                                   mode=compilation_mode,
+                                   name=self.name,
+                                   profile=profile,
+                                   on_unused_input='ignore')
+                if key is not None:
+                    _inner_fn_cache[key] = self.fn
 
         # Analyse the compile inner function to determine which inputs and
         # outputs are on the gpu and speed up some checks during the execution
@@ -946,6 +980,14 @@ class Scan(PureOp):
                                                 self, node)
         except (ImportError, theano.gof.cmodule.MissingGXX):
             p = self.execute
+        if isinstance(getattr(self.fn.maker, 'profile', None),
+                      ScanProfileStats):
+            # Only execute times each step.
+            p = self.execute
+        if impl != 'py' and config.scan.c_loop:
+            p = self.make_c_loop() or p
+        if config.scan.n_threads > 1:
+            p = self.make_parallel_perform(config.scan.n_threads, p)
         # default arguments are stored in the closure of `rval`
 
         # Big ugly hack since we can't get the real value of allow_gc
@@ -966,6 +1008,46 @@ class Scan(PureOp):
         rval.lazy = False
         return rval
 
+    def _inner_fn_key(self):
+        """
+        Return the key of the compiled inner function in the cache shared
+        by the Scan ops, or None if it can't be shared.
+
+        The key is made of the structure of the inner graph (its cmodule
+        key, which covers the ops, types, constants and the config), of
+        the properties of the scan that decide how the inner inputs and
+        outputs are wrapped, and of the compilation mode.
+
+        """
+        cmodule_key = getattr(self, '_cmodule_key', None)
+        if cmodule_key is None:
+            # GPU scans, or an inner graph without a key.
+            return None
+        # DebugMode doesn't reuse the optimized graph when copying a
+        # function.
+        if isinstance(self.mode_instance, compile.debugmode.DebugMode):
+            return None
+        # The copies of a function share its ops, and an op with an inner
+        # function (like a nested scan) keeps its state in the op.
+        if any(type(node.op) in gof.ops_with_inner_function
+               for node in gof.graph.io_toposort(self.inputs,
+                                                 self.outputs)):
+            return None
+        props = tuple(repr(self.info[k]) for k in
+                      ['n_seqs', 'n_mit_mot', 'n_mit_mot_outs',
+                       'mit_mot_out_slices', 'n_mit_sot', 'n_sit_sot',
+                       'tap_array', 'n_nit_sot', 'n_shared_outs',
+                       'as_while', 'allow_gc'])
+        # Each scan has its own clone of the mode, so describe it by its
+        # optimizer and the flags of its linker.
+        linker = self.mode_instance.linker
+        linker_flags = tuple(sorted(
+            (k, v) for k, v in iteritems(vars(linker))
+            if isinstance(v, (bool, string_types) + integer_types)))
+        mode = (type(self.mode_instance), type(linker), linker_flags,
+                str(self.mode_instance.provided_optimizer))
+        return (cmodule_key, props, mode, config.scan.allow_output_prealloc)
+
     def inner_seqs(self, list_inputs):
         # Given the list of inner inputs this function grabs those
         # corresponding to sequences
@@ -1113,32 +1195,204 @@ class Scan(PureOp):
                   self.n_sit_sot + self.n_nit_sot + self.n_shared_outs)
         return list_inputs[offset:]
 
-    def execute(self, node, args, outs):
+    def make_c_loop(self):
         """
-        The args are packed like this:
+        Return a perform function that runs the whole loop in C, or None
+        if this scan can't do it.
 
-            n_steps
-
-            X sequence inputs x_1, x_2, ... x_<self.n_seqs>
+        The inner graph is compiled by the CLinker into one C struct that
+        shares its storage with `self.fn`. The iterations, the indexing of
+        the sequences and taps and the writes of the outputs are then done
+        by `scan_loop_ext.perform`, without going back to Python between
+        iterations.
 
-            Y initial states (u_1, u_2, ... u_<self.n_outs>) for our
-            outputs. Each must have appropriate length (T_1, T_2, ..., T_Y).
+        This is only possible when the scan has no mit_mot and shared
+        outputs, all inner variables are CPU tensors, every node of the
+        inner graph has C code and the inner function isn't profiled.
 
-            W other inputs w_1, w_2, ... w_W
+        """
+        maker = self.fn.maker
+        fgraph = maker.fgraph
+        linker = getattr(maker, 'linker', None)
+        if (self.n_mit_mot or self.n_shared_outs or
+                getattr(maker, 'profile', None) or
+                not theano.config.cxx or
+                not isinstance(linker, (gof.vm.VM_Linker, gof.CLinker,
+                                        gof.OpWiseCLinker)) or
+                getattr(linker, 'c_thunks', True) is False):
+            return None
+        if any(type(var.type) is not TensorType
+               for var in fgraph.inputs + fgraph.outputs):
+            return None
+        # The CLinker doesn't write the outputs that aren't computed by a
+        # node in their storage.
+        if any(out.owner is None for out in fgraph.outputs):
+            return None
+        # Ops like an inner Scan don't even implement the CLinker interface.
+        if not all(isinstance(node.op, gof.Op)
+                   for node in fgraph.apply_nodes):
+            return None
+        if any(inp.update is not None for inp in maker.expanded_inputs):
+            return None
+        try:
+            from . import scan_loop_ext
+            in_storage = [c.storage for c in self.fn.input_storage]
+            out_storage = [c.storage for c in self.fn.output_storage]
+            thunk, _, _ = gof.CLinker().accept(fgraph).make_thunk(
+                input_storage=in_storage, output_storage=out_storage)
+        except (ImportError, NotImplementedError, gof.utils.MethodNotDefined,
+                theano.gof.cmodule.MissingGXX):
+            return None
+
+        n_outs = self.n_outs + self.n_nit_sot
+        seq_storage = in_storage[:self.n_seqs]
+        taps = [list(map(int, self.tap_array[j])) for j in xrange(self.n_outs)]
+        tap_storage = []
+        offset = self.n_seqs
+        for j_taps in taps:
+            tap_storage.append(in_storage[offset:offset + len(j_taps)])
+            offset += len(j_taps)
+        other_storage = in_storage[offset:]
+        loop_out_storage = out_storage[:n_outs]
+        cond_storage = out_storage[-1] if self.as_while else None
+        mintaps = [int(m) for m in self.mintaps[:n_outs]]
+        # The inner graph was compiled so that those outputs can be
+        # computed directly in the outer storage, see make_thunk.
+        prealloc = [bool(config.scan.allow_output_prealloc)] * n_outs
+
+        def p(node, args, outs):
+            n_steps = args[0]
+            seqs = self._check_sequences(node, args)
+            store_steps = [int(arg.shape[0]) for arg
+                           in args[self.seqs_arg_offset:
+                                   self.shared_arg_offset]]
+            store_steps += [int(arg) for arg in
+                            args[self.nit_sot_arg_offset:
+                                 self.nit_sot_arg_offset + self.n_nit_sot]]
+            if not getattr(self, 'destroy_map', None):
+                self.destroy_map = OrderedDict()
+            self._init_recurrent_outputs(args, outs, store_steps)
+            other_args = args[self.nit_sot_arg_offset + self.n_nit_sot:]
+            for storage, arg in izip(other_storage, other_args):
+                storage[0] = arg
+            try:
+                i, failure = scan_loop_ext.perform(
+                    int(n_steps), thunk.cthunk, seqs, seq_storage,
+                    list(outs[:n_outs]), taps, tap_storage, loop_out_storage,
+                    store_steps, mintaps, self.n_nit_sot, prealloc,
+                    cond_storage)
+                if failure:
+                    try:
+                        thunk.raise_failure(failure)
+                    except Exception:
+                        if hasattr(thunk, 'position_of_error'):
+                            gof.link.raise_with_op(
+                                thunk.nodes[thunk.position_of_error])
+                        raise
+            finally:
+                # We never reuse the input or output storage of the
+                # inner function so we clear it.
+                for storage in in_storage + out_storage:
+                    storage[0] = None
+            pos = [(i - mintap) % store for mintap, store
+                   in izip(mintaps, store_steps)]
+            self._reorder_outputs(node, outs, store_steps, pos, i, n_steps)
+
+        return p
+
+    def make_parallel_perform(self, n_threads, perform):
+        """
+        Return a perform function that splits the iterations of a scan
+        without recurrent outputs (a map) between `n_threads` threads.
 
-        There are at least 1 + self.n_seqs + self.n_outs inputs, and the
-        ones above this number are passed to the scanned function as
-        non-sequential inputs.
+        Each thread runs a contiguous block of iterations with its own
+        copy of the inner function, and writes its outputs in its rows of
+        the preallocated outputs. The threads only run at the same time
+        while the inner function is in code that releases the GIL (most
+        numpy functions and BLAS), so this helps inner graphs with such
+        ops, like data dependent ones that can't be vectorized.
 
-        The outputs are more straightforward:
+        Returns `perform` if the scan has recurrent outputs, and the
+        returned function falls back to `perform` for calls that can't be
+        split.
 
-            Y sequence outputs y_1, y_2, ... y_<self.n_outs>
+        """
+        if (self.n_outs or self.n_shared_outs or not self.n_nit_sot or
+                self.as_while or self.info['gpu'] or self.info['gpua']):
+            return perform
+        # The copies of the inner function and the thread pool are only
+        # made at the first call that needs them, and are kept in this
+        # closure as they can't be pickled with the op. The threads of the
+        # pool exit when the thunk is released.
+        fns = [self.fn]
+        pool = []
+
+        def run(fn, seqs, non_seqs, begin, end, outs=None):
+            # Run the iterations `begin` to `end` with `fn`, and write
+            # their outputs in `outs`. Without `outs`, return the outputs
+            # of the last iteration.
+            input_storage = [c.storage for c in fn.input_storage]
+            output_storage = [c.storage for c in fn.output_storage]
+            for storage, arg in izip(input_storage[self.n_seqs:], non_seqs):
+                storage[0] = arg
+            try:
+                for i in xrange(begin, end):
+                    for idx, seq in enumerate(seqs):
+                        if self.vector_seqs[idx]:
+                            input_storage[idx][0] = seq[i:i + 1].reshape(())
+                        else:
+                            input_storage[idx][0] = seq[i]
+                    fn.fn()
+                    if outs is not None:
+                        for out, storage in izip(outs, output_storage):
+                            out[i] = storage[0]
+                return [storage[0] for storage in output_storage]
+            finally:
+                # We never reuse the input or output storage of the
+                # inner function so we clear it.
+                for storage in input_storage + output_storage:
+                    storage[0] = None
+
+        def p(node, args, outs):
+            n_steps = args[0]
+            store_steps = args[self.nit_sot_arg_offset:
+                               self.nit_sot_arg_offset + self.n_nit_sot]
+            # The outputs must keep all the steps, so that the threads
+            # write in different rows.
+            if n_steps < 2 or any(store != n_steps for store in store_steps):
+                return perform(node, args, outs)
+            t0_call = time.time()
+            seqs = self._check_sequences(node, args)
+            non_seqs = args[self.nit_sot_arg_offset + self.n_nit_sot:]
+
+            # The first iteration gives the shape of the outputs.
+            for j, value in enumerate(run(self.fn, seqs, non_seqs, 0, 1)):
+                shape = (n_steps,) + value.shape
+                if (outs[j][0] is None or outs[j][0].shape != shape or
+                        outs[j][0].dtype != value.dtype):
+                    outs[j][0] = node.outputs[j].type.value_zeros(shape)
+                outs[j][0][0] = value
+
+            while len(fns) < n_threads:
+                fns.append(self.fn.copy(name=self.name, profile=False))
+            if not pool:
+                pool.append(_ThreadPoolOwner(n_threads))
+            out_values = [out[0] for out in outs]
+            bounds = numpy.linspace(1, n_steps, n_threads + 1).astype('int64')
+            pool[0].pool.map(lambda k: run(fns[k], seqs, non_seqs,
+                                           bounds[k], bounds[k + 1],
+                                           out_values),
+                             xrange(n_threads))
+            self.t_call = time.time() - t0_call
+            self.t_fn = self.t_call
+
+        return p
+
+    def _check_sequences(self, node, args):
+        """
+        Check the number of steps and return the sequences.
 
         """
-        # 1. Unzip the number of steps and sequences. If number of steps is
-        # negative flip sequences around, and make n_steps positive
-        t0_call = time.time()
-        t_fn = 0
         n_steps = args[0]
         seqs = []
         if n_steps < 0:
@@ -1159,6 +1413,42 @@ class Scan(PureOp):
                                      node.inputs[1 + idx],
                                      seq.shape)
                 seqs.append(seq)
+        return seqs
+
+    def execute(self, node, args, outs):
+        """
+        The args are packed like this:
+
+            n_steps
+
+            X sequence inputs x_1, x_2, ... x_<self.n_seqs>
+
+            Y initial states (u_1, u_2, ... u_<self.n_outs>) for our
+            outputs. Each must have appropriate length (T_1, T_2, ..., T_Y).
+
+            W other inputs w_1, w_2, ... w_W
+
+        There are at least 1 + self.n_seqs + self.n_outs inputs, and the
+        ones above this number are passed to the scanned function as
+        non-sequential inputs.
+
+        The outputs are more straightforward:
+
+            Y sequence outputs y_1, y_2, ... y_<self.n_outs>
+
+        """
+        # 1. Unzip the number of steps and sequences. If number of steps is
+        # negative flip sequences around, and make n_steps positive
+        t0_call = time.time()
+        t_fn = 0
+        n_steps = args[0]
+        seqs = self._check_sequences(node, args)
+        profile = getattr(self.fn.maker, 'profile', None)
+        if not isinstance(profile, ScanProfileStats):
+            profile = None
+        # Number and size of the inner outputs copied in the outer ones
+        n_copies = 0
+        copied_bytes = 0
 
         # 2. Allocate memory for the outputs. Construct the list:
         #       store_steps  -- map containting the length of each output
@@ -1175,27 +1465,15 @@ class Scan(PureOp):
 
         pos = [(-self.mintaps[idx]) % store_steps[idx] for idx
                in xrange(self.n_outs + self.n_nit_sot)]
+        # The inner function can compute the mit_sot, sit_sot and nit_sot
+        # outputs directly in a view of the row of the outer buffer where
+        # they go, unless a tap reads that row.
+        prealloc = [store_steps[idx] > -self.mintaps[idx]
+                    for idx in xrange(self.n_outs + self.n_nit_sot)]
         if not getattr(self, 'destroy_map', None):
             self.destroy_map = OrderedDict()
         # 2.1 Create storage space for outputs
-        for idx in xrange(self.n_outs):
-            if idx in self.destroy_map:
-                # ^ Case 1. Outputs should be computed inplace of their
-                # initial state
-                outs[idx][0] = args[self.seqs_arg_offset + idx]
-            elif (outs[idx][0] is not None and
-                  outs[idx][0].shape[1:] == args[self.seqs_arg_offset +
-                                                 idx].shape[1:] and
-                  outs[idx][0].shape[0] >= store_steps[idx]):
-                # Put in the values of the initial state
-                outs[idx][0] = outs[idx][0][:store_steps[idx]]
-                if idx > self.n_mit_mot:
-                    l = - self.mintaps[idx]
-                    outs[idx][0][:l] = args[self.seqs_arg_offset + idx][:l]
-                else:
-                    outs[idx][0][:] = args[self.seqs_arg_offset + idx]
-            else:
-                outs[idx][0] = args[self.seqs_arg_offset + idx].copy()
+        self._init_recurrent_outputs(args, outs, store_steps)
 
         offset = self.nit_sot_arg_offset + self.n_nit_sot
         other_args = args[offset:]
@@ -1212,6 +1490,19 @@ class Scan(PureOp):
         for idx in xrange(len(other_args)):
             input_storage[idx + offset].storage[0] = other_args[idx]
 
+        def output_reused(idx):
+            # Whether the inner function computed output `idx` in the
+            # storage it was given before the call.
+            old_var = old_output_storage[idx]
+            old_data = old_output_data[idx]
+            new_var = output_storage[idx].storage[0]
+            if old_var is not new_var or old_data is None:
+                return False
+            elif self.outs_is_tensor[idx]:
+                return new_var.data == old_data
+            else:
+                return new_var.gpudata == old_data
+
         i = 0
         cond = True
         # ############# THE MAIN LOOP ##############
@@ -1253,28 +1544,37 @@ class Scan(PureOp):
 
             # 4. collecting slices where the output should be stored
 
-            # 4.1. Collect slices for mitmots
+            # 4.1. Collect slices for mitmots. The output taps that aren't
+            # also input taps are computed in a view of the outer buffer.
             offset = 0
-            for idx in xrange(self.n_mit_mot_outs):
-                if not self.mitmots_preallocated[idx]:
-                    output_storage[offset].storage[0] = None
-                    offset += 1
+            mitmot_out_idx = 0
+            for j in xrange(self.n_mit_mot):
+                for k in self.mit_mot_out_slices[j]:
+                    if not self.mitmots_preallocated[mitmot_out_idx]:
+                        if (k in self.tap_array[j] or
+                                self.vector_outs[j] or
+                                not self.outs_is_tensor[offset]):
+                            output_storage[offset].storage[0] = None
+                        else:
+                            output_storage[offset].storage[0] = \
+                                outs[j][0][k + pos[j]]
+                        offset += 1
+                    mitmot_out_idx += 1
 
             # 4.2. Collect slices for mitsots, sitsots and nitsots
-            if i != 0:
-                for idx in xrange(self.n_outs + self.n_nit_sot -
-                                  self.n_mit_mot):
-                    if (store_steps[idx + self.n_mit_mot] == 1 or
-                            self.vector_outs[idx + self.n_mit_mot]):
-                        output_storage[idx + offset].storage[0] = None
-                    else:
-                        _pos0 = idx + self.n_mit_mot
-                        output_storage[idx + offset].storage[0] =\
-                            outs[_pos0][0][pos[_pos0]]
-            else:
-                for idx in xrange(self.n_outs + self.n_nit_sot -
-                                  self.n_mit_mot):
+            for idx in xrange(self.n_outs + self.n_nit_sot -
+                              self.n_mit_mot):
+                _pos0 = idx + self.n_mit_mot
+                if not prealloc[_pos0] or (i == 0 and _pos0 >= self.n_outs):
+                    # The buffers of the nit_sot outputs are allocated
+                    # after the first step.
                     output_storage[idx + offset].storage[0] = None
+                elif self.vector_outs[_pos0]:
+                    output_storage[idx + offset].storage[0] = \
+                        outs[_pos0][0][pos[_pos0]:pos[_pos0] + 1].reshape(())
+                else:
+                    output_storage[idx + offset].storage[0] = \
+                        outs[_pos0][0][pos[_pos0]]
 
             # 4.3. Collect slices for shared outputs
             offset += self.n_outs + self.n_nit_sot - self.n_mit_mot
@@ -1347,6 +1647,8 @@ class Scan(PureOp):
                     raise
 
             dt_fn = time.time() - t0_fn
+            if profile is not None:
+                profile.add_step_time(dt_fn)
             if self.as_while:
                 pdx = offset + self.n_shared_outs
                 cond = output_storage[pdx].storage[0] == 0
@@ -1400,8 +1702,11 @@ class Scan(PureOp):
                     else:
                         # This output tap has not been preallocated, recover
                         # its value as usual
-                        outs[j][0][k + pos[j]] = \
-                            output_storage[offset_out].storage[0]
+                        if not output_reused(offset_out):
+                            value = output_storage[offset_out].storage[0]
+                            outs[j][0][k + pos[j]] = value
+                            n_copies += 1
+                            copied_bytes += getattr(value, 'nbytes', 0)
                         offset_out += 1
 
                     mitmot_out_idx += 1
@@ -1416,42 +1721,25 @@ class Scan(PureOp):
             for j in xrange(begin, end):
 
                 # Copy the output value to `outs`, if necessary
-                if store_steps[j] == 1 or self.vector_outs[j]:
-                    outs[j][0][pos[j]] = \
-                        output_storage[offset_out + j].storage[0]
-                else:
-                    # Check whether the initialization of the output storage
-                    # map for this output has been reused.
-                    old_var = old_output_storage[offset_out + j]
-                    new_var = output_storage[offset_out + j].storage[0]
-                    if old_var is new_var:
-                        old_data = old_output_data[offset_out + j]
-                        if old_data is None:
-                            output_reused = False
-                        elif self.outs_is_tensor[offset_out + j]:
-                            output_reused = (new_var.data == old_data)
-                        else:
-                            output_reused = (new_var.gpudata == old_data)
-                    else:
-                        output_reused = False
-
-                    if not output_reused:
-                        try:
-                            outs[j][0][pos[j]] = \
-                                output_storage[offset_out + j].storage[0]
-                        except ValueError as e:
-                            if i == 0:
-                                # First iteration, so don't change the
-                                # error message as it can't be the
-                                # case we write about.
-                                raise
-                            ne = ValueError(
-                                "An output of the scan has changed shape. "
-                                "This may be caused by a pushout optimization."
-                                " Try adding "
-                                "'optimizer_excluding=scanOp_pushout_output' "
-                                "to your Theano flags.")
-                            raise_from(ne, e)
+                if not output_reused(offset_out + j):
+                    value = output_storage[offset_out + j].storage[0]
+                    n_copies += 1
+                    copied_bytes += getattr(value, 'nbytes', 0)
+                    try:
+                        outs[j][0][pos[j]] = value
+                    except ValueError as e:
+                        if i == 0:
+                            # First iteration, so don't change the
+                            # error message as it can't be the
+                            # case we write about.
+                            raise
+                        ne = ValueError(
+                            "An output of the scan has changed shape. "
+                            "This may be caused by a pushout optimization."
+                            " Try adding "
+                            "'optimizer_excluding=scanOp_pushout_output' "
+                            "to your Theano flags.")
+                        raise_from(ne, e)
 
             # 5.5 Copy over the values for nit_sot outputs
             begin = end
@@ -1471,28 +1759,11 @@ class Scan(PureOp):
                     elif outs[j][0].shape[0] != store_steps[j]:
                         outs[j][0] = outs[j][0][:store_steps[j]]
                     outs[j][0][pos[j]] = output_storage[jout].storage[0]
-                elif store_steps[j] == 1 or self.vector_outs[j]:
-                    outs[j][0][pos[j]] = \
-                        output_storage[j + offset_out].storage[0]
-                else:
-                    # Check whether the initialization of the output storage map
-                    # for this output has been reused.
-                    old_var = old_output_storage[offset_out + j]
-                    old_data = old_output_data[offset_out + j]
-                    new_var = output_storage[offset_out + j].storage[0]
-                    if old_var is new_var:
-                        if old_data is None:
-                            output_reused = False
-                        elif self.outs_is_tensor[offset_out + j]:
-                            output_reused = (new_var.data == old_data)
-                        else:
-                            output_reused = (new_var.gpudata == old_data)
-                    else:
-                        output_reused = False
-
-                    if not output_reused:
-                        outs[j][0][pos[j]] = \
-                            output_storage[j + offset_out].storage[0]
+                elif not output_reused(offset_out + j):
+                    value = output_storage[offset_out + j].storage[0]
+                    outs[j][0][pos[j]] = value
+                    n_copies += 1
+                    copied_bytes += getattr(value, 'nbytes', 0)
 
             # 5.6 Copy over the values for outputs corresponding to shared
             # variables
@@ -1507,6 +1778,67 @@ class Scan(PureOp):
             i = i + 1
 
         # 6. Check if you need to re-order output buffers
+        self._reorder_outputs(node, outs, store_steps, pos, i, n_steps)
+
+        # We never reuse the input or output storage of the
+        # inner function so we clear it.
+        for i_s in input_storage:
+            i_s.storage[0] = None
+        for o_s in output_storage:
+            o_s.storage[0] = None
+
+        t_call = time.time() - t0_call
+        # NOTE: make this match what's in function_module.Function
+        # and this little string helps us to find this spot:
+        # "PROFILE_CODE"
+
+        if hasattr(self.fn.maker, 'profile') and self.fn.maker.profile:
+            profile = self.fn.maker.profile
+            profile.callcount += 1
+            profile.nbsteps += n_steps
+            profile.call_time += t_call
+            profile.vm_call_time += t_fn
+            if isinstance(profile, ScanProfileStats):
+                profile.output_copies += n_copies
+                profile.output_copied_bytes += copied_bytes
+            if hasattr(self.fn.fn, 'update_profile'):
+                self.fn.fn.update_profile(profile)
+
+        self.t_call = t_call
+        self.t_fn = t_fn
+
+    def _init_recurrent_outputs(self, args, outs, store_steps):
+        """
+        Put the initial states of the mit_mot, mit_sot and sit_sot outputs
+        in `outs`, reusing the storage already there when possible.
+
+        """
+        for idx in xrange(self.n_outs):
+            if idx in self.destroy_map:
+                # ^ Case 1. Outputs should be computed inplace of their
+                # initial state
+                outs[idx][0] = args[self.seqs_arg_offset + idx]
+            elif (outs[idx][0] is not None and
+                  outs[idx][0].shape[1:] == args[self.seqs_arg_offset +
+                                                 idx].shape[1:] and
+                  outs[idx][0].shape[0] >= store_steps[idx]):
+                # Put in the values of the initial state
+                outs[idx][0] = outs[idx][0][:store_steps[idx]]
+                if idx > self.n_mit_mot:
+                    l = - self.mintaps[idx]
+                    outs[idx][0][:l] = args[self.seqs_arg_offset + idx][:l]
+                else:
+                    outs[idx][0][:] = args[self.seqs_arg_offset + idx]
+            else:
+                outs[idx][0] = args[self.seqs_arg_offset + idx].copy()
+
+    def _reorder_outputs(self, node, outs, store_steps, pos, i, n_steps):
+        """
+        Rotate the circular buffers of the outputs after `i` iterations so
+        that their oldest entry comes first, and trim them if a scan
+        `until` stopped before `n_steps` iterations.
+
+        """
         begin = self.n_mit_mot
         end = self.n_outs + self.n_nit_sot
         for idx in xrange(begin, end):
@@ -1560,30 +1892,6 @@ class Scan(PureOp):
                     # little trick that I used
                     outs[idx][0] = outs[idx][0][:-(n_steps - i)]
 
-        # We never reuse the input or output storage of the
-        # inner function so we clear it.
-        for i_s in input_storage:
-            i_s.storage[0] = None
-        for o_s in output_storage:
-            o_s.storage[0] = None
-
-        t_call = time.time() - t0_call
-        # NOTE: make this match what's in function_module.Function
-        # and this little string helps us to find this spot:
-        # "PROFILE_CODE"
-
-        if hasattr(self.fn.maker, 'profile') and self.fn.maker.profile:
-            profile = self.fn.maker.profile
-            profile.callcount += 1
-            profile.nbsteps += n_steps
-            profile.call_time += t_call
-            profile.vm_call_time += t_fn
-            if hasattr(self.fn.fn, 'update_profile'):
-                self.fn.fn.update_profile(profile)
-
-        self.t_call = t_call
-        self.t_fn = t_fn
-
     # Infer Shape
     def infer_shape(self, node, input_shapes):
         # input_shapes correspond to the shapes of node.inputs
@@ -4,7 +4,9 @@ The Optimization provided in this file:
 
 local opt: remove_constants_and_unused_inputs_scan,
            constant_folding_for_scan2,
-           scan_merge_inouts
+           scan_merge_inouts,
+           scan_vectorize,
+           scan_unroll
            They are wrapped in in2out to create global opt.
 global opt: ScanInplaceOptimizer,
             PushOutNonSeqScan,
@@ -19,7 +21,9 @@ optdb: scan_eqopt1 (.1), scan_eqopt2(1.6), scan_inplace(75)
 scan_eqopt1 -> scan_seqopt1
 scan_seqopt1 -> in2out(remove_constants_and_unused_inputs_scan)(1),
                 PushOutNonSeqScan(2),
-                PushOutSeqScan(3), PushOutDot1(4)
+                PushOutSeqScan(3), PushOutDot1(4),
+                PushOutScanOutput(5), in2out(scan_vectorize)(5.5),
+                in2out(scan_unroll)(6)
 scan_eqopt2 -> They are all global optimizer. (in2out convert local to global).
                This is important, as the order is important and all global
                optimizer run before local optimizer in the order they where
@@ -70,6 +74,7 @@ from theano.gof.opt import pre_constant_merge, pre_greedy_local_optimizer
 
 from theano.scan_module import scan_op
 from theano.scan_module import scan_utils
+from theano.scan_module import scan_elemwise
 from theano.scan_module.scan_utils import equal_computations, find_up, scan_args
 
 __docformat__ = 'restructedtext en'
@@ -2252,6 +2257,438 @@ class PushOutDot1(gof.Optimizer):
                             old_new, remove=[node], reason='scan_pushout_dot1')
 
 
+def _unroll_steps(args, seqs, states, non_seqs, n_steps):
+    """
+    Build the graph of `n_steps` iterations of the inner graph of a scan.
+
+    Parameters
+    ----------
+    args
+        The `scan_args` of the scan.
+    seqs
+        For each sequence, a function mapping the index of an iteration
+        to the value of the sequence at that iteration.
+    states
+        For each mit_sot and sit_sot output, the list of its previous
+        values (at least as many as its smallest tap). The new values
+        of the output are appended to it.
+    non_seqs
+        The values of the non sequences.
+    n_steps
+        The number of iterations.
+
+    Returns
+    -------
+    list
+        For each nit_sot output, the list of its values at each iteration.
+
+    """
+    inner_in_states = (args.inner_in_mit_sot +
+                       [[x] for x in args.inner_in_sit_sot])
+    state_taps = (args.mit_sot_in_slices +
+                  [[-1]] * len(args.inner_in_sit_sot))
+    inner_outs = (args.inner_out_mit_sot + args.inner_out_sit_sot +
+                  args.inner_out_nit_sot)
+    nit_sots = [[] for x in args.inner_out_nit_sot]
+    for step in xrange(n_steps):
+        givens = OrderedDict()
+        for inner, seq in zip(args.inner_in_seqs, seqs):
+            givens[inner] = seq(step)
+        for inners, taps, values in zip(inner_in_states, state_taps,
+                                         states):
+            for inner, tap in zip(inners, taps):
+                givens[inner] = values[tap]
+        for inner, non_seq in zip(args.inner_in_non_seqs, non_seqs):
+            givens[inner] = non_seq
+        outs = scan_utils.clone(inner_outs, replace=givens, strict=False)
+        for values, out in zip(states + nit_sots, outs):
+            values.append(out)
+    return nit_sots
+
+
+def _stack_steps(values, like):
+    """
+    Stack the values of an output at successive iterations along a new
+    leading axis, with the type of `like`.
+
+    """
+    return tensor.patternbroadcast(
+        tensor.stack([tensor.patternbroadcast(v, like.broadcastable[1:])
+                      for v in values]),
+        (False,) + like.broadcastable[1:])
+
+
+@gof.local_optimizer([scan_op.Scan])
+def scan_unroll(node):
+    """
+    Unroll the loop of a scan with a constant number of steps.
+
+    If the unrolled graph has at most `config.scan.unroll_threshold`
+    nodes, the scan is replaced by its iterations. Otherwise, if
+    `config.scan.unroll_factor` (k) is bigger than 1 and divides the
+    number of steps, the scan is replaced by a scan doing k iterations
+    per step. Either way, consecutive iterations become visible to the
+    optimizations of the graph containing them (elemwise fusion, gemm,
+    ...) and the per-iteration overhead of scan is paid less often.
+
+    Only scans without mit_mot, shared outputs or condition are unrolled.
+
+    """
+    op = node.op
+    if not isinstance(op, scan_op.Scan):
+        return False
+    threshold = theano.config.scan.unroll_threshold
+    factor = theano.config.scan.unroll_factor
+    if threshold <= 0 and factor <= 1:
+        return False
+    if (op.n_mit_mot or op.n_shared_outs or op.as_while or
+            op.info['gpu'] or op.info['gpua'] or
+            hasattr(op, '_scan_unroll_visited')):
+        return False
+    try:
+        n_steps = int(get_scalar_constant_value(node.inputs[0]))
+    except tensor.NotScalarConstantError:
+        return False
+    n_nodes = len(gof.graph.ops(op.inputs, op.outputs))
+    if 0 < n_steps and n_steps * n_nodes <= threshold:
+        unroll = n_steps
+    elif factor > 1 and n_steps > factor and n_steps % factor == 0:
+        unroll = factor
+    else:
+        return False
+
+    args = scan_utils.scan_args(node.inputs, node.outputs,
+                                op.inputs, op.outputs, op.info)
+    # The initial values of the mit_sot and sit_sot outputs are at the
+    # beginning of their outer buffer, followed by room for n_steps values.
+    buffers = args.outer_in_mit_sot + args.outer_in_sit_sot
+    depths = ([-min(taps) for taps in args.mit_sot_in_slices] +
+              [1] * len(args.outer_in_sit_sot))
+    old_outs = (args.outer_out_mit_sot + args.outer_out_sit_sot +
+                args.outer_out_nit_sot)
+    n_states = len(buffers)
+
+    if unroll == n_steps:
+        seqs = [(lambda step, seq=seq: seq[step])
+                for seq in args.outer_in_seqs]
+        states = [[buf[i] for i in xrange(depth)]
+                  for buf, depth in zip(buffers, depths)]
+        nit_sots = _unroll_steps(args, seqs, states, args.outer_in_non_seqs,
+                                 n_steps)
+        new_outs = [tensor.concatenate([buf[:depth],
+                                        _stack_steps(values[depth:], buf)])
+                    for buf, depth, values in zip(buffers, depths, states)]
+        new_outs += [_stack_steps(values, old)
+                     for values, old in zip(nit_sots,
+                                             args.outer_out_nit_sot)]
+    else:
+        # Each step of the new scan does `unroll` steps of the old one.
+        # Its sequences are the old ones cut in blocks of `unroll` rows,
+        # and the last values of each mit_sot and sit_sot output are
+        # carried as one sit_sot "window". All the values computed at a
+        # step are returned in blocks as nit_sot outputs.
+        n_blocks = n_steps // unroll
+
+        def rows_type(var):
+            return tensor.TensorType(var.dtype,
+                                     (False,) + var.broadcastable[1:])
+
+        inner_seqs = [rows_type(seq)() for seq in args.outer_in_seqs]
+        inner_windows = [rows_type(buf)() for buf in buffers]
+        inner_non_seqs = [scan_utils.safe_new(x)
+                          for x in args.inner_in_non_seqs]
+        seqs = [(lambda step, seq=seq: seq[step]) for seq in inner_seqs]
+        states = [[window[i] for i in xrange(depth)]
+                  for window, depth in zip(inner_windows, depths)]
+        nit_sots = _unroll_steps(args, seqs, states, inner_non_seqs, unroll)
+        inner_outs = [tensor.patternbroadcast(
+            tensor.stack(values[-depth:]), window.broadcastable)
+            for window, depth, values in zip(inner_windows, depths, states)]
+        inner_outs += [_stack_steps(values[depth:], buf)
+                       for buf, depth, values in zip(buffers, depths, states)]
+        inner_outs += [_stack_steps(values, old)
+                       for values, old in zip(nit_sots,
+                                               args.outer_out_nit_sot)]
+
+        def to_blocks(var):
+            shape = tensor.concatenate([[n_blocks, unroll], var.shape[1:]])
+            return var[:n_steps].reshape(shape, ndim=var.ndim + 1)
+
+        outer_n_steps = tensor.constant(n_blocks,
+                                        dtype=node.inputs[0].dtype)
+        outer_ins = [outer_n_steps]
+        outer_ins += [to_blocks(seq) for seq in args.outer_in_seqs]
+        outer_ins += [scan_utils.expand_empty(
+            tensor.shape_padleft(buf[:depth]), n_blocks)
+            for buf, depth in zip(buffers, depths)]
+        outer_ins += [outer_n_steps] * (n_states + len(nit_sots))
+        outer_ins += args.outer_in_non_seqs
+
+        info = copy.deepcopy(op.info)
+        info['tap_array'] = [[-1]] * n_states
+        info['n_seqs'] = len(inner_seqs)
+        info['n_mit_sot'] = 0
+        info['n_sit_sot'] = n_states
+        info['n_nit_sot'] = n_states + len(nit_sots)
+        info['destroy_map'] = OrderedDict()
+        info.pop('_scan_savemem_visited', None)
+        info['_scan_unroll_visited'] = True
+        new_op = scan_op.Scan(inner_seqs + inner_windows + inner_non_seqs,
+                              inner_outs, info)
+        outs = new_op(*outer_ins, **dict(return_list=True))
+
+        def from_blocks(var):
+            shape = tensor.concatenate([[n_steps], var.shape[2:]])
+            return var.reshape(shape, ndim=var.ndim - 1)
+
+        blocks = [from_blocks(out) for out in outs[n_states:]]
+        new_outs = [tensor.concatenate([buf[:depth], values])
+                    for buf, depth, values in zip(buffers, depths, blocks)]
+        new_outs += blocks[n_states:]
+
+    return [tensor.patternbroadcast(new, old.broadcastable)
+            for new, old in zip(new_outs, old_outs)]
+
+
+def _batch_node(node, inputs, batched):
+    """
+    Apply the op of `node` to a batch of inputs.
+
+    Parameters
+    ----------
+    node
+        An Apply node of the inner graph of a scan.
+    inputs
+        The new inputs of `node`. The ones whose `batched` flag is True
+        have a new leading axis, indexed by the iterations of the scan.
+    batched
+        For each input, whether it is batched.
+
+    Returns
+    -------
+    list or None
+        The batched outputs of `node`, or None if its op isn't supported.
+
+    """
+    op = node.op
+    if isinstance(op, tensor.Elemwise):
+        if op.inplace_pattern:
+            return None
+        inputs = [x if b else tensor.shape_padleft(x)
+                  for x, b in zip(inputs, batched)]
+        return op.make_node(*inputs).outputs
+    elif isinstance(op, tensor.DimShuffle):
+        x, = inputs
+        new_order = [0] + [d if d == 'x' else d + 1 for d in op.new_order]
+        return [tensor.DimShuffle(x.broadcastable, new_order,
+                                  inplace=op.inplace)(x)]
+    elif isinstance(op, tensor.elemwise.CAReduce):
+        x, = inputs
+        new_op = copy.copy(op)
+        if op.axis is None:
+            new_op.axis = tuple(xrange(1, x.ndim))
+        else:
+            new_op.axis = tuple(a + 1 for a in op.axis)
+        return [new_op(x)]
+    elif isinstance(op, tensor.MaxAndArgmax):
+        x, = inputs
+        return tensor.MaxAndArgmax([a + 1 for a in op.axis])(x)
+    elif isinstance(op, tensor.Dot):
+        a, b = inputs
+        if batched[0] and batched[1]:
+            out = tensor.batched_dot(a, b)
+        elif batched[0]:
+            # The leading axis of `a` stays in front.
+            out = tensor.dot(a, b)
+        else:
+            # The leading axis of `b` ends up after the remaining axes
+            # of `a`.
+            out = tensor.tensordot(a, b, [[a.ndim - 1], [1]])
+            out = out.dimshuffle([a.ndim - 1] + list(xrange(a.ndim - 1)) +
+                                 list(xrange(a.ndim, out.ndim)))
+        return [out]
+    return None
+
+
+@gof.local_optimizer([scan_op.Scan])
+def scan_vectorize(node):
+    """
+    Replace a scan without recurrent outputs by batched ops.
+
+    A scan that only has sequences and non sequences as inputs and nit_sot
+    outputs, like the ones built by `theano.map`, computes the same
+    function on each row of its sequences. When all the nodes of its inner
+    graph can work on a batch of rows (elemwise ops, dimshuffles,
+    reductions, max_and_argmax and dot products), the scan is replaced by its inner graph
+    applied to the whole sequences at once.
+
+    """
+    op = node.op
+    if not isinstance(op, scan_op.Scan):
+        return False
+    if (op.n_mit_mot or op.n_mit_sot or op.n_sit_sot or op.n_shared_outs or
+            not op.n_nit_sot or op.as_while or
+            op.info['gpu'] or op.info['gpua']):
+        return False
+    if not all(isinstance(x.type, tensor.TensorType)
+               for x in op.inputs + op.outputs):
+        return False
+
+    args = scan_utils.scan_args(node.inputs, node.outputs,
+                                op.inputs, op.outputs, op.info)
+    n_steps = node.inputs[0]
+    # For each inner variable, its value in the outer graph and whether
+    # it has a leading axis indexed by the iterations.
+    givens = OrderedDict()
+    for inner, outer in zip(args.inner_in_seqs, args.outer_in_seqs):
+        givens[inner] = (outer[:n_steps], True)
+    for inner, outer in zip(args.inner_in_non_seqs, args.outer_in_non_seqs):
+        givens[inner] = (outer, False)
+
+    inner_ins = args.inner_in_seqs + args.inner_in_non_seqs
+    for inner_node in gof.graph.io_toposort(inner_ins,
+                                            args.inner_out_nit_sot):
+        inputs = []
+        batched = []
+        for x in inner_node.inputs:
+            if x in givens:
+                new_x, b = givens[x]
+            else:
+                # A constant
+                new_x, b = x, False
+            inputs.append(new_x)
+            batched.append(b)
+        if any(batched):
+            outputs = _batch_node(inner_node, inputs, batched)
+            if outputs is None:
+                return False
+        else:
+            outputs = inner_node.op.make_node(*inputs).outputs
+        for old, new in zip(inner_node.outputs, outputs):
+            givens[old] = (new, any(batched))
+
+    new_outs = []
+    for inner, old in zip(args.inner_out_nit_sot, args.outer_out_nit_sot):
+        new, b = givens.get(inner, (inner, False))
+        if not b:
+            new = tensor.alloc(new, n_steps, *[new.shape[i]
+                                               for i in xrange(new.ndim)])
+        new_outs.append(tensor.patternbroadcast(new.astype(old.dtype),
+                                                old.broadcastable))
+    return new_outs
+
+
+def _is_expansion(op, ndim):
+    # Whether a DimShuffle only adds broadcastable dimensions to get `ndim`
+    # dimensions, keeping the others in order.
+    kept = [d for d in op.new_order if d != 'x']
+    return (kept == list(xrange(len(op.input_broadcastable))) and
+            len(op.new_order) == ndim)
+
+
+@gof.local_optimizer([scan_op.Scan])
+def scan_elemwise_fusion(node):
+    """
+    Replace a scan whose steps are elementwise by an ElemwiseScan.
+
+    In a scan with sequences, non sequences, sit_sot and nit_sot outputs
+    whose inner graph only has elemwise ops (and dimshuffles adding
+    broadcastable dimensions to its inputs), like an exponential moving
+    average, each position of the outputs is computed independently of
+    the others. The scan is replaced by an ElemwiseScan computing the
+    fused step in one C loop over the positions and the steps, instead of
+    running the inner function, one small Elemwise per op, at each step.
+
+    """
+    op = node.op
+    if not isinstance(op, scan_op.Scan):
+        return False
+    if (op.n_mit_mot or op.n_mit_sot or not op.n_sit_sot or
+            op.n_shared_outs or op.as_while or
+            op.info['gpu'] or op.info['gpua'] or not theano.config.cxx):
+        return False
+    # A mode given for the inner function (to monitor or profile its
+    # steps) is honoured.
+    if op.mode is not None:
+        return False
+    if not all(isinstance(x.type, tensor.TensorType)
+               for x in op.inputs + op.outputs):
+        return False
+
+    args = scan_utils.scan_args(node.inputs, node.outputs,
+                                op.inputs, op.outputs, op.info)
+    n_steps = node.inputs[0]
+    # The nit_sot outputs must store all the steps.
+    if not all(equal_computations([x], [n_steps])
+               for x in args.outer_in_nit_sot):
+        return False
+    inner_outs = args.inner_out_sit_sot + args.inner_out_nit_sot
+    if (len(set(inner_outs)) != len(inner_outs) or
+            not all(x.owner and isinstance(x.owner.op, tensor.Elemwise)
+                    for x in inner_outs)):
+        return False
+    nd = inner_outs[0].ndim
+
+    # The operands of the fused step: for each inner variable read by the
+    # elemwise ops, its value in the outer graph, with the steps on the
+    # first axis for the sequences.
+    seqs = OrderedDict(zip(args.inner_in_seqs, args.outer_in_seqs))
+    invariants = OrderedDict(zip(args.inner_in_non_seqs,
+                                  args.outer_in_non_seqs))
+    seq_operands = OrderedDict()
+    inv_operands = OrderedDict()
+    inner_ins = (args.inner_in_seqs + args.inner_in_sit_sot +
+                 args.inner_in_non_seqs)
+    for inner_node in gof.graph.io_toposort(inner_ins, inner_outs):
+        if isinstance(inner_node.op, tensor.DimShuffle):
+            x, = inner_node.inputs
+            out, = inner_node.outputs
+            if not _is_expansion(inner_node.op, nd):
+                return False
+            if x in seqs:
+                order = [0] + [d if d == 'x' else d + 1
+                               for d in inner_node.op.new_order]
+                seq_operands[out] = seqs[x].dimshuffle(order)
+            elif x in invariants:
+                inv_operands[out] = invariants[x].dimshuffle(
+                    inner_node.op.new_order)
+            elif isinstance(x, gof.Constant):
+                inv_operands[out] = x.dimshuffle(inner_node.op.new_order)
+            else:
+                return False
+        elif isinstance(inner_node.op, tensor.Elemwise):
+            if inner_node.outputs[0].ndim != nd:
+                return False
+            for x in inner_node.inputs:
+                if x in seqs:
+                    seq_operands[x] = seqs[x]
+                elif x in invariants:
+                    inv_operands[x] = invariants[x]
+                elif isinstance(x, gof.Constant):
+                    inv_operands[x] = x
+        else:
+            return False
+
+    inputs = (list(seq_operands.keys()) + args.inner_in_sit_sot +
+              list(inv_operands.keys()))
+    bcast = tuple(all(x.broadcastable[d] for x in inputs)
+                  for d in xrange(nd))
+    if not all(x.ndim == nd and x.broadcastable == bcast
+               for x in args.inner_in_sit_sot + inner_outs):
+        return False
+    new_op = scan_elemwise.elemwise_scan_op(
+        inputs, inner_outs, len(seq_operands), len(args.inner_in_sit_sot))
+    if new_op is None:
+        return False
+    new_outs = new_op(n_steps, *(list(seq_operands.values()) +
+                                 args.outer_in_sit_sot +
+                                 list(inv_operands.values())),
+                      return_list=True)
+    old_outs = args.outer_out_sit_sot + args.outer_out_nit_sot
+    return [tensor.patternbroadcast(new, old.broadcastable)
+            for new, old in zip(new_outs, old_outs)]
+
+
 # I've added an equilibrium because later scan optimization in the sequence
 # can make it such that earlier optimizations should apply. However, in
 # general I do not expect the sequence to run more then once
@@ -2317,6 +2754,31 @@ scan_seqopt1.register('scanOp_pushout_output',
                       'scan')
 
 
+# After the pushouts, so that what can be computed outside of the loop
+# isn't duplicated in each iteration.
+scan_seqopt1.register('scanOp_vectorize',
+                      opt.in2out(scan_vectorize, ignore_newtrees=True),
+                      5.5,
+                      'fast_run',
+                      'scan')
+
+
+# After the vectorization, that removes the whole loop when it can.
+scan_seqopt1.register('scanOp_unroll',
+                      opt.in2out(scan_unroll, ignore_newtrees=True),
+                      6,
+                      'fast_run',
+                      'scan')
+
+
+# After the unrolling, that is only done when asked for.
+scan_seqopt1.register('scanOp_elemwise',
+                      opt.in2out(scan_elemwise_fusion, ignore_newtrees=True),
+                      6.5,
+                      'fast_run',
+                      'scan')
+
+
 scan_eqopt2.register('constant_folding_for_scan2',
                      opt.in2out(tensor.opt.constant_folding,
                                 ignore_newtrees=True),
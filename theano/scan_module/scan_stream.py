@@ -0,0 +1,235 @@
+"""
+Run a scan over sequences given chunk by chunk.
+
+:func:`scan_stream` compiles the scan of a function over one chunk of its
+sequences, and runs it over the chunks of a Python iterator, carrying the
+recurrent states (and the rows of the sequences needed by their taps) from
+one chunk to the next. Only one chunk is in memory at a time, so sequences
+that don't fit in memory, like long audio or log streams, can be scanned.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import numpy
+
+import theano
+from theano import tensor
+from theano.compile import SharedVariable
+from theano.gof import Constant
+from theano.scan_module.scan import scan
+
+__docformat__ = 'restructedtext en'
+
+
+def _taps(info, default):
+    if isinstance(info, dict):
+        return info.get('taps', default)
+    return default
+
+
+class ScanStream(object):
+    """
+    A scan compiled to run over the chunks of its sequences.
+
+    Use :func:`scan_stream` to build it.
+
+    Attributes
+    ----------
+    fn
+        The compiled function, which takes a chunk of each sequence (with
+        the rows carried over from the previous chunk), the states of the
+        recurrent outputs and the non sequences, and returns the outputs of
+        the scan over the chunk followed by the new states.
+    states
+        The states of the recurrent outputs after the last chunk that was
+        run, in the format of their initial value: the last value of the
+        outputs without taps, and the values read by the taps of the others.
+        They can be given to a new call to continue the same stream.
+
+    """
+
+    def __init__(self, fn, seq_spans, n_outs, n_states, n_non_seqs):
+        self.fn = fn
+        self.seq_spans = seq_spans
+        self.n_outs = n_outs
+        self.n_states = n_states
+        self.n_non_seqs = n_non_seqs
+        self.states = None
+
+    def __call__(self, chunks, states=(), non_sequences=()):
+        """
+        Run the scan over the chunks of its sequences.
+
+        Parameters
+        ----------
+        chunks
+            An iterable over the chunks. Each chunk is the list of the next
+            rows of each sequence, or the next rows of the sequence if there
+            is only one. The chunks may have any length.
+        states
+            The initial value of each recurrent output.
+        non_sequences
+            The value of each non sequence that isn't a shared variable or
+            a constant.
+
+        Returns
+        -------
+        generator
+            Yields, for each chunk, the list of the outputs of the scan over
+            that chunk (or the output if there is only one). Chunks too short
+            for any step to be computed (because of the taps of the
+            sequences) are carried over to the next chunk and yield nothing.
+
+        """
+        states = list(states)
+        non_sequences = list(non_sequences)
+        if len(states) != self.n_states:
+            raise ValueError("The stream has %d recurrent outputs, but %d "
+                             "initial states were given" %
+                             (self.n_states, len(states)))
+        if len(non_sequences) != self.n_non_seqs:
+            raise ValueError("The stream has %d non sequences, but %d "
+                             "values were given" %
+                             (self.n_non_seqs, len(non_sequences)))
+        self.states = states
+        carried = [None] * len(self.seq_spans)
+        for chunk in chunks:
+            if len(self.seq_spans) == 1:
+                chunk = [chunk]
+            if len(chunk) != len(self.seq_spans):
+                raise ValueError("Each chunk should have %d sequences, got "
+                                 "%d" % (len(self.seq_spans), len(chunk)))
+            seqs = []
+            for rows, previous in zip(chunk, carried):
+                rows = numpy.asarray(rows)
+                if previous is not None and len(previous):
+                    rows = numpy.concatenate([previous, rows])
+                seqs.append(rows)
+            n_steps = min(len(rows) - span
+                          for rows, span in zip(seqs, self.seq_spans))
+            if n_steps <= 0:
+                carried = seqs
+                continue
+            # The next step reads the rows of the sequences from n_steps on.
+            carried = [rows[n_steps:] for rows in seqs]
+            values = self.fn(*(seqs + self.states + non_sequences))
+            self.states = values[self.n_outs:]
+            outputs = values[:self.n_outs]
+            if self.n_outs == 1:
+                yield outputs[0]
+            else:
+                yield outputs
+
+
+def scan_stream(fn, sequences=[], outputs_info=None, non_sequences=[],
+                name=None, mode=None, profile=False):
+    """
+    Compile a scan that runs over sequences given chunk by chunk.
+
+    The arguments have the same meaning as for :func:`~theano.scan`, except
+    that the sequences are only used for their type: the scan runs over the
+    chunks given when calling the returned :class:`ScanStream`. The results
+    are the same as those of the scan over the concatenation of the chunks,
+    but only one chunk (and the rows of the sequences needed by their taps)
+    is in memory at a time. The updates of the scan are applied after each
+    chunk.
+
+    Parameters
+    ----------
+    fn
+        The function computing one step of the scan.
+    sequences
+        The sequences the scan iterates over, as variables or dictionaries
+        with ``input`` and ``taps``.
+    outputs_info
+        The initial state of the outputs, as for :func:`~theano.scan`.
+        Their value is given when calling the stream.
+    non_sequences
+        The non sequences of the scan. The value of those that aren't shared
+        variables or constants is given when calling the stream.
+    name
+        The name of the scan.
+    mode
+        The mode used to compile the function.
+    profile
+        If True or a ProfileStats, profile the compiled function.
+
+    Returns
+    -------
+    :class:`ScanStream`
+        Call it with an iterable over the chunks of the sequences, the
+        initial states and the non sequences to get a generator over the
+        outputs of each chunk.
+
+    Examples
+    --------
+    >>> x = theano.tensor.vector('x')
+    >>> s0 = theano.tensor.scalar('s0')
+    >>> stream = theano.scan_stream(lambda x_t, s: s + x_t, sequences=x,
+    ...                             outputs_info=s0)
+    >>> for out in stream([[1., 2.], [3.]], [0.]):
+    ...     print(out)
+    [1. 3.]
+    [6.]
+
+    """
+    if not isinstance(sequences, (list, tuple)):
+        sequences = [sequences]
+    if outputs_info is None:
+        outputs_info = []
+    elif not isinstance(outputs_info, (list, tuple)):
+        outputs_info = [outputs_info]
+    if not isinstance(non_sequences, (list, tuple)):
+        non_sequences = [non_sequences]
+    if not sequences:
+        raise ValueError("scan_stream needs at least one sequence")
+
+    seq_inputs = []
+    seq_spans = []
+    for seq in sequences:
+        taps = _taps(seq, [0])
+        seq_inputs.append(seq['input'] if isinstance(seq, dict) else seq)
+        seq_spans.append(max(taps) - min(taps))
+
+    # The recurrent outputs, with the number of values of their state.
+    init_inputs = []
+    depths = []
+    for info in outputs_info:
+        init = info.get('initial', None) if isinstance(info, dict) else info
+        if init is None:
+            continue
+        taps = _taps(info, [-1])
+        if max(taps) >= 0:
+            raise ValueError("The taps of the outputs of scan_stream must "
+                             "be negative, got %s" % str(taps))
+        init_inputs.append(tensor.as_tensor_variable(init))
+        # scan takes an output with the only tap -1 as the initial value
+        # itself, and the others as the first values of the output.
+        depths.append((-min(taps), list(taps) != [-1]))
+
+    non_seq_inputs = [x for x in non_sequences
+                      if not isinstance(x, (SharedVariable, Constant))]
+
+    outputs, updates = scan(fn, sequences=sequences,
+                            outputs_info=outputs_info,
+                            non_sequences=non_sequences,
+                            name=name, return_list=True)
+
+    # The new states are the last values of the recurrent outputs, which
+    # come first in the outputs of scan, in the order of outputs_info.
+    recurrent = [out for out, info in zip(outputs, outputs_info)
+                 if (info.get('initial', None) if isinstance(info, dict)
+                     else info) is not None]
+    new_states = []
+    for out, init, (depth, has_taps) in zip(recurrent, init_inputs, depths):
+        if has_taps:
+            values = tensor.concatenate([init[:depth], out])
+            new_states.append(values[-depth:])
+        else:
+            new_states.append(out[-1])
+
+    compiled = theano.function(seq_inputs + init_inputs + non_seq_inputs,
+                               outputs + new_states, updates=updates,
+                               mode=mode, name=name, profile=profile)
+    return ScanStream(compiled, seq_spans, len(outputs), len(init_inputs),
+                      len(non_seq_inputs))
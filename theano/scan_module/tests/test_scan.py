@@ -1,8 +1,10 @@
 from __future__ import absolute_import, print_function, division
 
+import gc
 import os
 import shutil
 import sys
+import threading
 from tempfile import mkdtemp
 import time
 import unittest
@@ -285,10 +287,13 @@ class T_Scan(unittest.TestCase):
                                       [],
                                       n_steps=n_steps)
 
+        mode = theano.compile.mode.get_default_mode().excluding(
+            'scanOp_elemwise')
         f = theano.function([state, n_steps],
                             output,
                             updates=updates,
-                            allow_input_downcast=True)
+                            allow_input_downcast=True,
+                            mode=mode)
 
         scan_node = [node for node in f.maker.fgraph.toposort()
                      if isinstance(node.op, Scan)]
@@ -310,6 +315,151 @@ class T_Scan(unittest.TestCase):
         assert all(i.value is None for i in scan_node.op.fn.input_storage)
         assert all(o.value is None for o in scan_node.op.fn.output_storage)
 
+    def test_c_loop(self):
+        if not theano.config.cxx:
+            raise SkipTest("Need cxx for the C loop of scan")
+        x = tensor.matrix('x')
+        h0 = tensor.vector('h0')
+        y0 = tensor.matrix('y0')
+        W = tensor.matrix('W')
+
+        def step(x_t, h_tm1, y_tm2, y_tm1, W):
+            h_t = tensor.tanh(tensor.dot(h_tm1, W) + x_t)
+            return h_t, y_tm2 + y_tm1 * h_t, h_t.sum()
+
+        def until_step(x_t, h_tm1, W):
+            h_t = tensor.dot(h_tm1, W) + x_t
+            return h_t, theano.scan_module.until(h_t.sum() > 3)
+
+        outs, _ = theano.scan(step, sequences=x,
+                              outputs_info=[h0, dict(initial=y0,
+                                                     taps=[-2, -1]),
+                                            None],
+                              non_sequences=W)
+        while_out, _ = theano.scan(until_step, sequences=x,
+                                   outputs_info=h0, non_sequences=W)
+        outputs = outs + [outs[0][-1], while_out]
+
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        v_x = rng.uniform(size=(20, 3)).astype(theano.config.floatX)
+        v_h0 = rng.uniform(size=(3,)).astype(theano.config.floatX)
+        v_y0 = rng.uniform(size=(2, 3)).astype(theano.config.floatX)
+        v_W = rng.uniform(-.5, .5, (3, 3)).astype(theano.config.floatX)
+        values = []
+        for c_loop in [False, True]:
+            with theano.configparser.change_flags(
+                    **{'scan.c_loop': c_loop}):
+                f = theano.function([x, h0, y0, W], outputs,
+                                    mode=mode_nodebug)
+                scan_ops = [node.op for node in f.maker.fgraph.toposort()
+                            if isinstance(node.op, Scan)]
+                assert len(scan_ops) == 2
+                if c_loop:
+                    assert all(op.make_c_loop() for op in scan_ops)
+                values.append(f(v_x, v_h0, v_y0, v_W))
+                # Calling it again reuses the outputs of the first call
+                values.append(f(v_x, v_h0, v_y0, v_W))
+                # An error in the inner graph is raised in Python
+                assert_raises(ValueError, f, v_x, v_h0, v_y0, v_W[:2])
+                if c_loop:
+                    assert all(i.value is None for op in scan_ops
+                               for i in op.fn.input_storage)
+        # The scan until stopped before the end
+        assert len(values[0][-1]) < len(v_x)
+        for v in values[1:]:
+            for ref, val in zip(values[0], v):
+                utt.assert_allclose(ref, val)
+
+    def test_parallel_map(self):
+        x = tensor.matrix('x')
+        W = tensor.matrix('W')
+
+        # sort can't be vectorized, so the scan stays.
+        def step(x_t, W):
+            y_t = tensor.sort(tensor.dot(x_t, W))
+            return y_t, y_t.sum()
+
+        outputs, _ = theano.scan(step, sequences=x, non_sequences=W)
+
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        v_x = rng.uniform(size=(20, 3)).astype(theano.config.floatX)
+        v_W = rng.uniform(-.5, .5, (3, 3)).astype(theano.config.floatX)
+        values = []
+        n_threads_before = threading.active_count()
+        for n_threads in [1, 3]:
+            with theano.configparser.change_flags(
+                    **{'scan.n_threads': n_threads}):
+                f = theano.function([x, W], outputs, mode=mode_nodebug)
+                assert len([node for node in f.maker.fgraph.toposort()
+                            if isinstance(node.op, Scan)]) == 1
+                values.append(f(v_x, v_W))
+                # Calling it again reuses the outputs of the first call
+                values.append(f(v_x, v_W))
+                # An error in a thread is raised in the caller
+                assert_raises(ValueError, f, v_x, v_W[:2])
+                # A single step isn't split
+                values.append(f(v_x[:1], v_W))
+        for v in values[1:]:
+            for ref, val in zip(values[0], v):
+                utt.assert_allclose(ref[:len(val)], val)
+        # The threads of the pool exit with the function.
+        del f
+        gc.collect()
+        for i in range(100):
+            if threading.active_count() == n_threads_before:
+                break
+            time.sleep(0.05)
+        assert threading.active_count() == n_threads_before
+
+    def test_output_views(self):
+        x = tensor.matrix('x')
+        h0 = tensor.vector('h0')
+        y0 = tensor.matrix('y0')
+        s0 = tensor.scalar('s0')
+        W = tensor.matrix('W')
+
+        def step(x_t, h_tm1, y_tm2, y_tm1, s_tm1, W):
+            h_t = tensor.tanh(tensor.dot(h_tm1, W) + x_t)
+            return h_t, y_tm2 + y_tm1 * h_t, s_tm1 + h_t.sum(), h_t.sum()
+
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        floatX = theano.config.floatX
+        v_x = rng.uniform(size=(20, 3)).astype(floatX)
+        v_h0 = rng.uniform(size=(3,)).astype(floatX)
+        v_y0 = rng.uniform(size=(2, 3)).astype(floatX)
+        v_s0 = numpy.asarray(rng.uniform(), dtype=floatX)
+        v_W = rng.uniform(-.5, .5, (3, 3)).astype(floatX)
+        values = []
+        for prealloc in [False, True]:
+            with theano.configparser.change_flags(
+                    **{'scan.allow_output_prealloc': prealloc}):
+                outs, _ = theano.scan(step, sequences=x,
+                                      outputs_info=[h0, dict(initial=y0,
+                                                             taps=[-2, -1]),
+                                                    s0, None],
+                                      non_sequences=W, profile=True)
+                f = theano.function([x, h0, y0, s0, W], outs,
+                                    mode=mode_nodebug)
+                values.append(f(v_x, v_h0, v_y0, v_s0, v_W))
+                values.append(f(v_x, v_h0, v_y0, v_s0, v_W))
+                profile = [node.op.fn.maker.profile
+                           for node in f.maker.fgraph.toposort()
+                           if isinstance(node.op, Scan)][0]
+                if prealloc:
+                    # All the outputs, including the ones read back
+                    # through several taps and the scalar ones, are
+                    # computed in their outer buffer.
+                    assert profile.output_copies == 0
+                else:
+                    # Each output is copied at each step, except the
+                    # nit_sot one at the first step, whose buffer is
+                    # allocated then.
+                    assert profile.output_copies == 2 * (4 * len(v_x) - 1)
+                    assert profile.output_copied_bytes > 0
+        for v in values[1:]:
+            for ref, val in zip(values[0], v):
+                utt.assert_allclose(ref, val)
+
     # generator network, only one output , type scalar ; no sequence or
     # non sequence arguments
     def test_generator_one_output_scalar(self):
@@ -364,7 +514,8 @@ class T_Scan(unittest.TestCase):
                                [tensor.reshape(output, nw_shape, ndim=3)[:-2],
                                 output[:-4]],
                                updates=updates,
-                               allow_input_downcast=True)
+                               allow_input_downcast=True,
+                               mode=mode_with_opt.excluding('scanOp_elemwise'))
         nodes = [x for x in my_f.maker.fgraph.toposort()
                  if isinstance(x.op, theano.scan_module.scan_op.Scan)]
         # This assertation fails if savemem optimization failed on scan
@@ -908,7 +1059,8 @@ class T_Scan(unittest.TestCase):
         x1 = theano.tensor.scalar('y0')
         W_in = theano.shared(vW_in, 'Win')
         W = theano.shared(vW, 'W')
-        mode = theano.compile.mode.get_mode(None).including('inplace')
+        mode = theano.compile.mode.get_mode(None).including(
+            'inplace').excluding('scanOp_elemwise')
 
         def f_rnn_shared(u0_t, u1_t, u2_t, x0_tm1, x1_tm1):
             return [u0_t * W_in + x0_tm1 * W + u1_t * u2_t,
@@ -972,7 +1124,8 @@ class T_Scan(unittest.TestCase):
         x1 = theano.tensor.scalar('y0')
         W_in = theano.shared(vW_in, 'Win')
         W = theano.shared(vW, 'W')
-        mode = theano.compile.mode.get_mode(None).including('inplace')
+        mode = theano.compile.mode.get_mode(None).including(
+            'inplace').excluding('scanOp_elemwise')
 
         def f_rnn_shared(u0_t,
                          u1_t,
@@ -1041,7 +1194,8 @@ class T_Scan(unittest.TestCase):
         to_replace = outputs[0].owner.inputs[0].owner.inputs[1]
         outputs = theano.clone(outputs,
                                replace=[(to_replace, x0)])
-        mode = theano.compile.mode.get_mode(None).including('inplace')
+        mode = theano.compile.mode.get_mode(None).including(
+            'inplace').excluding('scanOp_elemwise')
         f9 = theano.function([],
                              outputs,
                              updates=updates,
@@ -2621,6 +2775,9 @@ class T_Scan(unittest.TestCase):
             self.assertTrue(nb_shape_i == 1)
 
     def test_merge(self):
+        # The scans are maps, that would otherwise be vectorized.
+        mode = mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                       'scanOp_vectorize')
         x = theano.tensor.vector()
         y = theano.tensor.vector()
 
@@ -2631,7 +2788,7 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[y])
 
         f = theano.function([x, y], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode)
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2641,7 +2798,7 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[y], n_steps=3)
 
         f = theano.function([x, y], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode)
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2651,7 +2808,7 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[y], n_steps=4)
 
         f = theano.function([x, y], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode)
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2661,7 +2818,7 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[x])
 
         f = theano.function([x], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode)
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2671,7 +2828,7 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[x], mode='FAST_COMPILE')
 
         f = theano.function([x], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode)
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2681,12 +2838,56 @@ class T_Scan(unittest.TestCase):
         sy, upy = theano.scan(sum, sequences=[x], truncate_gradient=1)
 
         f = theano.function([x], [sx, sy],
-                            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+                            mode=mode)
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
         self.assertTrue(len(scans) == 2)
 
+    def test_shared_inner_function(self):
+        # Identical scans that can't be merged only compile their inner
+        # function once.
+        x = tensor.vector()
+        y = tensor.vector()
+        w = tensor.scalar()
+
+        def step(s, acc, w):
+            return acc * w + s
+
+        sx, _ = theano.scan(step, sequences=[x],
+                            outputs_info=[tensor.zeros_like(w)],
+                            non_sequences=[w])
+        sy, _ = theano.scan(step, sequences=[y],
+                            outputs_info=[tensor.zeros_like(w)],
+                            non_sequences=[w])
+        f = theano.function([x, y, w], [sx, sy],
+                            mode=mode_with_opt.excluding('scanOp_elemwise'))
+        scans = [n.op for n in f.maker.fgraph.toposort()
+                 if isinstance(n.op, Scan)]
+        assert len(scans) == 2
+        key = scans[0]._inner_fn_key()
+        assert key is not None
+        assert scans[1]._inner_fn_key() == key
+        assert scans[0].fn is not scans[1].fn
+        assert theano.scan_module.scan_op._inner_fn_cache[key] in [
+            scans[0].fn, scans[1].fn]
+
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        x_val = rng.uniform(size=(4,)).astype(theano.config.floatX)
+        y_val = rng.uniform(size=(5,)).astype(theano.config.floatX)
+        w_val = numpy.asarray(.5, dtype=theano.config.floatX)
+
+        def ref(s_val):
+            acc = numpy.zeros((), dtype=theano.config.floatX)
+            out = []
+            for s in s_val:
+                acc = acc * w_val + s
+                out.append(acc)
+            return out
+        out_x, out_y = f(x_val, y_val, w_val)
+        utt.assert_allclose(out_x, ref(x_val))
+        utt.assert_allclose(out_y, ref(y_val))
+
     def test_merge_3scans(self):
         # This test checks a case where we have 3 scans, two of them
         # cannot be merged together, but the third one can be merged with
@@ -2705,7 +2906,8 @@ class T_Scan(unittest.TestCase):
 
         f = theano.function(
             [x, y], [sy, sz],
-            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops'))
+            mode=mode_with_opt.excluding('scanOp_pushout_seqs_ops',
+                                         'scanOp_vectorize'))
         topo = f.maker.fgraph.toposort()
         scans = [n for n in topo if isinstance(
             n.op, theano.scan_module.scan_op.Scan)]
@@ -2884,7 +3086,7 @@ class T_Scan(unittest.TestCase):
                                  numpy.asarray(0.,
                                                dtype=theano.config.floatX)))
         mode = theano.compile.mode.FAST_RUN
-        mode = mode.excluding('inplace')
+        mode = mode.excluding('inplace', 'scanOp_elemwise')
         f1 = theano.function([], o, mode=mode)
         inputs, outputs = clone_optimized_graph(f1)
 
@@ -2917,7 +3119,7 @@ class T_Scan(unittest.TestCase):
                                               dtype=theano.config.floatX)))
 
         mode = theano.compile.mode.FAST_RUN
-        mode = mode.excluding('inplace')
+        mode = mode.excluding('inplace', 'scanOp_elemwise')
         f0 = theano.function([], o, mode=mode)
         inputs, outputs = clone_optimized_graph(f0)
 
@@ -2951,7 +3153,7 @@ class T_Scan(unittest.TestCase):
                                               dtype=theano.config.floatX)))
 
         mode = theano.compile.mode.FAST_RUN
-        mode = mode.excluding('inplace')
+        mode = mode.excluding('inplace', 'scanOp_elemwise')
         f1 = theano.function([], o, mode=mode)
         inputs, outputs = clone_optimized_graph(f1)
 
@@ -5,6 +5,8 @@ import unittest
 
 import theano
 import theano.tensor as T
+from theano.scan_module.scan_checkpoints import checkpoint_interval
+from theano.tests import unittest_tools as utt
 
 try:
     from pygpu.gpuarray import GpuArrayException
@@ -68,3 +70,46 @@ class TestScanCheckpoint(unittest.TestCase):
         """Test that an error rises if we use taps in outputs_info."""
         self.assertRaises(RuntimeError, theano.scan_checkpoints,
                           lambda: None, [], {'initial': self.A, 'taps': [-2]})
+
+
+class TestCheckpointInterval(unittest.TestCase):
+
+    def test_interval(self):
+        """Test the number of steps between two checkpoints."""
+        n = T.iscalar("n")
+        x0 = T.dvector("x0")
+        f = theano.function(
+            inputs=[n, x0],
+            outputs=[checkpoint_interval(n, [x0]),
+                     # Room for 25 states of 3 doubles.
+                     checkpoint_interval(n, [x0], memory_budget=25 * 3 * 8),
+                     checkpoint_interval(n, [x0], memory_budget=10 ** 9),
+                     checkpoint_interval(n, [x0], memory_budget=1)])
+        assert f(100, numpy.zeros(3)) == [10, 20, 100, 10]
+
+    def test_auto(self):
+        """Test save_every_N='auto' with sequences and non_sequences."""
+        X = T.matrix("X")
+        h0 = T.vector("h0")
+        W = T.matrix("W")
+
+        def step(x, h, W):
+            return T.tanh(T.dot(h, W) + x)
+        result, _ = theano.scan(step, sequences=X, outputs_info=h0,
+                                non_sequences=W)
+        outputs = [result[-1]]
+        for memory_budget in [None, 4000]:
+            result_check, _ = theano.scan_checkpoints(
+                step, sequences=X, outputs_info=h0, non_sequences=W,
+                save_every_N='auto', memory_budget=memory_budget)
+            outputs.append(result_check[-1])
+        outputs += [T.grad(o.sum(), W) for o in outputs]
+        f = theano.function(inputs=[X, h0, W], outputs=outputs)
+
+        rng = numpy.random.RandomState(utt.fetch_seed())
+        floatX = theano.config.floatX
+        out = f(rng.rand(101, 4).astype(floatX), rng.rand(4).astype(floatX),
+                rng.rand(4, 4).astype(floatX) * .1)
+        for i in [1, 2]:
+            assert numpy.allclose(out[0], out[i])
+            assert numpy.allclose(out[3], out[3 + i])
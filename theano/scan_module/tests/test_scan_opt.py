@@ -5,6 +5,7 @@ import unittest
 import theano
 from theano import config
 from theano import tensor as T
+from theano.scan_module import scan_elemwise
 from theano.scan_module.scan_op import Scan
 from theano.tests import unittest_tools as utt
 
@@ -201,11 +202,12 @@ class TestPushOutScanOutputDot(object):
                                           non_sequences=b)
 
         # Compile the function twice, once with the optimization and once
-        # without
-        opt_mode = mode.including("scan")
+        # without. The scan is a map, that would otherwise be vectorized.
+        opt_mode = mode.including("scan").excluding("scanOp_vectorize")
         f_opt = theano.function([a, b], outputs, mode=opt_mode)
 
-        no_opt_mode = mode.excluding("scanOp_pushout_output")
+        no_opt_mode = mode.excluding("scanOp_pushout_output",
+                                     "scanOp_vectorize")
         f_no_opt = theano.function([a, b], outputs, mode=no_opt_mode)
 
         # Ensure that the optimization was performed correctly in f_opt
@@ -421,3 +423,205 @@ class TestPushOutSumOfDot():
         output_no_opt = f_no_opt(input1_value, input2_value, input3_value)
 
         utt.assert_allclose(output_opt, output_no_opt)
+
+
+class TestScanUnroll(object):
+    """
+    Test class for the scan_unroll optimizer.
+    """
+
+    def setUp(self):
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+
+    def _run(self, n_steps, threshold, factor):
+        y0 = T.matrix()
+        x0 = T.vector()
+        W = T.matrix()
+
+        def step(ym2, ym1, x, W):
+            new_x = T.tanh(T.dot(x, W))
+            return ym2 + ym1 * 0.5, new_x, new_x.sum()
+
+        outputs, _ = theano.scan(step,
+                                 outputs_info=[dict(initial=y0,
+                                                    taps=[-2, -1]),
+                                               x0, None],
+                                 non_sequences=W,
+                                 n_steps=n_steps)
+
+        f_ref = theano.function([y0, x0, W], outputs,
+                                mode=mode.excluding('scanOp_unroll'))
+        with theano.configparser.change_flags(
+                **{'scan.unroll_threshold': threshold,
+                   'scan.unroll_factor': factor}):
+            f = theano.function([y0, x0, W], outputs,
+                                mode=mode.including('scanOp_unroll'))
+
+        vals = [self.rng.rand(2, 3).astype(config.floatX),
+                self.rng.rand(3).astype(config.floatX),
+                self.rng.rand(3, 3).astype(config.floatX)]
+        for out, ref in zip(f(*vals), f_ref(*vals)):
+            utt.assert_allclose(out, ref)
+        return [node for node in f.maker.fgraph.toposort()
+                if isinstance(node.op, Scan)]
+
+    def test_full_unroll(self):
+        assert len(self._run(4, 1000, 1)) == 0
+
+    def test_threshold(self):
+        scans = self._run(4, 10, 1)
+        assert len(scans) == 1
+        assert T.get_scalar_constant_value(scans[0].inputs[0]) == 4
+
+    def test_partial_unroll(self):
+        for factor in [2, 4]:
+            scans = self._run(8, 0, factor)
+            assert len(scans) == 1
+            n_steps = T.get_scalar_constant_value(scans[0].inputs[0])
+            assert n_steps == 8 // factor
+
+    def test_partial_unroll_not_multiple(self):
+        scans = self._run(7, 0, 2)
+        assert len(scans) == 1
+        assert T.get_scalar_constant_value(scans[0].inputs[0]) == 7
+
+
+class TestScanVectorize(object):
+    """
+    Test class for the scan_vectorize optimizer.
+    """
+
+    def setUp(self):
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+
+    def _check(self, inputs, outputs, vals):
+        # The recurrent scans would be turned into ElemwiseScan.
+        f_ref = theano.function(inputs, outputs,
+                                mode=mode.excluding('scanOp_vectorize',
+                                                    'scanOp_elemwise'))
+        f = theano.function(inputs, outputs,
+                            mode=mode.including('scanOp_vectorize').excluding(
+                                'scanOp_elemwise'))
+        for out, ref in zip(f(*vals), f_ref(*vals)):
+            utt.assert_allclose(out, ref)
+        return [node for node in f.maker.fgraph.toposort()
+                if isinstance(node.op, Scan)]
+
+    def test_map(self):
+        X = T.matrix()
+        Y = T.tensor3()
+        W = T.matrix()
+        v = T.vector()
+
+        def fn(x, y, W, v):
+            h = T.tanh(T.dot(x, W) + v)
+            return [h.sum(), T.dot(W, x) * 2, T.dot(y, x),
+                    T.dot(x, y).max(axis=0), T.dot(v, y), T.exp(v)]
+
+        outputs, _ = theano.map(fn, sequences=[X, Y], non_sequences=[W, v])
+        vals = [self.rng.rand(5, 3).astype(config.floatX),
+                self.rng.rand(5, 3, 3).astype(config.floatX),
+                self.rng.rand(3, 3).astype(config.floatX),
+                self.rng.rand(3).astype(config.floatX)]
+        assert len(self._check([X, Y, W, v], outputs, vals)) == 0
+
+    def test_unsupported_op(self):
+        X = T.matrix()
+        output, _ = theano.map(lambda x: T.sort(x) * 2, sequences=[X])
+        vals = [self.rng.rand(5, 3).astype(config.floatX)]
+        assert len(self._check([X], [output], vals)) == 1
+
+    def test_recurrent(self):
+        X = T.matrix()
+        output, _ = theano.scan(lambda x, h: x * h, sequences=[X],
+                                outputs_info=[T.ones_like(X[0])])
+        vals = [self.rng.rand(5, 3).astype(config.floatX)]
+        assert len(self._check([X], [output], vals)) == 1
+
+
+class TestScanElemwise(object):
+    """
+    Test class for the scan_elemwise_fusion optimizer.
+    """
+
+    def setUp(self):
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+
+    def _check(self, inputs, outputs, vals):
+        f_ref = theano.function(inputs, outputs,
+                                mode=mode.excluding('scanOp_elemwise'))
+        f = theano.function(inputs, outputs,
+                            mode=mode.including('scanOp_elemwise'))
+        for out, ref in zip(f(*vals), f_ref(*vals)):
+            utt.assert_allclose(out, ref)
+        topo = f.maker.fgraph.toposort()
+        return ([node for node in topo if isinstance(node.op, Scan)],
+                [node for node in topo
+                 if isinstance(node.op, scan_elemwise.ElemwiseScan)])
+
+    def test_moving_average(self):
+        X = T.matrix()
+        h0 = T.vector()
+        a = T.scalar()
+
+        def step(x, h, a):
+            new_h = a * h + (1 - a) * x
+            return new_h, T.exp(new_h) * 2
+
+        outputs, _ = theano.scan(step, sequences=[X],
+                                 outputs_info=[h0, None], non_sequences=[a])
+        vals = [self.rng.rand(20, 3).astype(config.floatX),
+                self.rng.rand(3).astype(config.floatX),
+                numpy.asarray(.9, dtype=config.floatX)]
+        scans, elemwise_scans = self._check([X, h0, a], outputs, vals)
+        assert len(scans) == 0
+        assert len(elemwise_scans) == 1
+
+    def test_broadcast_and_taps(self):
+        X = T.tensor3()
+        H0 = T.matrix()
+        b = T.vector()
+        n_steps = T.iscalar()
+
+        def step(x, x_p1, h, b):
+            new_h = T.tanh(h * b + x - x_p1)
+            return new_h, new_h * 0.5 + 1
+
+        outputs, _ = theano.scan(step,
+                                 sequences=[dict(input=X, taps=[0, 1])],
+                                 outputs_info=[H0, None], non_sequences=[b],
+                                 n_steps=n_steps, go_backwards=True)
+        vals = [self.rng.rand(8, 4, 5).astype(config.floatX),
+                self.rng.rand(4, 5).astype(config.floatX),
+                self.rng.rand(5).astype(config.floatX), 6]
+        scans, elemwise_scans = self._check([X, H0, b, n_steps],
+                                            outputs, vals)
+        assert len(scans) == 0
+        assert len(elemwise_scans) == 1
+
+    def test_not_elemwise(self):
+        X = T.matrix()
+        h0 = T.vector()
+        output, _ = theano.scan(lambda x, h: T.sort(h) + x, sequences=[X],
+                                outputs_info=[h0])
+        vals = [self.rng.rand(5, 3).astype(config.floatX),
+                self.rng.rand(3).astype(config.floatX)]
+        scans, elemwise_scans = self._check([X, h0], [output], vals)
+        assert len(scans) == 1
+        assert len(elemwise_scans) == 0
+
+    def test_perform(self):
+        X = T.matrix()
+        h0 = T.vector()
+        output, _ = theano.scan(lambda x, h: h * 0.5 + x, sequences=[X],
+                                outputs_info=[h0])
+        f = theano.function([X, h0], output,
+                            mode=mode.including('scanOp_elemwise'))
+        f_py = theano.function([X, h0], output,
+                               mode=theano.Mode(linker='py',
+                                                optimizer=mode.optimizer))
+        assert any(isinstance(node.op, scan_elemwise.ElemwiseScan)
+                   for node in f_py.maker.fgraph.toposort())
+        vals = [self.rng.rand(6, 3).astype(config.floatX),
+                self.rng.rand(3).astype(config.floatX)]
+        utt.assert_allclose(f_py(*vals), f(*vals))
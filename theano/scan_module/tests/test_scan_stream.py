@@ -0,0 +1,108 @@
+from __future__ import absolute_import, print_function, division
+
+import numpy
+import unittest
+
+import theano
+import theano.tensor as T
+from theano.tests import unittest_tools as utt
+
+
+class TestScanStream(unittest.TestCase):
+
+    def setUp(self):
+        utt.seed_rng()
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+        self.floatX = theano.config.floatX
+
+    def chunks(self, value, sizes):
+        start = 0
+        for size in sizes:
+            yield value[start:start + size]
+            start += size
+
+    def test_rnn(self):
+        x = T.matrix('x')
+        h0 = T.vector('h0')
+        W = T.matrix('W')
+
+        def step(x_t, h_tm1, W):
+            h_t = T.tanh(T.dot(h_tm1, W) + x_t)
+            return h_t, h_t.sum()
+
+        outputs, _ = theano.scan(step, sequences=x, outputs_info=[h0, None],
+                                 non_sequences=W)
+        f = theano.function([x, h0, W], outputs)
+        stream = theano.scan_stream(step, sequences=x,
+                                    outputs_info=[h0, None],
+                                    non_sequences=W)
+
+        v_x = self.rng.uniform(size=(20, 3)).astype(self.floatX)
+        v_h0 = self.rng.uniform(size=(3,)).astype(self.floatX)
+        v_W = self.rng.uniform(-.5, .5, (3, 3)).astype(self.floatX)
+        ref_h, ref_s = f(v_x, v_h0, v_W)
+
+        results = list(stream(self.chunks(v_x, [7, 1, 12]), [v_h0], [v_W]))
+        assert len(results) == 3
+        utt.assert_allclose(numpy.concatenate([r[0] for r in results]),
+                            ref_h)
+        utt.assert_allclose(numpy.concatenate([r[1] for r in results]),
+                            ref_s)
+        utt.assert_allclose(stream.states[0], ref_h[-1])
+
+        # The stream can be continued from its last states.
+        results = list(stream(self.chunks(v_x[:5], [5]), [v_h0], [v_W]))
+        results += list(stream(self.chunks(v_x[5:], [15]), stream.states,
+                               [v_W]))
+        utt.assert_allclose(numpy.concatenate([r[0] for r in results]),
+                            ref_h)
+
+        self.assertRaises(ValueError, list, stream([v_x], [], [v_W]))
+        self.assertRaises(ValueError, list, stream([v_x], [v_h0], []))
+
+    def test_taps(self):
+        x = T.vector('x')
+        y = T.vector('y')
+        z0 = T.vector('z0')
+
+        def step(x_tm1, x_tp1, y_t, z_tm2, z_tm1):
+            return z_tm2 + 0.5 * z_tm1 + x_tm1 * x_tp1 - y_t
+
+        sequences = [dict(input=x, taps=[-1, 1]), y]
+        outputs_info = [dict(initial=z0, taps=[-2, -1])]
+        output, _ = theano.scan(step, sequences=sequences,
+                                outputs_info=outputs_info)
+        f = theano.function([x, y, z0], output)
+        stream = theano.scan_stream(step, sequences=sequences,
+                                    outputs_info=outputs_info)
+
+        v_x = self.rng.uniform(size=(12,)).astype(self.floatX)
+        v_y = self.rng.uniform(size=(10,)).astype(self.floatX)
+        v_z0 = self.rng.uniform(size=(2,)).astype(self.floatX)
+        ref = f(v_x, v_y, v_z0)
+
+        # The first chunk is too short for the taps of x, and is carried
+        # over to the next one.
+        sizes = [1, 4, 1, 6]
+        chunks = zip(self.chunks(v_x, sizes), self.chunks(v_y, sizes))
+        results = list(stream(chunks, [v_z0]))
+        assert len(results) == 3
+        utt.assert_allclose(numpy.concatenate(results), ref)
+        utt.assert_allclose(stream.states[0], ref[-2:])
+
+    def test_updates(self):
+        x = T.vector('x')
+        count = theano.shared(numpy.asarray(0, dtype='int64'))
+
+        def step(x_t):
+            return 2 * x_t, {count: count + 1}
+
+        stream = theano.scan_stream(step, sequences=x)
+        v_x = self.rng.uniform(size=(10,)).astype(self.floatX)
+        results = list(stream(self.chunks(v_x, [3, 3, 4])))
+        utt.assert_allclose(numpy.concatenate(results), 2 * v_x)
+        assert count.get_value() == 10
+
+
+if __name__ == '__main__':
+    unittest.main()
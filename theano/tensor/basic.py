@@ -1193,6 +1193,7 @@ class MaxAndArgmax(Op):
     E_axis = 'invalid axis'
     params_type = Generic()
     __props__ = ('axis',)
+    _f16_ok = True
 
     def __init__(self, axis):
         assert isinstance(axis, list)
@@ -1399,6 +1400,7 @@ class Argmax(Op):
     nout = 1
     E_axis = 'invalid axis'
     __props__ = ()
+    _f16_ok = True
 
     def make_node(self, x, axis=None):
         x = _as_tensor_variable(x)
@@ -2862,7 +2864,7 @@ class Alloc(gof.Op):
             {
                 Py_XDECREF(%(zz)s);
                 %(zz)s = (PyArrayObject*) PyArray_SimpleNew(%(ndim)s,
-                    shape, PyArray_TYPE((PyArrayObject*) py_%(vv)s));
+                    shape, PyArray_TYPE(%(vv)s));
                 if (!%(zz)s)
                 {
                     PyErr_SetString(PyExc_MemoryError, "alloc failed");
@@ -2878,7 +2880,7 @@ class Alloc(gof.Op):
         return code
 
     def c_code_cache_version(self):
-        return (2,)
+        return (3,)
 
     def infer_shape(self, node, input_shapes):
         return [node.inputs[1:]]
@@ -3888,6 +3890,7 @@ class Join(Op):
     """
     check_input = False
     __props__ = ("view",)
+    _f16_ok = True
 
     def __init__(self, view=-1):
         self.view = view
@@ -4776,6 +4779,7 @@ class Flatten(Op):
 
     check_input = False
     __props__ = ("outdim",)
+    _f16_ok = True
 
     def __init__(self, outdim=1):
         warnings.warn(
@@ -6428,6 +6432,7 @@ class AllocEmpty(gof.Op):
     """Implement Alloc on the cpu, but without initializing memory."""
 
     __props__ = ("dtype",)
+    _f16_ok = True
 
     # specify the type of the data
     def __init__(self, dtype):
@@ -40,6 +40,10 @@ Dot22Scalar is a GEMM where b=0 and Z is allocated every time.
 
 Gemm is a GEMM in all its generality.
 
+The three of them also accept float16 matrices: the tiles of X and Y are
+converted to float32 and multiplied by sgemm, and the result is stored back
+in float16.
+
 In the future we can refactor the GemmRelated, Gemm, Dot22 and
 Dot22Scalar Ops into a single Op.  That new Op (Gemm2) is basically a
 normal Gemm, but with an additional configuration variable that says
@@ -151,6 +155,7 @@ import theano.scalar
 from theano.tensor import basic as T
 from theano.tensor.blas_headers import blas_header_text
 from theano.tensor.blas_headers import blas_header_version
+from theano.tensor.fp16_help import half_support_code
 from theano.tensor.opt import in2out, local_dimshuffle_lift
 from theano.tensor.type import values_eq_approx_remove_inf_nan
 
@@ -465,9 +470,19 @@ class GemmRelated(Op):
 
     This class provides a kind of templated gemm Op.
 
+    float16 matrices are multiplied in float32: tiles of at most
+    `half_block_size` rows and columns of x and y are converted to float32
+    and multiplied by sgemm into a float32 copy of z, which is converted back
+    at the end.
+
     """
 
     __props__ = ()
+    _f16_ok = True
+
+    # The size of the tiles of x and y converted to float32 for each sgemm
+    # call of the float16 case.
+    half_block_size = 256
 
     def c_support_code(self):
         # return cblas_header_text()
@@ -482,12 +497,13 @@ class GemmRelated(Op):
             return (double) tv.tv_sec + (double) tv.tv_usec / 1000000.0;
         }
         """
-        return blas_header_text() + mod_str
+        return blas_header_text() + mod_str + half_support_code
 
     def c_headers(self):
         # std.cout doesn't require the '%' symbol to print stuff...
         # so it works much better with python's string-substitution stuff.
-        return ['<iostream>', '<time.h>', '<sys/time.h>']
+        return ['<iostream>', '<time.h>', '<sys/time.h>', '<vector>',
+                '<algorithm>']
 
     def c_libraries(self):
         return ldflags()
@@ -544,16 +560,19 @@ class GemmRelated(Op):
         """
     check_xyz_double_or_float = """
         if ((PyArray_DESCR(%(_x)s)->type_num != NPY_DOUBLE)
-            && (PyArray_DESCR(%(_x)s)->type_num != NPY_FLOAT))
-        {PyErr_SetString(PyExc_NotImplementedError, "type(x) is not double or float"); %(fail)s;}
+            && (PyArray_DESCR(%(_x)s)->type_num != NPY_FLOAT)
+            && (PyArray_DESCR(%(_x)s)->type_num != NPY_HALF))
+        {PyErr_SetString(PyExc_NotImplementedError, "type(x) is not double, float or half"); %(fail)s;}
 
         if ((PyArray_DESCR(%(_y)s)->type_num != NPY_DOUBLE)
-            && (PyArray_DESCR(%(_y)s)->type_num != NPY_FLOAT))
-        {PyErr_SetString(PyExc_NotImplementedError, "type(y) is not double or float"); %(fail)s;}
+            && (PyArray_DESCR(%(_y)s)->type_num != NPY_FLOAT)
+            && (PyArray_DESCR(%(_y)s)->type_num != NPY_HALF))
+        {PyErr_SetString(PyExc_NotImplementedError, "type(y) is not double, float or half"); %(fail)s;}
 
         if ((PyArray_DESCR(%(_zout)s)->type_num != NPY_DOUBLE)
-            && (PyArray_DESCR(%(_zout)s)->type_num != NPY_FLOAT))
-        {PyErr_SetString(PyExc_NotImplementedError, "type(z) is not double or float"); %(fail)s;}
+            && (PyArray_DESCR(%(_zout)s)->type_num != NPY_FLOAT)
+            && (PyArray_DESCR(%(_zout)s)->type_num != NPY_HALF))
+        {PyErr_SetString(PyExc_NotImplementedError, "type(z) is not double, float or half"); %(fail)s;}
 
         if ((PyArray_DESCR(%(_x)s)->type_num != PyArray_DESCR(%(_y)s)->type_num)
             ||(PyArray_DESCR(%(_x)s)->type_num != PyArray_DESCR(%(_zout)s)->type_num))
@@ -563,12 +582,14 @@ class GemmRelated(Op):
     # it is not necessary that a or b have the same type as x,y,z
     check_ab_double_or_float = """
         if ((PyArray_DESCR(%(_a)s)->type_num != NPY_DOUBLE)
-            && (PyArray_DESCR(%(_a)s)->type_num != NPY_FLOAT))
-        {PyErr_SetString(PyExc_NotImplementedError, "type(a) is not double or float"); %(fail)s;}
+            && (PyArray_DESCR(%(_a)s)->type_num != NPY_FLOAT)
+            && (PyArray_DESCR(%(_a)s)->type_num != NPY_HALF))
+        {PyErr_SetString(PyExc_NotImplementedError, "type(a) is not double, float or half"); %(fail)s;}
 
         if ((PyArray_DESCR(%(_b)s)->type_num != NPY_DOUBLE)
-            && (PyArray_DESCR(%(_b)s)->type_num != NPY_FLOAT))
-        {PyErr_SetString(PyExc_NotImplementedError, "type(b) is not double or float"); %(fail)s;}
+            && (PyArray_DESCR(%(_b)s)->type_num != NPY_FLOAT)
+            && (PyArray_DESCR(%(_b)s)->type_num != NPY_HALF))
+        {PyErr_SetString(PyExc_NotImplementedError, "type(b) is not double, float or half"); %(fail)s;}
         """
 
     check_dims = """
@@ -748,6 +769,102 @@ class GemmRelated(Op):
                 //        unit, Nz1, Nz0, Nx1, time_time()- t0);
         """
 
+    case_half = """
+            }
+            break;
+            case NPY_HALF:
+            {
+        """
+
+    # The float16 case uses case_float_ab_constants.
+
+    case_half_gemm = """
+                const npy_half* x = (npy_half*)PyArray_DATA(%(_x)s);
+                const npy_half* y = (npy_half*)PyArray_DATA(%(_y)s);
+                npy_half* z = (npy_half*)PyArray_DATA(%(_zout)s);
+                char N = 'N';
+                float one = 1.0;
+                npy_intp M = Nz[0], Ncol = Nz[1], K = Nx[1];
+                if (M > 0 && Ncol > 0)
+                {
+                    const npy_intp block = %(half_block_size)s;
+                    int iM = M, iN = Ncol;
+                    // z in float32 and in row major order, scaled by b. As
+                    // for the BLAS, z is not read when b == 0.
+                    std::vector<float> zf(M * Ncol, 0.0f);
+                    if (b != 0)
+                    {
+                        for (npy_intp i = 0; i < M; ++i)
+                        {
+                            const npy_half* zi = z + i * sz_0;
+                            float* zfi = &zf[i * Ncol];
+                            if (sz_1 == 1)
+                                for (npy_intp j = 0; j < Ncol; ++j)
+                                    zfi[j] = b * theano_half_to_float(zi[j]);
+                            else
+                                for (npy_intp j = 0; j < Ncol; ++j)
+                                    zfi[j] = b * theano_half_to_float(
+                                        zi[j * sz_1]);
+                        }
+                    }
+                    std::vector<float> xf(M * std::min(block, K));
+                    std::vector<float> yf(std::min(block, K) *
+                                          std::min(block, Ncol));
+                    for (npy_intp k0 = 0; k0 < K; k0 += block)
+                    {
+                        // The next columns of x, in float32.
+                        int kn = std::min(block, K - k0);
+                        for (npy_intp i = 0; i < M; ++i)
+                        {
+                            const npy_half* xi = x + i * sx_0 + k0 * sx_1;
+                            float* xfi = &xf[i * kn];
+                            if (sx_1 == 1)
+                                for (npy_intp k = 0; k < kn; ++k)
+                                    xfi[k] = theano_half_to_float(xi[k]);
+                            else
+                                for (npy_intp k = 0; k < kn; ++k)
+                                    xfi[k] = theano_half_to_float(
+                                        xi[k * sx_1]);
+                        }
+                        for (npy_intp j0 = 0; j0 < Ncol; j0 += block)
+                        {
+                            // A tile of y in float32, small enough to stay
+                            // in the cache while sgemm reads it.
+                            int jn = std::min(block, Ncol - j0);
+                            for (npy_intp k = 0; k < kn; ++k)
+                            {
+                                const npy_half* yk = (y + (k0 + k) * sy_0 +
+                                                      j0 * sy_1);
+                                float* yfk = &yf[k * jn];
+                                if (sy_1 == 1)
+                                    for (npy_intp j = 0; j < jn; ++j)
+                                        yfk[j] = theano_half_to_float(yk[j]);
+                                else
+                                    for (npy_intp j = 0; j < jn; ++j)
+                                        yfk[j] = theano_half_to_float(
+                                            yk[j * sy_1]);
+                            }
+                            // zf[:, j0:j0+jn] += a * xf * yf, in row major
+                            // order, so the arguments are swapped as for
+                            // the case 0x000.
+                            sgemm_(&N, &N, &jn, &iM, &kn, &a, &yf[0], &jn,
+                                   &xf[0], &kn, &one, &zf[j0], &iN);
+                        }
+                    }
+                    for (npy_intp i = 0; i < M; ++i)
+                    {
+                        npy_half* zi = z + i * sz_0;
+                        const float* zfi = &zf[i * Ncol];
+                        if (sz_1 == 1)
+                            for (npy_intp j = 0; j < Ncol; ++j)
+                                zi[j] = theano_float_to_half(zfi[j]);
+                        else
+                            for (npy_intp j = 0; j < Ncol; ++j)
+                                zi[j * sz_1] = theano_float_to_half(zfi[j]);
+                    }
+                }
+        """
+
     end_switch_typenum = """
             }
             break;
@@ -773,10 +890,14 @@ class GemmRelated(Op):
             self.case_double,
             self.case_double_ab_constants,
             self.case_double_gemm,
+            self.case_half,
+            self.case_float_ab_constants,
+            self.case_half_gemm.replace(
+                '%(half_block_size)s', str(self.half_block_size)),
             self.end_switch_typenum), '')
 
     def build_gemm_version(self):
-        return (13, blas_header_version())
+        return (14, blas_header_version())
 
 
 class Gemm(GemmRelated):
@@ -1000,30 +1121,54 @@ class Gemm(GemmRelated):
                 }
             }
         }
+        else if (PyArray_DESCR(%(_zout)s)->type_num == NPY_HALF)
+        {
+            npy_half * zoutdata = (npy_half*) PyArray_DATA(%(_zout)s);
+            int zoi = Sz[0] / sizeof(npy_half);
+            int zoj = Sz[1] / sizeof(npy_half);
+            const npy_half * zdata = (npy_half*)PyArray_DATA(%(_z)s);
+            int zi = PyArray_STRIDES(%(_z)s)[0]/sizeof(npy_half);
+            int zj = PyArray_STRIDES(%(_z)s)[1]/sizeof(npy_half);
+            for (int i = 0; i < Nz[0]; ++i)
+            {
+                for (int j = 0; j < Nz[1]; ++j)
+                {
+                    zoutdata[zoi*i + zoj*j] = zdata[zi*i + zj*j];
+                }
+            }
+        }
         else
         {
             PyErr_SetString(PyExc_AssertionError,
-                            "neither float nor double dtype");
+                            "neither float, double nor half dtype");
             %(fail)s
         }
         """
 
     case_float_ab_constants = """
         #define REAL float
-        float a = (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
+        float a = (PyArray_DESCR(%(_a)s)->type_num == NPY_HALF)
+        ? (REAL)theano_half_to_float(((npy_half*)PyArray_DATA(%(_a)s))[0])
+        : (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
         ? (REAL)(((float*)PyArray_DATA(%(_a)s))[0])
         : (REAL)(((double*)PyArray_DATA(%(_a)s))[0]);
-        float b = (PyArray_DESCR(%(_b)s)->type_num == NPY_FLOAT) ?
+        float b = (PyArray_DESCR(%(_b)s)->type_num == NPY_HALF)
+        ? (REAL)theano_half_to_float(((npy_half*)PyArray_DATA(%(_b)s))[0])
+        : (PyArray_DESCR(%(_b)s)->type_num == NPY_FLOAT) ?
         (REAL)(((float*)PyArray_DATA(%(_b)s))[0])
         : (REAL)(((double*)PyArray_DATA(%(_b)s))[0]);
         #undef REAL
         """
     case_double_ab_constants = """
         #define REAL double
-        double a = (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
+        double a = (PyArray_DESCR(%(_a)s)->type_num == NPY_HALF)
+        ? (REAL)theano_half_to_float(((npy_half*)PyArray_DATA(%(_a)s))[0])
+        : (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
         ? (REAL)(((float*)PyArray_DATA(%(_a)s))[0])
         : (REAL)(((double*)PyArray_DATA(%(_a)s))[0]);
-        double b = (PyArray_DESCR(%(_b)s)->type_num == NPY_FLOAT) ?
+        double b = (PyArray_DESCR(%(_b)s)->type_num == NPY_HALF)
+        ? (REAL)theano_half_to_float(((npy_half*)PyArray_DATA(%(_b)s))[0])
+        : (PyArray_DESCR(%(_b)s)->type_num == NPY_FLOAT) ?
         (REAL)(((float*)PyArray_DATA(%(_b)s))[0])
         : (REAL)(((double*)PyArray_DATA(%(_b)s))[0]);
         #undef REAL
@@ -1661,6 +1806,9 @@ def local_gemm_to_gemv(node):
     """GEMM acting on row or column matrices -> GEMV."""
     if node.op == gemm_no_inplace:
         z, a, x, y, b = node.inputs
+        # Gemv and Ger have no float16 implementation, Gemm does.
+        if z.dtype == 'float16':
+            return
         if z.broadcastable == x.broadcastable == (True, False):
             r = gemv_no_inplace(z.dimshuffle(1), a, y.T, x.dimshuffle(1), b)
             return [r.dimshuffle('x', 0)]
@@ -1674,6 +1822,9 @@ def local_gemm_to_ger(node):
     """GEMM computing an outer-product -> GER."""
     if node.op == gemm_no_inplace:
         z, a, x, y, b = node.inputs
+        # Gemv and Ger have no float16 implementation, Gemm does.
+        if z.dtype == 'float16':
+            return
         if x.broadcastable[1] and y.broadcastable[0]:
             # x and y are both vectors so this might qualifies for a GER
             xv = x.dimshuffle(0)
@@ -1704,6 +1855,9 @@ def local_dot22_to_ger_or_gemv(node):
     """dot22 computing an outer-product -> GER."""
     if node.op == _dot22:
         x, y = node.inputs
+        # Gemv and Ger have no float16 implementation, Gemm does.
+        if x.dtype == 'float16':
+            return
         xb = x.broadcastable
         yb = y.broadcastable
         one = T.as_tensor_variable(numpy.asarray(1, dtype=x.dtype))
@@ -1826,14 +1980,17 @@ class Dot22Scalar(GemmRelated):
 
     check_ab_double_or_float = """
         if ((PyArray_DESCR(%(_a)s)->type_num != NPY_DOUBLE)
-            && (PyArray_DESCR(%(_a)s)->type_num != NPY_FLOAT))
+            && (PyArray_DESCR(%(_a)s)->type_num != NPY_FLOAT)
+            && (PyArray_DESCR(%(_a)s)->type_num != NPY_HALF))
         {PyErr_SetString(PyExc_NotImplementedError,
-                         "type(a) is not double or float"); %(fail)s;}
+                         "type(a) is not double, float or half"); %(fail)s;}
 
         """
     case_float_ab_constants = """
         #define REAL float
-        float a = (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
+        float a = (PyArray_DESCR(%(_a)s)->type_num == NPY_HALF)
+        ? (REAL)theano_half_to_float(((npy_half*)PyArray_DATA(%(_a)s))[0])
+        : (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
         ? (REAL)(((float*)PyArray_DATA(%(_a)s))[0])
         : (REAL)(((double*)PyArray_DATA(%(_a)s))[0]);
         #undef REAL
@@ -1842,7 +1999,9 @@ class Dot22Scalar(GemmRelated):
 
     case_double_ab_constants = """
         #define REAL double
-        double a = (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
+        double a = (PyArray_DESCR(%(_a)s)->type_num == NPY_HALF)
+        ? (REAL)theano_half_to_float(((npy_half*)PyArray_DATA(%(_a)s))[0])
+        : (PyArray_DESCR(%(_a)s)->type_num == NPY_FLOAT)
         ? (REAL)(((float*)PyArray_DATA(%(_a)s))[0])
         : (REAL)(((double*)PyArray_DATA(%(_a)s))[0]);
         #undef REAL
@@ -17,6 +17,8 @@ from theano.printing import pprint
 from theano.gradient import DisconnectedType
 from theano.gof.null_type import NullType
 from theano.tensor import elemwise_cgen as cgen
+from theano.tensor.fp16_help import (composite_float32, half_support_code,
+                                     load_w, work_dtype, write_w)
 from theano.misc.frozendict import frozendict
 config = theano.config
 
@@ -44,6 +46,37 @@ def TensorConstant(*inputs, **kwargs):
                     "prevent using this here. import tensor before elemwise")
 
 
+def _uses_float16(variables, scalar_op):
+    # This is for Composite
+    return (any(v.type.dtype == 'float16' for v in variables) or
+            getattr(scalar_op, 'inner_float16', False))
+
+
+def _float32_scalar_node(scalar_op, inputs, outputs):
+    """
+    Return the node of `scalar_op` on scalars of the dtypes of the tensors
+    `inputs`, but float32 instead of float16.
+
+    The C code stores the float16 values as half precision, but computes on
+    them in float32, with this node. Raise MethodNotDefined if its outputs
+    don't have the dtypes of the tensors `outputs`, with float32 instead of
+    float16.
+
+    """
+    if isinstance(scalar_op, scalar.Composite):
+        scalar_op = composite_float32(scalar_op)
+    elif isinstance(scalar_op, scalar.Cast):
+        scalar_op = scalar_op.clone_float32()
+    s_node = scalar_op.make_node(
+        *[get_scalar_type(dtype=work_dtype(i.type.dtype)).make_variable()
+          for i in inputs])
+    if ([o.type.dtype for o in s_node.outputs] !=
+            [work_dtype(o.type.dtype) for o in outputs]):
+        raise theano.gof.utils.MethodNotDefined(
+            "float16 output not computed in float32")
+    return s_node
+
+
 ##################
 #   DimShuffle   #
 ##################
@@ -472,6 +505,7 @@ second dimension
     """
 
     __props__ = ("scalar_op", "inplace_pattern")
+    _f16_ok = True
 
     def __init__(self, scalar_op, inplace_pattern=None, name=None,
                  nfunc_spec=None, openmp=None):
@@ -1053,12 +1087,7 @@ second dimension
         # the index of the last of these aliased outputs.
 
         # We generate the C code of the inner loop using the scalar op
-        task_code = self.scalar_op.c_code(
-            node.tag.fake_node,
-            nodename + '_scalar_',
-            ["%s_i" % s for s in _inames],
-            ["%s_i" % s for s in onames],
-            sub)
+        task_code = self._c_task_code(node, nodename, _inames, onames, sub)
         code = """
         {
             %(defines)s
@@ -1145,34 +1174,8 @@ second dimension
                 if all([io.broadcastable == node.outputs[0].broadcastable or
                         all(io.broadcastable)
                         for io in node.inputs + node.outputs]):
-                    z = onames[0]
-                    contig = """
-                    // All output have the same size
-                    npy_intp n = PyArray_SIZE(%(z)s);
-                    """ % locals()
-                    index = ""
-                    for x, var in zip(inames + onames,
-                                      inputs + node.outputs):
-                        if not all(var.broadcastable):
-                            contig += """
-            dtype_%(x)s * %(x)s_ptr = (dtype_%(x)s*) PyArray_DATA(%(x)s);
-                            """ % locals()
-                            index += """
-            dtype_%(x)s& %(x)s_i = %(x)s_ptr[i];
-                            """ % locals()
-                        else:
-                            contig += """
-            dtype_%(x)s& %(x)s_i = ((dtype_%(x)s*) PyArray_DATA(%(x)s))[0];
-                            """ % locals()
-                    if self.openmp:
-                        contig += """#pragma omp parallel for if(n>=%d)
-                        """ % (config.openmp_elemwise_minsize)
-                    contig += """
-                    for(int i=0; i<n; i++){
-                        %(index)s
-                        %(task_code)s;
-                    }
-                    """ % locals()
+                    contig = self._c_contiguous_loop(
+                        node, inames, inputs, onames, task_code)
             if contig is not None:
                 z = list(zip(inames + onames, inputs + node.outputs))
                 cond1 = ' && '.join(["PyArray_ISCONTIGUOUS(%s)" % arr
@@ -1190,13 +1193,115 @@ second dimension
             """ % locals()
         return decl, checks, alloc, loop
 
+    def _c_scalar_node(self, node):
+        """
+        Return the node of the scalar op whose C code computes the elements.
+
+        It computes in float32 the elements of the float16 inputs and
+        outputs.
+
+        """
+        if _uses_float16(node.inputs + node.outputs, self.scalar_op):
+            return _float32_scalar_node(self.scalar_op, node.inputs,
+                                        node.outputs)
+        return Apply(
+            self.scalar_op,
+            [get_scalar_type(dtype=input.type.dtype).make_variable()
+             for input in node.inputs],
+            [get_scalar_type(dtype=output.type.dtype).make_variable()
+             for output in node.outputs])
+
+    def _c_task_code(self, node, nodename, inames, onames, sub):
+        """
+        Return the C code computing the elements ``<oname>_i`` of the outputs
+        from the elements ``<iname>_i`` of the inputs.
+
+        The elements of the float16 inputs and outputs are converted from and
+        to float32 variables ``<name>_i_w``, on which the scalar op computes.
+
+        """
+        s_node = self._c_scalar_node(node)
+        load = ""
+        store = ""
+        s_inames = []
+        for iname, input in izip(inames, node.inputs):
+            iname += '_i'
+            if input.type.dtype == 'float16':
+                if iname + '_w' not in s_inames:
+                    load += "npy_float32 %s_w = %s(%s);\n" % (
+                        iname, load_w('float16'), iname)
+                iname += '_w'
+            s_inames.append(iname)
+        s_onames = []
+        for oname, output in izip(onames, node.outputs):
+            oname += '_i'
+            if output.type.dtype == 'float16':
+                load += "npy_float32 %s_w;\n" % oname
+                store += "%s = %s(%s_w);\n" % (oname, write_w('float16'),
+                                                oname)
+                oname += '_w'
+            s_onames.append(oname)
+        task_code = s_node.op.c_code(s_node, nodename + '_scalar_',
+                                     s_inames, s_onames, sub)
+        return load + task_code + store
+
+    def _c_contiguous_loop(self, node, inames, inputs, onames, task_code):
+        """
+        Return the C code of the loop over contiguous inputs and outputs.
+
+        All the arrays that aren't broadcasted scalars have the same shape
+        and are all C or all F contiguous, so they are walked with one flat
+        index. The pointers are declared ``__restrict__`` and the scalars
+        are read once before the loop, so the compiler can vectorize it.
+        With OpenMP 4, the parallel loop also gets a ``simd`` hint.
+
+        """
+        # An output computed inplace goes through the pointer of the input
+        # it overwrites, so that the restrict pointers don't alias.
+        aliased = dict((onames[o], inames[inputs.index(node.inputs[i])])
+                       for o, i in iteritems(self.inplace_pattern))
+        z = onames[0]
+        contig = """
+        // All output have the same size
+        npy_intp n = PyArray_SIZE(%(z)s);
+        """ % locals()
+        index = ""
+        for x, var in zip(inames + onames, inputs + node.outputs):
+            if x in aliased:
+                ptr = "%s_ptr" % aliased[x]
+                index += """
+            dtype_%(x)s& %(x)s_i = %(ptr)s[i];
+                """ % locals()
+            elif not all(var.broadcastable):
+                contig += """
+        dtype_%(x)s * __restrict__ %(x)s_ptr =
+            (dtype_%(x)s*) PyArray_DATA(%(x)s);
+                """ % locals()
+                index += """
+            dtype_%(x)s& %(x)s_i = %(x)s_ptr[i];
+                """ % locals()
+            else:
+                contig += """
+        dtype_%(x)s %(x)s_i = ((dtype_%(x)s*) PyArray_DATA(%(x)s))[0];
+                """ % locals()
+        if self.openmp:
+            minsize = config.openmp_elemwise_minsize
+            contig += """
+        #if _OPENMP >= 201307
+        #pragma omp parallel for simd if(n>=%(minsize)d)
+        #else
+        #pragma omp parallel for if(n>=%(minsize)d)
+        #endif
+            """ % locals()
+        contig += """
+        for(npy_intp i=0; i<n; i++){
+            %(index)s
+            %(task_code)s;
+        }
+        """ % locals()
+        return contig
+
     def c_code(self, node, nodename, inames, onames, sub):
-        if (any(i.dtype == 'float16' for i in node.inputs) or
-                any(o.dtype == 'float16' for o in node.outputs) or
-                # This is for Composite
-                getattr(self.scalar_op, 'inner_float16', False)):
-            # Disable C code for float16 vars
-            super(Elemwise, self).c_code(node, nodename, inames, onames, sub)
         code = "\n".join(self._c_all(node, nodename, inames, onames, sub))
         return code
 
@@ -1207,21 +1312,25 @@ second dimension
         return self.scalar_op.c_support_code()
 
     def c_support_code_apply(self, node, nodename):
-        support_code = self.scalar_op.c_support_code_apply(node, nodename +
-                                                           '_scalar_')
-        return support_code
+        scalar_op = self._c_scalar_node(node).op
+        if not _uses_float16(node.inputs + node.outputs, self.scalar_op):
+            return scalar_op.c_support_code_apply(node, nodename + '_scalar_')
+        try:
+            support_code = scalar_op.c_support_code_apply(node, nodename +
+                                                          '_scalar_')
+        except theano.gof.utils.MethodNotDefined:
+            support_code = ""
+        return support_code + half_support_code
 
     def c_code_cache_version_apply(self, node):
-        version = [12]  # the version corresponding to the c code in this Op
+        version = [14]  # the version corresponding to the c code in this Op
 
         # now we insert versions for the ops on which we depend...
-        scalar_node = Apply(
-            self.scalar_op,
-            [get_scalar_type(dtype=input.type.dtype).make_variable()
-             for input in node.inputs],
-            [get_scalar_type(dtype=output.type.dtype).make_variable()
-             for output in node.outputs])
-        version.append(self.scalar_op.c_code_cache_version_apply(scalar_node))
+        try:
+            scalar_node = self._c_scalar_node(node)
+        except theano.gof.utils.MethodNotDefined:
+            return ()
+        version.append(scalar_node.op.c_code_cache_version_apply(scalar_node))
         for i in node.inputs + node.outputs:
             version.append(
                 get_scalar_type(dtype=i.type.dtype).c_code_cache_version())
@@ -1244,7 +1353,7 @@ second dimension
 #   CAReduce   #
 ################
 
-class CAReduce(Op):
+class CAReduce(OpenMPOp):
     """
     CAReduce = Commutative Associative Reduce
     Reduces a scalar operation along the specified axis(es).
@@ -1286,11 +1395,18 @@ class CAReduce(Op):
     and associative (eg add, multiply, maximum, binary or/and/xor - but not
     subtract, divide or power).
 
+    When the reduced axes are consecutive and the input is C contiguous,
+    the C code reduces contiguous runs of the input, in inner loops the
+    compiler can vectorize. With OpenMP, a full reduction is then split in
+    chunks whose partial results are combined at the end, and a partial
+    reduction is parallel over the kept axes.
+
     """
 
     __props__ = ("scalar_op", "axis")
+    _f16_ok = True
 
-    def __init__(self, scalar_op, axis=None):
+    def __init__(self, scalar_op, axis=None, openmp=None):
         if scalar_op.nin not in [-1, 2] or scalar_op.nout != 1:
             raise NotImplementedError((
                 "CAReduce only supports binary functions with a single "
@@ -1312,6 +1428,7 @@ class CAReduce(Op):
             self.axis = tuple(self.axis)
 
         self.set_ufunc(scalar_op)
+        super(CAReduce, self).__init__(openmp=openmp)
 
     def set_ufunc(self, scalar_op):
         # This is probably a speed up of the implementation
@@ -1377,7 +1494,7 @@ class CAReduce(Op):
         return d
 
     def __setstate__(self, d):
-        self.__dict__.update(d)
+        super(CAReduce, self).__setstate__(d)
         self.set_ufunc(self.scalar_op)
 
     def __str__(self):
@@ -1443,7 +1560,19 @@ class CAReduce(Op):
                 for (i, b) in enumerate(node.inputs[0].type.broadcastable)
                 if i not in axis],
 
-    def _c_all(self, node, name, inames, onames, sub):
+    def _c_all(self, node, name, inames, onames, sub, pre_node=None,
+               openmp=None):
+        """
+        Return the pieces of the C code of the reduction.
+
+        If `pre_node` is given, it is the node of a scalar op applied
+        elementwise to the inputs of `node` (which are broadcasted
+        together), whose output is reduced, as done by ElemwiseCAReduce.
+        Otherwise, `node` has only one input, which is reduced.
+
+        """
+        if openmp is None:
+            openmp = self.openmp
 
         input = node.inputs[0]
         output = node.outputs[0]
@@ -1453,6 +1582,14 @@ class CAReduce(Op):
 
         idtype = input.type.dtype_specs()[1]
         odtype = output.type.dtype_specs()[1]
+        idtypes = [i.type.dtype_specs()[1] for i in node.inputs]
+
+        # The dtype of the reduced values, float16 values being reduced in
+        # float32.
+        if pre_node is None:
+            vdtype = work_dtype(input.type.dtype)
+        else:
+            vdtype = pre_node.outputs[0].type.dtype
 
         if hasattr(self, 'acc_dtype') and self.acc_dtype is not None:
             if self.acc_dtype == 'float16':
@@ -1462,6 +1599,11 @@ class CAReduce(Op):
                 broadcastable=node.outputs[0].broadcastable,
                 dtype=self.acc_dtype)
             adtype = acc_type.dtype_specs()[1]
+        elif output.type.dtype == 'float16':
+            acc_type = TensorType(
+                broadcastable=node.outputs[0].broadcastable,
+                dtype='float32')
+            adtype = acc_type.dtype_specs()[1]
         else:
             adtype = odtype
 
@@ -1470,6 +1612,9 @@ class CAReduce(Op):
             axis = list(range(len(input.type.broadcastable)))
 
         if len(axis) == 0:
+            if pre_node is not None:
+                raise theano.gof.utils.MethodNotDefined(
+                    "no c_code when no axis is reduced")
             # The acc_dtype is never a downcast compared to the input dtype
             # So we just need a cast to the output dtype.
             var = theano.tensor.cast(input, node.outputs[0].dtype)
@@ -1483,6 +1628,13 @@ class CAReduce(Op):
 
         nnested = len(order1)
 
+        if pre_node is None:
+            orders = [order]
+        else:
+            # Don't loop over the broadcasted dimensions of each input.
+            orders = [[('x' if i.type.broadcastable[d] else d) for d in order]
+                      for i in node.inputs]
+
         sub = dict(sub)
         for i, (input, iname) in enumerate(izip(node.inputs, inames)):
             sub['lv%i' % i] = iname
@@ -1497,8 +1649,8 @@ class CAReduce(Op):
             # the output is the accumulator variable
             aname = oname
 
-        decl += cgen.make_declare([order], [idtype], sub)
-        checks = cgen.make_checks([order], [idtype], sub)
+        decl += cgen.make_declare(orders, idtypes, sub)
+        checks = cgen.make_checks(orders, idtypes, sub)
 
         alloc = ""
         i += 1
@@ -1509,7 +1661,7 @@ class CAReduce(Op):
         alloc += cgen.make_declare(
             [list(range(nnested)) + ['x'] * len(axis)],
             [odtype], dict(sub, lv0=oname))
-        alloc += cgen.make_alloc([order1], odtype, sub)
+        alloc += cgen.make_alloc([o[:nnested] for o in orders], odtype, sub)
         alloc += cgen.make_checks(
             [list(range(nnested)) + ['x'] * len(axis)],
             [odtype], dict(sub, lv0=oname))
@@ -1522,7 +1674,8 @@ class CAReduce(Op):
             alloc += cgen.make_declare(
                 [list(range(nnested)) + ['x'] * len(axis)],
                 [adtype], dict(sub, lv0=aname))
-            alloc += cgen.make_alloc([order1], adtype, sub)
+            alloc += cgen.make_alloc([o[:nnested] for o in orders], adtype,
+                                     sub)
             alloc += cgen.make_checks(
                 [list(range(nnested)) + ['x'] * len(axis)],
                 [adtype], dict(sub, lv0=aname))
@@ -1532,19 +1685,19 @@ class CAReduce(Op):
         elif self.scalar_op in [scalar.maximum, scalar.minimum]:
             if self.scalar_op == scalar.maximum:
                 scal_name = 'maximum'
-                if input.type.dtype in ["float32", "float64"]:
+                if vdtype in ["float32", "float64"]:
                     identity = "-__builtin_inf()"
-                elif input.type.dtype.startswith("uint"):
+                elif vdtype.startswith("uint"):
                     # numpy does not define NPY_MIN_UINT*
                     identity = "0"
                 else:
-                    identity = "NPY_MIN_" + str(input.type.dtype).upper()
+                    identity = "NPY_MIN_" + str(vdtype).upper()
             if self.scalar_op == scalar.minimum:
                 scal_name = 'minimum'
-                if input.type.dtype in ["float32", "float64"]:
+                if vdtype in ["float32", "float64"]:
                     identity = "__builtin_inf()"
                 else:
-                    identity = "NPY_MAX_" + str(input.type.dtype).upper()
+                    identity = "NPY_MAX_" + str(vdtype).upper()
             fail = sub["fail"]
             pattern = [0] * len(node.inputs[0].broadcastable)
             axis = self.axis
@@ -1554,7 +1707,8 @@ class CAReduce(Op):
                 pattern[i] = 1
             pattern_ = str(pattern)[1:-1]
             decl += """int tosum[]={%(pattern_)s};""" % locals()
-            alloc += """
+            for iname in inames:
+                alloc += """
 for(int i=0;i<PyArray_NDIM(%(iname)s);i++){
   if(PyArray_DIMS(%(iname)s)[i]==0 && tosum[i]){
     PyErr_Format(PyExc_ValueError,
@@ -1571,17 +1725,38 @@ for(int i=0;i<PyArray_NDIM(%(iname)s);i++){
                       "%(name)s_i = %(identity)s;"
                       % dict(dtype=adtype, name=aname, identity=identity))
 
-        task1_decl = ("%(dtype)s& %(name)s_i = *%(name)s_iter;\n"
-                      % dict(dtype=idtype, name=inames[0]))
+        task1_decl = "".join("%(dtype)s& %(name)s_i = *%(name)s_iter;\n"
+                             % dict(dtype=dtype, name=iname)
+                             for dtype, iname in izip(idtypes, inames))
+        # The values of the float16 inputs, converted to float32.
+        values = []
+        for input, iname in izip(node.inputs, inames):
+            value = "%s_i" % iname
+            if input.type.dtype == 'float16':
+                if value + '_w' not in values:
+                    task1_decl += "npy_float32 %s_w = %s(%s);\n" % (
+                        value, load_w('float16'), value)
+                value += '_w'
+            values.append(value)
+        if pre_node is None:
+            value = values[0]
+        else:
+            # Compute the value to reduce from the values of the inputs.
+            value = "%s_value_i" % aname
+            task1_decl += "%s %s;\n" % (
+                get_scalar_type(dtype=vdtype).dtype_specs()[1], value)
+            task1_decl += pre_node.op.c_code(
+                pre_node, name + '_scalar_', values, [value], sub)
 
         task1_code = self.scalar_op.c_code(
             Apply(self.scalar_op,
-                  [get_scalar_type(dtype=iv.type.dtype).make_variable()
-                   for iv in (node.inputs * 2)],
-                  [get_scalar_type(dtype=ov.type.dtype).make_variable()
+                  [get_scalar_type(dtype=vdtype).make_variable()
+                   for _ in range(2)],
+                  [get_scalar_type(dtype=work_dtype(ov.type.dtype))
+                   .make_variable()
                    for ov in node.outputs]),
             None,
-            ["%s_i" % aname, "%s_i" % inames[0]],
+            ["%s_i" % aname, value],
             ["%s_i" % aname],
             sub)
         code1 = """
@@ -1602,8 +1777,34 @@ for(int i=0;i<PyArray_NDIM(%(iname)s);i++){
         else:
             all_code = [task0_decl + code1]
         loop = cgen.make_loop_careduce(
-            [order, list(range(nnested)) + ['x'] * len(axis)],
-            [idtype, adtype], all_code, sub)
+            orders + [list(range(nnested)) + ['x'] * len(axis)],
+            idtypes + [adtype], all_code, sub)
+
+        # The reduced axes of a C contiguous input are then in one run of
+        # the data, between the kept axes before and after them. For a full
+        # reduction, the order of the data doesn't matter. Several inputs
+        # must have the same shape.
+        axis = sorted(axis)
+        bcast = node.inputs[0].type.broadcastable
+        if (axis == list(range(axis[0], axis[-1] + 1)) and
+                all(i.type.broadcastable == bcast for i in node.inputs)):
+            contiguous = " && ".join("PyArray_IS_C_CONTIGUOUS(%s)" % iname
+                                     for iname in inames)
+            if nnested == 0:
+                contiguous = "((%s) || (%s))" % (
+                    contiguous,
+                    " && ".join("PyArray_IS_F_CONTIGUOUS(%s)" % iname
+                                for iname in inames))
+            fast_loop = self._c_contiguous_loop(
+                node, name, axis, inames, aname, adtype, identity, sub,
+                pre_node, openmp)
+            loop = """
+            if (%(contiguous)s && PyArray_IS_C_CONTIGUOUS(%(aname)s)) {
+                %(fast_loop)s
+            }
+            else %(loop)s
+            """ % dict(contiguous=contiguous, aname=aname,
+                       fast_loop=fast_loop, loop=loop)
 
         end = ""
         if adtype != odtype:
@@ -1614,16 +1815,211 @@ for(int i=0;i<PyArray_NDIM(%(iname)s);i++){
 
         return decl, checks, alloc, loop, end
 
+    def _c_contiguous_loop(self, node, name, axis, inames, aname, adtype,
+                           identity, sub, pre_node=None, openmp=None):
+        """
+        Return the C code of the reduction of C contiguous inputs.
+
+        The inputs are seen as arrays of shape (n_before, n_reduced, n_after)
+        and the accumulator as a C contiguous array of shape (n_before,
+        n_after). When n_after is 1, each value of the accumulator is the
+        reduction of a contiguous run of the inputs, which is done in
+        `n_lanes` independent accumulators, so that the compiler can
+        vectorize it. Otherwise, the inputs are read by rows of n_after
+        values, which are accumulated by blocks of the accumulator. Large
+        runs are split in chunks to reduce them in parallel.
+
+        """
+        def scalar_code(x_dtype, x, y_dtype, y, z):
+            return self.scalar_op.c_code(
+                Apply(self.scalar_op,
+                      [get_scalar_type(dtype=x_dtype).make_variable(),
+                       get_scalar_type(dtype=y_dtype).make_variable()],
+                      [get_scalar_type(dtype=x_dtype).make_variable()]),
+                None, [x, y], [z], sub)
+
+        idtypes = [i.type.dtype_specs()[1] for i in node.inputs]
+        # The float16 values are loaded in float32.
+        wctypes = [get_scalar_type(dtype=work_dtype(i.dtype)).dtype_specs()[1]
+                   for i in node.inputs]
+        loads = [load_w(i.dtype) for i in node.inputs]
+        if pre_node is None:
+            vdtype = work_dtype(node.inputs[0].dtype)
+        else:
+            vdtype = pre_node.outputs[0].type.dtype
+        vctype = get_scalar_type(dtype=vdtype).dtype_specs()[1]
+        acc_dtype = getattr(self, 'acc_dtype', None)
+        if acc_dtype is None:
+            acc_dtype = work_dtype(node.outputs[0].dtype)
+        # Accumulate one value.
+        step = scalar_code(acc_dtype, 'acc_v', vdtype, 'in_v', 'acc_v')
+        # Combine two accumulators.
+        combine = scalar_code(acc_dtype, 'acc_v', acc_dtype, 'in_v', 'acc_v')
+
+        def load(index):
+            # Declare in_v, the value at the given index of the sources.
+            code = "".join("const %s in%d_v = %s(src%d[%s]);\n" % (
+                wctypes[k], k, loads[k], k, index)
+                for k in range(len(idtypes)))
+            if pre_node is None:
+                return code + "const %s in_v = in0_v;\n" % vctype
+            return code + "%s in_v;\n%s\n" % (vctype, pre_node.op.c_code(
+                pre_node, name + '_scalar_',
+                ["in%d_v" % k for k in range(len(idtypes))], ["in_v"], sub))
+
+        def sources(offset):
+            return "".join(
+                "const %s* __restrict__ src%d = in_data%d + %s;\n" % (
+                    dtype, k, k, offset) for k, dtype in enumerate(idtypes))
+
+        if openmp is None:
+            openmp = self.openmp
+        if openmp:
+            minsize = theano.config.openmp_elemwise_minsize
+            omp_rows = ("#pragma omp parallel for "
+                        "if(n_before * n_reduced >= %d)" % minsize)
+            omp_chunks = ("#pragma omp parallel for "
+                          "if(n_reduced >= %d)" % minsize)
+            omp_blocks = ("#pragma omp parallel for "
+                          "if(n_before * n_reduced * n_after >= %d)" %
+                          minsize)
+        else:
+            omp_rows = omp_chunks = omp_blocks = ""
+
+        in_data = "".join(
+            "const %s* in_data%d = (%s*)PyArray_DATA(%s);\n" % (
+                dtype, k, dtype, iname)
+            for k, (dtype, iname) in enumerate(zip(idtypes, inames)))
+        # Reduce the run_n values from run_start into *run_dst.
+        reduce_run = """
+        {
+            %(run_sources)s
+            const npy_intp n = run_n;
+            %(adtype)s lanes[n_lanes];
+            for (int l = 0; l < n_lanes; ++l) {
+                lanes[l] = %(identity)s;
+            }
+            npy_intp i = 0;
+            for (; i + n_lanes <= n; i += n_lanes) {
+                for (int l = 0; l < n_lanes; ++l) {
+                    %(adtype)s acc_v = lanes[l];
+                    %(load_lane)s
+                    %(step)s
+                    lanes[l] = acc_v;
+                }
+            }
+            for (; i < n; ++i) {
+                %(adtype)s acc_v = lanes[0];
+                %(load_tail)s
+                %(step)s
+                lanes[0] = acc_v;
+            }
+            %(adtype)s acc_v = lanes[0];
+            for (int l = 1; l < n_lanes; ++l) {
+                const %(adtype)s in_v = lanes[l];
+                %(combine)s
+            }
+            *run_dst = acc_v;
+        }
+        """ % dict(locals(), run_sources=sources("run_start"),
+                   load_lane=load("i + l"), load_tail=load("i"))
+        block_sources = sources("(b * n_reduced + r) * n_after + start")
+        load_block = load("j")
+        iname = inames[0]
+        first = axis[0]
+        last = axis[-1]
+        return """
+        {
+            const int n_lanes = 8;
+            const npy_intp chunk_size = 65536;
+            const npy_intp block_size = 1024;
+            const npy_intp* dims = PyArray_DIMS(%(iname)s);
+            npy_intp n_before = 1, n_reduced = 1, n_after = 1;
+            for (int d = 0; d < %(first)d; ++d) {
+                n_before *= dims[d];
+            }
+            for (int d = %(first)d; d <= %(last)d; ++d) {
+                n_reduced *= dims[d];
+            }
+            for (int d = %(last)d + 1; d < PyArray_NDIM(%(iname)s); ++d) {
+                n_after *= dims[d];
+            }
+            %(in_data)s
+            %(adtype)s* acc_data = (%(adtype)s*)PyArray_DATA(%(aname)s);
+
+            if (n_after == 1 && n_before == 1 && n_reduced > chunk_size) {
+                // Full reduction: the partial results of the chunks are
+                // combined in order, whatever the number of threads.
+                const npy_intp n_chunks = (n_reduced + chunk_size - 1) /
+                                          chunk_size;
+                std::vector<%(adtype)s> partial(n_chunks);
+                %(omp_chunks)s
+                for (npy_intp c = 0; c < n_chunks; ++c) {
+                    const npy_intp run_start = c * chunk_size;
+                    const npy_intp run_n = std::min(chunk_size,
+                                                    n_reduced - run_start);
+                    %(adtype)s* run_dst = &partial[c];
+                    %(reduce_run)s
+                }
+                %(adtype)s acc_v = partial[0];
+                for (npy_intp c = 1; c < n_chunks; ++c) {
+                    const %(adtype)s in_v = partial[c];
+                    %(combine)s
+                }
+                acc_data[0] = acc_v;
+            }
+            else if (n_after == 1) {
+                %(omp_rows)s
+                for (npy_intp b = 0; b < n_before; ++b) {
+                    const npy_intp run_start = b * n_reduced;
+                    const npy_intp run_n = n_reduced;
+                    %(adtype)s* run_dst = acc_data + b;
+                    %(reduce_run)s
+                }
+            }
+            else {
+                const npy_intp n_blocks = (n_after + block_size - 1) /
+                                          block_size;
+                %(omp_blocks)s
+                for (npy_intp task = 0; task < n_before * n_blocks; ++task) {
+                    const npy_intp b = task / n_blocks;
+                    const npy_intp start = (task %% n_blocks) * block_size;
+                    const npy_intp n = std::min(block_size, n_after - start);
+                    %(adtype)s* __restrict__ dst = (acc_data + b * n_after +
+                                                    start);
+                    for (npy_intp j = 0; j < n; ++j) {
+                        dst[j] = %(identity)s;
+                    }
+                    for (npy_intp r = 0; r < n_reduced; ++r) {
+                        %(block_sources)s
+                        for (npy_intp j = 0; j < n; ++j) {
+                            %(adtype)s acc_v = dst[j];
+                            %(load_block)s
+                            %(step)s
+                            dst[j] = acc_v;
+                        }
+                    }
+                }
+            }
+        }
+        """ % locals()
+
     def c_code(self, node, name, inames, onames, sub):
         code = "\n".join(self._c_all(node, name, inames, onames, sub))
         return code
 
     def c_headers(self):
         # Sometimes, Elemwise's c_code is returned, so we need its headers
-        return ['<vector>', '<algorithm>']
+        return (['<vector>', '<algorithm>'] +
+                super(CAReduce, self).c_headers())
+
+    def c_support_code_apply(self, node, name):
+        if _uses_float16(node.inputs + node.outputs, None):
+            return half_support_code
+        return super(CAReduce, self).c_support_code_apply(node, name)
 
     def c_code_cache_version_apply(self, node):
-        version = (6,)  # the version corresponding to the c code in this Op
+        version = [9]  # the version corresponding to the c code in this Op
 
         # now we insert versions for the ops on which we depend...
         scalar_node = Apply(
@@ -1636,6 +2032,7 @@ for(int i=0;i<PyArray_NDIM(%(iname)s);i++){
         for i in node.inputs + node.outputs:
             version.append(
                 get_scalar_type(dtype=i.type.dtype).c_code_cache_version())
+        version.append(('openmp', self.openmp))
         if all(version):
             return tuple(version)
         else:
@@ -2161,3 +2558,148 @@ class ProdWithoutZeros(CAReduceDtype):
             "If `a` is guarenteed to contains no zeros, use "
             "`product(a, no_zeros_in_input=True)`.")
         return [a_grad]
+
+
+########################
+#   ElemwiseCAReduce   #
+########################
+
+class ElemwiseCAReduce(OpenMPOp):
+    """
+    Reduce the output of an elementwise scalar op without storing it.
+
+    ``ElemwiseCAReduce(careduce, pre_scalar_op)(*inputs)`` computes
+    ``careduce(Elemwise(pre_scalar_op)(*inputs))``, like ``sum(x ** 2)`` or
+    ``max(abs(a - b))``, but its C code applies `pre_scalar_op` inside the
+    loop of the reduction, instead of writing the elementwise result to
+    memory and reading it back.
+
+    The optimization local_elemwise_careduce_fusion introduces it.
+
+    Parameters
+    ----------
+    careduce
+        The CAReduce op (Sum, Max, All, ...) applied to the output of the
+        elementwise op.
+    pre_scalar_op
+        A scalar op with one output, often a Composite.
+
+    """
+
+    __props__ = ("careduce", "pre_scalar_op")
+    _f16_ok = True
+
+    def __init__(self, careduce, pre_scalar_op, openmp=None):
+        if pre_scalar_op.nout != 1:
+            raise NotImplementedError(
+                "ElemwiseCAReduce only supports scalar ops with a single "
+                "output.")
+        self.careduce = careduce
+        self.pre_scalar_op = pre_scalar_op
+        super(ElemwiseCAReduce, self).__init__(openmp=openmp)
+
+    def __str__(self):
+        return "%s{pre=%s}" % (self.careduce, self.pre_scalar_op)
+
+    def _decompose(self, inputs):
+        # The elemwise and reduction nodes computing the same output.
+        elem_node = Elemwise(self.pre_scalar_op).make_node(*inputs)
+        red_node = self.careduce.make_node(elem_node.outputs[0])
+        return elem_node, red_node
+
+    def _scalar_node(self, node):
+        return self.pre_scalar_op.make_node(
+            *[get_scalar_type(dtype=i.type.dtype).make_variable()
+              for i in node.inputs])
+
+    def make_node(self, *inputs):
+        inputs = [as_tensor_variable(i) for i in inputs]
+        elem_node, red_node = self._decompose(inputs)
+        op = self
+        if red_node.op is not self.careduce:
+            # The reduction normalized its negative axes.
+            op = ElemwiseCAReduce(red_node.op, self.pre_scalar_op,
+                                  openmp=self.openmp)
+        return Apply(op, elem_node.inputs, [red_node.outputs[0].type()])
+
+    def prepare_node(self, node, storage_map, compute_map, impl):
+        super(ElemwiseCAReduce, self).prepare_node(
+            node, storage_map, compute_map, impl)
+        node.tag.fake_node = self._scalar_node(node)
+        self.pre_scalar_op.prepare_node(node.tag.fake_node, None, None, impl)
+        if impl == 'py':
+            elem_node, red_node = self._decompose(node.inputs)
+            elem_node.op.prepare_node(elem_node, None, None, impl)
+            node.tag.decomposed = elem_node, red_node
+
+    def perform(self, node, inputs, output_storage):
+        if not hasattr(node.tag, 'decomposed'):
+            self.prepare_node(node, None, None, 'py')
+        elem_node, red_node = node.tag.decomposed
+        value = [None]
+        elem_node.op.perform(elem_node, inputs, [value])
+        red_node.op.perform(red_node, value, output_storage)
+
+    def infer_shape(self, node, shapes):
+        elem_node, red_node = self._decompose(node.inputs)
+        elem_shapes = elem_node.op.infer_shape(elem_node, shapes)
+        return red_node.op.infer_shape(red_node, elem_shapes)
+
+    def grad(self, inputs, output_grads):
+        # The gradient of the same computation without the fusion.
+        output = self.careduce(Elemwise(self.pre_scalar_op)(*inputs))
+        return theano.gradient.grad(None, inputs,
+                                    known_grads={output: output_grads[0]},
+                                    disconnected_inputs='ignore',
+                                    return_disconnected='zero')
+
+    def _c_scalar_node(self, node):
+        # The node of pre_scalar_op whose C code computes the values to
+        # reduce, in float32 for the float16 values.
+        s_node = self._scalar_node(node)
+        if _uses_float16(node.inputs + node.outputs + s_node.outputs,
+                         self.pre_scalar_op):
+            s_node = _float32_scalar_node(self.pre_scalar_op, node.inputs,
+                                          s_node.outputs)
+        return s_node
+
+    def c_code(self, node, name, inames, onames, sub):
+        return "\n".join(self.careduce._c_all(
+            node, name, inames, onames, sub,
+            pre_node=self._c_scalar_node(node), openmp=self.openmp))
+
+    def c_headers(self):
+        return (['<vector>', '<algorithm>'] +
+                super(ElemwiseCAReduce, self).c_headers())
+
+    def c_support_code(self):
+        return self.pre_scalar_op.c_support_code()
+
+    def c_support_code_apply(self, node, nodename):
+        s_node = self._c_scalar_node(node)
+        if s_node.op is self.pre_scalar_op and not _uses_float16(
+                node.inputs + node.outputs, None):
+            return self.pre_scalar_op.c_support_code_apply(
+                node, nodename + '_scalar_')
+        try:
+            support_code = s_node.op.c_support_code_apply(
+                node, nodename + '_scalar_')
+        except theano.gof.utils.MethodNotDefined:
+            support_code = ""
+        return support_code + half_support_code
+
+    def c_code_cache_version_apply(self, node):
+        version = [2]  # the version corresponding to the c code in this Op
+
+        # now we insert versions for the ops on which we depend...
+        version.append(self.careduce.c_code_cache_version_apply(node))
+        try:
+            s_node = self._c_scalar_node(node)
+        except theano.gof.utils.MethodNotDefined:
+            return ()
+        version.append(s_node.op.c_code_cache_version_apply(s_node))
+        version.append(('openmp', self.openmp))
+        if all(version):
+            return tuple(version)
+        else:
+            return ()
@@ -9,6 +9,7 @@ from theano.tensor import nlinalg  # noqa
 from theano import gof, scalar
 from theano.gof import Generic
 from theano import gradient
+from theano.gof.opt import copy_stack_trace
 from theano.gradient import DisconnectedType, disconnected_type
 tensor = basic
 
@@ -20,6 +21,7 @@ class CpuContiguous(theano.Op):
     """
 
     __props__ = ()
+    _f16_ok = True
     view_map = {0: [0]}
 
     def make_node(self, x):
@@ -242,22 +244,35 @@ def searchsorted(x, v, side='left', sorter=None):
     return SearchsortedOp(side=side)(x, v, sorter)
 
 
-class CumOp(theano.Op):
+class CumOp(theano.gof.OpenMPOp):
     # See function cumsum/cumprod for docstring
 
-    __props__ = ("axis", "mode")
+    __props__ = ("axis", "mode", "inplace")
 
-    def __init__(self, axis=None, mode='add'):
+    def __init__(self, axis=None, mode='add', inplace=False, openmp=None):
+        super(CumOp, self).__init__(openmp=openmp)
         if mode not in ('add', 'mul'):
             raise ValueError('%s: Unknown mode "%s"' % (type(self).__name__, mode))
         self.axis = axis
         self.mode = mode
+        self.inplace = inplace
+        if inplace:
+            self.destroy_map = {0: [0]}
+
+    def __setstate__(self, d):
+        super(CumOp, self).__setstate__(d)
+        # If we unpickle an op from before the inplace version
+        if not hasattr(self, "inplace"):
+            self.inplace = False
 
     def make_node(self, x):
         x = basic.as_tensor_variable(x)
         out_type = x.type()
 
         if self.axis is None:
+            if self.inplace and x.ndim != 1:
+                raise ValueError('%s: can only work inplace on a vector when '
+                                 'axis is None' % type(self).__name__)
             out_type = theano.tensor.vector(dtype=x.dtype)  # Flatten
         elif self.axis >= x.ndim or self.axis < -x.ndim:
             raise ValueError('axis(={0}) out of bounds'.format(self.axis))
@@ -267,7 +282,11 @@ class CumOp(theano.Op):
     def perform(self, node, inputs, output_storage):
         x = inputs[0]
         z = output_storage[0]
-        z[0] = {'add': np.cumsum, 'mul': np.cumprod}[self.mode](x, axis=self.axis)
+        func = {'add': np.cumsum, 'mul': np.cumprod}[self.mode]
+        if self.inplace:
+            z[0] = func(x, axis=self.axis, out=x)
+        else:
+            z[0] = func(x, axis=self.axis)
 
     def grad(self, inputs, output_gradients):
         x, = inputs
@@ -313,22 +332,35 @@ class CumOp(theano.Op):
         axis = self.axis
         fail = sub['fail']
         func = dict(mul='CumProd', add='CumSum')[self.mode]
+        dtype = node.inputs[0].dtype
+        if dtype in tensor.integer_dtypes or dtype in ('float32', 'float64'):
+            return self._c_code_scan(node, x, z, fail)
 
+        if self.inplace:
+            # The output of numpy can overlap its input.
+            alloc = """
+                Py_XDECREF(%(z)s);
+                %(z)s = %(x)s;
+                Py_INCREF(%(z)s);
+            """ % locals()
         if self.axis is None or (self.axis == 0 and node.inputs[0].ndim == 1):
-            code = """
+            if not self.inplace:
+                alloc = """
                 npy_intp shape[1] = { PyArray_SIZE(%(x)s) };
                 if(!(%(z)s && PyArray_DIMS(%(z)s)[0] == shape[0]))
                 {
                     Py_XDECREF(%(z)s);
-                    %(z)s = (PyArrayObject*) PyArray_SimpleNew(1, shape, PyArray_TYPE((PyArrayObject*) py_%(x)s));
+                    %(z)s = (PyArrayObject*) PyArray_SimpleNew(1, shape, PyArray_TYPE(%(x)s));
                 }
-
+                """ % locals()
+            code = """
+                %(alloc)s
                 if (!%(z)s)
                     %(fail)s;
                 {
                     PyObject * t = PyArray_%(func)s(
                         %(x)s, NPY_MAXDIMS,
-                        PyArray_TYPE((PyArrayObject*) py_%(x)s), %(z)s);
+                        PyArray_TYPE(%(x)s), %(z)s);
                     if (!t){
                        %(fail)s;
                     }
@@ -337,20 +369,23 @@ class CumOp(theano.Op):
                 }
             """ % locals()
         else:
-            code = """
+            if not self.inplace:
+                alloc = """
                 if(!(%(z)s && PyArray_CompareLists(PyArray_DIMS(%(z)s), PyArray_DIMS(%(x)s), PyArray_NDIM(%(x)s))))
                 {
                     Py_XDECREF(%(z)s);
-                    %(z)s = (PyArrayObject*) PyArray_SimpleNew(PyArray_NDIM(%(x)s), PyArray_DIMS(%(x)s), PyArray_TYPE((PyArrayObject*) py_%(x)s));
+                    %(z)s = (PyArrayObject*) PyArray_SimpleNew(PyArray_NDIM(%(x)s), PyArray_DIMS(%(x)s), PyArray_TYPE(%(x)s));
                 }
-
+                """ % locals()
+            code = """
+                %(alloc)s
                 if (!%(z)s)
                     %(fail)s;
                 {
 
                     PyObject * t = PyArray_%(func)s(
                         %(x)s, %(axis)s,
-                        PyArray_TYPE((PyArrayObject*) py_%(x)s), %(z)s);
+                        PyArray_TYPE(%(x)s), %(z)s);
                     if (!t){
                        %(fail)s;
                     }
@@ -361,10 +396,192 @@ class CumOp(theano.Op):
 
         return code
 
+    def _c_code_scan(self, node, x, z, fail):
+        """
+        C code of the scan for the integer, float32 and float64 dtypes.
+
+        The input is seen as a C-contiguous array of shape
+        (outer, len, inner), scanned along the middle axis. When inner is 1,
+        each row is scanned with an accumulator. Otherwise, the rows of
+        `inner` elements are combined one after the other, which
+        vectorizes. With OpenMP, the threads split the independent scans.
+        When there are fewer rows than threads, a long row is scanned in
+        blocks: each thread reduces its block, then scans it again starting
+        from the total of the blocks before it.
+
+        """
+        ndim = node.inputs[0].ndim
+        if self.axis is None:
+            axis = 0
+            out_nd = 1
+        else:
+            axis = self.axis % ndim
+            out_nd = ndim
+        op = dict(add='+', mul='*')[self.mode]
+        identity = dict(add='0', mul='1')[self.mode]
+        inplace = int(self.inplace)
+        minsize = theano.config.openmp_elemwise_minsize
+        if self.axis is None:
+            shape = """
+        npy_intp out_dims[1] = {PyArray_SIZE(%(x)s)};
+        npy_intp outer = 1, len = out_dims[0], inner = 1;
+            """ % locals()
+        else:
+            shape = """
+        npy_intp* out_dims = PyArray_DIMS(%(x)s);
+        npy_intp outer = 1, len = out_dims[%(axis)d], inner = 1;
+        for (int d = 0; d < %(axis)d; ++d) {
+            outer *= out_dims[d];
+        }
+        for (int d = %(axis)d + 1; d < %(ndim)d; ++d) {
+            inner *= out_dims[d];
+        }
+            """ % locals()
+        if self.inplace:
+            alloc = """
+        Py_XDECREF(%(z)s);
+        %(z)s = %(x)s;
+        Py_INCREF(%(z)s);
+        // Scan in the input, or in a contiguous copy that is copied back.
+        PyArrayObject* dst = xc;
+            """ % locals()
+        else:
+            alloc = """
+        if (NULL == %(z)s || PyArray_NDIM(%(z)s) != %(out_nd)d ||
+            !PyArray_CompareLists(PyArray_DIMS(%(z)s), out_dims, %(out_nd)d) ||
+            !PyArray_IS_C_CONTIGUOUS(%(z)s)) {
+            Py_XDECREF(%(z)s);
+            %(z)s = (PyArrayObject*)PyArray_EMPTY(%(out_nd)d, out_dims,
+                                                   PyArray_TYPE(%(x)s), 0);
+            if (NULL == %(z)s) {
+                Py_DECREF(xc);
+                %(fail)s;
+            }
+        }
+        PyArrayObject* dst = %(z)s;
+            """ % locals()
+
+        scan_rows = """
+        for (npy_intp j = 0; j < n_jobs; ++j) {
+            npy_intp o = j / nb_chunks;
+            npy_intp c = j %% nb_chunks;
+            const dtype_%(x)s* sp = src + o * len * inner;
+            dtype_%(z)s* dp = out + o * len * inner;
+            if (inner == 1) {
+                dtype_%(z)s acc = %(identity)s;
+                for (npy_intp i = 0; i < len; ++i) {
+                    acc = acc %(op)s sp[i];
+                    dp[i] = acc;
+                }
+                continue;
+            }
+            npy_intp lo = inner * c / nb_chunks;
+            npy_intp hi = inner * (c + 1) / nb_chunks;
+            if (len > 0) {
+                for (npy_intp k = lo; k < hi; ++k) {
+                    dp[k] = sp[k];
+                }
+            }
+            for (npy_intp i = 1; i < len; ++i) {
+                const dtype_%(x)s* si = sp + i * inner;
+                dtype_%(z)s* di = dp + i * inner;
+                const dtype_%(z)s* prev = di - inner;
+                for (npy_intp k = lo; k < hi; ++k) {
+                    di[k] = prev[k] %(op)s si[k];
+                }
+            }
+        }
+        """ % locals()
+        if self.openmp:
+            scan = """
+        int nb_threads = omp_get_max_threads();
+        if (nb_threads > 1 && inner == 1 && outer < nb_threads &&
+            len >= %(minsize)d) {
+            dtype_%(z)s* partial = (dtype_%(z)s*)malloc(
+                nb_threads * sizeof(dtype_%(z)s));
+            if (NULL == partial) {
+                PyErr_NoMemory();
+                Py_DECREF(xc);
+                %(fail)s;
+            }
+            for (npy_intp o = 0; o < outer; ++o) {
+                const dtype_%(x)s* sp = src + o * len;
+                dtype_%(z)s* dp = out + o * len;
+                #pragma omp parallel
+                {
+                    int nb = omp_get_num_threads();
+                    int t = omp_get_thread_num();
+                    npy_intp lo = len * t / nb;
+                    npy_intp hi = len * (t + 1) / nb;
+                    dtype_%(z)s acc = %(identity)s;
+                    if (t < nb - 1) {
+                        for (npy_intp i = lo; i < hi; ++i) {
+                            acc = acc %(op)s sp[i];
+                        }
+                        partial[t] = acc;
+                    }
+                    #pragma omp barrier
+                    acc = %(identity)s;
+                    for (int k = 0; k < t; ++k) {
+                        acc = acc %(op)s partial[k];
+                    }
+                    for (npy_intp i = lo; i < hi; ++i) {
+                        acc = acc %(op)s sp[i];
+                        dp[i] = acc;
+                    }
+                }
+            }
+            free(partial);
+        }
+        else {
+            // Split the rows in slices of columns if there are not enough
+            // of them for all the threads.
+            npy_intp nb_chunks = 1;
+            if (inner > 1 && outer < nb_threads) {
+                nb_chunks = inner < nb_threads ? inner : nb_threads;
+            }
+            npy_intp n_jobs = outer * nb_chunks;
+            #pragma omp parallel for schedule(static) if(outer * len * inner >= %(minsize)d)
+            %(scan_rows)s
+        }
+            """ % locals()
+        else:
+            scan = """
+        {
+            npy_intp nb_chunks = 1;
+            npy_intp n_jobs = outer;
+            %(scan_rows)s
+        }
+            """ % locals()
+
+        return """
+        {
+        %(shape)s
+        PyArrayObject* xc = PyArray_GETCONTIGUOUS(%(x)s);
+        if (NULL == xc) {
+            %(fail)s;
+        }
+        %(alloc)s
+        const dtype_%(x)s* src = (const dtype_%(x)s*)PyArray_DATA(xc);
+        dtype_%(z)s* out = (dtype_%(z)s*)PyArray_DATA(dst);
+        %(scan)s
+        if (%(inplace)d && xc != %(x)s) {
+            if (PyArray_CopyInto(%(x)s, xc) < 0) {
+                Py_DECREF(xc);
+                %(fail)s;
+            }
+        }
+        Py_DECREF(xc);
+        }
+        """ % locals()
+
     def c_code_cache_version(self):
-        return (7,)
+        return (9, self.openmp)
 
     def __str__(self):
+        if self.inplace:
+            return "%s{%s, %s, inplace}" % (self.__class__.__name__,
+                                            self.axis, self.mode)
         return "%s{%s, %s}" % (self.__class__.__name__, self.axis, self.mode)
 
 
@@ -429,6 +646,27 @@ class CumprodOp(theano.Op):
         return obj
 
 
+@gof.local_optimizer([CumOp], inplace=True)
+def local_inplace_cumop(node):
+    """
+    Make cumsum and cumprod overwrite their input when it can be destroyed.
+
+    """
+    op = node.op
+    if (type(op) is CumOp and not op.inplace and
+            (op.axis is not None or node.inputs[0].ndim == 1)):
+        new_op = CumOp(op.axis, op.mode, inplace=True, openmp=op.openmp)
+        new_node = new_op(*node.inputs)
+        copy_stack_trace(node.outputs, new_node)
+        return [new_node]
+    return False
+theano.compile.optdb.register(
+    'local_inplace_cumop',
+    gof.TopoOptimizer(local_inplace_cumop,
+                      failure_callback=gof.TopoOptimizer.warn_inplace),
+    60, 'fast_run', 'inplace')
+
+
 class DiffOp(theano.Op):
     # See function diff for docstring
 
@@ -475,6 +713,89 @@ class DiffOp(theano.Op):
         out_shape[self.axis] = out_shape[self.axis] - self.n
         return [out_shape]
 
+    def c_code(self, node, name, inames, onames, sub):
+        x, = inames
+        z, = onames
+        fail = sub['fail']
+        dtype = node.inputs[0].dtype
+        ndim = node.inputs[0].ndim
+        if (self.n == 0 or not -ndim <= self.axis < ndim or
+                dtype in ('bool', 'float16') or dtype.startswith('complex')):
+            raise theano.gof.utils.MethodNotDefined()
+        axis = self.axis % ndim
+        n = self.n
+        # The input is processed by blocks x[i, :, ...] of contiguous rows
+        # along the axis, differenced in place in a buffer n times.
+        return """
+        {
+        PyArrayObject* xc = PyArray_GETCONTIGUOUS(%(x)s);
+        if (NULL == xc) {
+            %(fail)s;
+        }
+        npy_intp dims[%(ndim)d];
+        npy_intp outer = 1, inner = 1;
+        for (int d = 0; d < %(ndim)d; ++d) {
+            dims[d] = PyArray_DIMS(xc)[d];
+            if (d < %(axis)d)
+                outer *= dims[d];
+            else if (d > %(axis)d)
+                inner *= dims[d];
+        }
+        npy_intp len = dims[%(axis)d];
+        npy_intp out_len = len > %(n)d ? len - %(n)d : 0;
+        dims[%(axis)d] = out_len;
+        if (NULL == %(z)s || PyArray_NDIM(%(z)s) != %(ndim)d ||
+            !PyArray_CompareLists(PyArray_DIMS(%(z)s), dims, %(ndim)d) ||
+            !PyArray_IS_C_CONTIGUOUS(%(z)s)) {
+            Py_XDECREF(%(z)s);
+            %(z)s = (PyArrayObject*)PyArray_EMPTY(%(ndim)d, dims,
+                                                   PyArray_TYPE(xc), 0);
+            if (NULL == %(z)s) {
+                Py_DECREF(xc);
+                %(fail)s;
+            }
+        }
+        const dtype_%(x)s* src = (const dtype_%(x)s*)PyArray_DATA(xc);
+        dtype_%(z)s* dst = (dtype_%(z)s*)PyArray_DATA(%(z)s);
+        npy_intp block = len * inner;
+        npy_intp out_block = out_len * inner;
+        if (out_len > 0 && %(n)d == 1) {
+            for (npy_intp o = 0; o < outer; ++o) {
+                const dtype_%(x)s* s = src + o * block;
+                dtype_%(z)s* d = dst + o * out_block;
+                for (npy_intp i = 0; i < out_block; ++i) {
+                    d[i] = s[i + inner] - s[i];
+                }
+            }
+        }
+        else if (out_len > 0) {
+            dtype_%(x)s* buf = (dtype_%(x)s*)malloc(
+                block * sizeof(dtype_%(x)s));
+            if (NULL == buf) {
+                Py_DECREF(xc);
+                PyErr_NoMemory();
+                %(fail)s;
+            }
+            for (npy_intp o = 0; o < outer; ++o) {
+                memcpy(buf, src + o * block, block * sizeof(dtype_%(x)s));
+                for (npy_intp k = 1; k <= %(n)d; ++k) {
+                    npy_intp m = (len - k) * inner;
+                    for (npy_intp i = 0; i < m; ++i) {
+                        buf[i] = buf[i + inner] - buf[i];
+                    }
+                }
+                memcpy(dst + o * out_block, buf,
+                       out_block * sizeof(dtype_%(z)s));
+            }
+            free(buf);
+        }
+        Py_DECREF(xc);
+        }
+        """ % locals()
+
+    def c_code_cache_version(self):
+        return (1,)
+
 
 def diff(x, n=1, axis=-1):
     """Calculate the n-th order discrete difference along given axis.
@@ -501,6 +822,174 @@ def diff(x, n=1, axis=-1):
     return DiffOp(n=n, axis=axis)(x)
 
 
+class BinCountOp(theano.gof.OpenMPOp):
+    # See function bincount for docstring
+
+    __props__ = ()
+
+    def make_node(self, x, weights, minlength):
+        x = basic.as_tensor_variable(x)
+        if x.ndim != 1 or x.dtype not in tensor.integer_dtypes:
+            raise TypeError('%s: x must be a vector of integers'
+                            % self.__class__.__name__, x.type)
+        minlength = basic.cast(minlength, 'int64')
+        if minlength.ndim != 0:
+            raise TypeError('%s: minlength must be a scalar'
+                            % self.__class__.__name__)
+        if weights is None:
+            return theano.Apply(self, [x, minlength], [x.type()])
+        weights = basic.as_tensor_variable(weights)
+        if weights.ndim != 1:
+            raise TypeError('%s: weights must be a vector'
+                            % self.__class__.__name__)
+        return theano.Apply(self, [x, weights, minlength],
+                            [basic.TensorType(weights.dtype, (False,))()])
+
+    def perform(self, node, inputs, output_storage):
+        x = inputs[0]
+        weights = inputs[1] if len(inputs) == 3 else None
+        minlength = inputs[-1]
+        if x.size and x.min() < 0:
+            raise ValueError('bincount: input has negative values')
+        # numpy.bincount does not accept uint64.
+        z = np.bincount(x.astype('int64'), weights=weights,
+                        minlength=max(int(minlength), 0))
+        output_storage[0][0] = theano._asarray(z,
+                                               dtype=node.outputs[0].dtype)
+
+    def connection_pattern(self, node):
+        if len(node.inputs) == 2:
+            return [[False], [False]]
+        return [[False], [True], [False]]
+
+    def grad(self, inputs, output_grads):
+        if len(inputs) == 2:
+            return [DisconnectedType()(), DisconnectedType()()]
+        x, weights, minlength = inputs
+        gz, = output_grads
+        return [DisconnectedType()(),
+                theano.tensor.advanced_subtensor1(gz, x),
+                DisconnectedType()()]
+
+    def infer_shape(self, node, ins_shapes):
+        x = node.inputs[0]
+        minlength = node.inputs[-1]
+        return [(basic.maximum(basic.cast(basic.max(x) + 1, 'int64'),
+                               minlength),)]
+
+    def c_code(self, node, name, inames, onames, sub):
+        x = inames[0]
+        minlength = inames[-1]
+        z, = onames
+        fail = sub['fail']
+        dtype = node.outputs[0].dtype
+        if dtype == 'float16' or dtype.startswith('complex'):
+            raise theano.gof.utils.MethodNotDefined()
+        if len(inames) == 3:
+            weights = inames[1]
+            check_weights = """
+        if (PyArray_DIMS(%(weights)s)[0] != n) {
+            PyErr_SetString(PyExc_ValueError,
+                            "bincount: x and weights have different lengths");
+            %(fail)s;
+        }
+        const char* w_data = PyArray_BYTES(%(weights)s);
+        npy_intp w_step = PyArray_STRIDES(%(weights)s)[0];
+            """ % locals()
+            weight = '*(const dtype_%s*)(w_data + i * w_step)' % weights
+        else:
+            check_weights = ''
+            weight = '1'
+        if node.inputs[0].dtype.startswith('u'):
+            check_negative = ''
+        else:
+            check_negative = """
+            if (v < 0) {
+                PyErr_SetString(PyExc_ValueError,
+                                "bincount: input has negative values");
+                %(fail)s;
+            }
+            """ % locals()
+        count = """
+            bins[*(const dtype_%(x)s*)(x_data + i * x_step)] += %(weight)s;
+        """ % locals()
+        if self.openmp:
+            minsize = theano.config.openmp_elemwise_minsize
+            # Each thread counts in its own bins, added at the end.
+            parallel = """
+        int nb_threads = omp_get_max_threads();
+        dtype_%(z)s* thread_bins = NULL;
+        if (nb_threads > 1 && n >= %(minsize)d && nb_bins * nb_threads <= n) {
+            thread_bins = (dtype_%(z)s*)calloc((nb_threads - 1) * nb_bins,
+                                               sizeof(dtype_%(z)s));
+        }
+        if (thread_bins != NULL) {
+            dtype_%(z)s* out_bins = bins;
+            #pragma omp parallel
+            {
+                int t = omp_get_thread_num();
+                dtype_%(z)s* bins = (t == 0 ? out_bins :
+                                     thread_bins + (t - 1) * nb_bins);
+                #pragma omp for schedule(static)
+                for (npy_intp i = 0; i < n; ++i) {
+                    %(count)s
+                }
+            }
+            #pragma omp parallel for schedule(static)
+            for (npy_intp b = 0; b < nb_bins; ++b) {
+                for (int t = 1; t < nb_threads; ++t) {
+                    out_bins[b] += thread_bins[(t - 1) * nb_bins + b];
+                }
+            }
+            free(thread_bins);
+        }
+        else
+            """ % locals()
+        else:
+            parallel = ''
+        return """
+        {
+        npy_intp n = PyArray_DIMS(%(x)s)[0];
+        const char* x_data = PyArray_BYTES(%(x)s);
+        npy_intp x_step = PyArray_STRIDES(%(x)s)[0];
+        %(check_weights)s
+        npy_intp nb_bins = *(npy_int64*)PyArray_DATA(%(minlength)s);
+        if (nb_bins < 0) {
+            nb_bins = 0;
+        }
+        for (npy_intp i = 0; i < n; ++i) {
+            dtype_%(x)s v = *(const dtype_%(x)s*)(x_data + i * x_step);
+            %(check_negative)s
+            if (v >= nb_bins) {
+                nb_bins = (npy_intp)v + 1;
+            }
+        }
+        if (NULL == %(z)s || PyArray_DIMS(%(z)s)[0] != nb_bins ||
+            !PyArray_IS_C_CONTIGUOUS(%(z)s)) {
+            Py_XDECREF(%(z)s);
+            %(z)s = (PyArrayObject*)PyArray_ZEROS(1, &nb_bins,
+                                                   %(typenum)s, 0);
+            if (NULL == %(z)s) {
+                %(fail)s;
+            }
+        }
+        else {
+            memset(PyArray_DATA(%(z)s), 0, nb_bins * sizeof(dtype_%(z)s));
+        }
+        dtype_%(z)s* bins = (dtype_%(z)s*)PyArray_DATA(%(z)s);
+        %(parallel)s
+        {
+            for (npy_intp i = 0; i < n; ++i) {
+                %(count)s
+            }
+        }
+        }
+        """ % dict(locals(), typenum=node.outputs[0].type.dtype_specs()[2])
+
+    def c_code_cache_version(self):
+        return (1, self.openmp)
+
+
 def bincount(x, weights=None, minlength=None, assert_nonneg=False):
     """Count number of occurrences of each value in array of ints.
 
@@ -523,6 +1012,11 @@ def bincount(x, weights=None, minlength=None, assert_nonneg=False):
         every input x is nonnegative.
         Optional.
 
+    Notes
+    -----
+    The result has the dtype of `weights`, or of `x` without weights. Its
+    computation raises a ValueError if x has negative values.
+
 
     .. versionadded:: 0.6
 
@@ -535,20 +1029,9 @@ def bincount(x, weights=None, minlength=None, assert_nonneg=False):
         assert_op = Assert('Input to bincount has negative values!')
         x = assert_op(x, theano.tensor.all(x >= 0))
 
-    max_value = theano.tensor.cast(x.max() + 1, 'int64')
-
-    if minlength is not None:
-        max_value = theano.tensor.maximum(max_value, minlength)
-
-    # Note: we do not use inc_subtensor(out[x], ...) in the following lines,
-    # since out[x] raises an exception if the indices (x) are int8.
-    if weights is None:
-        out = theano.tensor.zeros([max_value], dtype=x.dtype)
-        out = theano.tensor.advanced_inc_subtensor1(out, 1, x)
-    else:
-        out = theano.tensor.zeros([max_value], dtype=weights.dtype)
-        out = theano.tensor.advanced_inc_subtensor1(out, weights, x)
-    return out
+    if minlength is None:
+        minlength = 0
+    return BinCountOp()(x, weights, minlength)
 
 
 def squeeze(x):
@@ -714,6 +1197,107 @@ class RepeatOp(theano.Op):
                 out_shape[self.axis] = theano.tensor.sum(repeats, dtype=dtype)
         return [out_shape]
 
+    def c_code(self, node, name, inames, onames, sub):
+        x, repeats = inames
+        z, = onames
+        fail = sub['fail']
+        ndim = node.inputs[0].ndim
+        if self.axis is None:
+            axis = 0
+            out_nd = 1
+        elif -ndim <= self.axis < ndim:
+            axis = self.axis % ndim
+            out_nd = ndim
+        else:
+            raise theano.gof.utils.MethodNotDefined()
+        flat = int(self.axis is None)
+        scalar_repeats = int(node.inputs[1].ndim == 0)
+        # Each element along the axis is a contiguous block of the
+        # C-contiguous input, copied as many times as it is repeated.
+        return """
+        {
+        PyArrayObject* xc = PyArray_GETCONTIGUOUS(%(x)s);
+        if (NULL == xc) {
+            %(fail)s;
+        }
+        npy_intp dims[%(out_nd)d];
+        npy_intp outer = 1, len, inner = PyArray_ITEMSIZE(xc);
+        if (%(flat)d) {
+            len = PyArray_SIZE(xc);
+        }
+        else {
+            for (int d = 0; d < %(out_nd)d; ++d) {
+                dims[d] = PyArray_DIMS(xc)[d];
+                if (d < %(axis)d)
+                    outer *= dims[d];
+                else if (d > %(axis)d)
+                    inner *= dims[d];
+            }
+            len = dims[%(axis)d];
+        }
+        npy_intp nb_repeats = %(scalar_repeats)d ? 1 : PyArray_DIMS(%(repeats)s)[0];
+        npy_intp r_step = %(scalar_repeats)d ? 0 : PyArray_STRIDES(%(repeats)s)[0];
+        if (nb_repeats != 1 && nb_repeats != len) {
+            PyErr_Format(PyExc_ValueError,
+                         "repeat: %%lld repeats for an axis of length %%lld",
+                         (long long)nb_repeats, (long long)len);
+            Py_DECREF(xc);
+            %(fail)s;
+        }
+        if (nb_repeats == 1) {
+            r_step = 0;
+        }
+        const char* rp = PyArray_BYTES(%(repeats)s);
+        npy_intp total = 0;
+        for (npy_intp i = 0; i < len; ++i) {
+            npy_int64 r = (npy_int64)*(const dtype_%(repeats)s*)(rp + i * r_step);
+            if (r < 0) {
+                PyErr_SetString(PyExc_ValueError,
+                                "repeat: negative number of repetitions");
+                Py_DECREF(xc);
+                %(fail)s;
+            }
+            total += r;
+        }
+        dims[%(axis)d] = total;
+        if (NULL == %(z)s || PyArray_NDIM(%(z)s) != %(out_nd)d ||
+            !PyArray_CompareLists(PyArray_DIMS(%(z)s), dims, %(out_nd)d) ||
+            !PyArray_IS_C_CONTIGUOUS(%(z)s)) {
+            Py_XDECREF(%(z)s);
+            %(z)s = (PyArrayObject*)PyArray_EMPTY(%(out_nd)d, dims,
+                                                   PyArray_TYPE(xc), 0);
+            if (NULL == %(z)s) {
+                Py_DECREF(xc);
+                %(fail)s;
+            }
+        }
+        const char* src = PyArray_BYTES(xc);
+        char* dst = PyArray_BYTES(%(z)s);
+        for (npy_intp o = 0; o < outer; ++o) {
+            for (npy_intp i = 0; i < len; ++i, src += inner) {
+                npy_int64 r = (npy_int64)*(const dtype_%(repeats)s*)(rp + i * r_step);
+                // Copies of a constant size are inlined by the compiler.
+                if (inner == 4) {
+                    for (npy_int64 j = 0; j < r; ++j, dst += 4)
+                        memcpy(dst, src, 4);
+                }
+                else if (inner == 8) {
+                    for (npy_int64 j = 0; j < r; ++j, dst += 8)
+                        memcpy(dst, src, 8);
+                }
+                else {
+                    for (npy_int64 j = 0; j < r; ++j, dst += inner)
+                        memcpy(dst, src, inner);
+                }
+            }
+        }
+        Py_DECREF(xc);
+        }
+        """ % locals()
+
+    def c_code_cache_version(self):
+        return (1,)
+
 
 def repeat(x, repeats, axis=None):
     """Repeat elements of an array.
@@ -1180,3 +1764,296 @@ class Unique(theano.Op):
             ret[1] = shape
             return ret
         return ret
+
+    def c_headers(self):
+        return ['<algorithm>']
+
+    def c_support_code(self):
+        return """
+        template<typename T>
+        struct theano_unique_entry {
+            T value;
+            npy_intp id;
+            bool operator<(const theano_unique_entry& other) const {
+                return value < other.value;
+            }
+        };
+        """
+
+    def c_code(self, node, name, inames, onames, sub):
+        x, = inames
+        outs = list(onames)
+        fail = sub['fail']
+        dtype = node.inputs[0].dtype
+        if dtype == 'float16' or dtype.startswith('complex'):
+            raise theano.gof.utils.MethodNotDefined()
+        integer = int(dtype in tensor.integer_dtypes or dtype == 'bool')
+        groups = int(self.return_index or self.return_inverse or
+                     self.return_counts)
+        cleanup = """
+            free(table);
+            free(sorted);
+            free(hash_ids);
+            free(hash_values);
+            free(first);
+            free(counts);
+            free(groups);
+            free(entries);
+            Py_DECREF(xc);
+        """
+        alloc = ''
+        for out, var, size, typenum in [
+                (outs.pop(0), 'u_values', 'nb_unique', 'PyArray_TYPE(xc)'),
+                (self.return_index and outs.pop(0), 'u_index', 'nb_unique',
+                 'NPY_INT64'),
+                (self.return_inverse and outs.pop(0), 'u_inverse', 'n',
+                 'NPY_INT64'),
+                (self.return_counts and outs.pop(0), 'u_counts', 'nb_unique',
+                 'NPY_INT64')]:
+            if not out:
+                continue
+            alloc += """
+        Py_XDECREF(%(out)s);
+        %(out)s = (PyArrayObject*)PyArray_EMPTY(1, &%(size)s, %(typenum)s, 0);
+        if (NULL == %(out)s) {
+            %(cleanup)s
+            %(fail)s;
+        }
+        %(var)s = (dtype_%(out)s*)PyArray_DATA(%(out)s);
+            """ % locals()
+        # Three ways to find the unique values, depending on the input and
+        # on the outputs:
+        #  - integers of a small range are counted in a table indexed by
+        #    value;
+        #  - if the groups of the elements are needed, the values are
+        #    numbered in the order of their first occurrence with a hash
+        #    table, then only the unique values are sorted;
+        #  - otherwise, the values are sorted.
+        # As in numpy, NaN are all distinct, after the other values.
+        return """
+        {
+        PyArrayObject* xc = PyArray_GETCONTIGUOUS(%(x)s);
+        if (NULL == xc) {
+            %(fail)s;
+        }
+        npy_intp n = PyArray_SIZE(xc);
+        const dtype_%(x)s* data = (const dtype_%(x)s*)PyArray_DATA(xc);
+        dtype_%(x)s* u_values = NULL;
+        npy_int64* u_index = NULL;
+        npy_int64* u_inverse = NULL;
+        npy_int64* u_counts = NULL;
+        npy_intp nb_unique = 0;
+        // Number of unique values that are not NaN.
+        npy_intp nb_numbers = 0;
+        npy_intp* table = NULL;
+        dtype_%(x)s* sorted = NULL;
+        npy_intp* hash_ids = NULL;
+        dtype_%(x)s* hash_values = NULL;
+        npy_intp* first = NULL;
+        npy_intp* counts = NULL;
+        npy_intp* groups = NULL;
+        theano_unique_entry<dtype_%(x)s>* entries = NULL;
+        dtype_%(x)s lowest = 0;
+        npy_uint64 range = 0;
+        if (%(integer)d && n > 0) {
+            dtype_%(x)s highest = data[0];
+            lowest = data[0];
+            for (npy_intp i = 1; i < n; ++i) {
+                if (data[i] < lowest) lowest = data[i];
+                if (data[i] > highest) highest = data[i];
+            }
+            npy_uint64 spread = (npy_uint64)highest - (npy_uint64)lowest;
+            if (spread < (npy_uint64)n * 2 + 1024) {
+                range = spread + 1;
+                // The count of each value, then the position of its first
+                // occurrence.
+                table = (npy_intp*)calloc(range * 2, sizeof(npy_intp));
+            }
+        }
+        if (table != NULL) {
+            npy_intp* table_first = table + range;
+            for (npy_intp i = n - 1; i >= 0; --i) {
+                npy_uint64 v = (npy_uint64)data[i] - (npy_uint64)lowest;
+                ++table[v];
+                table_first[v] = i;
+            }
+            for (npy_uint64 v = 0; v < range; ++v) {
+                nb_unique += (table[v] != 0);
+            }
+        }
+        else if (%(groups)d) {
+            // Values, position of the first occurrence and count of each
+            // number, and number or -1 - (index of the NaN) of each element.
+            npy_intp capacity = 1024;
+            hash_ids = (npy_intp*)malloc(capacity * sizeof(npy_intp));
+            hash_values = (dtype_%(x)s*)malloc(capacity * sizeof(dtype_%(x)s));
+            sorted = (dtype_%(x)s*)malloc((n + 1) * sizeof(dtype_%(x)s));
+            first = (npy_intp*)malloc((n + 1) * sizeof(npy_intp));
+            counts = (npy_intp*)malloc((n + 1) * sizeof(npy_intp));
+            groups = (npy_intp*)malloc((n + 1) * sizeof(npy_intp));
+            if (!hash_ids || !hash_values || !sorted || !first || !counts ||
+                !groups) {
+                %(cleanup)s
+                PyErr_NoMemory();
+                %(fail)s;
+            }
+            for (npy_intp h = 0; h < capacity; ++h) {
+                hash_ids[h] = -1;
+            }
+            npy_intp nb_nan = 0;
+            for (npy_intp i = 0; i < n; ++i) {
+                dtype_%(x)s v = data[i];
+                if (v != v) {
+                    groups[i] = -1 - nb_nan++;
+                    continue;
+                }
+                // -0.0 and 0.0 are equal, so they must have the same hash.
+                dtype_%(x)s key_value = (v == 0) ? 0 : v;
+                npy_uint64 key = 0;
+                memcpy(&key, &key_value, sizeof(dtype_%(x)s));
+                npy_intp mask = capacity - 1;
+                npy_intp h = (npy_intp)((key * 11400714819323198485ull) >> 40)
+                             & mask;
+                while (hash_ids[h] >= 0 && !(hash_values[h] == v)) {
+                    h = (h + 1) & mask;
+                }
+                npy_intp id = hash_ids[h];
+                if (id < 0) {
+                    id = nb_numbers++;
+                    hash_ids[h] = id;
+                    hash_values[h] = v;
+                    sorted[id] = v;
+                    first[id] = i;
+                    counts[id] = 0;
+                    if (nb_numbers * 2 > capacity) {
+                        // Grow the hash table, that stays half empty.
+                        npy_intp new_capacity = capacity * 2;
+                        npy_intp* new_ids = (npy_intp*)malloc(
+                            new_capacity * sizeof(npy_intp));
+                        dtype_%(x)s* new_values = (dtype_%(x)s*)malloc(
+                            new_capacity * sizeof(dtype_%(x)s));
+                        if (!new_ids || !new_values) {
+                            free(new_ids);
+                            free(new_values);
+                            %(cleanup)s
+                            PyErr_NoMemory();
+                            %(fail)s;
+                        }
+                        for (npy_intp j = 0; j < new_capacity; ++j) {
+                            new_ids[j] = -1;
+                        }
+                        npy_intp new_mask = new_capacity - 1;
+                        for (npy_intp j = 0; j < nb_numbers; ++j) {
+                            dtype_%(x)s w = (sorted[j] == 0) ? 0 : sorted[j];
+                            npy_uint64 k = 0;
+                            memcpy(&k, &w, sizeof(dtype_%(x)s));
+                            npy_intp p = (npy_intp)(
+                                (k * 11400714819323198485ull) >> 40) & new_mask;
+                            while (new_ids[p] >= 0) {
+                                p = (p + 1) & new_mask;
+                            }
+                            new_ids[p] = j;
+                            new_values[p] = sorted[j];
+                        }
+                        free(hash_ids);
+                        free(hash_values);
+                        hash_ids = new_ids;
+                        hash_values = new_values;
+                        capacity = new_capacity;
+                    }
+                }
+                ++counts[id];
+                groups[i] = id;
+            }
+            // Sort the numbers, and replace the numbers of the elements by
+            // their rank.
+            entries = (theano_unique_entry<dtype_%(x)s>*)malloc(
+                (nb_numbers + 1) * sizeof(theano_unique_entry<dtype_%(x)s>));
+            if (NULL == entries) {
+                %(cleanup)s
+                PyErr_NoMemory();
+                %(fail)s;
+            }
+            for (npy_intp j = 0; j < nb_numbers; ++j) {
+                entries[j].value = sorted[j];
+                entries[j].id = j;
+            }
+            std::sort(entries, entries + nb_numbers);
+            nb_unique = nb_numbers + nb_nan;
+        }
+        else {
+            sorted = (dtype_%(x)s*)malloc((n + 1) * sizeof(dtype_%(x)s));
+            if (NULL == sorted) {
+                %(cleanup)s
+                PyErr_NoMemory();
+                %(fail)s;
+            }
+            npy_intp m = 0;
+            for (npy_intp i = 0; i < n; ++i) {
+                if (data[i] == data[i])
+                    sorted[m++] = data[i];
+            }
+            std::sort(sorted, sorted + m);
+            for (npy_intp i = 0; i < m; ++i) {
+                if (i == 0 || sorted[i] != sorted[nb_numbers - 1])
+                    sorted[nb_numbers++] = sorted[i];
+            }
+            nb_unique = nb_numbers + n - m;
+        }
+        %(alloc)s
+        if (table != NULL) {
+            npy_intp* table_first = table + range;
+            npy_intp g = 0;
+            for (npy_uint64 v = 0; v < range; ++v) {
+                if (table[v] == 0)
+                    continue;
+                u_values[g] = (dtype_%(x)s)((npy_uint64)lowest + v);
+                if (u_index) u_index[g] = table_first[v];
+                if (u_counts) u_counts[g] = table[v];
+                // The count is replaced by the group of the value.
+                table[v] = g++;
+            }
+            if (u_inverse) {
+                for (npy_intp i = 0; i < n; ++i) {
+                    u_inverse[i] = table[(npy_uint64)data[i] -
+                                         (npy_uint64)lowest];
+                }
+            }
+        }
+        else if (%(groups)d) {
+            // The counts are replaced by the rank of each number.
+            npy_intp* rank = counts;
+            for (npy_intp r = 0; r < nb_numbers; ++r) {
+                npy_intp id = entries[r].id;
+                u_values[r] = entries[r].value;
+                if (u_index) u_index[r] = first[id];
+                if (u_counts) u_counts[r] = counts[id];
+            }
+            for (npy_intp r = 0; r < nb_numbers; ++r) {
+                rank[entries[r].id] = r;
+            }
+            for (npy_intp i = 0, g = nb_numbers; i < n; ++i) {
+                if (groups[i] >= 0) {
+                    if (u_inverse) u_inverse[i] = rank[groups[i]];
+                    continue;
+                }
+                u_values[g] = data[i];
+                if (u_index) u_index[g] = i;
+                if (u_counts) u_counts[g] = 1;
+                if (u_inverse) u_inverse[i] = g;
+                ++g;
+            }
+        }
+        else {
+            memcpy(u_values, sorted, nb_numbers * sizeof(dtype_%(x)s));
+            for (npy_intp i = 0, g = nb_numbers; i < n; ++i) {
+                if (data[i] != data[i])
+                    u_values[g++] = data[i];
+            }
+        }
+        %(cleanup)s
+        }
+        """ % locals()
+
+    def c_code_cache_version(self):
+        return (1,)
@@ -0,0 +1,167 @@
+"""
+Helpers for the C code of the ops that store float16 values on CPU.
+
+NumPy stores float16 values as half precision numbers, an unsigned 16 bit
+integer (``npy_half``) for C, on which the C compilers can't compute. The C
+code of the ops that support float16 loads them with `load_w`, computes on
+the `work_dtype` (float32), and stores the results with `write_w`. The
+conversions are in `half_support_code`, which must be in the support code of
+these ops. They have no branches, so that the loops using them can be
+vectorized, and they give the same results as NumPy, with a rounding to the
+nearest even.
+
+This is the CPU version of :mod:`theano.gpuarray.fp16_help`.
+
+"""
+from __future__ import absolute_import, print_function, division
+
+import numpy
+
+from theano import scalar
+from theano.scalar.basic import Compositef32, handle_cast
+
+
+def work_dtype(dtype):
+    if dtype == 'float16':
+        return 'float32'
+    else:
+        return dtype
+
+
+def load_w(dtype):
+    if dtype == 'float16':
+        return 'theano_half_to_float'
+    else:
+        return ''
+
+
+def write_w(dtype):
+    if dtype == 'float16':
+        return 'theano_float_to_half'
+    else:
+        return ''
+
+
+half_support_code = """
+#ifndef THEANO_HALF_FLOAT
+#define THEANO_HALF_FLOAT
+#include <string.h>
+
+static inline float theano_half_to_float(npy_half h)
+{
+    // The exponent and mantissa, aligned on those of a float32.
+    npy_uint32 bits = (npy_uint32)(h & 0x7fff) << 13;
+    npy_uint32 exponent = bits & 0x0f800000;
+    // Rebias the exponent, to 255 for inf and NaN. The masks and
+    // multiplications are selects that the compiler does not turn into
+    // branches.
+    bits += ((npy_uint32)(127 - 15) << 23) *
+        (1 + (npy_uint32)(exponent == 0x0f800000));
+    // Zeros and subnormal numbers are their mantissa times 2**-24, which is
+    // computed for all the numbers.
+    float subnormal = (float)(npy_int32)(h & 0x3ff) * 5.96046448e-08f;
+    npy_uint32 subnormal_bits;
+    memcpy(&subnormal_bits, &subnormal, sizeof(subnormal_bits));
+    npy_uint32 is_subnormal = -(npy_uint32)(exponent == 0);
+    bits = (subnormal_bits & is_subnormal) | (bits & ~is_subnormal);
+    bits |= (npy_uint32)(h & 0x8000) << 16;
+    float f;
+    memcpy(&f, &bits, sizeof(f));
+    return f;
+}
+
+static inline npy_half theano_float_to_half(float f)
+{
+    npy_uint32 u;
+    memcpy(&u, &f, sizeof(u));
+    npy_uint32 sign = (u >> 16) & 0x8000;
+    u &= 0x7fffffff;
+    // Normal results: rebias the exponent and round the mantissa to the
+    // nearest even. The overflows give inf.
+    npy_uint32 normal = (u + ((npy_uint32)(15 - 127) << 23) + 0xfff +
+                         ((u >> 13) & 1)) >> 13;
+    normal = normal > 0x7c00 ? 0x7c00 : normal;
+    // Subnormal results: adding 0.5 aligns the mantissa on the last bits
+    // of the float32 and rounds it to the nearest even.
+    float fa;
+    memcpy(&fa, &u, sizeof(fa));
+    fa += 0.5f;
+    npy_uint32 subnormal;
+    memcpy(&subnormal, &fa, sizeof(subnormal));
+    subnormal -= 0x3f000000;
+    npy_uint32 h = u < (npy_uint32)113 << 23 ? subnormal : normal;
+    // NaN keep the first bits of their payload, and at least one bit.
+    npy_uint32 nan = 0x7c00 | ((u >> 13) & 0x3ff);
+    nan += nan == 0x7c00;
+    h = u > 0x7f800000 ? nan : h;
+    return (npy_half)(h | sign);
+}
+#endif
+"""
+
+
+class RoundHalf(scalar.UnaryScalarOp):
+    """
+    Round a float32 value to the nearest float16, as a float32.
+
+    """
+
+    def impl(self, x):
+        return numpy.float32(numpy.float16(x))
+
+    def c_code(self, node, name, inputs, outputs, sub):
+        (x,) = inputs
+        (z,) = outputs
+        return "%s = theano_half_to_float(theano_float_to_half(%s));" % (z,
+                                                                           x)
+
+    def c_support_code(self):
+        return half_support_code
+
+    def c_code_cache_version(self):
+        return (1,)
+
+round_half = RoundHalf(scalar.same_out, name='round_half')
+
+
+class _CompositeFloat32(Compositef32):
+    special = dict(Compositef32.special)
+
+_composite_f32 = _CompositeFloat32()
+
+
+def composite_float32(composite):
+    """
+    Return the version of the scalar Composite `composite` computed in
+    float32 by the C code of the ops that store float16 values.
+
+    Unlike `Composite.clone_float32`, the casts to float16 inside the
+    composite become `round_half`, so that their rounding and overflow are
+    kept.
+
+    """
+    new_ins, new_outs = _composite_f32.apply(composite.fgraph)
+    # A Composite can't return its inputs.
+    new_outs = [scalar.identity(o) if o in new_ins else o for o in new_outs]
+    return scalar.Composite(new_ins, new_outs)
+
+
+def _handle_cast(node, mapping):
+    if (node.op.o_type == scalar.float16 and
+            node.inputs[0].type != scalar.float16):
+        inp = mapping[node.inputs[0]]
+        if inp.type != scalar.float32:
+            inp = scalar.cast(inp, 'float32')
+        mapping[node.outputs[0]] = round_half(inp)
+    else:
+        handle_cast(node, mapping)
+
+
+def _handle_composite(node, mapping):
+    new_outs = composite_float32(node.op)(
+        *[mapping[i] for i in node.inputs], return_list=True)
+    for o, no in zip(node.outputs, new_outs):
+        mapping[o] = no
+
+_CompositeFloat32.special[scalar.Cast] = _handle_cast
+_CompositeFloat32.special[scalar.Composite] = _handle_composite
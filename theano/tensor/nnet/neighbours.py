@@ -152,7 +152,7 @@ class Images2Neibs(Op):
                 grad_undefined(self, 2, neib_step)]
 
     def c_code_cache_version(self):
-        return (5,)
+        return (6,)
 
     def perform(self, node, inp, out_):
         ten4, neib_shape, neib_step = inp
@@ -397,7 +397,7 @@ class Images2Neibs(Op):
 
             %(z)s = (PyArrayObject*) PyArray_EMPTY(2,
                 dims,
-                PyArray_TYPE((PyArrayObject*) py_%(ten4)s),
+                PyArray_TYPE(%(ten4)s),
                 0);
 
             if (!%(z)s)
@@ -13,6 +13,7 @@ import numpy
 
 import theano
 from theano import config, gof, printing, scalar
+from theano.scalar import fast_math
 from theano.compat import imap
 from theano.printing import pprint
 from theano.tensor import basic as tensor
@@ -374,6 +375,29 @@ softplus = elemwise.Elemwise(scalar_softplus, name='softplus')
 pprint.assign(softplus, printing.FunctionPrinter('softplus'))
 
 
+class FastScalarSigmoid(fast_math.FastMathOp, ScalarSigmoid):
+    """
+    sigmoid, with a fast_math approximation in C.
+
+    See :mod:`theano.scalar.fast_math`.
+
+    """
+    fast_math_function = 'theano_fast_sigmoid'
+
+
+class FastScalarSoftplus(fast_math.FastMathOp, ScalarSoftplus):
+    """
+    softplus, with a fast_math approximation in C.
+
+    See :mod:`theano.scalar.fast_math`.
+
+    """
+    fast_math_function = 'theano_fast_softplus'
+
+fast_math.fast_math_ops[ScalarSigmoid] = FastScalarSigmoid
+fast_math.fast_math_ops[ScalarSoftplus] = FastScalarSoftplus
+
+
 def _skip_mul_1(r):
     if r.owner and r.owner.op == tensor.mul:
         not_is_1 = [i for i in r.owner.inputs if not _is_1(i)]
@@ -15,6 +15,7 @@ from theano.tensor.nnet import (sigmoid, sigmoid_inplace,
 from theano.tensor.nnet.sigm import (
     compute_mul, is_1pexp, parse_mul_tree, perform_sigm_times_exp,
     register_local_1msigmoid, simplify_mul,
+    FastScalarSigmoid, FastScalarSoftplus,
 )
 from theano.tensor.tests.test_basic import (makeBroadcastTester, copymod,
                                             check_floatX, upcast_int8_nfunc,
@@ -340,6 +341,23 @@ class T_sigmoid_opts(unittest.TestCase):
         assert len(topo) == 1
         f([[-50, -10, -4, -1, 0, 1, 4, 10, 50]])
 
+    def test_local_fast_math(self):
+        x = tensor.dmatrix('x')
+        mode = self.get_mode().including('fast_math').excluding('fusion')
+        for out, fast_op, ref in [
+                (sigmoid(x), FastScalarSigmoid,
+                 lambda v: 1 / (1 + numpy.exp(-v))),
+                (softplus(x), FastScalarSoftplus,
+                 lambda v: numpy.log1p(numpy.exp(v)))]:
+            f = theano.function([x], out, mode=mode)
+            topo = f.maker.fgraph.toposort()
+            assert len(topo) == 1
+            assert isinstance(topo[0].op.scalar_op, fast_op)
+            assert check_stack_trace(f, ops_to_check='all')
+            v = numpy.asarray([[-50, -10, -4, -1, 0, 1, 4, 10, 50]],
+                              dtype='float64')
+            utt.assert_allclose(f(v), ref(v))
+
     def test_local_hard_sigmoid(self):
         x = tensor.matrix('x')
         s = sigmoid(x)
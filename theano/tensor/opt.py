@@ -27,7 +27,8 @@ from theano.gof.opt import copy_stack_trace, in2out
 from theano.gof.utils import MethodNotDefined
 from theano.gradient import DisconnectedType
 from theano.configparser import config
-from theano.tensor.elemwise import Elemwise, DimShuffle
+from theano.tensor.elemwise import (Elemwise, DimShuffle, CAReduce,
+                                    ElemwiseCAReduce)
 from theano.tensor.subtensor import (get_idx_list, get_canonical_form_slice,
                                      Subtensor, IncSubtensor, make_constant,
                                      AdvancedIncSubtensor1,
@@ -38,6 +39,7 @@ from theano.tensor.subtensor import (get_idx_list, get_canonical_form_slice,
                                      advanced_inc_subtensor1)
 from theano import scalar
 from theano.scalar import basic
+from theano.scalar import fast_math
 from theano.tensor import basic as T
 from theano import compile  # to register the optimizer built by this file
 from theano.compile.ops import Shape, Shape_i
@@ -3327,6 +3329,22 @@ compile.optdb.register('local_inplace_incsubtensor1',
                        60, 'fast_run', 'inplace')  # DEBUG
 
 
+@gof.local_optimizer([AdvancedIncSubtensor], inplace=True)
+def local_inplace_advanced_incsubtensor(node):
+    if (isinstance(node.op, AdvancedIncSubtensor) and
+            not node.op.inplace):
+        new_op = node.op.clone_inplace()
+        new_node = new_op(*node.inputs)
+        copy_stack_trace(node.outputs, new_node)
+        return [new_node]
+    return False
+compile.optdb.register('local_inplace_advanced_incsubtensor',
+                       TopoOptimizer(
+                           local_inplace_advanced_incsubtensor,
+                           failure_callback=TopoOptimizer.warn_inplace),
+                       60, 'fast_run', 'inplace')
+
+
 # Register old name
 @register_canonicalize("local_incsubtensor_of_allocs")
 @register_stabilize("local_incsubtensor_of_allocs")
@@ -7341,6 +7359,57 @@ else:
                            'FusionOptimizer')
 
 
+@gof.local_optimizer([CAReduce])
+def local_elemwise_careduce_fusion(node):
+    """
+    CAReduce(Elemwise(x, y, ...)) -> ElemwiseCAReduce(x, y, ...)
+
+    When the reduction is the only client of the output of the elemwise
+    (often a Composite made by the fusion), the elemwise is computed inside
+    the loop of the reduction, and its output is never stored. This halves
+    the memory traffic of expressions like ``sum(x ** 2)`` or
+    ``max(abs(a - b))``.
+
+    """
+    op = node.op
+    # Mean has its own perform and C code.
+    if (not isinstance(op, CAReduce) or
+            isinstance(op, T.Mean) or
+            not theano.config.cxx):
+        return False
+    inp = node.inputs[0]
+    if (not inp.owner or
+            type(inp.owner.op) is not Elemwise or
+            inp.owner.op.inplace_pattern or
+            len(inp.owner.outputs) != 1 or
+            len(inp.clients) != 1 or
+            inp.ndim == 0 or
+            (op.axis is not None and len(op.axis) == 0)):
+        return False
+    elem_node = inp.owner
+    variables = elem_node.inputs + elem_node.outputs + node.outputs
+    if not all(isinstance(v.type, T.TensorType) for v in variables):
+        return False
+    new_op = ElemwiseCAReduce(op, elem_node.op.scalar_op)
+    new_out = new_op(*elem_node.inputs)
+    try:
+        # The scalar node computes float16 values in float32.
+        s_node = new_op._c_scalar_node(new_out.owner)
+        s_node.op.c_code(s_node, "test_presence_of_c_code",
+                         ["x" for x in s_node.inputs], ["z"], {})
+    except (MethodNotDefined, NotImplementedError):
+        return False
+
+    copy_stack_trace(node.outputs[0], new_out)
+    return [new_out]
+
+# After the fusion, to fold the Composites it made, and before the
+# inplace optimizations.
+compile.optdb.register('elemwise_careduce_fusion',
+                       in2out(local_elemwise_careduce_fusion), 49.1,
+                       'fast_run', 'fusion', 'local_elemwise_careduce_fusion')
+
+
 @register_canonicalize
 @gof.local_optimizer([Elemwise])
 def local_useless_composite(node):
@@ -7361,6 +7430,102 @@ def local_useless_composite(node):
         e = Elemwise(scalar_op=c)(*node.inputs, return_list=True)
         return dict(zip([node.outputs[i] for i in idx], e))
 
+
+@gof.local_optimizer([Elemwise])
+def local_fast_math(node):
+    """
+    Replace exp, log, log1p, tanh, sigmoid and softplus by their fast_math
+    approximations.
+
+    Their C code can be vectorized by the compiler, and their relative
+    errors are of a few machine epsilons, see :mod:`theano.scalar.fast_math`.
+    Enable it with mode.including('fast_math') or the Theano flag
+    tensor.fast_math=True.
+
+    This is done in the uncanonicalize phase, after the stabilization
+    optimizations and before the elemwise fusion.
+
+    """
+    if not isinstance(node.op, Elemwise) or node.op.inplace_pattern:
+        return False
+    scalar_op = node.op.scalar_op
+    fast_op = fast_math.fast_math_ops.get(type(scalar_op))
+    if fast_op is None:
+        return False
+    if any(v.type.dtype not in ('float32', 'float64')
+           for v in node.inputs + node.outputs):
+        return False
+    out = Elemwise(fast_op(scalar_op.output_types_preference))(
+        *node.inputs)
+    copy_stack_trace(node.outputs[0], out)
+    return [out]
+
+if config.tensor.fast_math:
+    compile.optdb['uncanonicalize'].register('local_fast_math',
+                                             local_fast_math,
+                                             'fast_math', 'fast_run')
+else:
+    compile.optdb['uncanonicalize'].register('local_fast_math',
+                                             local_fast_math, 'fast_math')
+
+
+@gof.local_optimizer(None)
+def local_float16_to_float32(node):
+    """
+    op(x_float16, ...) -> cast(op(cast(x_float16, 'float32'), ...), 'float16')
+
+    Theano runs the Python code of the ops whose C code doesn't support
+    float16 (those without the `_f16_ok` attribute). Compute them in float32
+    instead, with casts of their float16 inputs and outputs. An input that is
+    the cast to float16 of the float32 output of an op rewritten here is
+    replaced by that output, so the casts are only at the boundaries between
+    the float16 graph and the ops computing in float32, and the elemwise
+    fusion merges them in the float16 Elemwise around. The other casts to
+    float16, like those written by the user, are kept, as they round.
+
+    """
+    op = node.op
+    # Scan and the other PureOp have no c_code at all.
+    if (getattr(op, '_f16_ok', False) or getattr(op, 'destroy_map', None) or
+            not theano.config.cxx or
+            getattr(type(op), 'c_code', gof.Op.c_code) is gof.Op.c_code):
+        return False
+    variables = node.inputs + node.outputs
+    if (not all(isinstance(v.type, T.TensorType) for v in variables) or
+            not any(v.dtype == 'float16' for v in variables)):
+        return False
+    inputs = []
+    for i in node.inputs:
+        if i.dtype == 'float16':
+            if getattr(i.tag, 'float16_to_float32_cast', False):
+                i = i.owner.inputs[0]
+            else:
+                i = T.cast(i, 'float32')
+        inputs.append(i)
+    try:
+        new_node = op.make_node(*inputs)
+    except (TypeError, ValueError):
+        return False
+    outputs = []
+    for out, new_out in zip(node.outputs, new_node.outputs):
+        if new_out.type == out.type:
+            outputs.append(new_out)
+        elif (out.dtype == 'float16' and
+              new_out.type == out.type.clone(dtype='float32')):
+            cast_out = T.cast(new_out, 'float16')
+            cast_out.tag.float16_to_float32_cast = True
+            outputs.append(cast_out)
+        else:
+            return False
+    copy_stack_trace(node.outputs, new_node.outputs + outputs)
+    return outputs
+
+# After the optimizations that introduce new ops and the transfer to the GPU,
+# and before the elemwise fusion that merges the casts.
+compile.optdb.register('local_float16_to_float32',
+                       in2out(local_float16_to_float32), 48.8,
+                       'fast_run', 'float16')
+
 # ############################
 # # Remove consider_constant #
 # ############################
@@ -1,7 +1,12 @@
 from __future__ import absolute_import, print_function, division
 import numpy as np
 import theano
-from theano.tensor.basic import mul, arange
+from theano.gof import local_optimizer
+from theano.gof.opt import copy_stack_trace
+from theano.tensor.basic import (mul, arange, get_scalar_constant_value,
+                                 NotScalarConstantError)
+from theano.tensor.opt import register_specialize
+from theano.tensor.subtensor import Subtensor, get_idx_list
 
 
 class SortOp(theano.Op):
@@ -206,3 +211,412 @@ def argsort(a, axis=-1, kind='quicksort', order=None):
         a = a.flatten()
         axis = 0
     return ArgSortOp(kind, order)(a, axis)
+
+
+class TopKOp(theano.gof.OpenMPOp):
+    """
+    Find the k largest or smallest elements of a tensor along an axis.
+
+    The first input is the tensor, the second the integer scalar `kth`. If
+    `kth` is positive, the `kth` largest elements are selected, if it is
+    negative, the `-kth` smallest ones. If `abs(kth)` is larger than the
+    length of the axis, all the elements are selected.
+
+    The elements are ordered by value then by position, NaN being larger
+    than everything else, like in a stable sort. So with `sorted=True`, the
+    result is the same as `sort(x)[..., -kth:]` or `sort(x)[..., :-kth]`,
+    in ascending order.
+
+    Parameters
+    ----------
+    axis : int
+        Axis along which to select the elements.
+    sorted : bool
+        If True, the selected elements are returned in ascending order.
+        Otherwise, their order is unspecified, which is faster for large
+        `kth`.
+    return_values : bool
+        Return the selected elements.
+    return_indices : bool
+        Return the positions of the selected elements along `axis`.
+    idx_dtype : str
+        Dtype of the positions.
+
+    Notes
+    -----
+    The C code selects the elements of each slice with `std::nth_element`,
+    in time linear in the length of the axis, then sorts them if `sorted`.
+    With openmp, the slices are split between the threads.
+
+    """
+
+    __props__ = ('axis', 'sorted', 'return_values', 'return_indices',
+                 'idx_dtype')
+
+    def __init__(self, axis=-1, sorted=True, return_values=True,
+                 return_indices=False, idx_dtype='int64', openmp=None):
+        super(TopKOp, self).__init__(openmp=openmp)
+        assert return_values or return_indices
+        assert idx_dtype in theano.tensor.integer_dtypes
+        self.axis = axis
+        self.sorted = sorted
+        self.return_values = return_values
+        self.return_indices = return_indices
+        self.idx_dtype = idx_dtype
+
+    def __str__(self):
+        return '%s{axis=%d, sorted=%s, values=%s, indices=%s}' % (
+            self.__class__.__name__, self.axis, self.sorted,
+            self.return_values, self.return_indices)
+
+    def make_node(self, x, kth):
+        x = theano.tensor.as_tensor_variable(x)
+        kth = theano.tensor.as_tensor_variable(kth)
+        if x.ndim == 0:
+            raise ValueError('topk needs a tensor of at least one dimension')
+        if not -x.ndim <= self.axis < x.ndim:
+            raise ValueError('topk: axis %d is out of bounds for a tensor '
+                             'of %d dimensions' % (self.axis, x.ndim))
+        if kth.ndim != 0 or kth.dtype not in theano.tensor.integer_dtypes:
+            raise TypeError('topk: kth must be an integer scalar', kth.type)
+        bcast = list(x.broadcastable)
+        bcast[self.axis % x.ndim] = False
+        outputs = []
+        if self.return_values:
+            outputs.append(theano.tensor.TensorType(x.dtype, bcast)())
+        if self.return_indices:
+            outputs.append(theano.tensor.TensorType(self.idx_dtype, bcast)())
+        return theano.Apply(self, [x, kth], outputs)
+
+    def perform(self, node, inputs, output_storage):
+        x, kth = inputs
+        kth = int(kth)
+        if kth == 0:
+            raise ValueError('topk: kth must not be 0')
+        axis = self.axis % x.ndim
+        k = min(abs(kth), x.shape[axis])
+        selection = [slice(None)] * x.ndim
+        if kth > 0:
+            selection[axis] = slice(x.shape[axis] - k, None)
+        else:
+            selection[axis] = slice(None, k)
+        idx = np.argsort(x, axis, kind='mergesort')[tuple(selection)]
+        out = list(output_storage)
+        if self.return_values:
+            index = list(np.ix_(*[np.arange(s) for s in idx.shape]))
+            index[axis] = idx
+            out.pop(0)[0] = x[tuple(index)]
+        if self.return_indices:
+            out.pop(0)[0] = theano._asarray(idx, dtype=self.idx_dtype)
+
+    def infer_shape(self, node, inputs_shapes):
+        x_shape = list(inputs_shapes[0])
+        axis = self.axis % len(x_shape)
+        k = theano.tensor.abs_(node.inputs[1])
+        x_shape[axis] = theano.tensor.minimum(
+            theano.tensor.cast(k, 'int64'), x_shape[axis])
+        return [tuple(x_shape)] * len(node.outputs)
+
+    def connection_pattern(self, node):
+        return [[True] * self.return_values + [False] * self.return_indices,
+                [False] * len(node.outputs)]
+
+    def grad(self, inputs, output_grads):
+        x, kth = inputs
+        if (not self.return_values or
+                isinstance(output_grads[0].type,
+                           theano.gradient.DisconnectedType)):
+            return [x.zeros_like(), theano.gradient.DisconnectedType()()]
+        axis = self.axis % x.ndim
+        idx = TopKOp(self.axis, self.sorted, return_values=False,
+                     return_indices=True, idx_dtype=self.idx_dtype,
+                     openmp=self.openmp)(x, kth)
+        indices = []
+        for i in range(x.ndim):
+            if i == axis:
+                indices.append(idx)
+            else:
+                index_shape = [1] * x.ndim
+                index_shape[i] = x.shape[i]
+                indices.append(arange(x.shape[i]).reshape(index_shape))
+        x_grad = theano.tensor.subtensor.advanced_inc_subtensor(
+            x.zeros_like(), output_grads[0], *indices)
+        return [x_grad, theano.gradient.DisconnectedType()()]
+
+    def c_headers(self):
+        return ['<algorithm>'] + super(TopKOp, self).c_headers()
+
+    def c_support_code(self):
+        return """
+        template<typename T>
+        struct theano_topk_item {
+            T value;
+            npy_intp position;
+        };
+
+        // Order by value then by position, NaN being the largest value,
+        // like a stable sort of numpy.
+        template<typename T>
+        struct theano_topk_less {
+            bool operator()(const theano_topk_item<T>& a,
+                            const theano_topk_item<T>& b) const {
+                bool a_nan = a.value != a.value;
+                bool b_nan = b.value != b.value;
+                if (a_nan || b_nan) {
+                    if (a_nan && b_nan)
+                        return a.position < b.position;
+                    return b_nan;
+                }
+                if (a.value < b.value)
+                    return true;
+                if (b.value < a.value)
+                    return false;
+                return a.position < b.position;
+            }
+        };
+        """
+
+    def c_code(self, node, name, inp, out, sub):
+        x, kth = inp
+        dtype = node.inputs[0].dtype
+        if dtype == 'float16' or dtype.startswith('complex'):
+            raise theano.gof.utils.MethodNotDefined()
+        fail = sub['fail']
+        ndim = node.inputs[0].ndim
+        axis = self.axis % ndim
+        outs = list(out)
+        targets = []
+        if self.return_values:
+            targets.append((outs.pop(0), 'it->value', 'PyArray_TYPE(%s)' % x))
+        if self.return_indices:
+            typenum = node.outputs[-1].type.dtype_specs()[2]
+            targets.append((outs.pop(0), 'it->position', typenum))
+        sorted = int(self.sorted)
+        alloc = ''
+        write = ''
+        for o, value, typenum in targets:
+            alloc += """
+    if (NULL == %(o)s || PyArray_NDIM(%(o)s) != %(ndim)d ||
+        !PyArray_CompareLists(PyArray_DIMS(%(o)s), dims, %(ndim)d)) {
+        Py_XDECREF(%(o)s);
+        %(o)s = (PyArrayObject*)PyArray_EMPTY(%(ndim)d, dims, %(typenum)s, 0);
+        if (NULL == %(o)s) {
+            %(fail)s;
+        }
+    }
+            """ % locals()
+            write += """
+            {
+                char* op = PyArray_BYTES(%(o)s);
+                npy_intp step = PyArray_STRIDES(%(o)s)[%(axis)d];
+                for (int d = 0; d < %(ndim)d - 1; ++d) {
+                    op += coords[d] * PyArray_STRIDES(%(o)s)[other[d]];
+                }
+                const theano_topk_item<dtype_%(x)s>* it = first;
+                for (npy_intp j = 0; j < k; ++j, ++it, op += step) {
+                    *(dtype_%(o)s*)op = (dtype_%(o)s)%(value)s;
+                }
+            }
+            """ % locals()
+        if self.openmp:
+            minsize = theano.config.openmp_elemwise_minsize
+            nb_threads = 'omp_get_max_threads()'
+            thread_num = 'omp_get_thread_num()'
+            parallel = '#pragma omp parallel if(n_rows * n >= %d)' % minsize
+            omp_for = '#pragma omp for schedule(static)'
+        else:
+            nb_threads = '1'
+            thread_num = '0'
+            parallel = ''
+            omp_for = ''
+        return """
+    {
+    npy_int64 kth = (npy_int64)*(dtype_%(kth)s*)PyArray_DATA(%(kth)s);
+    if (kth == 0) {
+        PyErr_SetString(PyExc_ValueError, "topk: kth must not be 0");
+        %(fail)s;
+    }
+    npy_intp n = PyArray_DIMS(%(x)s)[%(axis)d];
+    npy_intp k = kth > 0 ? kth : -kth;
+    if (k > n) {
+        k = n;
+    }
+    npy_intp dims[%(ndim)d];
+    // The other dimensions, that enumerate the slices.
+    int other[%(ndim)d];
+    npy_intp n_rows = 1;
+    for (int d = 0, j = 0; d < %(ndim)d; ++d) {
+        dims[d] = PyArray_DIMS(%(x)s)[d];
+        if (d != %(axis)d) {
+            other[j++] = d;
+            n_rows *= dims[d];
+        }
+    }
+    dims[%(axis)d] = k;
+    %(alloc)s
+    if (n_rows > 0 && k > 0) {
+        int nb_threads = %(nb_threads)s;
+        theano_topk_item<dtype_%(x)s>* buf = (theano_topk_item<dtype_%(x)s>*)
+            malloc(nb_threads * n * sizeof(theano_topk_item<dtype_%(x)s>));
+        if (NULL == buf) {
+            PyErr_NoMemory();
+            %(fail)s;
+        }
+        npy_intp x_step = PyArray_STRIDES(%(x)s)[%(axis)d];
+        %(parallel)s
+        {
+        theano_topk_item<dtype_%(x)s>* items = buf + %(thread_num)s * n;
+        theano_topk_less<dtype_%(x)s> less;
+        %(omp_for)s
+        for (npy_intp r = 0; r < n_rows; ++r) {
+            npy_intp coords[%(ndim)d];
+            npy_intp rest = r;
+            const char* xp = PyArray_BYTES(%(x)s);
+            for (int d = %(ndim)d - 2; d >= 0; --d) {
+                coords[d] = rest %% dims[other[d]];
+                rest /= dims[other[d]];
+                xp += coords[d] * PyArray_STRIDES(%(x)s)[other[d]];
+            }
+            for (npy_intp i = 0; i < n; ++i, xp += x_step) {
+                items[i].value = *(const dtype_%(x)s*)xp;
+                items[i].position = i;
+            }
+            theano_topk_item<dtype_%(x)s>* first;
+            if (kth > 0) {
+                first = items + n - k;
+                std::nth_element(items, first, items + n, less);
+            }
+            else {
+                first = items;
+                std::nth_element(items, items + k - 1, items + n, less);
+            }
+            if (%(sorted)d) {
+                std::sort(first, first + k, less);
+            }
+            %(write)s
+        }
+        }
+        free(buf);
+    }
+    }
+        """ % locals()
+
+    def c_code_cache_version(self):
+        return (1, self.openmp)
+
+
+def _topk(x, kth, axis, sorted, idx_dtype, return_values, return_indices):
+    if axis is None:
+        x = theano.tensor.flatten(x)
+        axis = 0
+    return TopKOp(axis, sorted, return_values=return_values,
+                  return_indices=return_indices, idx_dtype=idx_dtype)(x, kth)
+
+
+def topk(x, kth, axis=-1, sorted=True, idx_dtype='int64'):
+    """
+    Returns the `kth` largest elements of a tensor along an axis, or the
+    `-kth` smallest ones if `kth` is negative.
+
+    Parameters
+    ----------
+    x : Tensor
+        Input tensor.
+    kth : int or integer scalar Tensor
+        Number of elements to select, it must not be 0. If it is larger
+        than the length of the axis, all the elements are returned.
+    axis : int or None
+        Axis along which to select the elements. If None, the tensor is
+        flattened first.
+    sorted : bool
+        If True, the elements are returned in ascending order, so that
+        `topk(x, k)` is `sort(x)[..., -k:]` and `topk(x, -k)` is
+        `sort(x)[..., :k]`. Otherwise, their order is unspecified.
+    idx_dtype : str
+        Unused, for symmetry with `argtopk`.
+
+    Returns
+    -------
+    Tensor
+        The selected elements, with the same dimensions as `x` except
+        along `axis`.
+
+    """
+    return _topk(x, kth, axis, sorted, idx_dtype, True, False)
+
+
+def argtopk(x, kth, axis=-1, sorted=True, idx_dtype='int64'):
+    """
+    Returns the positions along an axis of the `kth` largest elements of a
+    tensor, or of the `-kth` smallest ones if `kth` is negative.
+
+    With `sorted=True`, `argtopk(x, k)` is `argsort(x, kind='mergesort')
+    [..., -k:]`. See `topk` for the parameters, `idx_dtype` being the dtype
+    of the result.
+
+    """
+    return _topk(x, kth, axis, sorted, idx_dtype, False, True)
+
+
+def topk_and_argtopk(x, kth, axis=-1, sorted=True, idx_dtype='int64'):
+    """
+    Returns the result of `topk` and `argtopk`, computed together.
+
+    See `topk` for the parameters.
+
+    """
+    return _topk(x, kth, axis, sorted, idx_dtype, True, True)
+
+
+@register_specialize
+@local_optimizer([Subtensor])
+def local_sort_subtensor_topk(node):
+    """
+    sort(x)[..., -k:] -> topk(x, k)
+    sort(x)[..., :k] -> topk(x, -k)
+
+    and the same with argsort and argtopk, for a constant k, when the full
+    sort is not used elsewhere.
+
+    """
+    if not isinstance(node.op, Subtensor):
+        return
+    sorted_x = node.inputs[0]
+    if (not sorted_x.owner or
+            not isinstance(sorted_x.owner.op, (SortOp, ArgSortOp)) or
+            sorted_x.owner.op.order is not None or
+            len(sorted_x.clients) != 1):
+        return
+    x, axis = sorted_x.owner.inputs
+    try:
+        axis = int(get_scalar_constant_value(axis)) % x.ndim
+    except (NotScalarConstantError, TypeError):
+        return
+    idx = get_idx_list(node.inputs, node.op.idx_list)
+    if len(idx) <= axis:
+        return
+    for i, entry in enumerate(idx):
+        if not isinstance(entry, slice) or entry.step is not None:
+            return
+        if i != axis and (entry.start is not None or entry.stop is not None):
+            return
+    entry = idx[axis]
+    try:
+        if entry.start is not None and entry.stop is None:
+            kth = -int(get_scalar_constant_value(entry.start))
+            if kth <= 0:
+                return
+        elif entry.start is None and entry.stop is not None:
+            kth = -int(get_scalar_constant_value(entry.stop))
+            if kth >= 0:
+                return
+        else:
+            return
+    except NotScalarConstantError:
+        return
+    is_sort = isinstance(sorted_x.owner.op, SortOp)
+    out = TopKOp(axis, return_values=is_sort,
+                 return_indices=not is_sort)(x, kth)
+    out = theano.tensor.patternbroadcast(out, node.outputs[0].broadcastable)
+    copy_stack_trace(node.outputs[0], out)
+    return [out]
@@ -12,7 +12,8 @@ import theano
 from theano.compat import izip
 from theano.gradient import DisconnectedType
 from theano import gof
-from theano.gof import Apply, hashtype, Op, Type, MethodNotDefined
+from theano.gof import (Apply, hashtype, Op, OpenMPOp, Type,
+                        MethodNotDefined)
 from theano.printing import pprint
 from theano import scalar as scal
 from theano.tensor.basic import alloc
@@ -929,13 +930,12 @@ class Subtensor(Op):
 
         finish_view = """
         Py_XDECREF(%(z)s);
-        Py_INCREF(py_%(x)s);
+        Py_INCREF(%(x)s);
 #if NPY_API_VERSION < 0x00000007
-        PyArray_BASE(xview) = py_%(x)s;
+        PyArray_BASE(xview) = (PyObject*)%(x)s;
 #else
-        PyArray_SetBaseObject(xview, py_%(x)s);
+        PyArray_SetBaseObject(xview, (PyObject*)%(x)s);
 #endif
-        assert(py_%(x)s == (PyObject*)%(x)s);
         %(z)s = xview;
         """ % locals()
 
@@ -948,7 +948,7 @@ class Subtensor(Op):
         # have a versioned version of this op's C code.
         if len(hv) == 0:
             return ()
-        return (4, hv)
+        return (5, hv)
 
     def R_op(self, inputs, eval_points):
         # Subtensor is not differentiable wrt to its indices, therefore we
@@ -1226,6 +1226,7 @@ class IncSubtensor(Op):
     """
 
     check_input = False
+    _f16_ok = True
     __props__ = ("idx_list", "inplace", "set_instead_of_inc")
 
     def __init__(self, idx_list, inplace=False, set_instead_of_inc=False,
@@ -1482,7 +1483,7 @@ class IncSubtensor(Op):
     def c_code_cache_version(self):
         hv = Subtensor.helper_c_code_cache_version()
         if hv:
-            return (1, hv)
+            return (2, hv)
         else:
             return ()
 
@@ -1510,7 +1511,7 @@ class IncSubtensor(Op):
         # max_depth: we pass 0 to have this parameter ignored
         # requirements: here we pass NPY_ARRAY_ENSURECOPY to force a copy
         # context: this is almost always NULL, I'm not sure what it's used for
-        return """(PyArrayObject*)PyArray_FromAny(py_%(x)s, NULL, 0, 0,
+        return """(PyArrayObject*)PyArray_FromAny((PyObject*)%(x)s, NULL, 0, 0,
                 NPY_ARRAY_ENSURECOPY, NULL)""" % locals()
 
     def make_view_array(self, x, view_ndim):
@@ -1572,7 +1573,7 @@ class IncSubtensor(Op):
 
         return """
             PyArrayObject * add_rval = (PyArrayObject*)PyNumber_InPlaceAdd(
-                    (PyObject*)zview, py_%(x)s);
+                    (PyObject*)zview, (PyObject*)%(x)s);
             if (add_rval)
             {
                 assert (PyArray_Check((PyObject*)add_rval));
@@ -1675,17 +1676,75 @@ def _sum_grad_over_bcasted_dims(x, gx):
 # docs.scipy.org/doc/numpy/reference/arrays.indexing.html#advanced-indexing
 
 
-class AdvancedSubtensor1(Op):
+def _c_index1(ilist, k):
+    """
+    C expression of the `k`-th value of the vector of indices `ilist`,
+    as a npy_int64.
+
+    """
+    return ("((npy_int64)*(dtype_%(ilist)s*)(PyArray_BYTES(%(ilist)s) + "
+            "(%(k)s) * PyArray_STRIDES(%(ilist)s)[0]))" % locals())
+
+
+def _c_check_index1(ilist, dtype, n, fail):
+    """
+    C code raising an IndexError if a value of the vector of indices
+    `ilist` is out of bounds for a dimension of length `n`.
+
+    """
+    index = _c_index1(ilist, 'k')
+    if dtype == 'uint64':
+        # Values that do not fit in a npy_int64 are negative after the cast.
+        lower = '0'
+    else:
+        lower = '-(%s)' % n
+    return """
+    for (npy_intp k = 0; k < PyArray_DIMS(%(ilist)s)[0]; ++k) {
+        npy_int64 j = %(index)s;
+        if (j < %(lower)s || j >= (%(n)s)) {
+            PyErr_Format(PyExc_IndexError,
+                         "index %%lld is out of bounds for axis 0 with size %%lld",
+                         (long long)j, (long long)(%(n)s));
+            %(fail)s;
+        }
+    }
+    """ % locals()
+
+
+def _c_rows_contiguous(x, row_size, rows_contiguous):
+    """
+    C code declaring `row_size`, the number of elements of x[i], and
+    `rows_contiguous`, true when the elements of each x[i] are contiguous.
+
+    """
+    return """
+    npy_intp %(row_size)s = 1;
+    bool %(rows_contiguous)s = true;
+    for (int d = PyArray_NDIM(%(x)s) - 1; d > 0; --d) {
+        if (PyArray_DIMS(%(x)s)[d] != 1 &&
+            PyArray_STRIDES(%(x)s)[d] !=
+                %(row_size)s * PyArray_ITEMSIZE(%(x)s))
+            %(rows_contiguous)s = false;
+        %(row_size)s *= PyArray_DIMS(%(x)s)[d];
+    }
+    """ % locals()
+
+
+class AdvancedSubtensor1(OpenMPOp):
     """
     Implement x[ilist] where ilist is a vector of integers.
 
+    When the rows x[i] are contiguous, the C code copies them directly, in
+    parallel over the indices if `openmp` is enabled.
+
     """
     # sparse_grad doesn't go in here since it only affects the output
     # of the grad() method.
     __props__ = ()
     _f16_ok = True
 
-    def __init__(self, sparse_grad=False):
+    def __init__(self, sparse_grad=False, openmp=None):
+        super(AdvancedSubtensor1, self).__init__(openmp=openmp)
         self.sparse_grad = sparse_grad
 
     def make_node(self, x, ilist):
@@ -1781,7 +1840,70 @@ class AdvancedSubtensor1(Op):
         a_name, i_name = input_names[0], input_names[1]
         output_name = output_names[0]
         fail = sub['fail']
+        check_index = _c_check_index1(i_name, node.inputs[1].dtype,
+                                      'n_rows', fail)
+        index = _c_index1(i_name, 'k')
+        rows_contiguous = _c_rows_contiguous(a_name, 'row_size',
+                                             'rows_contiguous')
+        if self.openmp:
+            minsize = config.openmp_elemwise_minsize
+            omp = ("#pragma omp parallel for schedule(static) "
+                   "if(n_idx * row_size >= %d)" % minsize)
+        else:
+            omp = ""
         return """
+        npy_intp n_rows = PyArray_DIMS(%(a_name)s)[0];
+        npy_intp n_idx = PyArray_DIMS(%(i_name)s)[0];
+        %(rows_contiguous)s
+        if (rows_contiguous) {
+            %(check_index)s
+            int nd = PyArray_NDIM(%(a_name)s);
+            bool reuse = (%(output_name)s != NULL &&
+                          PyArray_IS_C_CONTIGUOUS(%(output_name)s) &&
+                          PyArray_DIMS(%(output_name)s)[0] == n_idx);
+            for (int d = 1; reuse && d < nd; ++d) {
+                reuse = (PyArray_DIMS(%(output_name)s)[d] ==
+                         PyArray_DIMS(%(a_name)s)[d]);
+            }
+            if (!reuse) {
+                npy_intp dims[NPY_MAXDIMS];
+                dims[0] = n_idx;
+                for (int d = 1; d < nd; ++d) {
+                    dims[d] = PyArray_DIMS(%(a_name)s)[d];
+                }
+                Py_XDECREF(%(output_name)s);
+                %(output_name)s = (PyArrayObject*)PyArray_EMPTY(
+                    nd, dims, PyArray_TYPE(%(a_name)s), 0);
+                if (%(output_name)s == NULL) {
+                    %(fail)s;
+                }
+            }
+            const char* a_data = PyArray_BYTES(%(a_name)s);
+            npy_intp a_stride = PyArray_STRIDES(%(a_name)s)[0];
+            if (row_size == 1) {
+                dtype_%(output_name)s* out_data =
+                    (dtype_%(output_name)s*)PyArray_DATA(%(output_name)s);
+                %(omp)s
+                for (npy_intp k = 0; k < n_idx; ++k) {
+                    npy_int64 j = %(index)s;
+                    if (j < 0) j += n_rows;
+                    out_data[k] = *(const dtype_%(a_name)s*)(
+                        a_data + j * a_stride);
+                }
+            }
+            else {
+                char* out_data = PyArray_BYTES(%(output_name)s);
+                npy_intp row_bytes = row_size * PyArray_ITEMSIZE(%(a_name)s);
+                %(omp)s
+                for (npy_intp k = 0; k < n_idx; ++k) {
+                    npy_int64 j = %(index)s;
+                    if (j < 0) j += n_rows;
+                    memcpy(out_data + k * row_bytes, a_data + j * a_stride,
+                           row_bytes);
+                }
+            }
+        }
+        else {
             PyArrayObject *indices;
             int i_type = PyArray_TYPE(%(i_name)s);
             if (i_type != NPY_INTP) {
@@ -1856,23 +1978,31 @@ class AdvancedSubtensor1(Op):
                         %(a_name)s, (PyObject*)indices, 0, %(output_name)s, NPY_RAISE);
             Py_DECREF(indices);
             if (%(output_name)s == NULL) %(fail)s;
+        }
         """ % locals()
 
     def c_code_cache_version(self):
-        return (0, 1, 2)
+        return (0, 2, 0, self.openmp)
 
 advanced_subtensor1 = AdvancedSubtensor1()
 
 
-class AdvancedIncSubtensor1(Op):
+class AdvancedIncSubtensor1(OpenMPOp):
     """
     Increments a subtensor using advanced slicing (list of index).
 
+    When the rows x[i] are contiguous and y is either a row per index or
+    broadcasted over them, the C code updates the rows directly. If `openmp`
+    is enabled, each thread updates the rows it owns (the i with
+    i % nb_threads == thread number), in the order of the indices, so
+    duplicated indices are summed (or set) as in the sequential code.
+
     """
 
     __props__ = ('inplace', 'set_instead_of_inc')
 
-    def __init__(self, inplace=False, set_instead_of_inc=False):
+    def __init__(self, inplace=False, set_instead_of_inc=False, openmp=None):
+        super(AdvancedIncSubtensor1, self).__init__(openmp=openmp)
         self.inplace = inplace
         self.set_instead_of_inc = set_instead_of_inc
         if inplace:
@@ -1881,7 +2011,8 @@ class AdvancedIncSubtensor1(Op):
     def clone_inplace(self):
         return self.__class__(
             inplace=True,
-            set_instead_of_inc=self.set_instead_of_inc)
+            set_instead_of_inc=self.set_instead_of_inc,
+            openmp=self.openmp)
 
     def __str__(self):
         if self.inplace:
@@ -1942,7 +2073,7 @@ class AdvancedIncSubtensor1(Op):
         # max_depth: we pass 0 to have this parameter ignored
         # requirements: here we pass NPY_ARRAY_ENSURECOPY to force a copy
         # context: this is almost always NULL, I'm not sure what it's used for
-        return """(PyArrayObject*)PyArray_FromAny(py_%(x)s, NULL, 0, 0,
+        return """(PyArrayObject*)PyArray_FromAny((PyObject*)%(x)s, NULL, 0, 0,
                 NPY_ARRAY_ENSURECOPY, NULL)""" % locals()
 
     def c_support_code(self):
@@ -1963,8 +2094,7 @@ class AdvancedIncSubtensor1(Op):
             inplace = 0
         copy_of_x = self.copy_of_x(x)
 
-        return """
-        PyObject* rval = NULL;
+        code = """
         if (%(inplace)s)
         {
             if (%(x)s != %(out)s)
@@ -1979,17 +2109,130 @@ class AdvancedIncSubtensor1(Op):
             Py_XDECREF(%(out)s);
             %(out)s = %(copy_of_x)s;
         }
-        PyObject *arglist = Py_BuildValue("OOOi",%(out)s, %(idx)s, %(y)s, %(inc_or_set)d);
-        rval = inplace_increment(NULL, arglist);
-        Py_XDECREF(arglist);
-        if (rval == NULL) {
-            %(fail)s;
+        bool done = false;
+        """ % locals()
+        dtypes = [node.inputs[0].dtype, node.inputs[1].dtype]
+        if not any(d == 'float16' or d in theano.tensor.complex_dtypes
+                   for d in dtypes):
+            code += self._c_code_rows(node, name, input_names, output_names,
+                                      sub)
+        code += """
+        if (!done) {
+            PyObject *arglist = Py_BuildValue("OOOi",%(out)s, %(idx)s, %(y)s, %(inc_or_set)d);
+            PyObject* rval = inplace_increment(NULL, arglist);
+            Py_XDECREF(arglist);
+            if (rval == NULL) {
+                %(fail)s;
+            }
+            Py_XDECREF(rval);
+        }
+        """ % locals()
+        return code
+
+    def _c_code_rows(self, node, name, input_names, output_names, sub):
+        """
+        C code updating the rows of the output directly, setting `done` to
+        true, when they are contiguous and `y` is either a row per index or
+        broadcasted over the rows. Otherwise, `done` stays false and
+        inplace_increment is used.
+
+        """
+        x, y, idx = input_names
+        out = output_names[0]
+        fail = sub['fail']
+        check_index = _c_check_index1(idx, node.inputs[2].dtype, 'n_rows',
+                                      fail)
+        index = _c_index1(idx, 'k')
+        rows_contiguous = _c_rows_contiguous(out, 'row_size',
+                                             'rows_contiguous')
+        if self.set_instead_of_inc:
+            update = '='
+        else:
+            update = '+='
+        if self.openmp:
+            minsize = config.openmp_elemwise_minsize
+            omp = "#pragma omp parallel if(n_idx * row_size >= %d)" % minsize
+            nb_threads = "omp_get_num_threads()"
+            thread_num = "omp_get_thread_num()"
+        else:
+            omp = ""
+            nb_threads = "1"
+            thread_num = "0"
+        return """
+        {
+        npy_intp n_rows = PyArray_DIMS(%(out)s)[0];
+        npy_intp n_idx = PyArray_DIMS(%(idx)s)[0];
+        int x_nd = PyArray_NDIM(%(out)s);
+        int y_nd = PyArray_NDIM(%(y)s);
+        %(rows_contiguous)s
+        // Stride in bytes of y between the rows, 0 if they are broadcasted.
+        npy_intp y_row_stride = 0;
+        int y_inner = 0;
+        bool rows_ok = rows_contiguous;
+        if (y_nd == x_nd) {
+            y_inner = 1;
+            if (PyArray_DIMS(%(y)s)[0] == n_idx && n_idx != 1)
+                y_row_stride = PyArray_STRIDES(%(y)s)[0];
+            else if (PyArray_DIMS(%(y)s)[0] != 1)
+                rows_ok = false;
+        }
+        // The dimensions of y that match those of a row of the output.
+        npy_intp y_row_size = 1;
+        bool y_rows_contiguous = true;
+        for (int d = y_nd - 1; d >= y_inner; --d) {
+            npy_intp dim = PyArray_DIMS(%(y)s)[d];
+            if (dim != PyArray_DIMS(%(out)s)[d + x_nd - y_nd] && dim != 1)
+                rows_ok = false;
+            if (dim != 1 && PyArray_STRIDES(%(y)s)[d] !=
+                    y_row_size * PyArray_ITEMSIZE(%(y)s))
+                y_rows_contiguous = false;
+            y_row_size *= dim;
+        }
+        // Each row of y is either a full contiguous row, or one element
+        // broadcasted over the row.
+        npy_intp y_step = 1;
+        if (y_row_size == 1)
+            y_step = 0;
+        else if (y_row_size != row_size || !y_rows_contiguous)
+            rows_ok = false;
+        if (rows_ok) {
+            %(check_index)s
+            char* x_data = PyArray_BYTES(%(out)s);
+            npy_intp x_stride = PyArray_STRIDES(%(out)s)[0];
+            const char* y_data = PyArray_BYTES(%(y)s);
+            %(omp)s
+            {
+                int nb_threads = %(nb_threads)s;
+                int thread_num = %(thread_num)s;
+                for (npy_intp k = 0; k < n_idx; ++k) {
+                    npy_int64 j = %(index)s;
+                    if (j < 0) j += n_rows;
+                    if (j %% nb_threads != thread_num)
+                        continue;
+                    dtype_%(out)s* x_row = (dtype_%(out)s*)(
+                        x_data + j * x_stride);
+                    const dtype_%(y)s* y_row = (const dtype_%(y)s*)(
+                        y_data + k * y_row_stride);
+                    if (y_step) {
+                        for (npy_intp e = 0; e < row_size; ++e) {
+                            x_row[e] %(update)s (dtype_%(out)s)y_row[e];
+                        }
+                    }
+                    else {
+                        const dtype_%(out)s y_val = (dtype_%(out)s)y_row[0];
+                        for (npy_intp e = 0; e < row_size; ++e) {
+                            x_row[e] %(update)s y_val;
+                        }
+                    }
+                }
+            }
+            done = true;
+        }
         }
-        Py_XDECREF(rval);
         """ % locals()
 
     def c_code_cache_version(self):
-        return (3,)
+        return (5, self.openmp)
 
     def perform(self, node, inp, out_):
         # TODO opt to make this inplace
@@ -2127,16 +2370,400 @@ def adv_index_broadcastable_pattern(a, idx):
     return tuple([dim == 1 for dim in retshape])
 
 
-class AdvancedSubtensor(Op):
+def _advanced_index_kinds(x_ndim, indices):
+    """
+    Describe the layout of x[indices] for the C code of advanced indexing.
+
+    Parameters
+    ----------
+    x_ndim : int
+        Number of dimensions of the indexed tensor.
+    indices : list of Variable
+        The index inputs: integer tensors, slices and None.
+
+    Returns
+    -------
+    tuple
+        `(arrays, out_entries, nb)`. `arrays` lists, for each integer
+        index, its position in `indices`, the dimension of x it indexes and
+        its number of dimensions. `out_entries` describes the dimensions of
+        the output in order: ('b',) for the `nb` dimensions of the
+        broadcasted index arrays, ('slice', k, xdim), ('none',) or
+        ('full', xdim).
+
+    Raises
+    ------
+    MethodNotDefined
+        If an index is of an unknown type, or if there are more indices
+        than dimensions in x.
+
+    """
+    arrays = []
+    entries = []
+    xdim = 0
+    b_entry = None
+    last_array = None
+    adjacent = True
+    for k, idx in enumerate(indices):
+        if isinstance(idx.type, SliceType):
+            entries.append(('slice', k, xdim))
+            xdim += 1
+        elif isinstance(idx.type, NoneTypeT):
+            entries.append(('none',))
+        elif (isinstance(idx.type, TensorType) and
+              idx.type.dtype in theano.tensor.integer_dtypes):
+            if last_array is not None and last_array != k - 1:
+                adjacent = False
+            if b_entry is None:
+                b_entry = len(entries)
+                entries.append(('b',))
+            arrays.append((k, xdim, idx.type.ndim))
+            last_array = k
+            xdim += 1
+        else:
+            raise MethodNotDefined("advanced indexing with index", idx)
+    if xdim > x_ndim:
+        raise MethodNotDefined("too many indices")
+    entries.extend(('full', d) for d in range(xdim, x_ndim))
+    if b_entry is None:
+        b_entry = 0
+        entries.insert(0, ('b',))
+    elif not adjacent:
+        # The dimensions of the index arrays go first, as in numpy.
+        del entries[b_entry]
+        entries.insert(0, ('b',))
+    nb = max([nd for _, _, nd in arrays] + [0])
+    return arrays, entries, nb
+
+
+def _c_advanced_index(node, indexed, index_names, fail, setup, update,
+                      scatter, openmp):
+    """
+    C code applying `update` to each element of indexed[indices], for the C
+    code of AdvancedSubtensor and AdvancedIncSubtensor.
+
+    The integer index arrays are broadcasted once into a table of offsets
+    in `indexed`, then the elements are visited row by row, a row being
+    the last dimension of the output that does not come from the index
+    arrays, or the table of offsets when the dimensions of the index arrays
+    are the last ones of the output.
+
+    Parameters
+    ----------
+    node : Apply
+        The node, whose inputs are x, (y,) and the indices.
+    indexed : str
+        Name of the C array indexed, x or a copy of it.
+    index_names : list of str
+        Names of the C variables of the indices.
+    fail : str
+        C code to execute on failure.
+    setup : str
+        C code executed once the shape `out_dims` of the result of the
+        indexing is known, that declares `o_data`, the data of the other
+        array visited with the indexed elements, and fills `o_str`, its
+        strides in bytes for each dimension of `out_dims`.
+    update : str
+        C statement applied to each element, given `xp` and `op`, pointers
+        to the element in `indexed` and in the other array.
+    scatter : bool
+        If True, the threads split the rows so that an element of
+        `indexed` is always updated by the same thread, in the order of the
+        indices. Otherwise, they split the rows evenly.
+    openmp : bool
+        Use OpenMP.
+
+    """
+    x_ndim = node.inputs[0].ndim
+    indices = node.inputs[len(node.inputs) - len(index_names):]
+    arrays, entries, nb = _advanced_index_kinds(x_ndim, indices)
+    nb1 = max(nb, 1)
+    out_nd = sum(nb if e[0] == 'b' else 1 for e in entries)
+    out_nd1 = max(out_nd, 1)
+    nm = len(entries) - 1
+    nm1 = max(nm, 1)
+
+    # The block keeps the declarations out of the scope of the fail label.
+    code = """
+    {
+    npy_intp b_dims[%(nb1)d];
+    npy_intp nb_b = 1;
+    for (int j = 0; j < %(nb)d; ++j) {
+        b_dims[j] = 1;
+    }
+    """ % locals()
+    for k, xdim, na in arrays:
+        idx = index_names[k]
+        code += """
+    for (int j = 0; j < %(na)d; ++j) {
+        npy_intp dim = PyArray_DIMS(%(idx)s)[j];
+        npy_intp* b_dim = &b_dims[%(nb)d - %(na)d + j];
+        if (dim != 1) {
+            if (*b_dim == 1) {
+                *b_dim = dim;
+            }
+            else if (*b_dim != dim) {
+                PyErr_SetString(PyExc_IndexError,
+                    "shape mismatch: indexing arrays could not be "
+                    "broadcast together");
+                %(fail)s;
+            }
+        }
+    }
+    """ % locals()
+    code += """
+    for (int j = 0; j < %(nb)d; ++j) {
+        nb_b *= b_dims[j];
+    }
+    npy_intp x_base = 0;
+    """ % locals()
+
+    out_dims = []
+    m_code = []
+    for entry in entries:
+        if entry[0] == 'b':
+            b_pos = len(out_dims)
+            out_dims.extend('b_dims[%d]' % j for j in range(nb))
+            continue
+        m = len(m_code)
+        if entry[0] == 'slice':
+            _, k, xdim = entry
+            slc = index_names[k]
+            code += """
+    Py_ssize_t start_%(k)d, stop_%(k)d, step_%(k)d, len_%(k)d;
+    if (PySlice_GetIndicesEx(THEANO_PYSLICE(%(slc)s),
+                             PyArray_DIMS(%(indexed)s)[%(xdim)d],
+                             &start_%(k)d, &stop_%(k)d, &step_%(k)d,
+                             &len_%(k)d) != 0) {
+        %(fail)s;
+    }
+    x_base += start_%(k)d * PyArray_STRIDES(%(indexed)s)[%(xdim)d];
+    """ % locals()
+            dim = 'len_%d' % k
+            xstr = 'step_%d * PyArray_STRIDES(%s)[%d]' % (k, indexed, xdim)
+        elif entry[0] == 'none':
+            dim = '1'
+            xstr = '0'
+        else:
+            _, xdim = entry
+            dim = 'PyArray_DIMS(%s)[%d]' % (indexed, xdim)
+            xstr = 'PyArray_STRIDES(%s)[%d]' % (indexed, xdim)
+        m_code.append("""
+    m_dims[%d] = %s;
+    m_xstr[%d] = %s;
+    m_out[%d] = %d;
+    """ % (m, dim, m, xstr, m, len(out_dims)))
+        out_dims.append(dim)
+    assert len(out_dims) == out_nd
+
+    code += """
+    const int out_nd = %(out_nd)d;
+    npy_intp out_dims[%(out_nd1)d];
+    npy_intp o_str[%(out_nd1)d];
+    npy_intp m_dims[%(nm1)d], m_xstr[%(nm1)d], m_ostr[%(nm1)d];
+    int m_out[%(nm1)d];
+    """ % locals()
+    code += ''.join('out_dims[%d] = %s;\n' % (d, dim)
+                    for d, dim in enumerate(out_dims))
+    code += ''.join(m_code)
+    code += setup
+    code += """
+    for (int m = 0; m < %(nm)d; ++m) {
+        m_ostr[m] = o_str[m_out[m]];
+    }
+    // Offsets in %(indexed)s and in the other array of each element of the
+    // broadcasted index arrays.
+    npy_intp* b_x = (npy_intp*)malloc((2 * nb_b + 1) * sizeof(npy_intp));
+    if (b_x == NULL) {
+        PyErr_NoMemory();
+        %(fail)s;
+    }
+    npy_intp* b_o = b_x + nb_b;
+    for (npy_intp b = 0; b < nb_b; ++b) {
+        npy_intp coords[%(nb1)d];
+        npy_intp rest = b;
+        for (int j = %(nb)d - 1; j >= 0; --j) {
+            coords[j] = rest %% b_dims[j];
+            rest /= b_dims[j];
+        }
+        npy_intp x_off = 0, o_off = 0;
+        for (int j = 0; j < %(nb)d; ++j) {
+            o_off += coords[j] * o_str[%(b_pos)d + j];
+        }
+    """ % locals()
+    for k, xdim, na in arrays:
+        idx = index_names[k]
+        if indices[k].dtype == 'uint64':
+            # Values that do not fit in a npy_int64 are negative after the
+            # cast.
+            lower = '0'
+        else:
+            lower = '-n'
+        code += """
+        {
+            const char* p = PyArray_BYTES(%(idx)s);
+            for (int j = 0; j < %(na)d; ++j) {
+                if (PyArray_DIMS(%(idx)s)[j] != 1)
+                    p += (coords[%(nb)d - %(na)d + j] *
+                          PyArray_STRIDES(%(idx)s)[j]);
+            }
+            npy_int64 v = (npy_int64)*(const dtype_%(idx)s*)p;
+            npy_intp n = PyArray_DIMS(%(indexed)s)[%(xdim)d];
+            if (v < %(lower)s || v >= n) {
+                PyErr_Format(PyExc_IndexError,
+                             "index %%lld is out of bounds for axis %(xdim)d "
+                             "with size %%lld", (long long)v, (long long)n);
+                free(b_x);
+                %(fail)s;
+            }
+            if (v < 0) v += n;
+            x_off += v * PyArray_STRIDES(%(indexed)s)[%(xdim)d];
+        }
+        """ % locals()
+    code += """
+        b_x[b] = x_off;
+        b_o[b] = o_off;
+    }
+    """
+    if nm and nb and entries[-1] == ('b',):
+        # The dimensions of the index arrays are the last ones of the
+        # output: a row is the table of offsets, and a thread updates a whole
+        # row, so duplicated indices never go to different threads.
+        loop = """
+        for (npy_intp r = 0; r < n_rows; ++r) {
+            char* x_row = x_data + x_base;
+            char* o_row = o_data;
+            npy_intp rest = r;
+            for (int d = %(nm)d - 1; d >= 0; --d) {
+                npy_intp c = rest %% m_dims[d];
+                rest /= m_dims[d];
+                x_row += c * m_xstr[d];
+                o_row += c * m_ostr[d];
+            }
+            for (npy_intp i = 0; i < nb_b; ++i) {
+                char* xp = x_row + b_x[i];
+                char* op = o_row + b_o[i];
+                %(update)s;
+            }
+        }
+        """ % locals()
+        code += """
+    npy_intp inner_n = nb_b;
+    npy_intp n_rows = 1;
+    for (int d = 0; d < %(nm)d; ++d) {
+        n_rows *= m_dims[d];
+    }
+        """ % locals()
+        scatter = False
+    else:
+        if scatter:
+            owner = """
+            if (nb_threads > 1 &&
+                (npy_intp)((((npy_uint64)b_x[b] * 11400714819323198485ull) >> 32)
+                           + q) % nb_threads != thread_num)
+                continue;
+            """
+        else:
+            owner = ""
+        loop = """
+        for (npy_intp r = 0; r < n_rows; ++r) {
+            npy_intp b = r / n_outer;
+            npy_intp q = r %% n_outer;
+            %(owner)s
+            char* xp = x_data + x_base + b_x[b];
+            char* op = o_data + b_o[b];
+            npy_intp rest = q;
+            for (int d = %(nm)d - 2; d >= 0; --d) {
+                npy_intp c = rest %% m_dims[d];
+                rest /= m_dims[d];
+                xp += c * m_xstr[d];
+                op += c * m_ostr[d];
+            }
+            for (npy_intp i = 0; i < inner_n; ++i) {
+                %(update)s;
+                xp += x_in;
+                op += o_in;
+            }
+        }
+        """ % locals()
+        if nm:
+            code += """
+    npy_intp inner_n = m_dims[%(nm)d - 1];
+    npy_intp x_in = m_xstr[%(nm)d - 1];
+    npy_intp o_in = m_ostr[%(nm)d - 1];
+            """ % locals()
+        else:
+            code += """
+    npy_intp inner_n = 1, x_in = 0, o_in = 0;
+            """
+        code += """
+    npy_intp n_outer = 1;
+    for (int d = 0; d < %(nm)d - 1; ++d) {
+        n_outer *= m_dims[d];
+    }
+    npy_intp n_rows = nb_b * n_outer;
+        """ % locals()
+    if openmp:
+        minsize = config.openmp_elemwise_minsize
+        if scatter:
+            loop = """
+    #pragma omp parallel if(n_rows * inner_n >= %(minsize)d)
+    {
+        int nb_threads = omp_get_num_threads();
+        int thread_num = omp_get_thread_num();
+        %(loop)s
+    }
+            """ % locals()
+        else:
+            loop = """
+    #pragma omp parallel for schedule(static) if(n_rows * inner_n >= %(minsize)d)
+    %(loop)s
+            """ % locals()
+    elif scatter:
+        loop = """
+    {
+        int nb_threads = 1;
+        int thread_num = 0;
+        %(loop)s
+    }
+        """ % locals()
+    code += """
+    char* x_data = PyArray_BYTES(%(indexed)s);
+    %(loop)s
+    free(b_x);
+    }
+    """ % locals()
+    return code
+
+
+_advanced_index_support_code = """
+#ifndef THEANO_PYSLICE
+#if PY_MAJOR_VERSION >= 3
+#define THEANO_PYSLICE(s) (s)
+#else
+#define THEANO_PYSLICE(s) ((PySliceObject*)(s))
+#endif
+#endif
+"""
+
+
+class AdvancedSubtensor(OpenMPOp):
     """
     Return a subtensor copy, using advanced indexing.
 
+    The C code handles integer index arrays mixed with slices and None. A
+    boolean mask is indexed with the integer arrays of its nonzero().
+
     """
 
     # Should be used by __getitem__ and __getslice__, as follow:
     # AdvancedSubtensor()(self, *args),
     # if args contains and advanced indexing pattern
     __props__ = ()
+    _f16_ok = True
+
+    def __init__(self, openmp=None):
+        super(AdvancedSubtensor, self).__init__(openmp=openmp)
 
     def make_node(self, x, *index):
         x = theano.tensor.as_tensor_variable(x)
@@ -2174,7 +2801,43 @@ class AdvancedSubtensor(Op):
         out, = out_
         # TODO: in general, we need to re-pack the inputs into a valid
         # index, just like subtensor
-        out[0] = inputs[0].__getitem__(inputs[1:])
+        out[0] = inputs[0].__getitem__(tuple(inputs[1:]))
+
+    def c_support_code(self):
+        return _advanced_index_support_code
+
+    def c_code(self, node, name, inputs, outputs, sub):
+        if self.__class__ is not AdvancedSubtensor:
+            raise MethodNotDefined(
+                "c_code defined for AdvancedSubtensor,"
+                " not for child class", type(self))
+        x = inputs[0]
+        out, = outputs
+        fail = sub['fail']
+        setup = """
+        bool reuse = (%(out)s != NULL && PyArray_NDIM(%(out)s) == out_nd);
+        for (int d = 0; reuse && d < out_nd; ++d) {
+            reuse = (PyArray_DIMS(%(out)s)[d] == out_dims[d]);
+        }
+        if (!reuse) {
+            Py_XDECREF(%(out)s);
+            %(out)s = (PyArrayObject*)PyArray_EMPTY(
+                out_nd, out_dims, PyArray_TYPE(%(x)s), 0);
+            if (%(out)s == NULL) {
+                %(fail)s;
+            }
+        }
+        char* o_data = PyArray_BYTES(%(out)s);
+        for (int d = 0; d < out_nd; ++d) {
+            o_str[d] = PyArray_STRIDES(%(out)s)[d];
+        }
+        """ % locals()
+        update = "*(dtype_%(out)s*)op = *(const dtype_%(x)s*)xp" % locals()
+        return _c_advanced_index(node, x, inputs[1:], fail, setup, update,
+                                 scatter=False, openmp=self.openmp)
+
+    def c_code_cache_version(self):
+        return (1, self.openmp)
 
     def connection_pattern(self, node):
         rval = [[True]]
@@ -2194,22 +2857,33 @@ class AdvancedSubtensor(Op):
 advanced_subtensor = AdvancedSubtensor()
 
 
-class AdvancedIncSubtensor(Op):
+class AdvancedIncSubtensor(OpenMPOp):
     """
     Increments a subtensor using advanced indexing.
+
+    In the C code, if `openmp` is enabled, each element of x is updated by
+    only one thread, in the order of the indices, so duplicated indices are
+    summed (or set) as in the sequential code.
+
     """
 
     __props__ = ("inplace", "set_instead_of_inc")
 
-    def __init__(self, inplace=False, set_instead_of_inc=False):
+    def __init__(self, inplace=False, set_instead_of_inc=False, openmp=None):
+        super(AdvancedIncSubtensor, self).__init__(openmp=openmp)
         self.inplace = inplace
         self.set_instead_of_inc = set_instead_of_inc
         # The assert is needed as in the pass the first argument was
         # something else that was not used.
         assert isinstance(inplace, bool)
         if self.inplace:
-            raise NotImplementedError('In place computation is not'
-                                      ' implemented')
+            self.destroy_map = {0: [0]}
+
+    def clone_inplace(self):
+        return self.__class__(
+            inplace=True,
+            set_instead_of_inc=self.set_instead_of_inc,
+            openmp=self.openmp)
 
     def __str__(self):
         return "%s{%s, %s}" % (self.__class__.__name__,
@@ -2243,7 +2917,7 @@ class AdvancedIncSubtensor(Op):
             out[0] = inputs[0]
 
         if self.set_instead_of_inc:
-            out[0][inputs[2:]] = inputs[1]
+            out[0][tuple(inputs[2:])] = inputs[1]
         elif config.cxx:
             inplace_increment(out[0], tuple(inputs[2:]), inputs[1])
         else:
@@ -2253,6 +2927,69 @@ class AdvancedIncSubtensor(Op):
                 'Please make sure that you have a working C++ compiler '
                 'and that config.cxx is correctly set.')
 
+    def c_support_code(self):
+        return _advanced_index_support_code
+
+    def c_code(self, node, name, inputs, outputs, sub):
+        if self.__class__ is not AdvancedIncSubtensor:
+            raise MethodNotDefined(
+                "c_code defined for AdvancedIncSubtensor,"
+                " not for child class", type(self))
+        for var in node.inputs[:2]:
+            if (var.dtype == 'float16' or
+                    var.dtype in theano.tensor.complex_dtypes):
+                raise MethodNotDefined("AdvancedIncSubtensor of", var.dtype)
+        x, y = inputs[:2]
+        out, = outputs
+        fail = sub['fail']
+        if self.set_instead_of_inc:
+            update = "="
+        else:
+            update = "+="
+        update = ("*(dtype_%(out)s*)xp %(update)s "
+                  "(dtype_%(out)s)*(const dtype_%(y)s*)op" % locals())
+        setup = """
+        for (int d = 0; d < out_nd; ++d) {
+            o_str[d] = 0;
+        }
+        for (int d = 0; d < PyArray_NDIM(%(y)s); ++d) {
+            npy_intp dim = PyArray_DIMS(%(y)s)[d];
+            int od = d + out_nd - PyArray_NDIM(%(y)s);
+            if (dim != 1 && (od < 0 || dim != out_dims[od])) {
+                PyErr_SetString(PyExc_ValueError,
+                    "shape mismatch: value array could not be broadcast "
+                    "to the indexing result");
+                %(fail)s;
+            }
+            if (dim != 1) {
+                o_str[od] = PyArray_STRIDES(%(y)s)[d];
+            }
+        }
+        char* o_data = PyArray_BYTES(%(y)s);
+        """ % locals()
+        if self.inplace:
+            copy_x = """
+        if (%(out)s != %(x)s) {
+            Py_XDECREF(%(out)s);
+            Py_INCREF(%(x)s);
+            %(out)s = %(x)s;
+        }
+        """ % locals()
+        else:
+            copy_x = """
+        Py_XDECREF(%(out)s);
+        %(out)s = (PyArrayObject*)PyArray_NewCopy(%(x)s, NPY_CORDER);
+        if (%(out)s == NULL) {
+            %(fail)s;
+        }
+        """ % locals()
+        return copy_x + _c_advanced_index(
+            node, out, inputs[2:], fail, setup, update, scatter=True,
+            openmp=self.openmp)
+
+    def c_code_cache_version(self):
+        return (2, self.openmp)
+
     def infer_shape(self, node, ishapes):
         return [ishapes[0]]
 
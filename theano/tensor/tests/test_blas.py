@@ -7,6 +7,7 @@ import numpy
 from numpy import (arange, array, common_type, complex64, complex128, float32,
                   float64, newaxis, shape, transpose, zeros)
 from numpy.testing import assert_array_almost_equal
+from nose.plugins.skip import SkipTest
 
 from six.moves import xrange
 
@@ -1081,6 +1082,42 @@ def test_dot_w_self():
     f(numpy.asarray([[0, 1], [2, 3]], dtype=config.floatX))
 
 
+def test_float16():
+    # float16 matrices are multiplied in float32 by the C code of Dot22,
+    # Dot22Scalar and Gemm.
+    if not config.cxx or not config.blas.ldflags:
+        raise SkipTest("No C BLAS")
+    rng = numpy.random.RandomState(unittest_tools.fetch_seed())
+    x = T.matrix(dtype='float16')
+    y = T.matrix(dtype='float16')
+    z = T.matrix(dtype='float16')
+    a = numpy.float16(0.5)
+    b = numpy.float16(-2)
+    mode = theano.compile.Mode(linker='c', optimizer='fast_run')
+    for out, op, ref in [
+            (T.dot(x, y), _dot22, lambda xv, yv, zv: numpy.dot(xv, yv)),
+            (a * T.dot(x, y), _dot22scalar,
+             lambda xv, yv, zv: a * numpy.dot(xv, yv)),
+            (b * z + a * T.dot(x, y), gemm_no_inplace,
+             lambda xv, yv, zv: b * zv + a * numpy.dot(xv, yv))]:
+        f = theano.function([x, y, z], out, mode=mode,
+                            on_unused_input='ignore')
+        assert op in [n.op for n in f.maker.fgraph.toposort()]
+        # The tiles converted to float32 are 256 x 256.
+        for m, k, n in [(3, 4, 5), (40, 600, 300), (1, 5, 7), (0, 4, 5),
+                        (3, 0, 5)]:
+            xv = rng.uniform(-1, 1, (m, k)).astype('float16')
+            yv = rng.uniform(-1, 1, (k, n)).astype('float16')
+            zv = rng.uniform(-1, 1, (m, n)).astype('float16')
+            for xv, yv in [(xv, yv), (numpy.asfortranarray(xv), yv[:, ::-1])]:
+                res = f(xv, yv, zv)
+                assert res.dtype == 'float16'
+                expected = ref(xv.astype('float32'), yv.astype('float32'),
+                               zv.astype('float32'))
+                unittest_tools.assert_allclose(res, expected, rtol=2e-3,
+                                               atol=1e-2)
+
+
 ###############################################################################
 # Tests for Gemv
 ###############################################################################
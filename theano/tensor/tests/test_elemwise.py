@@ -17,7 +17,7 @@ from theano import tensor
 from theano.tensor import TensorType, as_tensor_variable
 from theano.compile.mode import get_default_mode
 from theano.tensor.elemwise import (CAReduce, Elemwise, DimShuffle,
-                                    Prod, ProdWithoutZeros)
+                                    ElemwiseCAReduce, Prod, ProdWithoutZeros)
 from theano.tests import unittest_tools
 from theano.tests.unittest_tools import attr
 
@@ -551,6 +551,36 @@ class test_CAReduce(unittest_tools.InferShapeTester):
             self.with_linker(gof.CLinker(), scalar.maximum, dtype=dtype,
                              test_nan=True)
 
+    def test_c_contiguous(self):
+        # The C code has a faster path for C contiguous inputs reduced over
+        # consecutive axes, and splits large full reductions in chunks.
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        rng = numpy.random.RandomState(unittest_tools.fetch_seed())
+        mode = theano.Mode(linker='c', optimizer=None)
+        cases = [((200003,), None),
+                 ((7, 300), (0, )),
+                 ((7, 300), (1, )),
+                 ((3, 1500, 5), (1, )),
+                 ((2, 3, 4, 5), (1, 2)),
+                 ((2, 3, 4, 5), (0, 2))]
+        for openmp in [False, True]:
+            for xsh, axis in cases:
+                x = tensor.tensor(theano.config.floatX, (False,) * len(xsh))
+                outs = [CAReduce(scalar_op, axis=axis, openmp=openmp)(x)
+                        for scalar_op in [scalar.add, scalar.maximum]]
+                f = theano.function([x], outs, mode=mode)
+                xv = numpy.asarray(rng.uniform(-1, 1, xsh),
+                                   dtype=theano.config.floatX)
+                np_axis = tuple(axis) if axis is not None else None
+                # C contiguous, F contiguous and non contiguous inputs.
+                for v in [xv, numpy.asfortranarray(xv), xv[..., ::-1]]:
+                    f_sum, f_max = f(v)
+                    unittest_tools.assert_allclose(v.sum(axis=np_axis),
+                                                   f_sum)
+                    unittest_tools.assert_allclose(v.max(axis=np_axis),
+                                                   f_max)
+
     def test_infer_shape(self, dtype=None, pre_scalar_op=None):
         if dtype is None:
             dtype = theano.config.floatX
@@ -1183,6 +1213,83 @@ class TestElemwise(unittest_tools.InferShapeTester):
                 [Elemwise(scalar.add)(t_left, t_right)],
                 [t_left_val, t_right_val], Elemwise)
 
+    def test_c_contiguous(self):
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        x = tensor.dmatrix()
+        y = tensor.dmatrix()
+        s = tensor.dscalar()
+        rng = numpy.random.RandomState(unittest_tools.fetch_seed())
+        xv = rng.rand(5, 8)
+        yv = rng.rand(5, 8)
+        mode = theano.compile.Mode(linker='c', optimizer=None)
+        for openmp in [False, True]:
+            add = Elemwise(scalar.add, openmp=openmp)
+            add_inplace = Elemwise(scalar.add, {0: 0}, openmp=openmp)
+            mul = Elemwise(scalar.mul, openmp=openmp)
+            f = theano.function([x, y, s], [add(x, y), mul(x, s)], mode=mode)
+            g = theano.function([x, y], add_inplace(x, y), mode=mode,
+                                accept_inplace=True)
+            for a, b in [(xv, yv),
+                         (numpy.asfortranarray(xv), numpy.asfortranarray(yv)),
+                         (xv, numpy.asfortranarray(yv)),
+                         (xv[:, ::2], yv[:, ::2])]:
+                out = f(a, b, 3.)
+                unittest_tools.assert_allclose(out[0], a + b)
+                unittest_tools.assert_allclose(out[1], a * 3.)
+                unittest_tools.assert_allclose(g(a.copy(), b), a + b)
+
+    def test_float16(self):
+        # The float16 values are computed in float32 by the C code.
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        x = tensor.matrix(dtype='float16')
+        y = tensor.matrix(dtype='float16')
+        rng = numpy.random.RandomState(unittest_tools.fetch_seed())
+        xv = rng.uniform(-2, 2, (5, 8)).astype('float16')
+        yv = rng.uniform(-2, 2, (5, 8)).astype('float16')
+        c_mode = theano.compile.Mode(linker='c', optimizer='fast_run')
+        py_mode = theano.compile.Mode(linker='py', optimizer='fast_run')
+        for out in [x + y, tensor.exp(x) * y, tensor.tanh(x * 2),
+                    tensor.cast(x, 'float32') + 1, tensor.cast(x * 2, 'int32'),
+                    tensor.switch(x > y, x, y), x > 0]:
+            f = theano.function([x, y], out, mode=c_mode,
+                                on_unused_input='ignore')
+            assert all(isinstance(n.op, Elemwise)
+                       for n in f.maker.fgraph.toposort())
+            ref = theano.function([x, y], out, mode=py_mode,
+                                  on_unused_input='ignore')
+            for a, b in [(xv, yv),
+                         (numpy.asfortranarray(xv), yv[:, ::-1])]:
+                out_c = f(a, b)
+                out_py = ref(a, b)
+                assert out_c.dtype == out_py.dtype
+                unittest_tools.assert_allclose(out_c, out_py, rtol=1e-3)
+
+        # The conversions round to the nearest even, like numpy.
+        f = theano.function([x], tensor.cast(tensor.cast(x, 'float32') * 3,
+                                             'float16'), mode=c_mode)
+        g = theano.function([y], tensor.cast(y, 'float32'), mode=c_mode)
+        halves = numpy.arange(2 ** 16, dtype='uint16').view('float16')
+        floats = halves.astype('float32').reshape(256, 256)
+        assert numpy.array_equal(g(halves.reshape(256, 256)).view('uint32'),
+                                 floats.view('uint32'))
+        assert numpy.array_equal(
+            f(halves.reshape(256, 256)).view('uint16'),
+            (floats * 3).astype('float16').view('uint16'))
+
+        # A cast to float16 inside a Composite computed in float32 still
+        # rounds, and overflows.
+        z = tensor.matrix(dtype='float32')
+        out = tensor.cast(tensor.cast(z * 3, 'float16'), 'float32') + z
+        f = theano.function([z], out, mode=c_mode)
+        assert isinstance(f.maker.fgraph.toposort()[0].op.scalar_op,
+                          theano.scalar.Composite)
+        zv = floats[numpy.isfinite(floats)][::64][:960] * 1.001
+        assert numpy.array_equal(
+            f(zv.reshape(40, 24)).flatten(),
+            (zv * 3).astype('float16').astype('float32') + zv)
+
     def test_input_dimensions_overflow(self):
         # Elemwise.perform used to compute the product
         # of input shapes to check if there was a zero in them,
@@ -1194,6 +1301,84 @@ class TestElemwise(unittest_tools.InferShapeTester):
         g(*[numpy.zeros(2 ** 11, config.floatX) for i in xrange(6)])
 
 
+class TestElemwiseCAReduce(unittest_tools.InferShapeTester):
+    def setUp(self):
+        super(TestElemwiseCAReduce, self).setUp()
+        self.rng = numpy.random.RandomState(unittest_tools.fetch_seed())
+        a = scalar.float64()
+        b = scalar.float64()
+        self.pre = scalar.Composite([a, b], [scalar.sqr(a - b)])
+
+    def test_perform(self):
+        x = tensor.dmatrix()
+        m = tensor.dcol()
+        xv = self.rng.rand(4, 5)
+        mv = self.rng.rand(4, 1)
+        for axis in [None, 0, 1, (0, 1)]:
+            op = ElemwiseCAReduce(CAReduce(scalar.add, axis), self.pre)
+            out = op(x, m)
+            ref = ((xv - mv) ** 2).sum(axis=axis)
+            for linker in ['py', 'c']:
+                if linker == 'c' and not theano.config.cxx:
+                    continue
+                f = theano.function([x, m], out,
+                                    mode=theano.compile.Mode(linker=linker))
+                unittest_tools.assert_allclose(f(xv, mv), ref)
+                unittest_tools.assert_allclose(
+                    f(numpy.asfortranarray(xv), mv), ref)
+
+    def test_infer_shape(self):
+        x = tensor.dmatrix()
+        m = tensor.dcol()
+        for axis in [None, 0, 1]:
+            op = ElemwiseCAReduce(CAReduce(scalar.add, axis), self.pre)
+            self._compile_and_check([x, m], [op(x, m)],
+                                    [self.rng.rand(4, 5), self.rng.rand(4, 1)],
+                                    ElemwiseCAReduce)
+
+    def test_float16(self):
+        # The float16 values are reduced in float32 by the C code.
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        x = tensor.matrix(dtype='float16')
+        y = tensor.matrix(dtype='float16')
+        xv = self.rng.uniform(-2, 2, (40, 30)).astype('float16')
+        yv = self.rng.uniform(-2, 2, (40, 30)).astype('float16')
+        mode = theano.compile.Mode(linker='c', optimizer='fast_run')
+        for axis in [None, 0, 1]:
+            for out, op, ref in [
+                    (x.sum(axis=axis), CAReduce,
+                     xv.astype('float32').sum(axis=axis)),
+                    (x.max(axis=axis), CAReduce, xv.max(axis=axis)),
+                    ((x * y).sum(axis=axis), ElemwiseCAReduce,
+                     (xv.astype('float32') * yv).sum(axis=axis)),
+                    (abs(x - y).max(axis=axis), ElemwiseCAReduce,
+                     abs(xv - yv).max(axis=axis))]:
+                f = theano.function([x, y], out, mode=mode,
+                                    on_unused_input='ignore')
+                topo = f.maker.fgraph.toposort()
+                assert [type(n.op) for n in topo if
+                        isinstance(n.op, (CAReduce, ElemwiseCAReduce))] == \
+                    [op] or issubclass(type(topo[-1].op), op), topo
+                for a, b in [(xv, yv),
+                             (numpy.asfortranarray(xv), yv[::-1])]:
+                    if b is not yv:
+                        ref = theano.function(
+                            [x, y], out, mode=theano.compile.Mode(
+                                linker='py'),
+                            on_unused_input='ignore')(a, b)
+                    res = f(a, b)
+                    assert res.dtype == 'float16'
+                    unittest_tools.assert_allclose(res, ref, rtol=2e-3,
+                                                   atol=2e-2)
+
+    def test_grad(self):
+        for axis in [None, 1]:
+            op = ElemwiseCAReduce(tensor.elemwise.Sum(axis), scalar.mul)
+            unittest_tools.verify_grad(op, [self.rng.rand(4, 5),
+                                            self.rng.rand(4, 1)])
+
+
 def test_gt_grad():
     """A user test that failed.
 
@@ -10,7 +10,8 @@ from theano.tests import unittest_tools as utt
 from theano.tensor.extra_ops import (SearchsortedOp, searchsorted,
                                      CumOp, cumsum, cumprod,
                                      CpuContiguous, cpu_contiguous,
-                                     bincount, DiffOp, diff, squeeze, compress,
+                                     BinCountOp, bincount, DiffOp, diff,
+                                     squeeze, compress,
                                      RepeatOp, repeat, Bartlett, bartlett,
                                      FillDiagonal, fill_diagonal,
                                      FillDiagonalOffset, fill_diagonal_offset,
@@ -176,6 +177,36 @@ class TestCumOp(utt.InferShapeTester):
             utt.verify_grad(self.op_class(axis=axis, mode='add'), [a], eps=4e-4)
             utt.verify_grad(self.op_class(axis=axis, mode='mul'), [a], eps=4e-4)
 
+    def test_c_code(self):
+        for dtype in ['float64', 'float32', 'int8', 'uint32']:
+            x = T.tensor3('x', dtype=dtype)
+            a = (np.random.random((3, 7, 4)) + 0.5).astype(dtype)
+            for axis in [None, 0, 1, -1]:
+                for mode, ref in [('add', np.cumsum), ('mul', np.cumprod)]:
+                    for op in [CumOp(axis, mode),
+                               CumOp(axis, mode, openmp=True)]:
+                        f = theano.function([x], op(x))
+                        for inp in [a, a[:, ::-1], a[:, :0]]:
+                            out = f(inp)
+                            assert out.dtype == dtype
+                            utt.assert_allclose(
+                                out, ref(inp, axis=axis, dtype=dtype))
+
+    def test_inplace(self):
+        x = T.matrix('x')
+        a = np.random.random((5, 6)).astype(config.floatX)
+        for axis in [0, 1]:
+            f = theano.function([theano.In(x, mutable=True)],
+                                cumsum(x, axis=axis))
+            assert f.maker.fgraph.toposort()[0].op == CumOp(axis,
+                                                            inplace=True)
+            for inp in [a.copy(), np.asfortranarray(a)]:
+                f(inp)
+                utt.assert_allclose(inp, np.cumsum(a, axis=axis))
+        # Not inplace on the flattened matrix.
+        f = theano.function([theano.In(x, mutable=True)], cumsum(x))
+        assert f.maker.fgraph.toposort()[0].op == CumOp()
+
 
 class TestBinCount(utt.InferShapeTester):
     def test_bincountFn(self):
@@ -217,6 +248,43 @@ class TestBinCount(utt.InferShapeTester):
                 f5 = theano.function([x], bincount(x, assert_nonneg=True))
                 self.assertRaises(AssertionError, f5, a)
 
+    def test_c_code(self):
+        x = T.lvector('x')
+        w = T.vector('w')
+        a = np.random.randint(0, 300, size=1000)
+        weights = np.random.random((1000,)).astype(config.floatX)
+        modes = [theano.compile.get_default_mode(),
+                 theano.compile.Mode(linker='py', optimizer='fast_run')]
+        for op in [BinCountOp(), BinCountOp(openmp=True)]:
+            for mode in modes:
+                f = theano.function([x, w], [op(x, None, 400),
+                                             op(x, w, 10)], mode=mode)
+                counts, sums = f(a, weights)
+                assert counts.dtype == 'int64'
+                assert sums.dtype == config.floatX
+                assert (counts == np.bincount(a, minlength=400)).all()
+                utt.assert_allclose(sums, np.bincount(a, weights))
+                f = theano.function([x], op(x, None, 3), mode=mode)
+                assert (f(np.zeros(0, dtype='int64')) == [0, 0, 0]).all()
+                self.assertRaises(ValueError, f, np.array([1, -1]))
+                f = theano.function([x, w], op(x, w, 0), mode=mode)
+                self.assertRaises(ValueError, f, a, weights[:10])
+
+    def test_infer_shape(self):
+        x = T.lvector('x')
+        w = T.vector('w')
+        a = np.random.randint(0, 50, size=25)
+        weights = np.random.random((25,)).astype(config.floatX)
+        self._compile_and_check([x, w],
+                                [bincount(x, w), bincount(x, minlength=70)],
+                                [a, weights],
+                                BinCountOp)
+
+    def test_grad(self):
+        a = np.random.randint(0, 10, size=25)
+        weights = np.random.random((25,)).astype(config.floatX)
+        utt.verify_grad(lambda w: bincount(a, w), [weights])
+
 
 class TestDiffOp(utt.InferShapeTester):
     nb = 10  # Number of time iterating for n
@@ -265,6 +333,18 @@ class TestDiffOp(utt.InferShapeTester):
             theano.function([x], T.grad(T.sum(diff(x, n=k)), x))
             utt.verify_grad(DiffOp(n=k), [a], eps=7e-3)
 
+    def test_c_code(self):
+        for dtype in ['float64', 'int8', 'uint16', 'int64']:
+            x = T.tensor3('x', dtype=dtype)
+            a = (np.random.random((4, 5, 6)) * 100).astype(dtype)
+            a = a[:, ::-1]
+            for axis in [0, 1, -1]:
+                for n in [1, 2, 4, 7]:
+                    f = theano.function([x], diff(x, n, axis))
+                    out = f(a)
+                    assert out.dtype == dtype
+                    assert (out == np.diff(a, n, axis)).all()
+
 
 class SqueezeTester(utt.InferShapeTester):
     shape_list = [(1, 3),
@@ -481,6 +561,24 @@ class TestRepeatOp(utt.InferShapeTester):
             for axis in self._possible_axis(ndim):
                 utt.verify_grad(lambda x: RepeatOp(axis=axis)(x, 3), [a])
 
+    def test_c_code(self):
+        for dtype in ['float64', 'bool', 'int16', 'complex64']:
+            x = T.tensor3(dtype=dtype)
+            a = (np.random.random((3, 4, 2)) * 3).astype(dtype)[:, ::-1]
+            r = T.lvector()
+            for axis in [None, 0, 1, -1]:
+                f = theano.function([x, r], RepeatOp(axis)(x, r))
+                n = a.size if axis is None else a.shape[axis]
+                reps = np.random.randint(0, 4, size=n)
+                out = f(a, reps)
+                assert out.dtype == dtype
+                assert (out == np.repeat(a, reps, axis)).all()
+                assert (f(a, [2]) == np.repeat(a, 2, axis)).all()
+                self.assertRaises(ValueError, f, a, [1, -1] + [1] * (n - 2))
+                self.assertRaises(ValueError, f, a, [1] * (n + 1))
+            f = theano.function([x], RepeatOp(1)(x, 3))
+            assert (f(a) == np.repeat(a, 3, 1)).all()
+
     def test_broadcastable(self):
         x = T.TensorType(config.floatX, [False, True, False])()
         r = RepeatOp(axis=1)(x, 2)
@@ -760,3 +858,41 @@ class test_Unique(utt.InferShapeTester):
                                     [np.asarray(np.array([[2, 1], [3, 2], [2, 3]]),
                                                 dtype=config.floatX)],
                                     self.op_class)
+
+    def test_c_code(self):
+        # The different ways the C code finds the unique values.
+        rng = np.random.RandomState(utt.fetch_seed())
+        floats = rng.randint(-5, 5, size=50).astype('float32')
+        floats[[3, 17, 40]] = np.nan
+        floats[floats == 0] = -0.0
+        floats[5] = 0
+        inputs = [rng.randint(-3, 4, size=(5, 7)).astype('int8'),
+                  rng.randint(0, 100, size=300).astype('uint16'),
+                  np.array([2 ** 62, -2 ** 62, 5, 2 ** 62, 5], dtype='int64'),
+                  rng.randint(0, 2, size=20).astype('bool'),
+                  floats,
+                  rng.rand(1000).round(2),
+                  np.zeros(0, dtype='float64')]
+        for inp in inputs:
+            x = theano.tensor.TensorType(inp.dtype, [False] * inp.ndim)()
+            for op in self.ops:
+                f = theano.function([x], op(x, return_list=True))
+                outs = f(inp)
+                outs_expected = np.unique(inp, op.return_index,
+                                          op.return_inverse, op.return_counts)
+                if not isinstance(outs_expected, tuple):
+                    outs_expected = [outs_expected]
+                outs_expected = list(outs_expected)
+                for out, out_exp in zip(outs, outs_expected):
+                    assert out.dtype == out_exp.dtype, (out.dtype,
+                                                        out_exp.dtype)
+                if op.return_inverse:
+                    # The NaNs are all distinct, but numpy only orders them
+                    # by position when it also returns the indices.
+                    inv = outs[1 + op.return_index]
+                    np.testing.assert_array_equal(outs[0][inv],
+                                                  inp.flatten())
+                    del outs[1 + op.return_index]
+                    del outs_expected[1 + op.return_index]
+                for out, out_exp in zip(outs, outs_expected):
+                    np.testing.assert_array_equal(out, out_exp)
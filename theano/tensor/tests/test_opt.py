@@ -14,6 +14,7 @@ from nose.tools import assert_raises, assert_true
 
 import theano
 import theano.scalar as scal
+from theano.scalar import fast_math
 from six import PY3, StringIO
 from theano import compile
 from theano.compile import deep_copy_op, DeepCopyOp
@@ -1547,6 +1548,145 @@ class TestCompositeCodegen(unittest.TestCase):
         utt.assert_allclose(f([[1.]]), [[0.]])
 
 
+class TestElemwiseCAReduceFusion(unittest.TestCase):
+    def setUp(self):
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        self.mode = mode_opt.including('local_elemwise_careduce_fusion')
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+
+    def test_fusion(self):
+        x = T.matrix()
+        y = T.matrix()
+        m = T.col()
+        cases = [(T.sum(x ** 2), lambda X, Y, M: (X ** 2).sum()),
+                 (T.max(abs(x - y), axis=0),
+                  lambda X, Y, M: abs(X - Y).max(axis=0)),
+                 (T.sum((x - m) ** 2, axis=-1),
+                  lambda X, Y, M: ((X - M) ** 2).sum(axis=-1)),
+                 (T.any(T.gt(x, y), axis=1),
+                  lambda X, Y, M: (X > Y).any(axis=1))]
+        X = numpy.asarray(self.rng.rand(5, 7), dtype=config.floatX)
+        Y = numpy.asarray(self.rng.rand(5, 7), dtype=config.floatX)
+        M = numpy.asarray(self.rng.rand(5, 1), dtype=config.floatX)
+        f = function([x], T.sum(x ** 2), mode=self.mode)
+        assert check_stack_trace(f, ops_to_check='all')
+        for out, ref in cases:
+            f = function([x, y, m], out, mode=self.mode,
+                         on_unused_input='ignore')
+            topo = f.maker.fgraph.toposort()
+            assert len(topo) == 1
+            assert isinstance(topo[0].op, T.elemwise.ElemwiseCAReduce)
+            for v in [X, numpy.asfortranarray(X)]:
+                utt.assert_allclose(f(v, Y, M), ref(v, Y, M))
+
+    def test_multiple_clients(self):
+        # The elemwise output is needed by another node.
+        x = T.matrix()
+        e = T.exp(x)
+        f = function([x], [e.sum(), e], mode=self.mode)
+        assert not any(isinstance(n.op, T.elemwise.ElemwiseCAReduce)
+                       for n in f.maker.fgraph.toposort())
+        X = numpy.asarray(self.rng.rand(5, 7), dtype=config.floatX)
+        utt.assert_allclose(f(X)[0], numpy.exp(X).sum())
+
+    def test_float16(self):
+        x = T.matrix(dtype='float16')
+        f = function([x], T.sum(T.exp(x), axis=1), mode=self.mode)
+        topo = f.maker.fgraph.toposort()
+        assert len(topo) == 1
+        assert isinstance(topo[0].op, T.elemwise.ElemwiseCAReduce)
+        X = self.rng.rand(5, 7).astype('float16')
+        utt.assert_allclose(f(X), numpy.exp(X.astype('float32')).sum(axis=1),
+                            rtol=1e-3)
+
+
+class TestLocalFloat16ToFloat32(unittest.TestCase):
+    def setUp(self):
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+
+    def test_softmax(self):
+        # Softmax has no float16 C code: it is computed in float32, and the
+        # casts are fused in the elemwise around.
+        x = T.matrix(dtype='float16')
+        y = T.matrix(dtype='float16')
+        out = T.nnet.softmax(T.nnet.softmax(x * 2)) + y
+        f = function([x, y], out, mode=mode_opt)
+        topo = f.maker.fgraph.toposort()
+        assert [type(n.op) for n in topo] == [
+            T.Elemwise, T.nnet.Softmax, T.nnet.Softmax, T.Elemwise], topo
+        assert topo[0].outputs[0].dtype == 'float32'
+        assert topo[1].inputs[0].dtype == 'float32'
+        assert topo[2].inputs[0].dtype == 'float32'
+        assert topo[-1].outputs[0].dtype == 'float16'
+        assert check_stack_trace(f, ops_to_check=T.nnet.Softmax)
+
+        X = self.rng.rand(5, 7).astype('float16')
+        Y = self.rng.rand(5, 7).astype('float16')
+        ref = function([x, y], out, mode=theano.compile.Mode(linker='py'))
+        res = f(X, Y)
+        assert res.dtype == 'float16'
+        utt.assert_allclose(res, ref(X, Y), rtol=2e-3)
+
+    def test_user_cast(self):
+        # The casts to float16 of float32 values, that round, are kept.
+        x = T.matrix(dtype='float32')
+        out = T.nnet.softmax(T.cast(x, 'float16'))
+        f = function([x], out, mode=mode_opt)
+        ref = function([x], out, mode=theano.compile.Mode(linker='py'))
+        X = numpy.asarray([[1e5, 0, 1], [1.0004, 1, 2]], dtype='float32')
+        res = f(X)
+        assert numpy.isnan(res[0]).all()
+        utt.assert_allclose(res[1], ref(X)[1], rtol=2e-3)
+
+    def test_not_applied(self):
+        # Not for the ops that support float16 or that have no C code.
+        x = T.matrix(dtype='float16')
+        for out in [T.exp(x).sum(axis=1), T.argmax(x, axis=1), x.T,
+                    T.split(x, [2, 3], 2, axis=1)[0]]:
+            f = function([x], out, mode=mode_opt)
+            assert not any(v.dtype == 'float32'
+                           for n in f.maker.fgraph.toposort()
+                           for v in n.inputs + n.outputs), out
+
+
+class TestLocalFastMath(unittest.TestCase):
+    def test_fast_math(self):
+        x = T.matrix()
+        out = T.tanh(x) + T.exp(-x) * T.log(x * x + 2)
+        v = numpy.random.RandomState(utt.fetch_seed()).uniform(
+            -5, 5, (4, 5)).astype(config.floatX)
+
+        f = function([x], out, mode=mode_opt)
+        ops = [n.op.scalar_op for n in f.maker.fgraph.toposort()]
+        assert not any(isinstance(op, fast_math.FastMathOp)
+                       for op in ops)
+
+        mode = mode_opt.including('fast_math')
+        f = function([x], out, mode=mode)
+        topo = f.maker.fgraph.toposort()
+        assert len(topo) == 1
+        inner = [type(n.op)
+                 for n in topo[0].op.scalar_op.fgraph.toposort()]
+        for fast_op in [fast_math.FastTanh, fast_math.FastExp,
+                        fast_math.FastLog]:
+            assert fast_op in inner
+        utt.assert_allclose(f(v), numpy.tanh(v) +
+                            numpy.exp(-v) * numpy.log(v * v + 2))
+
+        f = function([x], T.exp(x), mode=mode)
+        assert isinstance(f.maker.fgraph.toposort()[0].op.scalar_op,
+                          fast_math.FastExp)
+        assert check_stack_trace(f, ops_to_check='all')
+
+        # Not for integer inputs.
+        i = T.imatrix()
+        f = function([i], T.exp(i), mode=mode)
+        assert f.maker.fgraph.toposort()[0].op.scalar_op == scal.exp
+
+
 def test_log1p():
     m = theano.config.mode
     if m == 'FAST_COMPILE':
@@ -5278,8 +5418,9 @@ class T_local_sum_prod(unittest.TestCase):
     Test sum/prod opts in opt.py
     """
     def setUp(self):
-        self.mode = theano.compile.get_default_mode().including('canonicalize',
-                                                                'specialize')
+        self.mode = theano.compile.get_default_mode().including(
+            'canonicalize', 'specialize').excluding(
+            'local_elemwise_careduce_fusion')
 
     def test_local_sum_prod_mul_by_scalar(self):
         # Test the optimization local_sum_prod_mul_by_scalar for both Sum and
@@ -5634,7 +5775,8 @@ class T_local_reduce(unittest.TestCase):
         self.mode = theano.compile.get_default_mode().including(
             'canonicalize',
             'specialize',
-            'uncanonicalize', 'local_max_and_argmax')
+            'uncanonicalize', 'local_max_and_argmax').excluding(
+            'local_elemwise_careduce_fusion')
 
     def test_local_reduce_broadcast_all_0(self):
         for fct in [tensor.sum, tensor.all, tensor.any, tensor.prod,
@@ -5876,8 +6018,9 @@ class T_local_sum_prod_dimshuffle(unittest.TestCase):
         default_mode = theano.compile.mode.get_default_mode()
         # FusionOptimizer is included to make sure that expected_outer_operator
         # remains the same for all optimization modes.
-        mode_with_opt = default_mode.including('local_sum_prod_div_dimshuffle',
-                                               'FusionOptimizer')
+        mode_with_opt = default_mode.including(
+            'local_sum_prod_div_dimshuffle',
+            'FusionOptimizer').excluding('local_elemwise_careduce_fusion')
         mode_without_opt = default_mode.excluding('local_sum_prod_div_dimshuffle')
 
         # Numerical tests: tests whether the numerical values with and without
@@ -45,8 +45,11 @@ class T_max_and_argmax(unittest.TestCase):
 class T_min_max(unittest.TestCase):
     def setUp(self):
         utt.seed_rng()
+        # The fusion of the neg into the reduction would hide the graph
+        # checked here.
         self.mode = theano.compile.mode.get_default_mode().including(
-            'canonicalize', 'fast_run')
+            'canonicalize', 'fast_run').excluding(
+            'local_elemwise_careduce_fusion')
 
     def test_optimization_max(self):
         data = numpy.asarray(numpy.random.rand(2, 3), dtype=config.floatX)
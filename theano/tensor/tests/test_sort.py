@@ -9,6 +9,7 @@ from theano import tensor
 
 from theano.tensor.sort import sort, SortOp
 from theano.tensor.sort import argsort, ArgSortOp
+from theano.tensor.sort import topk, argtopk, topk_and_argtopk, TopKOp
 
 
 class test_sort(unittest.TestCase):
@@ -147,6 +148,18 @@ class TensorInferShapeTester(utt.InferShapeTester):
                 [np.random.randn(10, 40).astype(theano.config.floatX)],
                 SortOp)
 
+    def test_topk(self):
+        x = tensor.matrix()
+        k = tensor.lscalar()
+        for axis in [0, 1]:
+            for kth in [3, -2, 50]:
+                self._compile_and_check(
+                    [x, k],
+                    topk_and_argtopk(x, k, axis),
+                    [np.random.randn(10, 40).astype(theano.config.floatX),
+                     kth],
+                    TopKOp)
+
 
 def test_argsort():
     # Set up
@@ -219,3 +232,116 @@ def test_argsort_grad():
 
     data = np.random.rand(2, 3, 3).astype(theano.config.floatX)
     utt.verify_grad(lambda x: argsort(x, axis=2), [data])
+
+
+def _take(a, idx, axis):
+    # Like numpy.take_along_axis.
+    index = list(np.ix_(*[np.arange(n) for n in idx.shape]))
+    index[axis] = idx
+    return a[tuple(index)]
+
+
+class test_topk(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(seed=utt.fetch_seed())
+        mode = theano.compile.get_default_mode()
+        self.modes = [mode, theano.compile.Mode(linker='py',
+                                                optimizer=mode.optimizer)]
+
+    def _check(self, x, xval, kths, axis, sorted=True):
+        k = tensor.lscalar()
+        n = xval.shape[axis]
+        ref_idx = np.argsort(xval, axis, kind='mergesort')
+        for mode in self.modes:
+            f = theano.function([x, k], topk_and_argtopk(x, k, axis, sorted),
+                                mode=mode)
+            for kth in kths:
+                values, indices = f(xval, kth)
+                if kth > 0:
+                    expected = np.arange(max(n - kth, 0), n)
+                else:
+                    expected = np.arange(min(-kth, n))
+                expected = np.take(ref_idx, expected, axis)
+                assert values.dtype == xval.dtype
+                assert indices.dtype == 'int64'
+                ref = _take(xval, indices, axis)
+                assert np.all((values == ref) |
+                              (np.isnan(values) & np.isnan(ref)))
+                if not sorted:
+                    indices = np.sort(indices, axis)
+                    expected = np.sort(expected, axis)
+                assert np.all(indices == expected), (kth, indices, expected)
+
+    def test_values(self):
+        for dtype in ['float64', 'float32', 'int32', 'uint8']:
+            x = tensor.tensor3(dtype=dtype)
+            xval = (self.rng.rand(4, 7, 5) * 100).astype(dtype)
+            for axis in [0, 1, -1]:
+                self._check(x, xval, [1, 3, -1, -4, 7, 20, -20], axis)
+                self._check(x, xval, [2, -3, 20], axis, sorted=False)
+
+    def test_ties_and_nan(self):
+        # Equal elements are ordered by position, NaN comes last, like in
+        # a stable sort.
+        x = tensor.matrix(dtype='float64')
+        xval = np.floor(self.rng.rand(3, 30) * 4)
+        xval[xval == 3] = np.nan
+        self._check(x, xval, [1, 5, 29, -1, -6, -29], 1)
+
+    def test_functions(self):
+        x = tensor.vector(dtype='float64')
+        xval = self.rng.rand(10)
+        f = theano.function([x], [topk(x, 3), argtopk(x, -2),
+                                  argtopk(x, 2, idx_dtype='int32')])
+        values, indices, indices32 = f(xval)
+        utt.assert_allclose(values, np.sort(xval)[-3:])
+        assert np.all(indices == np.argsort(xval)[:2])
+        assert indices32.dtype == 'int32'
+        assert np.all(indices32 == np.argsort(xval)[-2:])
+        m = tensor.matrix(dtype='float64')
+        f = theano.function([m], topk(m, 4, axis=None))
+        mval = self.rng.rand(3, 5)
+        utt.assert_allclose(f(mval), np.sort(mval, None)[-4:])
+
+    def test_kth_zero(self):
+        x = tensor.vector()
+        k = tensor.lscalar()
+        for mode in self.modes:
+            f = theano.function([x, k], topk(x, k), mode=mode)
+            self.assertRaises(ValueError, f,
+                              np.ones(3, dtype=theano.config.floatX), 0)
+
+    def test_grad(self):
+        data = self.rng.rand(3, 6).astype(theano.config.floatX)
+        for kth in [2, -3]:
+            for axis in [0, 1]:
+                utt.verify_grad(lambda x: topk(x, kth, axis), [data])
+                utt.verify_grad(
+                    lambda x: topk(x, kth, axis, sorted=False) ** 2, [data])
+        x = tensor.matrix()
+        g = theano.grad(topk_and_argtopk(x, 2)[0].sum(), x)
+        expected = np.zeros_like(data)
+        expected[np.arange(3)[:, None], np.argsort(data)[:, -2:]] = 1
+        utt.assert_allclose(g.eval({x: data}), expected)
+
+    def test_opt(self):
+        x = tensor.matrix(dtype='float64')
+        xval = self.rng.rand(5, 8)
+        mode = theano.compile.get_default_mode().excluding('fusion')
+        cases = [(argsort(x)[:, -3:], np.argsort(xval)[:, -3:]),
+                 (argsort(x, 0)[:2], np.argsort(xval, 0)[:2]),
+                 (sort(x)[:, :4], np.sort(xval)[:, :4]),
+                 (sort(x, None)[-5:], np.sort(xval, None)[-5:])]
+        for out, expected in cases:
+            f = theano.function([x], out, mode=mode)
+            topo = f.maker.fgraph.toposort()
+            assert any(isinstance(n.op, TopKOp) for n in topo)
+            assert not any(isinstance(n.op, (SortOp, ArgSortOp))
+                           for n in topo)
+            utt.assert_allclose(f(xval), expected)
+        # The full sort is needed.
+        out = argsort(x)
+        f = theano.function([x], [out, out[:, -3:]], mode=mode)
+        assert not any(isinstance(n.op, TopKOp)
+                       for n in f.maker.fgraph.toposort())
@@ -24,15 +24,18 @@ from theano.tensor import (_shared, cscalar, ctensor3, dmatrix,
 from theano.tensor.basic import DimShuffle
 from theano.tensor.subtensor import (AdvancedIncSubtensor,
                                      AdvancedIncSubtensor1, AdvancedSubtensor,
+                                     AdvancedSubtensor1,
                                      IncSubtensor,
                                      Subtensor, advanced_inc_subtensor,
                                      advanced_inc_subtensor1,
                                      advanced_set_subtensor,
                                      advanced_set_subtensor1,
+                                     advanced_subtensor,
                                      get_canonical_form_slice, inc_subtensor,
                                      set_subtensor)
 
 from theano.tensor.tests.test_basic import inplace_func, rand, randint_ranged
+from theano.tensor.type_other import NoneConst, SliceConstant, slicetype
 from theano.tests import unittest_tools as utt
 from theano.tests.unittest_tools import attr
 
@@ -1258,6 +1261,33 @@ class T_subtensor(unittest.TestCase, utt.TestOptimizationMixin):
         f(numpy.random.normal(0, 1, (30, 4)))
 
 
+def test_c_linker_intermediate_input():
+    # When the whole graph is compiled by the CLinker, the input of the
+    # subtensor ops is an intermediate result that is never synced to
+    # Python.
+    if not theano.config.cxx:
+        raise SkipTest("G++ not available, so we need to skip this test.")
+    x = tensor.dmatrix()
+    y = tensor.dvector()
+    i = tensor.iscalar()
+    tmp = x * 2
+    outputs = [tmp[i] + 0,
+               tensor.inc_subtensor(tmp[i], y),
+               tensor.set_subtensor(tmp[1:], y),
+               tensor.inc_subtensor(tmp[[0, 2]], y)]
+    mode = theano.Mode(linker='c', optimizer=None)
+    f = theano.function([x, y, i], outputs, mode=mode)
+    x_val = numpy.arange(6.).reshape(3, 2)
+    y_val = numpy.ones(2)
+    ref = x_val * 2
+    expected = [ref[1], ref.copy(), ref.copy(), ref.copy()]
+    expected[1][1] += 1
+    expected[2][1:] = 1
+    expected[3][[0, 2]] += 1
+    for val, exp in zip(f(x_val, y_val, 1), expected):
+        utt.assert_allclose(val, exp)
+
+
 class TestIncSubtensor1(unittest.TestCase):
     # test inc_subtensor
     # also tests set_subtensor
@@ -1341,6 +1371,104 @@ class TestIncSubtensor1(unittest.TestCase):
         utt.assert_allclose(out1val, out2val)
 
 
+class TestAdvancedSubtensor1C(unittest.TestCase):
+    # Test the C code of AdvancedSubtensor1 and AdvancedIncSubtensor1,
+    # with and without OpenMP, against numpy.
+
+    def setUp(self):
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+        self.mode = theano.compile.Mode(linker='c', optimizer=None)
+
+    def test_take(self):
+        for openmp in [False, True]:
+            op = AdvancedSubtensor1(openmp=openmp)
+            for shape, idx_dtype in [((1000, 300), 'int64'),
+                                     ((7,), 'int8'),
+                                     ((5, 3, 4), 'uint64'),
+                                     ((5, 0), 'int32')]:
+                x = tensor.tensor(config.floatX, (False,) * len(shape))
+                idx = tensor.vector(dtype=idx_dtype)
+                f = theano.function([x, idx], op(x, idx), mode=self.mode)
+
+                xval = numpy.asarray(self.rng.rand(*shape),
+                                     dtype=config.floatX)
+                idxval = self.rng.randint(0, shape[0], 1200)
+                if idx_dtype != 'uint64':
+                    idxval[::3] -= shape[0]
+                idxval = idxval.astype(idx_dtype)
+                assert_array_equal(f(xval, idxval), xval[idxval])
+                # Strided indices and rows
+                assert_array_equal(f(xval[::2], idxval[::3] // 2),
+                                   xval[::2][idxval[::3] // 2])
+                if len(shape) > 1:
+                    xval_t = numpy.asarray(
+                        self.rng.rand(*shape[::-1]), dtype=config.floatX).T
+                    assert_array_equal(f(xval_t, idxval), xval_t[idxval])
+
+                for bad in [shape[0], -shape[0] - 1]:
+                    if bad < 0 and idx_dtype == 'uint64':
+                        continue
+                    self.assertRaises(IndexError, f, xval,
+                                      numpy.asarray([0, bad], idx_dtype))
+
+    def test_inc_set(self):
+        for openmp in [False, True]:
+            for set_instead_of_inc in [False, True]:
+                for inplace in [False, True]:
+                    op = AdvancedIncSubtensor1(
+                        inplace=inplace,
+                        set_instead_of_inc=set_instead_of_inc,
+                        openmp=openmp)
+                    self._check_inc_set(op)
+
+    def _check_inc_set(self, op):
+        for x_shape, y_shape, x_dtype, y_dtype in [
+                ((1000, 300), (1200, 300), 'float64', 'float64'),
+                ((20,), (1200,), 'int32', 'int32'),
+                ((20, 3), (1200, 3), 'float32', 'float64'),
+                ((20, 3, 2), (1, 3, 2), 'float64', 'float64'),
+                ((20, 3, 2), (3, 2), 'float64', 'float32'),
+                ((20, 3, 2), (), 'int64', 'int64'),
+                # Partly broadcasted y, that uses inplace_increment
+                ((20, 3, 2), (1200, 3, 1), 'float64', 'float64')]:
+            x = tensor.tensor(x_dtype, (False,) * len(x_shape))
+            y = tensor.tensor(y_dtype, [d == 1 for d in y_shape])
+            idx = tensor.lvector()
+            f = theano.function([x, y, idx], op(x, y, idx), mode=self.mode,
+                                accept_inplace=op.inplace)
+
+            xval = (self.rng.rand(*x_shape) * 10).astype(x_dtype)
+            yval = numpy.asarray(self.rng.rand(*y_shape) * 10, dtype=y_dtype)
+            # Many duplicated indices
+            idxval = self.rng.randint(-x_shape[0], x_shape[0], 1200)
+            if len(y_shape) < len(x_shape) or y_shape[0] == 1:
+                # y is broadcasted over the rows
+                idxval = idxval[:50]
+            else:
+                idxval = idxval[:y_shape[0]]
+                yval = yval[:len(idxval)]
+
+            expected = xval.copy()
+            if op.set_instead_of_inc:
+                expected[idxval] = yval
+            else:
+                yval_b = numpy.broadcast_to(
+                    yval.astype(x_dtype),
+                    (len(idxval),) + x_shape[1:])
+                for k, j in enumerate(idxval):
+                    expected[j] += yval_b[k]
+            xval_copy = xval.copy()
+            out = f(xval, yval, idxval)
+            utt.assert_allclose(out, expected)
+            if not op.inplace:
+                assert_array_equal(xval, xval_copy)
+
+            self.assertRaises(IndexError, f, xval, yval,
+                              idxval * 0 + x_shape[0])
+
+
 class TestAdvancedSubtensor(unittest.TestCase):
     # test inc_subtensor
     # also tests set_subtensor
@@ -1616,6 +1744,139 @@ class TestAdvancedSubtensor(unittest.TestCase):
                               numpy.random.rand(2).astype(self.dtype)])
 
 
+class TestAdvancedSubtensorC(unittest.TestCase):
+    # Test the C code of AdvancedSubtensor and AdvancedIncSubtensor,
+    # with and without OpenMP, against numpy.
+
+    def setUp(self):
+        if not theano.config.cxx:
+            raise SkipTest("G++ not available, so we need to skip this test.")
+        self.rng = numpy.random.RandomState(utt.fetch_seed())
+        self.mode = theano.compile.Mode(linker='c', optimizer=None)
+        self.xval = numpy.asarray(self.rng.rand(5, 6, 7), dtype=config.floatX)
+        self.x = tensor.tensor3()
+        self.indices = [
+            ([[0, -1, 3, 3]],),
+            ([1, 4], [[0], [5]]),
+            (slice(None), [2, 0, -6]),
+            (slice(1, None, 2), [[1, 2], [3, 4]], None),
+            # The index arrays are not next to each other, so their
+            # dimensions go first.
+            ([4, 0], slice(None, None, -2), [6, 0]),
+            (numpy.int64(2), slice(None), [1, 3, 1]),
+            ([3, 1], [0, 5], [6, 6]),
+            (None, numpy.asarray([1, 4, 1], dtype='uint8'), slice(1, 3)),
+            (numpy.zeros(0, dtype='int64'), slice(1, 3)),
+        ]
+
+    def index_variables(self, index):
+        variables = []
+        values = []
+        for i in index:
+            if isinstance(i, slice):
+                variables.append(SliceConstant(slicetype, i))
+            elif i is None:
+                variables.append(NoneConst.clone())
+            else:
+                i = numpy.asarray(i)
+                variables.append(tensor.tensor(str(i.dtype),
+                                               (False,) * i.ndim))
+                values.append(i)
+        return variables, values
+
+    def test_subtensor(self):
+        for openmp in [False, True]:
+            op = AdvancedSubtensor(openmp=openmp)
+            for index in self.indices:
+                variables, values = self.index_variables(index)
+                f = theano.function(
+                    [self.x] + [v for v in variables
+                                if isinstance(v.type, tensor.TensorType)],
+                    op(self.x, *variables), mode=self.mode)
+                assert_array_equal(f(self.xval, *values), self.xval[index])
+                # Non contiguous x
+                xval = self.xval[:, ::-1].copy()[:, ::-1]
+                assert_array_equal(f(xval, *values), xval[index])
+
+        variables, values = self.index_variables(([1, 4], [[0], [5]]))
+        f = theano.function([self.x] + variables,
+                            advanced_subtensor(self.x, *variables),
+                            mode=self.mode)
+        self.assertRaises(IndexError, f, self.xval, [1, 5], [[0], [5]])
+        self.assertRaises(IndexError, f, self.xval, [1, 4], [[0], [-7]])
+        self.assertRaises(IndexError, f, self.xval, [1, 4, 3], [[0, 5]])
+
+    def test_inc_subtensor(self):
+        for openmp in [False, True]:
+            for set_instead_of_inc in [False, True]:
+                op = AdvancedIncSubtensor(
+                    set_instead_of_inc=set_instead_of_inc, openmp=openmp)
+                for index in self.indices:
+                    self._check_inc_subtensor(op, index)
+
+    def _check_inc_subtensor(self, op, index):
+        variables, values = self.index_variables(index)
+        # Flat positions in x of the indexed elements
+        pos = numpy.arange(self.xval.size).reshape(self.xval.shape)[index]
+        for y_shape in [pos.shape, pos.shape[-1:], ()]:
+            y = tensor.tensor('float64', (False,) * len(y_shape))
+            f = theano.function(
+                [self.x, y] + [v for v in variables
+                               if isinstance(v.type, tensor.TensorType)],
+                op(self.x, y, *variables), mode=self.mode)
+            yval = numpy.asarray(self.rng.rand(*y_shape))
+            expected = self.xval.copy()
+            y_b = numpy.broadcast_to(yval.astype(expected.dtype), pos.shape)
+            if op.set_instead_of_inc:
+                expected.ravel()[pos.ravel()] = y_b.ravel()
+            else:
+                numpy.add.at(expected.ravel(), pos.ravel(), y_b.ravel())
+            utt.assert_allclose(f(self.xval, yval, *values), expected)
+
+    def test_nonzero(self):
+        # Boolean masks are indexed with their nonzero().
+        mask = self.x > 0.5
+        f = theano.function([self.x], [self.x[mask.nonzero()],
+                                       inc_subtensor(self.x[mask.nonzero()],
+                                                     1)])
+        out, inc_out = f(self.xval)
+        assert_array_equal(out, self.xval[self.xval > 0.5])
+        expected = self.xval.copy()
+        expected[self.xval > 0.5] += 1
+        utt.assert_allclose(inc_out, expected)
+
+    def test_inc_subtensor_inplace(self):
+        index = ([1, 4], [[0], [5]])
+        variables, values = self.index_variables(index)
+        y = tensor.dvector()
+        yval = self.rng.rand(7)
+        expected = self.xval.copy()
+        expected[index] += yval
+        for openmp in [False, True]:
+            op = AdvancedIncSubtensor(inplace=True, openmp=openmp)
+            f = theano.function(
+                [theano.In(self.x, mutable=True), y] + variables,
+                op(self.x, y, *variables), mode=self.mode,
+                accept_inplace=True)
+            xval = self.xval.copy()
+            out = f(xval, yval, *values)
+            utt.assert_allclose(out, expected)
+            utt.assert_allclose(xval, expected)
+
+        # The optimization only makes the increment inplace when x is not
+        # an input of the function.
+        out = inc_subtensor(advanced_subtensor(self.x * 2, *variables), y)
+        f = theano.function([self.x, y] + variables, out)
+        nodes = [n for n in f.maker.fgraph.toposort()
+                 if isinstance(n.op, AdvancedIncSubtensor)]
+        assert len(nodes) == 1 and nodes[0].op.inplace, nodes
+        xval = self.xval.copy()
+        expected = xval * 2
+        expected[index] += yval
+        utt.assert_allclose(f(xval, yval, *values), expected)
+        utt.assert_allclose(xval, self.xval)
+
+
 class TestInferShape(utt.InferShapeTester):
     @attr('slow')
     def test_infer_shape(self):
@@ -6,7 +6,7 @@ from __future__ import absolute_import, print_function, division
 import numpy
 
 import theano
-from theano.gof import Apply, Constant, Generic, Op, Type, hashtype
+from theano.gof import Apply, Constant, Generic, Op, hashtype
 from theano.gradient import DisconnectedType
 
 
@@ -49,7 +49,12 @@ class MakeSlice(Op):
 make_slice = MakeSlice()
 
 
-class SliceType(Type):
+class SliceType(Generic):
+    """
+    Inherit from Generic to have c code working: the C code receives the
+    Python slice object.
+
+    """
 
     def filter(self, x, strict=False, allow_downcast=None):
         if isinstance(x, slice):